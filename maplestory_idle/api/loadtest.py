@@ -0,0 +1,99 @@
+"""
+Load test for the process pool behind the CPU-bound endpoints.
+
+Fires a burst of concurrent jobs at a ComputePool for each worker count and
+prints throughput and latency, starting with workers=0 (the threadpool, i.e.
+how sync endpoints ran). Throughput should grow with workers up to the
+number of cores.
+
+    python -m api.loadtest --endpoint cooldown-analysis --requests 200
+    python -m api.loadtest --username alice --workers 0 1 2 4 8
+"""
+import api._paths  # noqa: F401
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from api.routers.dps import _aggregate_stats, _calculate_dps
+from api.routers.skills import _cooldown_analysis, _skill_breakdown
+from api.workers import ComputePool
+
+JOBS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    'aggregate-stats': _aggregate_stats,
+    'calculate-dps': _calculate_dps,
+    'skill-breakdown': _skill_breakdown,
+    'cooldown-analysis': _cooldown_analysis,
+}
+
+
+def _default_worker_counts() -> List[int]:
+    cores = os.cpu_count() or 1
+    counts, workers = [0], 1
+    while workers < cores:
+        counts.append(workers)
+        workers *= 2
+    return counts + [cores]
+
+
+async def _burst(pool: ComputePool, job: Callable, body: Dict[str, Any], requests: int) -> Dict[str, float]:
+    latencies: List[float] = []
+
+    async def one() -> None:
+        start = time.perf_counter()
+        await pool.run(job, body)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'throughput': requests / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+def run_load_test(job: Callable, body: Dict[str, Any], worker_counts: Sequence[int],
+                  requests: int) -> Dict[int, Dict[str, float]]:
+    """{workers: {'throughput': req/s, 'p50': s, 'p95': s}} for each worker count."""
+    results = {}
+    for workers in worker_counts:
+        pool = ComputePool(workers=workers, max_pending=requests)
+        pool.start()
+        try:
+            asyncio.run(_burst(pool, job, body, min(requests, 10)))  # warm per-worker caches
+            results[workers] = asyncio.run(_burst(pool, job, body, requests))
+        finally:
+            pool.shutdown()
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure endpoint throughput against the worker count.")
+    parser.add_argument('--endpoint', choices=sorted(JOBS), default='cooldown-analysis')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=_default_worker_counts())
+    parser.add_argument('--username', help="Saved account to use (default: a new account)")
+    args = parser.parse_args(argv)
+
+    from streamlit_app.utils.data_manager import UserData, load_user_data
+    user_data = load_user_data(args.username) if args.username else UserData()
+    body = {'user_data': user_data.model_dump()}
+
+    print(f"{args.endpoint}: {args.requests} concurrent requests, {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    results = run_load_test(JOBS[args.endpoint], body, args.workers, args.requests)
+    baseline = results[args.workers[0]]['throughput']
+    for workers, result in results.items():
+        label = workers if workers else 'threads'
+        print(f"{label:>8} {result['throughput']:>9.1f} {result['throughput'] / baseline:>7.2f}x "
+              f"{result['p50'] * 1000:>8.1f} {result['p95'] * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
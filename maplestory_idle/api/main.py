@@ -1,15 +1,29 @@
 ﻿"""
 FastAPI entry point for the MapleStory Idle Calculator backend.
-Wraps the existing Python calc engine (skills.py, dps_calculator.py) as REST endpoints.
+Wraps the existing Python calc engine (game/skills.py, engine/dps_calculator.py) as REST endpoints.
 """
 import api._paths  # noqa: F401 — configures sys.path before any other imports
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from api.routers import user_data, dps, skills, equipment_config
+from api.routers import user_data, dps, skills, equipment_config, upgrades
+from api.workers import compute_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the worker processes before taking requests (see api/workers.py)
+    compute_pool.start()
+    try:
+        yield
+    finally:
+        compute_pool.shutdown()
+
 
-app = FastAPI(title="MapleStory Idle Calculator API", version="1.0.0")
+app = FastAPI(title="MapleStory Idle Calculator API", version="1.0.0", lifespan=lifespan)
 
 # Allow the React dev server (port 5173) and any localhost origin during development
 app.add_middleware(
@@ -24,6 +38,7 @@ app.include_router(user_data.router, prefix="/api")
 app.include_router(dps.router, prefix="/api")
 app.include_router(skills.router, prefix="/api")
 app.include_router(equipment_config.router, prefix="/api")
+app.include_router(upgrades.router, prefix="/api")
 
 
 @app.get("/health")
@@ -1,15 +1,22 @@
-﻿"""DPS calculation endpoints — /api/aggregate-stats, /api/calculate-dps."""
+﻿"""DPS calculation endpoints — /api/aggregate-stats, /api/calculate-dps, /api/evaluate-batch."""
 import api._paths  # noqa: F401
 
 from fastapi import APIRouter, HTTPException
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Tuple
 
 from api.routers.user_data import _dict_to_user_data
-from streamlit_app.utils.dps_calculator import aggregate_stats, calculate_dps
+from api.workers import run_job
+from core.stat_vector import StatVector
+from engine.dps_calculator import aggregate_stats, calculate_dps, FastDPSEvaluator, LegacyBatchEvaluator
 from game.job_classes import JobClass
+from streamlit_app.utils.data_manager import UserData
 
 router = APIRouter(tags=["dps"])
 
+MAX_BATCH_CANDIDATES = 2000
+
+_MISSING = object()
+
 
 def _make_serializable(obj: Any) -> Any:
     """Recursively convert non-JSON-serializable types (tuples, sets) to lists."""
@@ -20,19 +27,42 @@ def _make_serializable(obj: Any) -> Any:
     return obj
 
 
+def _aggregate_stats(body: Dict[str, Any]) -> Dict[str, Any]:
+    user_data = _dict_to_user_data(body)
+    return _make_serializable(aggregate_stats(user_data))
+
+
+def _calculate_dps(body: Dict[str, Any]) -> Dict[str, Any]:
+    user_data_dict = body.get("user_data", body)
+    user_data = _dict_to_user_data(user_data_dict)
+
+    combat_mode = body.get("combat_mode", user_data.combat_mode)
+    enemy_def = float(body.get("enemy_def", 0.752))
+    use_realistic = bool(body.get("use_realistic_dps", False))
+    boss_importance = float(body.get("boss_importance", 0.7))
+
+    job_class = JobClass(user_data.job_class)
+
+    stats = aggregate_stats(user_data)
+    result = calculate_dps(
+        stats,
+        combat_mode=combat_mode,
+        enemy_def=enemy_def,
+        job_class=job_class,
+        use_realistic_dps=use_realistic,
+        boss_importance=boss_importance,
+    )
+    return _make_serializable(result)
+
+
 @router.post("/aggregate-stats")
-def aggregate_stats_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
+async def aggregate_stats_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
     """Aggregate all stat sources from user data into a flat stats dict."""
-    try:
-        user_data = _dict_to_user_data(body)
-        stats = aggregate_stats(user_data)
-        return _make_serializable(stats)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await run_job(_aggregate_stats, body)
 
 
 @router.post("/calculate-dps")
-def calculate_dps_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
+async def calculate_dps_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
     """
     Run the full DPS pipeline and return DPS result.
 
@@ -43,26 +73,166 @@ def calculate_dps_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
       - use_realistic_dps: bool — use phase-aware simulation, optional
       - boss_importance: float — 0.0-1.0, optional
     """
-    try:
-        user_data_dict = body.get("user_data", body)
-        user_data = _dict_to_user_data(user_data_dict)
-
-        combat_mode = body.get("combat_mode", user_data.combat_mode)
-        enemy_def = float(body.get("enemy_def", 0.752))
-        use_realistic = bool(body.get("use_realistic_dps", False))
-        boss_importance = float(body.get("boss_importance", 0.7))
-
-        job_class = JobClass(user_data.job_class)
-
-        stats = aggregate_stats(user_data)
-        result = calculate_dps(
-            stats,
-            combat_mode=combat_mode,
-            enemy_def=enemy_def,
-            job_class=job_class,
-            use_realistic_dps=use_realistic,
-            boss_importance=boss_importance,
-        )
-        return _make_serializable(result)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await run_job(_calculate_dps, body)
+
+
+def _apply_edit(user_data: UserData, edit: Dict[str, Any]) -> Callable[[], None]:
+    """
+    Set `edit['value']` at `edit['path']` (keys / list indexes) inside field
+    `edit['field']` of user_data, in place. Returns the undo.
+    """
+    field_name = edit['field']
+    if field_name not in UserData.model_fields:
+        raise ValueError(f"Unknown user_data field {field_name!r}")
+    path = list(edit.get('path') or [])
+    value = edit.get('value')
+    if not path:
+        old_field = getattr(user_data, field_name)
+        setattr(user_data, field_name, value)
+        return lambda: setattr(user_data, field_name, old_field)
+
+    container = getattr(user_data, field_name)
+    for key in path[:-1]:
+        container = container[key]
+    key = path[-1]
+    old = container.get(key, _MISSING) if isinstance(container, dict) else container[key]
+    container[key] = value
+
+    def undo() -> None:
+        if old is _MISSING:
+            del container[key]
+        else:
+            container[key] = old
+    return undo
+
+
+def _candidate_stats(user_data: UserData, base: StatVector, candidate: Dict[str, Any]) -> StatVector:
+    """
+    Stats of one batch candidate. Overlay edits and star overrides are
+    applied to user_data, re-aggregated (only the touched aggregation blocks
+    recompute) and undone; stat deltas and extra multiplicative sources are
+    layered on top without copying the stats dict.
+    """
+    edits = candidate.get('edits') or []
+    star_overrides = candidate.get('star_overrides') or None
+    stats = base
+    if edits or star_overrides:
+        undo: List[Callable[[], None]] = []
+        try:
+            for edit in edits:
+                undo.append(_apply_edit(user_data, edit))
+            stats = StatVector.from_dict(aggregate_stats(user_data, star_overrides=star_overrides))
+        finally:
+            for step in reversed(undo):
+                step()
+    if candidate.get('stat_deltas'):
+        stats = stats.with_deltas(candidate['stat_deltas'])
+    for key, entries in (candidate.get('sources') or {}).items():
+        for entry in entries:
+            stats = stats.with_source(key, entry)
+    return stats
+
+
+def _evaluate_batch(body: Dict[str, Any]) -> Dict[str, Any]:
+    user_data = _dict_to_user_data(body.get("user_data", {}))
+
+    combat_mode = body.get("combat_mode", user_data.combat_mode)
+    enemy_def = float(body.get("enemy_def", 0.752))
+    use_realistic = bool(body.get("use_realistic_dps", False))
+    boss_importance = float(body.get("boss_importance", 0.7))
+    extra_kwargs = {'job_class': JobClass(user_data.job_class), 'boss_importance': boss_importance}
+
+    base_stats = aggregate_stats(user_data)
+    base = StatVector.from_dict(base_stats)
+    evaluator = batch = None
+    if use_realistic:
+        # One realistic baseline and one sim cache for the whole batch
+        evaluator = FastDPSEvaluator(base_stats, combat_mode, enemy_def, calculate_dps, extra_kwargs=extra_kwargs)
+        baseline_dps = evaluator.baseline_realistic_dps
+        evaluate = evaluator.evaluate_changed
+    else:
+        # Delta-only candidates that scale every hit alike are scored
+        # together below; the rest run calculate_dps one at a time
+        batch = LegacyBatchEvaluator(base, combat_mode, enemy_def, extra_kwargs['job_class'])
+        baseline_dps = batch.baseline_dps
+
+        def evaluate(stats):
+            return calculate_dps(stats, combat_mode, enemy_def, **extra_kwargs)['total']
+
+    def result(label: str, dps: float) -> Dict[str, Any]:
+        gain_pct = (dps / baseline_dps - 1) * 100 if baseline_dps > 0 else 0.0
+        return {'label': label, 'dps': dps, 'gain_pct': gain_pct}
+
+    results: List[Dict[str, Any]] = []
+    batched: List[Tuple[int, str, StatVector]] = []
+    for index, candidate in enumerate(body.get("candidates", [])):
+        label = candidate.get('label', str(index))
+        try:
+            stats = _candidate_stats(user_data, base, candidate)
+            if (batch is not None and not candidate.get('edits') and not candidate.get('star_overrides')
+                    and batch.supports(stats)):
+                results.append({})
+                batched.append((len(results) - 1, label, stats))
+                continue
+            dps = evaluate(stats)
+        except Exception as e:
+            results.append({'label': label, 'error': str(e)})
+            continue
+        results.append(result(label, dps))
+
+    if batched:
+        try:
+            scores = batch.evaluate([stats for _, _, stats in batched]).tolist()
+        except Exception:
+            # Fall back to scoring (and reporting errors) one candidate at a time
+            scores = None
+        for i, (position, label, stats) in enumerate(batched):
+            if scores is not None:
+                results[position] = result(label, scores[i])
+                continue
+            try:
+                results[position] = result(label, evaluate(stats))
+            except Exception as e:
+                results[position] = {'label': label, 'error': str(e)}
+
+    response = {'baseline_dps': baseline_dps, 'results': results}
+    if evaluator is not None:
+        hits, misses = evaluator.cache_stats
+        response['simulations'] = {'cache_hits': hits, 'runs': misses}
+    return _make_serializable(response)
+
+
+@router.post("/evaluate-batch")
+async def evaluate_batch_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    DPS and gain % of many candidate edits to one build, aggregating and
+    simulating the base build once for the whole batch.
+
+    Body fields:
+      - user_data: dict — UserData fields of the base build
+      - candidates: list of dicts, each with any of
+          - label: str, optional (default: the candidate's index)
+          - stat_deltas: {stat: amount} added to the aggregated stats
+          - sources: {source_list: [entry, ...]} appended to multiplicative
+            source lists, e.g. {"def_pen_sources": [["new_line", 0.1, 100]]}
+          - star_overrides: {slot: stars}
+          - edits: [{"field": ..., "path": [...], "value": ...}] — values set
+            inside user_data fields, e.g. potential lines
+            {"field": "equipment_potentials", "path": ["gloves", "line1_value"], "value": 12}
+            or artifact swaps on "artifacts_equipped"
+      - combat_mode, enemy_def, use_realistic_dps, boss_importance: as /calculate-dps
+
+    Returns:
+      {
+        "baseline_dps": ...,
+        "results": [{"label": ..., "dps": ..., "gain_pct": ...} | {"label": ..., "error": ...}, ...],
+        "simulations": {"cache_hits": ..., "runs": ...}   (realistic path only)
+      }
+    """
+    candidates = body.get("candidates")
+    if not isinstance(candidates, list) or not all(isinstance(c, dict) for c in candidates):
+        raise HTTPException(status_code=400, detail="'candidates' must be a list of objects")
+    if len(candidates) > MAX_BATCH_CANDIDATES:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_BATCH_CANDIDATES} candidates per batch")
+    return await run_job(_evaluate_batch, body)
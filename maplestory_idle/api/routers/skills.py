@@ -1,12 +1,13 @@
 ﻿"""Skill analysis endpoints — /api/skill-breakdown, /api/cooldown-analysis."""
 import api._paths  # noqa: F401
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 from typing import Any, Dict, List
 
 from api.routers.user_data import _dict_to_user_data
 from api.routers.dps import _make_serializable
-from streamlit_app.utils.dps_calculator import (
+from api.workers import run_job
+from engine.dps_calculator import (
     aggregate_stats,
     get_combat_mode_enum,
     calculate_effective_defense_pen_with_sources,
@@ -84,8 +85,39 @@ def _build_character(stats: Dict[str, Any], job_class: JobClass,
     return char, scenario
 
 
+def _skill_breakdown(body: Dict[str, Any]) -> Dict[str, Any]:
+    user_data_dict = body.get("user_data", body)
+    user_data = _dict_to_user_data(user_data_dict)
+    combat_mode = body.get("combat_mode", user_data.combat_mode)
+    enemy_def = float(body.get("enemy_def", 0.752))
+    job_class = JobClass(user_data.job_class)
+
+    stats = aggregate_stats(user_data)
+    char, scenario = _build_character(stats, job_class, combat_mode)
+    calc = DPSCalculator(char, enemy_def=enemy_def)
+
+    dmg_range_mult = (BASE_MIN_DMG + stats['min_dmg_mult'] + BASE_MAX_DMG + stats['max_dmg_mult']) / 2 / 100
+    hex_mult = stats.get('hex_multiplier', 1.0)
+
+    raw = calc.get_skill_damage_breakdown(
+        fight_duration=scenario.fight_duration,
+        num_enemies=scenario.num_enemies,
+        mob_time_fraction=scenario.mob_time_fraction,
+    )
+
+    result = {}
+    for skill_name, info in raw.items():
+        result[skill_name] = {
+            **info,
+            'dps': info['dps'] * dmg_range_mult * hex_mult,
+            'total_damage': info.get('total_damage', 0) * dmg_range_mult * hex_mult,
+        }
+
+    return _make_serializable(result)
+
+
 @router.post("/skill-breakdown")
-def skill_breakdown_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
+async def skill_breakdown_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
     """
     Return per-skill DPS breakdown for the given user data.
 
@@ -94,41 +126,53 @@ def skill_breakdown_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
       - combat_mode: str, optional
       - enemy_def: float, optional
     """
-    try:
-        user_data_dict = body.get("user_data", body)
-        user_data = _dict_to_user_data(user_data_dict)
-        combat_mode = body.get("combat_mode", user_data.combat_mode)
-        enemy_def = float(body.get("enemy_def", 0.752))
-        job_class = JobClass(user_data.job_class)
-
-        stats = aggregate_stats(user_data)
-        char, scenario = _build_character(stats, job_class, combat_mode)
-        calc = DPSCalculator(char, enemy_def=enemy_def)
+    return await run_job(_skill_breakdown, body)
+
+
+def _cooldown_analysis(body: Dict[str, Any]) -> Dict[str, Any]:
+    user_data_dict = body.get("user_data", body)
+    user_data = _dict_to_user_data(user_data_dict)
+    combat_mode = body.get("combat_mode", user_data.combat_mode)
+    enemy_def = float(body.get("enemy_def", 0.752))
+    job_class = JobClass(user_data.job_class)
 
-        dmg_range_mult = (BASE_MIN_DMG + stats['min_dmg_mult'] + BASE_MAX_DMG + stats['max_dmg_mult']) / 2 / 100
-        hex_mult = stats.get('hex_multiplier', 1.0)
+    stats = aggregate_stats(user_data)
+    dmg_range_mult = (BASE_MIN_DMG + stats['min_dmg_mult'] + BASE_MAX_DMG + stats['max_dmg_mult']) / 2 / 100
+    hex_mult = stats.get('hex_multiplier', 1.0)
 
+    cd_values: List[float] = [x * 0.5 for x in range(0, 21)]  # 0.0 to 10.0
+    summary = []
+    breakdowns: Dict[str, List[Dict]] = {}
+
+    for cd_val in cd_values:
+        char, scenario = _build_character(stats, job_class, combat_mode, cd_override=cd_val)
+        calc = DPSCalculator(char, enemy_def=enemy_def)
         raw = calc.get_skill_damage_breakdown(
             fight_duration=scenario.fight_duration,
             num_enemies=scenario.num_enemies,
             mob_time_fraction=scenario.mob_time_fraction,
         )
 
-        result = {}
+        total_dps = sum(info['dps'] for info in raw.values()) * dmg_range_mult * hex_mult
+        summary.append({"cd_reduction": cd_val, "total_dps": total_dps})
+
+        skill_rows = []
         for skill_name, info in raw.items():
-            result[skill_name] = {
-                **info,
-                'dps': info['dps'] * dmg_range_mult * hex_mult,
-                'total_damage': info.get('total_damage', 0) * dmg_range_mult * hex_mult,
-            }
+            display = 'Basic Attack' if info['skill_type'] == 'basic' else info['display_name']
+            skill_rows.append({
+                "skill": display,
+                "skill_name": skill_name,
+                "dps": info['dps'] * dmg_range_mult * hex_mult,
+                "pct": info['pct_of_total'],
+                "skill_type": info['skill_type'],
+            })
+        breakdowns[str(cd_val)] = skill_rows
 
-        return _make_serializable(result)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return {"summary": summary, "breakdowns": breakdowns}
 
 
 @router.post("/cooldown-analysis")
-def cooldown_analysis_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
+async def cooldown_analysis_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
     """
     Sweep CD reduction 0-10s in 0.5s steps and return DPS + per-skill breakdown at each step.
 
@@ -143,45 +187,4 @@ def cooldown_analysis_endpoint(body: Dict[str, Any]) -> Dict[str, Any]:
         "breakdowns": {"0.0": [{"skill": ..., "dps": ..., "pct": ..., "skill_type": ...}, ...], ...}
       }
     """
-    try:
-        user_data_dict = body.get("user_data", body)
-        user_data = _dict_to_user_data(user_data_dict)
-        combat_mode = body.get("combat_mode", user_data.combat_mode)
-        enemy_def = float(body.get("enemy_def", 0.752))
-        job_class = JobClass(user_data.job_class)
-
-        stats = aggregate_stats(user_data)
-        dmg_range_mult = (BASE_MIN_DMG + stats['min_dmg_mult'] + BASE_MAX_DMG + stats['max_dmg_mult']) / 2 / 100
-        hex_mult = stats.get('hex_multiplier', 1.0)
-
-        cd_values: List[float] = [x * 0.5 for x in range(0, 21)]  # 0.0 to 10.0
-        summary = []
-        breakdowns: Dict[str, List[Dict]] = {}
-
-        for cd_val in cd_values:
-            char, scenario = _build_character(stats, job_class, combat_mode, cd_override=cd_val)
-            calc = DPSCalculator(char, enemy_def=enemy_def)
-            raw = calc.get_skill_damage_breakdown(
-                fight_duration=scenario.fight_duration,
-                num_enemies=scenario.num_enemies,
-                mob_time_fraction=scenario.mob_time_fraction,
-            )
-
-            total_dps = sum(info['dps'] for info in raw.values()) * dmg_range_mult * hex_mult
-            summary.append({"cd_reduction": cd_val, "total_dps": total_dps})
-
-            skill_rows = []
-            for skill_name, info in raw.items():
-                display = 'Basic Attack' if info['skill_type'] == 'basic' else info['display_name']
-                skill_rows.append({
-                    "skill": display,
-                    "skill_name": skill_name,
-                    "dps": info['dps'] * dmg_range_mult * hex_mult,
-                    "pct": info['pct_of_total'],
-                    "skill_type": info['skill_type'],
-                })
-            breakdowns[str(cd_val)] = skill_rows
-
-        return {"summary": summary, "breakdowns": breakdowns}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await run_job(_cooldown_analysis, body)
@@ -0,0 +1,98 @@
+"""Upgrade analysis endpoint — /api/upgrade-analysis, streamed as each analyser finishes."""
+import api._paths  # noqa: F401
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+
+import numpy as np
+from fastapi import APIRouter
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+import api.workers as workers
+from api.routers.user_data import _dict_to_user_data
+from api.workers import PoolOverloaded, run_job
+from optimizers.account_analysis import AccountSnapshot, analysis_tasks, build_snapshot
+
+router = APIRouter(tags=["upgrades"])
+
+_NUMPY_ENCODERS = {np.generic: lambda value: value.item(), np.ndarray: lambda array: array.tolist()}
+
+
+def _snapshot(body: Dict[str, Any]) -> AccountSnapshot:
+    user_data = _dict_to_user_data(body.get("user_data", body))
+    if "combat_mode" in body:
+        user_data.combat_mode = body["combat_mode"]
+    if "use_realistic_dps" in body:
+        user_data.use_realistic_dps = bool(body["use_realistic_dps"])
+    return build_snapshot(user_data)
+
+
+def _line(obj: Any) -> str:
+    return json.dumps(jsonable_encoder(obj, custom_encoder=_NUMPY_ENCODERS)) + "\n"
+
+
+async def _stream(snapshot: AccountSnapshot, tasks: List[Tuple[str, Callable]]) -> AsyncIterator[str]:
+    pool = workers.compute_pool
+    yield _line({
+        'combat_mode': snapshot.combat_mode,
+        'baseline_dps': snapshot.baseline_dps,
+        'analyses': [name for name, _ in tasks],
+    })
+
+    # One analyser per worker at a time, so a single analysis does not take
+    # every admission slot from the other endpoints
+    limit = asyncio.Semaphore(max(pool.workers, 1))
+    start = time.perf_counter()
+
+    async def run(name: str, task: Callable) -> Tuple[str, Any, Any]:
+        async with limit:
+            try:
+                return name, await pool.run(task), None
+            except PoolOverloaded:
+                return name, None, "Server busy, retry shortly"
+            except Exception as e:
+                return name, None, str(e)
+
+    pending = [asyncio.ensure_future(run(name, task)) for name, task in tasks]
+    try:
+        for completed, next_done in enumerate(asyncio.as_completed(pending), 1):
+            name, output, error = await next_done
+            event = {
+                'name': name,
+                'completed': completed,
+                'total': len(tasks),
+                'elapsed': time.perf_counter() - start,
+            }
+            if error is None:
+                event['result'] = output.result
+                event['evaluations'] = output.report['total']
+            else:
+                event['error'] = error
+            yield _line(event)
+    finally:
+        # Client went away: drop the analysers that have not started
+        for future in pending:
+            future.cancel()
+
+
+@router.post("/upgrade-analysis")
+async def upgrade_analysis_endpoint(body: Dict[str, Any]) -> StreamingResponse:
+    """
+    Run every account upgrade analyser (cubes and tier upgrades per slot,
+    starforce, hero power, weapons, summons, companion tickets, artifacts)
+    on the worker pool and stream the results as NDJSON.
+
+    Body fields:
+      - user_data: dict — the UserData fields
+      - combat_mode: str — overrides user_data's, optional
+      - use_realistic_dps: bool — overrides user_data's, optional
+
+    The first line is {combat_mode, baseline_dps, analyses: [names]}; then one
+    line per analyser in completion order: {name, completed, total, elapsed}
+    plus `result` and `evaluations` (DPS evaluations it made), or `error`.
+    """
+    snapshot = await run_job(_snapshot, body)
+    return StreamingResponse(_stream(snapshot, analysis_tasks(snapshot)), media_type="application/x-ndjson")
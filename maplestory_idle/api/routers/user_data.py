@@ -9,25 +9,34 @@ from streamlit_app.utils.data_manager import UserData, load_user_data, save_user
 router = APIRouter(tags=["user-data"])
 
 
+def _dict_to_user_data(body: Dict[str, Any]) -> UserData:
+    """Build a UserData from a request body; unknown fields are ignored."""
+    return UserData.model_validate(body)
+
+
 @router.get("/user-data")
 def get_user_data(username: str = "default") -> Dict[str, Any]:
-    """Load user data from CSV files and return as JSON."""
+    """Load user data from the account store and return as JSON."""
     try:
         data = load_user_data(username)
+        if data.load_failed:
+            raise HTTPException(status_code=500, detail="Saved user data could not be loaded")
         return data.model_dump()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/user-data")
 def post_user_data(body: Dict[str, Any]) -> Dict[str, Any]:
-    """Save user data JSON to CSV files. Body must include a 'username' field."""
+    """Save user data JSON to the account store. Body must include a 'username' field."""
     username = body.get("username", "default")
     try:
-        data = UserData.model_validate(body)
+        data = _dict_to_user_data(body)
         success = save_user_data(username, data)
         if not success:
-            raise HTTPException(status_code=500, detail="Save failed — file may be locked")
+            raise HTTPException(status_code=500, detail="Save failed")
         return {"ok": True}
     except HTTPException:
         raise
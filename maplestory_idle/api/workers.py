@@ -0,0 +1,128 @@
+"""
+Process pool for the CPU-bound endpoints.
+
+Stat aggregation and the skill simulations are pure Python and hold the GIL,
+so on FastAPI's threadpool one cooldown sweep stalls every other request.
+The DPS, skill and upgrade routers instead `await run_job(fn, body)`, which
+runs `fn` in a pool of worker processes started with the app (see
+api/main.py) and keeps the event loop free.
+
+Workers are started up front and pre-import the engine and skill tables, so
+the first request does not pay for them. Admission control caps the number
+of jobs queued or running at `max_pending`; past that, requests get a 503
+with Retry-After instead of queueing without bound.
+
+Configured by MAPLE_API_WORKERS (worker processes, default one per core;
+0 runs jobs on the threadpool instead) and MAPLE_API_MAX_PENDING (default
+4 per worker). Until start() is called, jobs also run on the threadpool, so
+the routers work when mounted without the app's lifespan.
+"""
+import api._paths  # noqa: F401
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+
+PENDING_PER_WORKER = 4
+RETRY_AFTER_SECONDS = 1
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name, "")
+    return int(value) if value.strip() else default
+
+
+def _warm_worker() -> None:
+    """Worker initializer: import the engine and load the tables jobs read."""
+    import api.routers.dps  # noqa: F401 — engine.dps_calculator, game.skills (skill factor table)
+    import api.routers.skills  # noqa: F401
+    import api.routers.upgrades  # noqa: F401 — optimizers.account_analysis
+    from engine.special_potential_tables import load_special_potential_tables
+    load_special_potential_tables()
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+class PoolOverloaded(Exception):
+    """Raised by ComputePool.run when `max_pending` jobs are already admitted."""
+
+
+class ComputePool:
+    """ProcessPoolExecutor with warm workers and a cap on admitted jobs."""
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.workers = workers if workers is not None else _env_int("MAPLE_API_WORKERS", os.cpu_count() or 1)
+        self.max_pending = (max_pending if max_pending is not None
+                            else _env_int("MAPLE_API_MAX_PENDING", PENDING_PER_WORKER * max(self.workers, 1)))
+        self.pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    def start(self) -> None:
+        """Start the worker processes and wait until each has warmed up."""
+        if self._executor is not None or self.workers <= 0:
+            return
+        self._executor = self._create_executor()
+        # Workers are created on demand; one concurrent job per worker creates them all
+        for future in [self._executor.submit(_ready) for _ in range(self.workers)]:
+            future.result()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn: same behaviour on every platform, and no fork of a process running threads
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run fn(*args) in a worker and return its result. `fn` and its arguments
+        must be picklable (module-level functions, plain data). Raises
+        PoolOverloaded when the pool is full.
+        """
+        # Only the event loop thread touches `pending`
+        if self.pending >= self.max_pending:
+            raise PoolOverloaded(f"{self.pending} jobs pending")
+        self.pending += 1
+        try:
+            executor = self._executor
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); replace the pool for later jobs
+                if executor is not None and executor is self._executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._create_executor()
+                raise
+        finally:
+            self.pending -= 1
+
+
+compute_pool = ComputePool()
+
+
+async def run_job(fn: Callable[..., Any], *args: Any) -> Any:
+    """compute_pool.run for an endpoint: 503 when overloaded, 500 when `fn` raises."""
+    try:
+        return await compute_pool.run(fn, *args)
+    except PoolOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly",
+                            headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -44,10 +44,25 @@ from .damage import (
     calculate_defense_multiplier,
     calculate_effective_crit_multiplier,
     calculate_attack_speed,
+    # Batched (NumPy) versions
+    calculate_damage_batch,
+    calculate_final_damage_mult_batch,
+    calculate_defense_pen_batch,
+    calculate_defense_multiplier_batch,
+    calculate_effective_crit_multiplier_batch,
+    calculate_attack_speed_batch,
 )
 
 from .models import CharacterModel
 
+from .stat_vector import (
+    StatVector,
+    StatDelta,
+    StatIndex,
+    SCALAR_STAT_KEYS,
+    SOURCE_LIST_KEYS,
+)
+
 __all__ = [
     # Constants
     'BASE_CRIT_DMG',
@@ -77,6 +92,18 @@ __all__ = [
     'calculate_defense_multiplier',
     'calculate_effective_crit_multiplier',
     'calculate_attack_speed',
+    'calculate_damage_batch',
+    'calculate_final_damage_mult_batch',
+    'calculate_defense_pen_batch',
+    'calculate_defense_multiplier_batch',
+    'calculate_effective_crit_multiplier_batch',
+    'calculate_attack_speed_batch',
     # Unified character model
     'CharacterModel',
+    # Array-backed stats
+    'StatVector',
+    'StatDelta',
+    'StatIndex',
+    'SCALAR_STAT_KEYS',
+    'SOURCE_LIST_KEYS',
 ]
@@ -217,7 +217,7 @@ ENEMY_DEFENSE_VALUES: Dict[str, float] = {
 
 EQUIPMENT_SLOTS: List[str] = [
     'hat', 'top', 'bottom', 'gloves', 'shoes', 'belt',
-    'shoulder', 'cape', 'ring', 'necklace', 'eye', 'face'
+    'shoulder', 'cape', 'ring', 'necklace', 'eye', 'face', 'earrings'
 ]
 
 
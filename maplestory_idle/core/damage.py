@@ -9,6 +9,8 @@ All formulas have been verified through in-game testing.
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+
 from .constants import (
     BASE_CRIT_DMG,
     DEF_PEN_CAP,
@@ -408,3 +410,152 @@ def calculate_damage_simple(
     def_mult = 1 / (1 + enemy_def * (1 - defense_pen))
 
     return base_atk * stat_mult * damage_mult * amp_mult * fd_mult * crit_mult * def_mult
+
+
+# =============================================================================
+# BATCHED FORMULAS (NUMPY)
+# =============================================================================
+# Array versions of the formulas above, for pricing many candidate stat vectors
+# in one call. Arguments broadcast like NumPy arithmetic and the scalar
+# operations are repeated in the same order, so every element matches the
+# scalar function bit for bit. Multi-source arguments carry the sources on the
+# last axis; pad shorter candidates with 0, which each formula treats as
+# "no source".
+
+def calculate_final_damage_mult_batch(sources) -> np.ndarray:
+    """
+    Batched calculate_final_damage_mult.
+
+    Args:
+        sources: Array (..., n_sources) of Final Damage values as decimals
+
+    Returns:
+        Array (...) of Final Damage multipliers
+    """
+    sources = np.asarray(sources, dtype=float)
+    mult = np.ones(sources.shape[:-1])
+    for i in range(sources.shape[-1]):
+        mult = mult * (1 + sources[..., i])
+    return mult
+
+
+def calculate_effective_crit_multiplier_batch(crit_rate, crit_damage) -> np.ndarray:
+    """
+    Batched calculate_effective_crit_multiplier.
+
+    Args:
+        crit_rate: Array of total crit rate %
+        crit_damage: Array of total crit damage % including base
+
+    Returns:
+        Array of effective crit multipliers
+    """
+    effective_crit_rate = np.minimum(np.asarray(crit_rate, dtype=float), 100.0) / 100.0
+    crit_dmg_bonus = np.asarray(crit_damage, dtype=float) / 100.0
+    return 1 + (effective_crit_rate * crit_dmg_bonus)
+
+
+def calculate_defense_pen_batch(sources) -> np.ndarray:
+    """
+    Batched calculate_defense_pen.
+
+    Args:
+        sources: Array (..., n_sources) of Defense Penetration values as decimals
+
+    Returns:
+        Array (...) of total Defense Penetration as decimals (capped at 1.0)
+    """
+    sources = np.asarray(sources, dtype=float)
+    remaining = np.ones(sources.shape[:-1])
+    for i in range(sources.shape[-1]):
+        remaining = remaining * (1 - sources[..., i])
+    return np.minimum(1 - remaining, DEF_PEN_CAP / 100)
+
+
+def calculate_defense_multiplier_batch(def_pen, enemy_def) -> np.ndarray:
+    """
+    Batched calculate_defense_multiplier.
+
+    Args:
+        def_pen: Array of total defense penetration as decimals (0-1)
+        enemy_def: Enemy defense value(s)
+
+    Returns:
+        Array of defense multipliers (0-1)
+    """
+    def_pen = np.asarray(def_pen, dtype=float)
+    return 1 / (1 + np.asarray(enemy_def, dtype=float) * (1 - def_pen))
+
+
+def calculate_attack_speed_batch(sources) -> np.ndarray:
+    """
+    Batched calculate_attack_speed.
+
+    Args:
+        sources: Array (..., n_sources) of attack speed values in percent,
+            in the same order the scalar version would receive them
+
+    Returns:
+        Array (...) of total attack speed percentages (capped at 150%)
+    """
+    sources = np.asarray(sources, dtype=float)
+    atk_spd = np.zeros(sources.shape[:-1])
+    for i in range(sources.shape[-1]):
+        value = sources[..., i]
+        gain = (ATK_SPD_CAP - atk_spd) * (value / ATK_SPD_CAP)
+        atk_spd = np.where(value > 0, atk_spd + gain, atk_spd)
+    return np.minimum(atk_spd, ATK_SPD_CAP)
+
+
+def calculate_damage_batch(
+    base_atk,
+    dex_flat,
+    dex_percent,
+    damage_percent,
+    damage_amp,
+    final_damage_sources,
+    crit_rate,
+    crit_damage,
+    defense_pen,
+    enemy_def,
+    boss_damage=0,
+    str_flat=0,
+    dex_flat_conversion=0,
+) -> DamageResult:
+    """
+    Batched calculate_damage over arrays of candidate stat vectors.
+
+    Takes the same arguments as calculate_damage, each either a scalar or an
+    array; final_damage_sources is an array (..., n_sources) of decimals.
+
+    Returns:
+        DamageResult whose fields are arrays of the broadcast shape
+    """
+    base_atk = np.asarray(base_atk, dtype=float)
+    total_dex = calculate_total_dex(
+        np.asarray(dex_flat, dtype=float), np.asarray(dex_percent, dtype=float)
+    ) + dex_flat_conversion
+    stat_mult = 1 + calculate_stat_proportional_damage(total_dex, np.asarray(str_flat, dtype=float))
+
+    damage_mult = 1 + (np.asarray(damage_percent, dtype=float) / 100) + (np.asarray(boss_damage, dtype=float) / 100)
+    amp_mult = calculate_damage_amp_multiplier(np.asarray(damage_amp, dtype=float))
+    fd_mult = calculate_final_damage_mult_batch(final_damage_sources)
+
+    total_crit_dmg = BASE_CRIT_DMG + np.asarray(crit_damage, dtype=float)
+    crit_mult = calculate_effective_crit_multiplier_batch(crit_rate, total_crit_dmg)
+    def_mult = calculate_defense_multiplier_batch(defense_pen, enemy_def)
+
+    total = base_atk * stat_mult * damage_mult * amp_mult * fd_mult * crit_mult * def_mult
+    shape = total.shape
+
+    return DamageResult(
+        total=total,
+        base_atk=np.broadcast_to(base_atk, shape),
+        stat_mult=np.broadcast_to(stat_mult, shape),
+        damage_mult=np.broadcast_to(damage_mult, shape),
+        amp_mult=np.broadcast_to(amp_mult, shape),
+        fd_mult=np.broadcast_to(fd_mult, shape),
+        crit_mult=np.broadcast_to(crit_mult, shape),
+        def_mult=np.broadcast_to(def_mult, shape),
+        total_dex=np.broadcast_to(total_dex, shape),
+    )
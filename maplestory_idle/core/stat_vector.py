@@ -0,0 +1,354 @@
+"""
+StatVector - fixed-schema, array-backed form of the aggregate stats dict.
+
+aggregate_stats() produces a Dict[str, Any] with ~60 string keys, and the
+optimizers used to deep-copy that dict for every candidate they scored.
+StatVector holds the same information as:
+  - one float64 buffer for the scalar stats, laid out by SCALAR_STAT_KEYS
+    (every additive stat in libs/stat_names.py plus the numeric keys only
+    the aggregation produces), addressed by the StatIndex constants
+  - one small float64 array per multiplicative source list
+    (final_damage_sources, def_pen_sources, ...)
+  - a dict of everything else (main_stat_type, companion metadata, levels)
+
+A StatVector is immutable. Candidates are built with with_delta() /
+with_source(), which copy the scalar buffer (a few hundred bytes) and share
+every other part with the original. scalars and source_values() are
+zero-copy read-only NumPy views.
+
+StatVector is a read-only Mapping with the same keys and values as the dict
+it was built from (scalars read back as floats), so calculate_dps() and the
+calc_dps_func callbacks accept it unchanged. Convert with to_dict() only at
+API and UI boundaries.
+
+StatDelta records how one build's stats differ from another's, so a
+candidate scored against one baseline can be rebuilt on a later one.
+"""
+
+import copy
+from array import array
+from collections import Counter
+from collections.abc import Mapping
+from enum import IntEnum
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from libs.stat_names import (
+    STAT_DEFINITIONS, StatType, GENERIC_STAT_KEYS,
+    DEF_PEN, FINAL_DAMAGE, ATTACK_SPEED,
+)
+
+# Numeric aggregate_stats keys that have no StatDefinition
+AGGREGATE_SCALAR_KEYS: Tuple[str, ...] = (
+    'damage_amp',
+    'companion_duration',
+    'defense_flat',
+    'defense_pct',
+    'hex_multiplier',
+    'main_stat_conversion',
+    'final_damage_correction',
+    'total_main_stat_adjustment',
+    'total_attack_adjustment',
+)
+
+# Buffer layout: additive/flat stats from libs/stat_names (generic main stat
+# keys are resolved per job before they reach a stats dict), then the rest
+SCALAR_STAT_KEYS: Tuple[str, ...] = tuple(
+    key for key, defn in STAT_DEFINITIONS.items()
+    if defn.stat_type != StatType.MULTIPLICATIVE and key not in GENERIC_STAT_KEYS
+) + AGGREGATE_SCALAR_KEYS
+
+StatIndex = IntEnum('StatIndex', [(key.upper(), i) for i, key in enumerate(SCALAR_STAT_KEYS)])
+StatIndex.__doc__ = "Position of each scalar stat in StatVector.scalars."
+
+# Multiplicative source lists -> the stat they stack. Entries are either bare
+# decimals (final damage) or tuples whose second item is the value
+# ((source, decimal, priority) for def pen, (source, pct) for attack speed).
+SOURCE_LIST_KEYS: Dict[str, str] = {
+    'final_damage_sources': FINAL_DAMAGE,
+    'companion_active_fd_sources': FINAL_DAMAGE,
+    'def_pen_sources': DEF_PEN,
+    'attack_speed_sources': ATTACK_SPEED,
+}
+
+_SCALAR_INDEX: Dict[str, int] = {key: i for i, key in enumerate(SCALAR_STAT_KEYS)}
+# Concrete types rather than numbers.Real: the ABC check dominates from_dict otherwise
+_NUMBER_TYPES = (float, int, np.floating, np.integer)
+_EMPTY = np.empty(0)
+_EMPTY.flags.writeable = False
+
+
+def _readonly_view(buffer: array) -> np.ndarray:
+    view = np.frombuffer(buffer, dtype=np.float64) if len(buffer) else _EMPTY
+    view.flags.writeable = False
+    return view
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, _NUMBER_TYPES) and value.__class__ is not bool
+
+
+def _entry_value(entry: Any) -> float:
+    return entry if _is_number(entry) else entry[1]
+
+
+class _SourceList(NamedTuple):
+    """One multiplicative source list: its values, plus the original entries if any were tuples."""
+    values: array
+    entries: Optional[Tuple[Any, ...]]
+
+    @classmethod
+    def of(cls, items: Iterable) -> '_SourceList':
+        entries = tuple(item if _is_number(item) else tuple(item) for item in items)
+        values = array('d', (_entry_value(entry) for entry in entries))
+        labelled = any(entry.__class__ is tuple for entry in entries)
+        return cls(values, entries if labelled else None)
+
+    def appended(self, item: Any) -> '_SourceList':
+        values = self.values + array('d', (_entry_value(item),))
+        if self.entries is None and _is_number(item):
+            return _SourceList(values, None)
+        entries = self.entries if self.entries is not None else tuple(self.values)
+        return _SourceList(values, entries + (item if _is_number(item) else tuple(item),))
+
+    def as_list(self) -> list:
+        return list(self.entries) if self.entries is not None else self.values.tolist()
+
+
+class StatVector(Mapping):
+    """Immutable array-backed stats; a read-only Mapping over the aggregate_stats keys."""
+
+    __slots__ = ('_keys', '_present', '_scalars', '_sources', '_extras')
+
+    def __init__(self, keys: Tuple[str, ...], present: FrozenSet[str], scalars: array,
+                 sources: Dict[str, _SourceList], extras: Dict[str, Any]):
+        self._keys = keys
+        self._present = present
+        self._scalars = scalars
+        self._sources = sources
+        self._extras = extras
+
+    # -- conversion ---------------------------------------------------------
+
+    @classmethod
+    def from_dict(cls, stats: Mapping) -> 'StatVector':
+        """
+        StatVector of a stats dict. Nested non-stat values (companion
+        metadata) are shared with `stats`, not copied.
+        """
+        if isinstance(stats, StatVector):
+            return stats
+        scalars = array('d', bytes(8 * len(SCALAR_STAT_KEYS)))
+        present = set()
+        sources: Dict[str, _SourceList] = {}
+        extras: Dict[str, Any] = {}
+        for key, value in stats.items():
+            index = _SCALAR_INDEX.get(key)
+            if index is not None and _is_number(value):
+                scalars[index] = value
+                present.add(key)
+            elif key in SOURCE_LIST_KEYS and isinstance(value, (list, tuple)):
+                sources[key] = _SourceList.of(value)
+            else:
+                extras[key] = value
+        return cls(tuple(stats), frozenset(present), scalars, sources, extras)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """A plain, independently mutable stats dict (same key order as the source dict)."""
+        result = {}
+        for key in self._keys:
+            if key in self._present:
+                result[key] = self._scalars[_SCALAR_INDEX[key]]
+            elif key in self._sources:
+                result[key] = self._sources[key].as_list()
+            else:
+                result[key] = copy.deepcopy(self._extras[key])
+        return result
+
+    # -- Mapping ------------------------------------------------------------
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._present:
+            return self._scalars[_SCALAR_INDEX[key]]
+        source = self._sources.get(key)
+        if source is not None:
+            return source.as_list()
+        return self._extras[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._present:
+            return self._scalars[_SCALAR_INDEX[key]]
+        source = self._sources.get(key)
+        if source is not None:
+            return source.as_list()
+        return self._extras.get(key, default)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._present or key in self._sources or key in self._extras
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, StatVector):
+            return (
+                self._present == other._present
+                and self._scalars == other._scalars
+                and self._sources == other._sources
+                and self._extras == other._extras
+            )
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"StatVector({len(self._present)} scalars, sources={sorted(self._sources)})"
+
+    # -- array views --------------------------------------------------------
+
+    @property
+    def scalars(self) -> np.ndarray:
+        """Read-only view of the scalar buffer, indexed by StatIndex (absent stats read 0)."""
+        return _readonly_view(self._scalars)
+
+    def source_values(self, key: str) -> np.ndarray:
+        """Read-only view of a multiplicative source list's values."""
+        source = self._sources.get(key)
+        return _readonly_view(source.values) if source is not None else _EMPTY
+
+    def changed_keys(self, other: 'StatVector') -> FrozenSet[str]:
+        """
+        Keys whose value differs from `other` (or that only one of the two
+        has). Cheap for a candidate derived from `other`: parts the two share
+        are not compared.
+        """
+        changed = set(self._present ^ other._present)
+        if self._scalars is not other._scalars:
+            changed.update(SCALAR_STAT_KEYS[i] for i in np.flatnonzero(self.scalars != other.scalars))
+        if self._sources is not other._sources:
+            changed.update(key for key in self._sources.keys() | other._sources.keys()
+                           if self._sources.get(key) != other._sources.get(key))
+        if self._extras is not other._extras:
+            changed.update(key for key in self._extras.keys() | other._extras.keys()
+                           if key not in self._extras or key not in other._extras
+                           or self._extras[key] != other._extras[key])
+        return frozenset(changed)
+
+    # -- derived vectors ----------------------------------------------------
+
+    def _derive(self, keys=None, present=None, scalars=None, sources=None, extras=None) -> 'StatVector':
+        return StatVector(
+            self._keys if keys is None else keys,
+            self._present if present is None else present,
+            self._scalars if scalars is None else scalars,
+            self._sources if sources is None else sources,
+            self._extras if extras is None else extras,
+        )
+
+    def _new_keys(self, keys: Iterable[str]) -> Tuple[str, ...]:
+        added = tuple(key for key in keys if key not in self)
+        return self._keys + added if added else self._keys
+
+    def with_deltas(self, deltas: Mapping) -> 'StatVector':
+        """Copy with each `deltas[key]` added to the stat (missing stats count as 0)."""
+        return self._with(deltas, add=True)
+
+    def with_delta(self, key: str, amount: float) -> 'StatVector':
+        """Copy with `amount` added to stat `key` (missing counts as 0)."""
+        return self._with({key: amount}, add=True)
+
+    def with_values(self, values: Mapping) -> 'StatVector':
+        """Copy with the given stats set (source-list keys take the whole list)."""
+        return self._with(values, add=False)
+
+    def _with(self, changes: Mapping, add: bool) -> 'StatVector':
+        keys = self._new_keys(changes)
+        scalars, present, sources, extras = None, None, None, None
+        for key, value in changes.items():
+            index = _SCALAR_INDEX.get(key)
+            if key in SOURCE_LIST_KEYS:
+                if add:
+                    raise ValueError(f"{key!r} is a source list; use with_source()")
+                sources = dict(self._sources) if sources is None else sources
+                sources[key] = _SourceList.of(value)
+            elif index is not None and _is_number(value) and key not in self._extras:
+                scalars = self._scalars[:] if scalars is None else scalars
+                scalars[index] = scalars[index] + value if add else value
+                if key not in self._present:
+                    present = set(self._present) if present is None else present
+                    present.add(key)
+            else:
+                extras = dict(self._extras) if extras is None else extras
+                extras[key] = extras.get(key, 0) + value if add else value
+                if key in self._present:
+                    present = set(self._present) if present is None else present
+                    present.discard(key)
+        return self._derive(keys, frozenset(present) if present is not None else None,
+                            scalars, sources, extras)
+
+    def with_source(self, key: str, entry: Any) -> 'StatVector':
+        """Copy with `entry` appended to multiplicative source list `key`."""
+        if key not in SOURCE_LIST_KEYS:
+            raise KeyError(f"{key!r} is not a source list ({', '.join(SOURCE_LIST_KEYS)})")
+        sources = dict(self._sources)
+        current = sources.get(key)
+        sources[key] = current.appended(entry) if current is not None else _SourceList.of([entry])
+        return self._derive(keys=self._new_keys((key,)), sources=sources)
+
+
+class StatDelta(NamedTuple):
+    """
+    Difference of one build's stats from another's: the scalar changes plus
+    the source-list entries removed and added. apply() replays it onto a
+    third build, e.g. a candidate's potential lines onto a baseline that has
+    since moved elsewhere. Exact while the stats it touches aggregate
+    additively (derived artifact effects that read a changed stat are not).
+    """
+    scalars: Tuple[Tuple[str, float], ...]
+    removed: Tuple[Tuple[str, Tuple[Any, ...]], ...]
+    added: Tuple[Tuple[str, Tuple[Any, ...]], ...]
+
+    @classmethod
+    def between(cls, stats: Mapping, reference: Mapping) -> Optional['StatDelta']:
+        """
+        `stats` minus `reference`, or None when they differ in a value that
+        is neither a number nor a source list (e.g. companion metadata).
+        """
+        scalars, removed, added = [], [], []
+        for key in list(reference) + [key for key in stats if key not in reference]:
+            value, base = stats.get(key), reference.get(key)
+            if key in SOURCE_LIST_KEYS:
+                entries = Counter(_SourceList.of(value or ()).as_list())
+                base_entries = Counter(_SourceList.of(base or ()).as_list())
+                if entries != base_entries:
+                    removed.append((key, tuple((base_entries - entries).elements())))
+                    added.append((key, tuple((entries - base_entries).elements())))
+            elif (value is None or _is_number(value)) and (base is None or _is_number(base)):
+                if (value or 0) != (base or 0):
+                    scalars.append((key, (value or 0) - (base or 0)))
+            elif value != base:
+                return None
+        return cls(tuple(scalars), tuple(removed), tuple(added))
+
+    def apply(self, stats: Mapping) -> StatVector:
+        """
+        `stats` with this delta applied. Raises ValueError when `stats` lacks
+        a source entry the delta removes.
+        """
+        vector = StatVector.from_dict(stats)
+        if self.scalars:
+            vector = vector.with_deltas(dict(self.scalars))
+        if not self.removed:
+            return vector
+        added = dict(self.added)
+        lists = {}
+        for key, entries in self.removed:
+            current = list(vector.get(key, ()))
+            for entry in entries:
+                current.remove(entry)
+            lists[key] = current + list(added[key])
+        return vector.with_values(lists)
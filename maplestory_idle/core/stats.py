@@ -2,6 +2,6 @@
 core/stats.py — Stat aggregation helpers.
 
 CharacterStats was removed in Phase 2 refactor (replaced by CharacterModel).
-The canonical aggregate_stats() is in streamlit_app/utils/dps_calculator.py.
+The canonical aggregate_stats() is in engine/dps_calculator.py.
 This module is intentionally minimal; further helpers can be added here as needed.
 """
@@ -0,0 +1,17 @@
+"""
+MapleStory Idle - DPS Engine
+============================
+Stat aggregation, DPS calculation and optimizer evaluation, free of any UI
+framework so API workers and scripts can import it cheaply.
+
+    from engine.dps_calculator import aggregate_stats, calculate_dps
+
+Caching goes through the pluggable backend in engine.cache.
+"""
+
+from .cache import (
+    CacheBackend,
+    LRUCache,
+    get_cache_backend,
+    set_cache_backend,
+)
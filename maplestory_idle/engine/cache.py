@@ -0,0 +1,99 @@
+"""
+Cache backends for the DPS engine.
+
+The engine memoises its stat aggregation blocks through a `CacheBackend` so the
+same code can run in an API worker, a CLI script or a Streamlit page without
+depending on any of them. By default every process gets one in-process LRU;
+front ends can swap in their own backend with `set_cache_backend()` (the
+Streamlit pages keep theirs in `st.cache_resource`, see
+streamlit_app/utils/dps_calculator.py).
+"""
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Union
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+class CacheBackend(ABC):
+    """Interface the engine caches through: a bounded key -> value store."""
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for key, or None."""
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value under key, evicting as the backend sees fit."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every entry."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of entries currently stored."""
+
+
+class LRUCache(CacheBackend):
+    """Thread-safe in-process LRU; the default backend."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def most_recent(self) -> Optional[Any]:
+        """The most recently used value, or None when empty."""
+        with self._lock:
+            return next(reversed(self._entries.values()), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_default_backend = LRUCache()
+_backend_provider: Callable[[], CacheBackend] = lambda: _default_backend
+
+
+def set_cache_backend(backend: Union[CacheBackend, Callable[[], CacheBackend], None]) -> None:
+    """
+    Route the engine's caches through `backend`.
+
+    Pass a CacheBackend to use it directly, or a zero-argument callable that
+    returns one to resolve the backend on every aggregation (for front ends
+    whose cache lives in framework-managed storage). None restores the
+    default in-process LRU.
+    """
+    global _backend_provider
+    if backend is None:
+        _backend_provider = lambda: _default_backend
+    elif isinstance(backend, CacheBackend):
+        _backend_provider = lambda: backend
+    else:
+        _backend_provider = backend
+
+
+def get_cache_backend() -> CacheBackend:
+    """The backend the engine's caches currently use."""
+    return _backend_provider()
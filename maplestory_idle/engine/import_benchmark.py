@@ -0,0 +1,81 @@
+"""
+Benchmark of the DPS engine's cold import cost.
+
+Times `import <module>` in a fresh interpreter (best of several runs) for
+the framework-free engine, the API app built on it and the Streamlit
+adapter, and reports whether each import pulled in Streamlit. The engine
+should import well under the adapter and never load Streamlit. Reports
+only: import times depend on the machine and its disk cache, so nothing
+here asserts a limit.
+
+    python -m engine.import_benchmark
+    python -m engine.import_benchmark --runs 10 engine.dps_calculator api.main
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, Optional, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ('engine.dps_calculator', 'api.main', 'streamlit_app.utils.dps_calculator')
+
+_IMPORT_CODE = (
+    "import sys, time; sys.path.insert(0, {root!r}); t = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - t, 'streamlit' in sys.modules)"
+)
+
+
+def cold_import(module: str, runs: int = 3) -> Tuple[float, bool]:
+    """
+    (best-of-`runs` seconds to import `module` in a fresh interpreter,
+    whether it pulled in Streamlit). Raises CalledProcessError when the
+    import fails (e.g. an optional dependency is missing).
+    """
+    code = _IMPORT_CODE.format(root=ROOT, module=module)
+    best, loaded_streamlit = float('inf'), False
+    for _ in range(max(1, runs)):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+        seconds, streamlit_loaded = out.stdout.split()[-2:]
+        best = min(best, float(seconds))
+        loaded_streamlit = loaded_streamlit or streamlit_loaded == 'True'
+    return best, loaded_streamlit
+
+
+def run_benchmark(modules: Sequence[str] = DEFAULT_MODULES, runs: int = 3) -> Dict[str, Dict]:
+    """
+    {module: {'seconds': s, 'streamlit': bool}} per module that imports;
+    {module: {'error': message}} for one that does not.
+    """
+    results = {}
+    for module in modules:
+        try:
+            seconds, loaded_streamlit = cold_import(module, runs)
+        except subprocess.CalledProcessError as e:
+            lines = (e.stderr or '').strip().splitlines()
+            results[module] = {'error': lines[-1] if lines else str(e)}
+        else:
+            results[module] = {'seconds': seconds, 'streamlit': loaded_streamlit}
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Time cold imports of the DPS engine and its front ends.")
+    parser.add_argument('modules', nargs='*', default=list(DEFAULT_MODULES))
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per module (best is reported)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.modules, args.runs)
+    reference = results.get('engine.dps_calculator', {}).get('seconds')
+    print(f"{'module':<40} {'seconds':>8} {'vs engine':>9} {'streamlit':>9}")
+    for module, result in results.items():
+        if 'error' in result:
+            print(f"{module:<40} {'failed':>8}  {result['error']}")
+            continue
+        ratio = f"{result['seconds'] / reference:>8.2f}x" if reference else f"{'-':>9}"
+        print(f"{module:<40} {result['seconds']:>8.3f} {ratio} {str(result['streamlit']):>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""
+Precomputed special-potential conversion tables.
+
+The special-potential helpers in engine/dps_calculator.py turn All Skills,
+BA Targets, Skill CD and Buff Duration into DPS values. Each evaluation is
+one or two DPSCalculator simulations. This module samples those simulations
+offline on dense grids per job class (level x all_skills x the potential's
+own value) and stores the grids in engine/data/special_potential_tables.npz.
+At runtime the helpers interpolate in the grid and simulate only for inputs
+the grid does not cover.
+
+Levels and the usual All Skills range are sampled at every integer, so skill
+and mastery unlocks and skill level steps are exact; the potentials' own
+values are interpolated linearly. Attack only scales damage and drops out
+of every ratio, so it is not a table axis.
+
+Regenerate after changing the skill data or the simulator:
+
+    python -m engine.special_potential_tables
+"""
+import argparse
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Add parent directory to path for imports (maplestory_idle root)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from game.job_classes import JobClass
+from game.skills import (
+    calculate_all_skills_value, create_character_at_level, DPSCalculator, BOWMASTER_SKILLS,
+)
+
+SPECIAL_POTENTIAL_TABLES_PATH = Path(__file__).parent / 'data' / 'special_potential_tables.npz'
+
+# Fixed character stats the simulations run at
+SIM_ATTACK = 50000
+SIM_CRIT_RATE = 70
+SIM_CRIT_DAMAGE = 200
+SIM_ATTACK_SPEED_PCT = 50
+
+# BA share is tabulated for the standard stage fight only
+BA_TABLE_NUM_ENEMIES = 6
+BA_TABLE_MOB_TIME_FRACTION = 0.6
+
+# Table name -> axis names, in lookup argument order
+TABLE_AXES: Dict[str, Tuple[str, ...]] = {
+    'all_skills': ('level', 'all_skills', 'crit_damage'),
+    'ba_percent': ('level', 'all_skills', 'ba_target_bonus'),
+    'skill_cd': ('level', 'all_skills', 'cd_reduction_seconds'),
+    'buff_duration': ('level', 'all_skills', 'buff_duration_pct'),
+}
+
+_LEVELS = tuple(range(10, 201))
+_ALL_SKILLS = tuple(range(0, 61)) + tuple(range(70, 101, 10))
+
+# Table name -> sample points per axis. Third axes cover three stacked
+# mystic lines (3 x +3 targets, 3 x 2s, 3 x 20%).
+DEFAULT_GRID: Dict[str, Tuple[Sequence[float], ...]] = {
+    'all_skills': (_LEVELS, _ALL_SKILLS, (100, 150, 200, 300, 400, 500, 700)),
+    'ba_percent': (_LEVELS, _ALL_SKILLS, tuple(range(0, 10))),
+    'skill_cd': (_LEVELS, _ALL_SKILLS, tuple(x / 2 for x in range(0, 13))),
+    'buff_duration': (_LEVELS, _ALL_SKILLS, tuple(range(0, 61, 5))),
+}
+
+# Jobs the committed tables cover. The helpers in engine/dps_calculator.py
+# take no job class and simulate a Bowmaster (Buff Duration reads Mortal
+# Blow), so a table for any other job would never be read. Add a job here
+# and regenerate once the helpers model it.
+TABULATED_JOBS: Tuple[JobClass, ...] = (JobClass.BOWMASTER,)
+
+
+# =============================================================================
+# Simulations (the values the tables store)
+# =============================================================================
+
+def _sim_character(level: int, all_skills_bonus: int, job_class: JobClass, crit_damage: float = SIM_CRIT_DAMAGE):
+    char = create_character_at_level(level, all_skills_bonus, job_class)
+    char.attack = SIM_ATTACK
+    char.crit_damage = crit_damage
+    char.crit_rate = SIM_CRIT_RATE
+    char.attack_speed_pct = SIM_ATTACK_SPEED_PCT
+    return char
+
+
+def simulate_all_skills_dps_value(level: int, current_all_skills: int, base_attack: float,
+                                  crit_damage: float) -> float:
+    """% DPS increase per +1 All Skills, simulated."""
+    try:
+        value, _ = calculate_all_skills_value(
+            level=level,
+            current_all_skills=current_all_skills,
+            attack=base_attack,
+            crit_rate=SIM_CRIT_RATE,
+            crit_damage=crit_damage,
+            attack_speed_pct=SIM_ATTACK_SPEED_PCT,
+        )
+        return value
+    except Exception:
+        return 0.68  # Fallback
+
+
+def simulate_ba_percent_of_dps(
+    level: int,
+    all_skills_bonus: int,
+    base_attack: float,
+    crit_damage: float,
+    num_enemies: int = BA_TABLE_NUM_ENEMIES,
+    mob_time_fraction: float = BA_TABLE_MOB_TIME_FRACTION,
+    ba_target_bonus: int = 0,
+    job_class: JobClass = JobClass.BOWMASTER,
+) -> float:
+    """Basic Attack DPS as a percentage of total DPS, simulated."""
+    try:
+        char = _sim_character(level, all_skills_bonus, job_class, crit_damage)
+        char.attack = base_attack
+        # BA Target bonus increases the number of targets BA can hit
+        # Base BA targets is 6, so +3 = 9 targets
+        char.ba_target_bonus = ba_target_bonus
+
+        calc = DPSCalculator(char)
+        result = calc.calculate_total_dps(
+            num_enemies=num_enemies,
+            mob_time_fraction=mob_time_fraction,
+        )
+
+        if result.total_dps > 0:
+            return (result.basic_attack_dps / result.total_dps) * 100
+    except Exception:
+        pass
+    return 40.0  # Fallback
+
+
+def simulate_skill_cd_dps_value(level: int, all_skills_bonus: int, cd_reduction_seconds: float,
+                                job_class: JobClass = JobClass.BOWMASTER) -> float:
+    """% DPS increase from Skill CD reduction (hat special potential), simulated."""
+    try:
+        char_base = _sim_character(level, all_skills_bonus, job_class)
+        char_base.skill_cd_reduction = 0.0
+        result_base = DPSCalculator(char_base).calculate_total_dps()
+
+        char_cd = _sim_character(level, all_skills_bonus, job_class)
+        char_cd.skill_cd_reduction = cd_reduction_seconds
+        result_cd = DPSCalculator(char_cd).calculate_total_dps()
+
+        if result_base.total_dps > 0:
+            return ((result_cd.total_dps / result_base.total_dps) - 1) * 100
+    except Exception:
+        pass
+    return 0.0  # Fallback
+
+
+def simulate_buff_duration_dps_value(level: int, all_skills_bonus: int, buff_duration_pct: float,
+                                     job_class: JobClass = JobClass.BOWMASTER) -> float:
+    """
+    % DPS increase from Buff Duration (belt special potential), from the
+    change in Mortal Blow uptime.
+    """
+    try:
+        char = _sim_character(level, all_skills_bonus, job_class)
+        calc = DPSCalculator(char)
+
+        if not char.is_skill_unlocked("mortal_blow"):
+            return 0.0
+
+        mb_skill = BOWMASTER_SKILLS["mortal_blow"]
+        mb_level = char.get_effective_skill_level("mortal_blow")
+        # Use skill_bonuses format: {stat_name: (base, per_level)}
+        base, per_level = mb_skill.skill_bonuses.get("final_damage", (0, 0))
+        mb_fd = int((base + per_level * mb_level) * 10) / 10
+
+        base_uptime = calc.calculate_mortal_blow_uptime()
+
+        base_duration = 5.0
+        if level >= 90:
+            base_duration += 5.0
+
+        new_duration = base_duration * (1 + buff_duration_pct / 100)
+
+        if base_uptime > 0 and base_uptime < 1:
+            build_time = base_duration * (1 - base_uptime) / base_uptime
+            new_uptime = new_duration / (new_duration + build_time)
+        else:
+            new_uptime = base_uptime
+
+        base_avg_fd = mb_fd * base_uptime
+        new_avg_fd = mb_fd * new_uptime
+
+        if base_avg_fd > 0:
+            return ((1 + new_avg_fd / 100) / (1 + base_avg_fd / 100) - 1) * 100
+    except Exception:
+        pass
+    return 0.0
+
+
+# Table name -> simulation at one grid point (level, all_skills, third axis, job)
+_TABLE_SIMULATIONS: Dict[str, Callable[[int, int, float, JobClass], float]] = {
+    'all_skills': lambda level, all_skills, crit_damage, job: simulate_all_skills_dps_value(
+        level, all_skills, SIM_ATTACK, crit_damage),
+    'ba_percent': lambda level, all_skills, targets, job: simulate_ba_percent_of_dps(
+        level, all_skills, SIM_ATTACK, SIM_CRIT_DAMAGE, ba_target_bonus=int(targets), job_class=job),
+    'skill_cd': lambda level, all_skills, seconds, job: simulate_skill_cd_dps_value(
+        level, all_skills, seconds, job),
+    'buff_duration': lambda level, all_skills, pct, job: simulate_buff_duration_dps_value(
+        level, all_skills, pct, job),
+}
+
+
+# =============================================================================
+# Tables
+# =============================================================================
+
+class ConversionTable(NamedTuple):
+    """One conversion grid: sample points per axis and the simulated value at each grid point."""
+    axes: Tuple[np.ndarray, ...]
+    values: np.ndarray
+
+    def lookup(self, *point: float) -> Optional[float]:
+        """Multilinear interpolation at `point`; None outside the grid."""
+        corners = [((), 1.0)]
+        for axis, x in zip(self.axes, point):
+            if not axis[0] <= x <= axis[-1]:
+                return None
+            hi = int(np.searchsorted(axis, x))
+            if axis[hi] == x:
+                steps = [(hi, 1.0)]
+            else:
+                t = (x - axis[hi - 1]) / (axis[hi] - axis[hi - 1])
+                steps = [(hi - 1, 1.0 - t), (hi, t)]
+            corners = [(index + (i,), weight * w) for index, weight in corners for i, w in steps]
+        return float(sum(weight * self.values[index] for index, weight in corners))
+
+
+def build_table(name: str, job_class: JobClass = JobClass.BOWMASTER,
+                grid: Optional[Sequence[Sequence[float]]] = None) -> ConversionTable:
+    """Simulate table `name` at every point of `grid` (default DEFAULT_GRID[name])."""
+    simulate = _TABLE_SIMULATIONS[name]
+    axes = tuple(np.asarray(axis, dtype=float) for axis in (grid or DEFAULT_GRID[name]))
+    values = np.empty(tuple(len(axis) for axis in axes))
+    for index in np.ndindex(values.shape):
+        level, all_skills, x = (axis[i] for axis, i in zip(axes, index))
+        values[index] = simulate(int(level), int(all_skills), float(x), job_class)
+    return ConversionTable(axes, values)
+
+
+def build_tables(jobs: Sequence[JobClass] = TABULATED_JOBS,
+                 grids: Optional[Dict[str, Sequence[Sequence[float]]]] = None,
+                 ) -> Dict[Tuple[str, str], ConversionTable]:
+    """Every table for every job, keyed by (job value, table name)."""
+    grids = grids or DEFAULT_GRID
+    return {(job.value, name): build_table(name, job, grids[name]) for job in jobs for name in grids}
+
+
+def save_tables(tables: Dict[Tuple[str, str], ConversionTable], path: Path = SPECIAL_POTENTIAL_TABLES_PATH) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {}
+    for (job, name), table in tables.items():
+        arrays[f'{job}/{name}/values'] = table.values
+        for i, axis in enumerate(table.axes):
+            arrays[f'{job}/{name}/axis{i}'] = axis
+    np.savez_compressed(path, **arrays)
+
+
+def read_tables(path: Path = SPECIAL_POTENTIAL_TABLES_PATH) -> Dict[Tuple[str, str], ConversionTable]:
+    """Tables stored at `path` (empty when the file does not exist)."""
+    if not Path(path).exists():
+        return {}
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files}
+    tables = {}
+    for key in arrays:
+        job, name, part = key.split('/')
+        if part == 'values':
+            axes = tuple(arrays[f'{job}/{name}/axis{i}'] for i in range(arrays[key].ndim))
+            tables[(job, name)] = ConversionTable(axes, arrays[key])
+    return tables
+
+
+_tables: Optional[Dict[Tuple[str, str], ConversionTable]] = None
+_tables_lock = threading.Lock()
+
+
+def load_special_potential_tables(path: Path = SPECIAL_POTENTIAL_TABLES_PATH) -> Dict[Tuple[str, str], ConversionTable]:
+    """(Re)load the tables lookups read from; call after regenerating them."""
+    global _tables
+    with _tables_lock:
+        _tables = read_tables(path)
+        return _tables
+
+
+def lookup_special_potential(name: str, *point: float,
+                             job_class: JobClass = JobClass.BOWMASTER) -> Optional[float]:
+    """
+    Tabulated value of conversion `name` at `point` (see TABLE_AXES for the
+    argument order), or None when no table covers it.
+    """
+    tables = _tables if _tables is not None else load_special_potential_tables()
+    table = tables.get((job_class.value, name))
+    return table.lookup(*point) if table is not None else None
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Regenerate the special-potential conversion tables.")
+    parser.add_argument('--output', type=Path, default=SPECIAL_POTENTIAL_TABLES_PATH)
+    parser.add_argument('--jobs', nargs='+', default=[job.value for job in TABULATED_JOBS],
+                        choices=[job.value for job in JobClass])
+    args = parser.parse_args(argv)
+
+    tables = {}
+    for job in args.jobs:
+        for name in DEFAULT_GRID:
+            print(f"{job}: {name} ({'x'.join(str(len(axis)) for axis in DEFAULT_GRID[name])} points)")
+            tables[(job, name)] = build_table(name, JobClass(job))
+    save_tables(tables, args.output)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
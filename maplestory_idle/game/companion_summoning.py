@@ -21,7 +21,12 @@ already-computed EV of the tier above for the maxed-companion branch.
 See plan: C:/Users/ianpr/.claude/plans/sorted-nibbling-meteor.md
 """
 
-from typing import Callable, Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from engine.cache import LRUCache
 
 from game.companions import (
     COMPANIONS,
@@ -252,16 +257,206 @@ def calculate_ev_per_pull_at_tier(
     return total / len(keys)
 
 
+# =============================================================================
+# BATCHED COMPANION VALUE ORACLE
+# =============================================================================
+# Each companion's stat contribution is a pure function of its level, so it is
+# tabulated once per companion as a (level × stat) array: one table for the
+# inventory effect (every owned companion) and one for the on-equip effect.
+# A level change is then a row difference, which lets callers score a
+# candidate by patching baseline stats instead of re-aggregating the account.
+#
+# The ticket EV only ever reads single-companion states ({key: level}), so
+# the full set is known up front: {key: 1} for unowned companions and
+# {key: L} / {key: L+1} for in-progress ones. They are evaluated in one
+# batched call and cached per account fingerprint.
+
+# Stats a companion can move that aggregate_stats() consumes. main_stat_flat /
+# main_stat_pct resolve to the job's main stat; attack_speed is a source entry.
+COMPANION_STAT_AXIS: Tuple[str, ...] = (
+    'attack_flat',
+    'main_stat_flat',
+    'main_stat_pct',
+    'damage_pct',
+    'crit_damage',
+    'crit_rate',
+    'boss_damage',
+    'normal_damage',
+    'min_dmg_mult',
+    'max_dmg_mult',
+    'skill_damage',
+    'basic_attack_damage',
+    'attack_speed',
+)
+_STAT_INDEX: Dict[str, int] = {name: i for i, name in enumerate(COMPANION_STAT_AXIS)}
+
+# On-equip stat types whose name differs from the stats-dict name.
+_ON_EQUIP_STAT_NAMES: Dict[str, str] = {'flat_attack': 'attack_flat'}
+
+CompanionOverride = Tuple[str, int]
+# (companion_key, level) — a single-companion what-if state
+
+MarginalDpsBatchFn = Callable[[List[Dict[str, int]]], Sequence[float]]
+
+_MARGINAL_CACHE_SIZE = 16
+_marginal_cache = LRUCache(maxsize=_MARGINAL_CACHE_SIZE)
+
+
+@lru_cache(maxsize=None)
+def companion_stat_table(companion_key: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (inventory, on_equip) stat vectors for a companion at levels 0..max.
+
+    Both arrays have shape (max_level + 1, len(COMPANION_STAT_AXIS)); row 0
+    is all zeros (not owned). Stats outside COMPANION_STAT_AXIS (max HP,
+    accuracy, ...) do not affect DPS and are dropped. Arrays are read-only.
+    """
+    comp = COMPANIONS[companion_key]
+    max_level = _max_level_for(comp.advancement)
+    inventory = np.zeros((max_level + 1, len(COMPANION_STAT_AXIS)))
+    on_equip = np.zeros_like(inventory)
+    equip_type = comp.on_equip_type.value
+    equip_index = _STAT_INDEX.get(_ON_EQUIP_STAT_NAMES.get(equip_type, equip_type))
+
+    for level in range(1, max_level + 1):
+        for stat, value in comp.get_inventory_stats(level).items():
+            if stat in _STAT_INDEX:
+                inventory[level, _STAT_INDEX[stat]] = value
+        if equip_index is not None:
+            value = comp.get_on_equip_value(level)
+            if value > 0:
+                on_equip[level, equip_index] = value
+
+    inventory.setflags(write=False)
+    on_equip.setflags(write=False)
+    return inventory, on_equip
+
+
+def companion_stat_vector(companion_key: str, level: int, equipped: bool = False) -> np.ndarray:
+    """Total stat vector a companion contributes at `level` (0 = not owned)."""
+    inventory, on_equip = companion_stat_table(companion_key)
+    level = max(0, min(level, len(inventory) - 1))
+    if equipped:
+        return inventory[level] + on_equip[level]
+    return inventory[level].copy()
+
+
+def companion_stat_delta(
+    companion_key: str,
+    from_level: int,
+    to_level: int,
+    equipped: bool = False,
+) -> Dict[str, float]:
+    """
+    Stat change from moving a companion between two levels, as
+    {stat_name: delta} over COMPANION_STAT_AXIS (zero entries omitted).
+    """
+    delta = (
+        companion_stat_vector(companion_key, to_level, equipped)
+        - companion_stat_vector(companion_key, from_level, equipped)
+    )
+    return {COMPANION_STAT_AXIS[i]: float(delta[i]) for i in np.flatnonzero(delta)}
+
+
+def account_fingerprint(user_state: UserState) -> Tuple:
+    """Hashable identity of a companion collection (owned levels + equipped)."""
+    owned = tuple(sorted(
+        (k, int(v)) for k, v in user_state.get('owned', {}).items() if v > 0
+    ))
+    return owned, tuple(user_state.get('equipped', []) or [])
+
+
+def required_companion_overrides(user_state: UserState) -> List[CompanionOverride]:
+    """
+    Every single-companion state the ticket EV reads, in a stable order.
+
+    Unowned companions need level 1; in-progress ones need their current
+    level and the next one. Maxed companions only feed promotion EV and
+    need no DPS evaluation.
+    """
+    owned = user_state.get('owned', {})
+    overrides: List[CompanionOverride] = []
+    for tier in JobAdvancement:
+        max_level = _max_level_for(tier)
+        for key in companions_in_tier(tier):
+            level = owned.get(key, 0)
+            if level >= max_level:
+                continue
+            if level == 0:
+                overrides.append((key, 1))
+            else:
+                overrides.append((key, level))
+                overrides.append((key, level + 1))
+    return overrides
+
+
+def evaluate_companion_marginals(
+    user_state: UserState,
+    marginal_dps_fn: Optional[Callable[[Dict[str, int]], float]] = None,
+    marginal_dps_batch_fn: Optional[MarginalDpsBatchFn] = None,
+    cache_key: Optional[Hashable] = None,
+) -> Dict[CompanionOverride, float]:
+    """
+    Marginal DPS for every state in required_companion_overrides().
+
+    `marginal_dps_batch_fn` receives the whole list of {key: level} deltas in
+    one call and returns one marginal per entry; without it the per-state
+    `marginal_dps_fn` is called once per distinct state. When `cache_key`
+    identifies everything outside the companion collection that the
+    marginals depend on (baseline stats, combat mode, ...), results are
+    cached per (cache_key, account fingerprint).
+    """
+    if marginal_dps_fn is None and marginal_dps_batch_fn is None:
+        raise ValueError("marginal_dps_fn or marginal_dps_batch_fn is required")
+
+    full_key = None
+    if cache_key is not None:
+        full_key = (cache_key, account_fingerprint(user_state))
+        cached = _marginal_cache.get(full_key)
+        if cached is not None:
+            return cached
+
+    overrides = required_companion_overrides(user_state)
+    if marginal_dps_batch_fn is not None:
+        values = list(marginal_dps_batch_fn([{key: level} for key, level in overrides]))
+        if len(values) != len(overrides):
+            raise ValueError(
+                f"marginal_dps_batch_fn returned {len(values)} values for {len(overrides)} states"
+            )
+    else:
+        values = [marginal_dps_fn({key: level}) for key, level in overrides]
+    marginals = {ov: float(v) for ov, v in zip(overrides, values)}
+
+    if full_key is not None:
+        _marginal_cache.set(full_key, marginals)
+    return marginals
+
+
 def calculate_expected_value_per_ticket(
     user_state: UserState,
-    marginal_dps_fn: Callable[[Dict[str, int]], float],
+    marginal_dps_fn: Optional[Callable[[Dict[str, int]], float]] = None,
+    marginal_dps_batch_fn: Optional[MarginalDpsBatchFn] = None,
+    cache_key: Optional[Hashable] = None,
 ) -> Dict:
     """
     Top-down EV solve: FOURTH → THIRD → SECOND → FIRST → BASIC.
 
+    Every marginal the solve needs is gathered first through
+    evaluate_companion_marginals() (one batched call when
+    `marginal_dps_batch_fn` is given), so the solve itself is a single
+    lookup pass.
+
     Returns a dict with the expected value per ticket and a per-tier
     breakdown for diagnostics.
     """
+    marginals = evaluate_companion_marginals(
+        user_state, marginal_dps_fn, marginal_dps_batch_fn, cache_key,
+    )
+
+    def _lookup(state_delta: Dict[str, int]) -> float:
+        (key, level), = state_delta.items()
+        return marginals[(key, level)]
+
     tier_order = [
         JobAdvancement.FOURTH,
         JobAdvancement.THIRD,
@@ -274,7 +469,7 @@ def calculate_expected_value_per_ticket(
         next_tier = _NEXT_TIER.get(tier)
         ev_next = per_tier_ev.get(next_tier, 0.0) if next_tier else 0.0
         per_tier_ev[tier] = calculate_ev_per_pull_at_tier(
-            tier, user_state, marginal_dps_fn, ev_next,
+            tier, user_state, _lookup, ev_next,
         )
 
     # Expected ticket value = sum of P(tier) × EV(tier).
@@ -312,9 +507,11 @@ def calculate_expected_value_per_ticket(
 
 def get_companion_ticket_recommendation_for_optimizer(
     user_state: UserState,
-    marginal_dps_fn: Callable[[Dict[str, int]], float],
+    marginal_dps_fn: Optional[Callable[[Dict[str, int]], float]],
     baseline_dps: float,
     batch_size: int = 100,
+    marginal_dps_batch_fn: Optional[MarginalDpsBatchFn] = None,
+    cache_key: Optional[Hashable] = None,
 ) -> Optional[Dict]:
     """
     Build a single optimizer-recommendation dict for a batch of `batch_size`
@@ -323,8 +520,12 @@ def get_companion_ticket_recommendation_for_optimizer(
 
     `baseline_dps` is needed to convert per-pull marginal DPS into a
     percentage gain (matching how every other recommendation reports gains).
+    `marginal_dps_batch_fn` / `cache_key` are passed through to
+    evaluate_companion_marginals().
     """
-    ev = calculate_expected_value_per_ticket(user_state, marginal_dps_fn)
+    ev = calculate_expected_value_per_ticket(
+        user_state, marginal_dps_fn, marginal_dps_batch_fn, cache_key,
+    )
     if ev['expected_value'] <= 0 or baseline_dps <= 0:
         return None
 
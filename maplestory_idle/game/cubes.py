@@ -1260,6 +1260,11 @@ class CachedRollDistribution:
         has_special = slot in SPECIAL_POTENTIALS
         special_def = SPECIAL_POTENTIALS.get(slot) if has_special else None
 
+        # Base value per stat type (the first tier entry, as _get_base_stat_value)
+        base_values = {}
+        for stat in POTENTIAL_STATS.get(self.tier, []):
+            base_values.setdefault(stat.stat_type, stat.value)
+
         scored_rolls = []
 
         for cached_roll in self._rolls:
@@ -1289,7 +1294,7 @@ class CachedRollDistribution:
                     base_value = self._get_special_base_value(slot, line.stat_type)
                 else:
                     weight = stat_weights.get(line.stat_type, 0.0)
-                    base_value = self._get_base_stat_value(line.stat_type)
+                    base_value = base_values.get(line.stat_type, 1.0)
 
                 line_dps_gain = weight * (line.value / base_value) if base_value > 0 else 0
                 total_dps_gain += line_dps_gain
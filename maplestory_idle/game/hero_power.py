@@ -10,12 +10,20 @@ Hero Power provides stats through two separate systems:
 Last Updated: December 2025
 """
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields, is_dataclass
 from typing import Dict, List, Optional, Tuple, Callable
 from enum import Enum
+from collections import defaultdict
+from collections.abc import Mapping
+import math
 import random
 import copy
 
+import numpy as np
+
+from core.stat_vector import StatVector
+from engine.cache import LRUCache
+
 # Import standardized stat names and utilities
 from libs.stat_names import (
     get_display_name,
@@ -81,6 +89,12 @@ STAT_DISPLAY_NAMES: Dict[HeroPowerStatType, str] = {
     HeroPowerStatType.MAX_HP: get_display_name("max_hp"),
 }
 
+# Tier order from worst to best (used for "tier >= min_tier" comparisons)
+HERO_POWER_TIER_ORDER: List[HeroPowerTier] = [
+    HeroPowerTier.COMMON, HeroPowerTier.RARE, HeroPowerTier.EPIC,
+    HeroPowerTier.UNIQUE, HeroPowerTier.LEGENDARY, HeroPowerTier.MYSTIC,
+]
+
 # Tier display colors (matching existing app style)
 TIER_COLORS: Dict[HeroPowerTier, str] = {
     HeroPowerTier.COMMON: "#888888",
@@ -650,13 +664,6 @@ def calculate_line_dps_value(
         # Defensive stat, no DPS impact
         return 0.0
 
-    # Stats stored as source lists (multiplicative stats) need special handling
-    # These are stored as lists of tuples, not scalar values
-    SOURCE_LIST_STATS = {
-        'def_pen': 'def_pen_sources',      # List of (source, value/100, priority)
-        'attack_speed': 'attack_speed_sources',  # List of (source, value)
-    }
-
     try:
         # Get current stats
         current_stats = get_stats_func()
@@ -668,35 +675,8 @@ def calculate_line_dps_value(
         if current_dps <= 0:
             return 0.0
 
-        # Make a deep copy for baseline calculation
-        baseline_stats = copy.deepcopy(current_stats)
-
-        # Handle stats stored in source lists vs scalar values
-        if stats_key in SOURCE_LIST_STATS:
-            # Multiplicative stat stored as source list
-            source_list_key = SOURCE_LIST_STATS[stats_key]
-            if source_list_key in baseline_stats:
-                # Filter out this specific hero_power line from the source list
-                # Source names are like 'hero_power_line1', 'hero_power_line2', etc. (no underscore before number)
-                original_sources = baseline_stats[source_list_key]
-                line_source_name = f'hero_power_line{line.slot}'
-                filtered_sources = [
-                    entry for entry in original_sources
-                    if entry[0].lower() != line_source_name
-                ]
-                baseline_stats[source_list_key] = filtered_sources
-        else:
-            # Scalar stat - subtract line value
-            # Handle main_stat_flat specially - it gets resolved to job-specific keys (dex_flat, str_flat, etc.)
-            if stats_key == 'main_stat_flat':
-                # The stats dict includes 'main_stat_type' which tells us the job's main stat
-                # e.g., 'dex' for Bowmaster, 'str' for Warrior, etc.
-                main_stat_type = baseline_stats.get('main_stat_type', 'dex')
-                actual_key = f'{main_stat_type}_flat'
-                baseline_stats[actual_key] = baseline_stats.get(actual_key, 0) - line.value
-            else:
-                current_value = baseline_stats.get(stats_key, 0)
-                baseline_stats[stats_key] = current_value - line.value
+        # Baseline = current stats with this line's contribution removed
+        baseline_stats = _remove_line_from_stats(current_stats, line)
 
         # Calculate baseline DPS (without this line)
         baseline_dps = calc_dps_func(baseline_stats)
@@ -893,12 +873,15 @@ def score_hero_power_line_for_mode(
 def rank_all_possible_lines_by_dps(
     calc_dps_func: Optional[Callable] = None,
     get_stats_func: Optional[Callable] = None,
+    value_table: Optional['HeroPowerLineValueTable'] = None,
+    context: Optional[Tuple] = None,
 ) -> Dict[str, List[Dict]]:
     """
     Rank ALL possible Hero Power lines by DPS contribution for each combat mode.
 
     This creates a simple lookup table showing the best possible lines you could roll,
-    ranked by their actual DPS contribution.
+    ranked by their actual DPS contribution. Values are read from `value_table`,
+    built (with `context` as its cache key, see get_line_value_table) when omitted.
 
     Returns:
         Dict with keys "stage", "boss", "world_boss", each containing a list of
@@ -929,16 +912,19 @@ def rank_all_possible_lines_by_dps(
         HeroPowerStatType.MIN_DMG_MULT,
     ]
 
-    # When real DPS callbacks are present, compute baseline ONCE and use the
-    # hypothetical-line evaluator (which correctly handles source-list stats
-    # like def_pen / attack_speed). calc_dps_func returns DPS for a single
-    # combat mode, so all 3 mode keys end up with identical real-DPS rankings
-    # (the per-mode distinction only matters in the heuristic fallback below).
-    use_real_dps = calc_dps_func is not None and get_stats_func is not None
-    current_stats = get_stats_func() if use_real_dps else None
-    current_dps = calc_dps_func(current_stats) if use_real_dps and current_stats else 0
-    if use_real_dps and current_dps <= 0:
-        use_real_dps = False  # Bad stats; fall back to heuristics
+    # When real DPS callbacks are present, read values from the shared line
+    # value table (hypothetical-line evaluations, which correctly handle
+    # source-list stats like def_pen / attack_speed). calc_dps_func returns
+    # DPS for a single combat mode, so all 3 mode keys end up with identical
+    # real-DPS rankings (the per-mode distinction only matters in the
+    # heuristic fallback below).
+    if value_table is None and calc_dps_func is not None and get_stats_func is not None:
+        current_stats = get_stats_func()
+        if current_stats:
+            value_table = get_line_value_table(
+                current_stats, calc_dps_func, HeroPowerLevelConfig(), context=context,
+            )
+    use_real_dps = value_table is not None and value_table.baseline_dps > 0
 
     for mode in combat_modes:
         mode_lines = []
@@ -951,15 +937,9 @@ def rank_all_possible_lines_by_dps(
                     continue
 
                 min_val, max_val = tier_ranges[stat_type]
-                hypothetical_line = HeroPowerLine(
-                    slot=0, stat_type=stat_type, value=max_val,
-                    tier=tier, is_locked=False,
-                )
 
                 if use_real_dps:
-                    dps_contribution = calculate_hypothetical_line_dps_value(
-                        hypothetical_line, current_stats, current_dps, calc_dps_func,
-                    )
+                    dps_contribution = value_table.line_value(stat_type, tier, max_val)
                 else:
                     # Heuristic fallback: per-mode weights × base weight × value
                     base_weight = STAT_DPS_WEIGHTS.get(stat_type, 0.5)
@@ -1152,15 +1132,11 @@ class HeroPowerConfig:
         min_tier: HeroPowerTier
     ) -> int:
         """Count lines that have a matching stat type at or above min tier."""
-        tier_order = [
-            HeroPowerTier.COMMON, HeroPowerTier.RARE, HeroPowerTier.EPIC,
-            HeroPowerTier.UNIQUE, HeroPowerTier.LEGENDARY, HeroPowerTier.MYSTIC
-        ]
-        min_tier_idx = tier_order.index(min_tier)
+        min_tier_idx = HERO_POWER_TIER_ORDER.index(min_tier)
 
         count = 0
         for line in self.lines:
-            line_tier_idx = tier_order.index(line.tier)
+            line_tier_idx = HERO_POWER_TIER_ORDER.index(line.tier)
             if line.stat_type in stat_types and line_tier_idx >= min_tier_idx:
                 count += 1
         return count
@@ -1223,7 +1199,7 @@ class SimulationTarget:
 
 @dataclass
 class HeroPowerSimulationResult:
-    """Results from Monte Carlo simulation."""
+    """Results from a custom-target analysis (exact solver or Monte Carlo)."""
     iterations: int
     target: SimulationTarget
 
@@ -1241,6 +1217,12 @@ class HeroPowerSimulationResult:
     # Whether simulation was capped
     capped_iterations: int = 0  # How many hit max_rerolls
 
+    # Exact solver output (solve_custom_target_exact)
+    is_exact: bool = False
+    capped_probability: float = 0.0  # P(target not reached within max_rerolls)
+    # reroll_pmf[k] = P(stop after exactly k rerolls); tail below 1e-12 is trimmed
+    reroll_pmf: List[float] = field(default_factory=list)
+
 
 # =============================================================================
 # SIMULATION FUNCTIONS
@@ -1347,15 +1329,235 @@ def check_target_achieved(config: HeroPowerConfig, target: SimulationTarget) ->
     return True
 
 
+def _custom_target_start_config(
+    config: Optional[HeroPowerConfig],
+    locked_lines: Optional[List[int]],
+) -> HeroPowerConfig:
+    """Starting config for a custom-target run with the requested slots locked.
+
+    Without an explicit config this is a fresh HeroPowerConfig(), matching the
+    original simulation (locked slots then hold placeholder lines that only
+    reduce the number of rerolled lines).
+    """
+    start = copy.deepcopy(config) if config is not None else HeroPowerConfig()
+    if locked_lines is not None:
+        for line in start.lines:
+            line.is_locked = line.slot in locked_lines
+    return start
+
+
+def _custom_target_cost_per_reroll(
+    num_locked: int,
+    level_config: Optional[HeroPowerLevelConfig],
+) -> int:
+    """Medal cost per reroll for a custom-target run."""
+    if level_config:
+        return level_config.get_reroll_cost(num_locked)
+    return HERO_POWER_REROLL_COSTS.get(num_locked, 86)
+
+
+def _line_outcome_probabilities(
+    level_config: Optional[HeroPowerLevelConfig] = None,
+) -> List[Tuple[HeroPowerTier, HeroPowerStatType, float]]:
+    """
+    Exact (tier, stat, probability) outcomes of one rerolled line.
+
+    Mirrors roll_hero_power_tier / roll_hero_power_stat, including their
+    fallbacks: tier mass beyond the listed rates lands on COMMON, and stat mass
+    beyond the listed probabilities is spread uniformly over every stat type.
+    """
+    tier_rates = level_config.get_tier_rates() if level_config else HERO_POWER_TIER_RATES
+
+    tier_probs: Dict[HeroPowerTier, float] = defaultdict(float)
+    cumulative = 0.0
+    for tier, prob in tier_rates.items():
+        tier_probs[tier] += max(0.0, min(cumulative + prob, 1.0) - min(cumulative, 1.0))
+        cumulative += prob
+    tier_probs[HeroPowerTier.COMMON] += max(0.0, 1.0 - cumulative)
+
+    all_stats = list(HeroPowerStatType)
+    outcomes: List[Tuple[HeroPowerTier, HeroPowerStatType, float]] = []
+    for tier, tier_prob in tier_probs.items():
+        if tier_prob <= 0:
+            continue
+        stat_probs: Dict[HeroPowerStatType, float] = defaultdict(float)
+        cumulative = 0.0
+        for stat_type, prob in STAT_PROBABILITIES.get(tier, DEFAULT_STAT_PROBS).items():
+            stat_probs[stat_type] += max(0.0, min(cumulative + prob, 1.0) - min(cumulative, 1.0))
+            cumulative += prob
+        remainder = max(0.0, 1.0 - cumulative)
+        if remainder > 0:
+            for stat_type in all_stats:
+                stat_probs[stat_type] += remainder / len(all_stats)
+        for stat_type, stat_prob in stat_probs.items():
+            if stat_prob > 0:
+                outcomes.append((tier, stat_type, tier_prob * stat_prob))
+    return outcomes
+
+
+def _remaining_target_needs(
+    config: HeroPowerConfig,
+    target: SimulationTarget,
+) -> Dict[HeroPowerStatType, int]:
+    """Qualifying lines each required stat still needs from the unlocked slots."""
+    min_tier_idx = HERO_POWER_TIER_ORDER.index(target.min_tier)
+    needs: Dict[HeroPowerStatType, int] = {}
+    for stat_type, required_count in target.stat_requirements:
+        have = sum(
+            1 for line in config.lines
+            if line.is_locked and line.stat_type == stat_type
+            and HERO_POWER_TIER_ORDER.index(line.tier) >= min_tier_idx
+        )
+        needs[stat_type] = max(needs.get(stat_type, 0), required_count - have)
+    return {s: n for s, n in needs.items() if n > 0}
+
+
+def calculate_custom_target_roll_probability(
+    target: SimulationTarget,
+    locked_lines: List[int] = None,
+    level_config: Optional[HeroPowerLevelConfig] = None,
+    config: Optional[HeroPowerConfig] = None,
+) -> float:
+    """
+    Probability that a single reroll satisfies a count-based target.
+
+    Each unlocked line independently lands in one "qualifying" bucket per
+    required stat (stat at tier >= min_tier) or in "other". A small DP over the
+    vector of still-missing counts gives the exact joint probability.
+    """
+    start = _custom_target_start_config(config, locked_lines)
+    needs = _remaining_target_needs(start, target)
+    if not needs:
+        return 1.0
+
+    n_unlocked = sum(1 for line in start.lines if not line.is_locked)
+    min_tier_idx = HERO_POWER_TIER_ORDER.index(target.min_tier)
+    line_probs: Dict[HeroPowerStatType, float] = defaultdict(float)
+    for tier, stat_type, prob in _line_outcome_probabilities(level_config):
+        if stat_type in needs and HERO_POWER_TIER_ORDER.index(tier) >= min_tier_idx:
+            line_probs[stat_type] += prob
+
+    stats = list(needs)
+    states: Dict[Tuple[int, ...], float] = {tuple(needs[s] for s in stats): 1.0}
+    for _ in range(n_unlocked):
+        next_states: Dict[Tuple[int, ...], float] = defaultdict(float)
+        for state, mass in states.items():
+            stay = 1.0
+            for i, stat_type in enumerate(stats):
+                if state[i] > 0:
+                    p = line_probs[stat_type]
+                    next_states[state[:i] + (state[i] - 1,) + state[i + 1:]] += mass * p
+                    stay -= p
+            next_states[state] += mass * max(0.0, stay)
+        states = next_states
+
+    return min(1.0, states.get(tuple(0 for _ in stats), 0.0))
+
+
+def solve_custom_target_exact(
+    target: SimulationTarget,
+    locked_lines: List[int] = None,  # slot numbers to lock (1-6)
+    max_rerolls: int = 50000,
+    level_config: Optional[HeroPowerLevelConfig] = None,
+    config: Optional[HeroPowerConfig] = None,
+) -> HeroPowerSimulationResult:
+    """
+    Exact reroll-count distribution for a count-based custom target.
+
+    A reroll redraws every unlocked line, so the chain over "qualifying
+    unlocked lines" has a single transient state: each reroll is absorbed
+    with the same probability p (calculate_custom_target_roll_probability).
+    The reroll count is therefore geometric, truncated at max_rerolls exactly
+    like run_custom_target_simulation, and every statistic is closed-form.
+
+    Args:
+        target: SimulationTarget with stat requirements (DPS targets unsupported)
+        locked_lines: List of slot numbers to lock (1-6)
+        max_rerolls: Reroll cap, matching the Monte Carlo
+        level_config: Optional level config for tier rates and costs
+        config: Optional current config; its locked lines count toward the target
+
+    Returns:
+        HeroPowerSimulationResult with is_exact=True and reroll_pmf filled in
+        (iterations=0, reroll_distribution empty).
+    """
+    if target.is_dps_mode():
+        raise ValueError("solve_custom_target_exact only supports stat-count targets")
+
+    start = _custom_target_start_config(config, locked_lines)
+    num_locked = start.get_locked_count() if locked_lines is None else len(locked_lines)
+    cost_per_reroll = _custom_target_cost_per_reroll(num_locked, level_config)
+
+    def _result(success_rate, expected, median, p90, pmf, capped_prob):
+        return HeroPowerSimulationResult(
+            iterations=0,
+            target=target,
+            success_rate=success_rate,
+            expected_rerolls=expected,
+            expected_medals=expected * cost_per_reroll,
+            median_rerolls=median,
+            percentile_90_rerolls=p90,
+            is_exact=True,
+            capped_probability=capped_prob,
+            reroll_pmf=pmf,
+        )
+
+    if check_target_achieved(start, target):
+        return _result(1.0, 0.0, 0, 0, [1.0], 0.0)
+    if max_rerolls <= 0:
+        return _result(0.0, 0.0, 0, 0, [1.0], 1.0)
+
+    p = calculate_custom_target_roll_probability(target, None, level_config, start)
+    if p <= 0:
+        pmf = [0.0] * max_rerolls + [1.0]
+        return _result(0.0, float(max_rerolls), max_rerolls, max_rerolls, pmf, 1.0)
+
+    q = 1.0 - p
+    # P(G > k) = q^k for the untruncated geometric G >= 1. Like the Monte
+    # Carlo, a hit on the final allowed reroll is not checked and counts as
+    # capped, so success needs G <= max_rerolls - 1.
+    capped_prob = q ** (max_rerolls - 1)
+    expected = (1.0 - q ** max_rerolls) / p  # E[min(G, max_rerolls)]
+
+    def _quantile(level: float) -> int:
+        if q <= 0:
+            return 1
+        k = math.ceil(math.log(1.0 - level) / math.log(q) - 1e-9)
+        return int(min(max(k, 1), max_rerolls))
+
+    pmf = [0.0]
+    survival = 1.0  # P(G > k - 1)
+    for k in range(1, max_rerolls):
+        pmf.append(survival * p)
+        survival *= q
+        if survival < 1e-12:
+            break
+    else:
+        pmf.append(survival)  # min(G, max_rerolls) == max_rerolls
+
+    return _result(1.0 - capped_prob, expected, _quantile(0.5), _quantile(0.9), pmf, capped_prob)
+
+
+# Upper bound on line draws generated per vectorised Monte Carlo chunk
+_MC_DRAWS_PER_CHUNK = 2_000_000
+
+
 def run_custom_target_simulation(
     target: SimulationTarget,
     locked_lines: List[int] = None,  # slot numbers to lock (1-6)
     iterations: int = 10000,
     max_rerolls: int = 50000,
-    level_config: Optional[HeroPowerLevelConfig] = None
+    level_config: Optional[HeroPowerLevelConfig] = None,
+    config: Optional[HeroPowerConfig] = None,
+    seed: Optional[int] = None,
 ) -> HeroPowerSimulationResult:
     """
-    Simulate rerolling until achieving specific stat targets.
+    Monte Carlo validator for solve_custom_target_exact.
+
+    All iterations are simulated together with NumPy: every still-running
+    iteration draws a chunk of rerolls at once from the exact per-line
+    (tier, stat) outcome distribution, and the first qualifying reroll in the
+    chunk ends that iteration. Prefer solve_custom_target_exact for analysis.
 
     Args:
         target: SimulationTarget with stat requirements or DPS target
@@ -1363,60 +1565,75 @@ def run_custom_target_simulation(
         iterations: Number of simulation runs
         max_rerolls: Max rerolls per simulation before capping
         level_config: Optional level config for tier rates and costs
+        config: Optional current config; its locked lines count toward the target
+        seed: Optional RNG seed for reproducible runs
 
     Example target: 2x DEF_PEN + 2x DAMAGE at Legendary+ tier
     """
-    reroll_counts = []
-    successes = 0
-    capped = 0
-
-    for _ in range(iterations):
-        # Fresh config with specified locks
-        config = HeroPowerConfig()
-        if locked_lines:
-            for line in config.lines:
-                if line.slot in locked_lines:
-                    line.is_locked = True
-
-        rerolls = 0
-
-        while rerolls < max_rerolls:
-            # Check if target achieved
-            if check_target_achieved(config, target):
-                successes += 1
-                break
-
-            # Simulate reroll of unlocked lines (using level config)
-            config = simulate_hero_power_reroll(config, level_config)
-            rerolls += 1
-        else:
-            # Hit max_rerolls without success
-            capped += 1
-
-        reroll_counts.append(rerolls)
+    start = _custom_target_start_config(config, locked_lines)
+    num_locked = start.get_locked_count() if locked_lines is None else len(locked_lines)
+    cost_per_reroll = _custom_target_cost_per_reroll(num_locked, level_config)
+
+    counts = np.full(iterations, max(max_rerolls, 0), dtype=np.int64)
+    initially_met = check_target_achieved(start, target)
+    if initially_met:
+        counts[:] = 0
+    elif max_rerolls > 0 and iterations > 0 and not target.is_dps_mode():
+        needs = _remaining_target_needs(start, target)
+        n_unlocked = sum(1 for line in start.lines if not line.is_locked)
+        min_tier_idx = HERO_POWER_TIER_ORDER.index(target.min_tier)
+
+        # Collapse the (tier, stat) outcomes into one bucket per required stat
+        # (stat at tier >= min_tier) plus a final "other" bucket.
+        bucket_probs = np.zeros(len(needs) + 1)
+        need_index = {stat_type: i for i, stat_type in enumerate(needs)}
+        for tier, stat_type, prob in _line_outcome_probabilities(level_config):
+            if stat_type in need_index and HERO_POWER_TIER_ORDER.index(tier) >= min_tier_idx:
+                bucket_probs[need_index[stat_type]] += prob
+            else:
+                bucket_probs[-1] += prob
+        cumulative = np.cumsum(bucket_probs)
+        cumulative /= cumulative[-1]
+        need_counts = np.array(list(needs.values()), dtype=np.int64)
+
+        rng = np.random.default_rng(seed)
+        active = np.arange(iterations)
+        step = 0
+        while active.size and step < max_rerolls:
+            chunk = min(
+                max_rerolls - step,
+                max(1, _MC_DRAWS_PER_CHUNK // (active.size * max(n_unlocked, 1))),
+            )
+            buckets = np.searchsorted(cumulative, rng.random((active.size, chunk, n_unlocked)), side='right')
+            met = np.ones((active.size, chunk), dtype=bool)
+            for i, need in enumerate(need_counts):
+                met &= (buckets == i).sum(axis=-1) >= need
+            done = met.any(axis=1)
+            counts[active[done]] = step + met[done].argmax(axis=1) + 1
+            active = active[~done]
+            step += chunk
+
+    reroll_counts = counts.tolist()
+    capped = 0 if initially_met else int(np.count_nonzero(counts >= max_rerolls))
+    successes = iterations - capped
 
     # Calculate statistics
     sorted_counts = sorted(reroll_counts)
     median_idx = len(sorted_counts) // 2
     p90_idx = int(len(sorted_counts) * 0.9)
-
-    # Get cost per reroll from level config if provided
-    num_locked = len(locked_lines or [])
-    if level_config:
-        cost_per_reroll = level_config.get_reroll_cost(num_locked)
-    else:
-        cost_per_reroll = HERO_POWER_REROLL_COSTS.get(num_locked, 86)
+    mean_rerolls = sum(reroll_counts) / len(reroll_counts) if reroll_counts else 0
 
     return HeroPowerSimulationResult(
         iterations=iterations,
         target=target,
         success_rate=successes / iterations if iterations > 0 else 0,
-        expected_rerolls=sum(reroll_counts) / len(reroll_counts) if reroll_counts else 0,
-        expected_medals=(sum(reroll_counts) / len(reroll_counts) * cost_per_reroll) if reroll_counts else 0,
+        expected_rerolls=mean_rerolls,
+        expected_medals=mean_rerolls * cost_per_reroll,
         median_rerolls=sorted_counts[median_idx] if sorted_counts else 0,
         percentile_90_rerolls=sorted_counts[p90_idx] if sorted_counts else 0,
         reroll_distribution=reroll_counts,
         capped_iterations=capped,
+        capped_probability=capped / iterations if iterations > 0 else 0.0,
     )
 
 
@@ -1429,65 +1646,35 @@ def calculate_probability_of_improvement(
     level_config: HeroPowerLevelConfig,
     calc_dps_func: Optional[Callable] = None,
     get_stats_func: Optional[Callable] = None,
+    value_table: Optional['HeroPowerLineValueTable'] = None,
+    context: Optional[Tuple] = None,
 ) -> Tuple[float, float]:
     """
     Calculate probability and expected value of rolling a line better than current.
 
-    This enumerates all possible rolls (tier × stat × value samples) and calculates
-    what fraction would give better DPS than the current line.
+    Reads the shared fresh-roll distribution (tier × stat × value samples) from
+    the line value table and returns the mass and mean above the current line.
 
     Args:
         current_line_dps: DPS contribution (%) of the current line
         level_config: HeroPowerLevelConfig with tier rates
         calc_dps_func: Callback to calculate DPS from stats dict
         get_stats_func: Callback to get current stats dict
+        value_table: Pre-built table from get_line_value_table (built if None)
+        context: get_line_value_table cache key for a table built here
 
     Returns:
         Tuple of (probability_of_improvement, expected_dps_if_better)
     """
-    tier_rates = level_config.get_tier_rates()
-
-    total_prob_better = 0.0
-    weighted_dps_sum = 0.0
-
-    for tier, tier_prob in tier_rates.items():
-        stat_probs = STAT_PROBABILITIES.get(tier, DEFAULT_STAT_PROBS)
-
-        for stat_type, stat_prob in stat_probs.items():
-            ranges = HERO_POWER_STAT_RANGES.get(tier, {})
-            if stat_type not in ranges:
-                continue
-
-            min_val, max_val = ranges[stat_type]
-            joint_prob = tier_prob * stat_prob
-
-            # Sample 3 points in the range to estimate DPS distribution
-            sample_values = [min_val, (min_val + max_val) / 2, max_val]
-            for val in sample_values:
-                sample_line = HeroPowerLine(
-                    slot=0,
-                    stat_type=stat_type,
-                    value=val,
-                    tier=tier,
-                    is_locked=False
-                )
-                sample_dps = calculate_line_dps_value(
-                    sample_line, calc_dps_func, get_stats_func
-                )
+    if value_table is None:
+        current_stats = get_stats_func() if calc_dps_func and get_stats_func else None
+        value_table = get_line_value_table(current_stats, calc_dps_func, level_config, context=context)
 
-                if sample_dps > current_line_dps:
-                    # This sample point is better - count it
-                    prob_this_point = joint_prob / len(sample_values)
-                    total_prob_better += prob_this_point
-                    weighted_dps_sum += prob_this_point * sample_dps
-
-    # Calculate expected DPS if we roll better
-    expected_dps_if_better = (
-        weighted_dps_sum / total_prob_better if total_prob_better > 0 else 0
+    return (
+        value_table.probability_above(current_line_dps),
+        value_table.mean_above(current_line_dps),
     )
 
-    return (total_prob_better, expected_dps_if_better)
-
 
 def calculate_reroll_efficiency(
     current_line_dps: float,
@@ -1495,6 +1682,8 @@ def calculate_reroll_efficiency(
     level_config: HeroPowerLevelConfig,
     calc_dps_func: Optional[Callable] = None,
     get_stats_func: Optional[Callable] = None,
+    value_table: Optional['HeroPowerLineValueTable'] = None,
+    context: Optional[Tuple] = None,
 ) -> Dict:
     """
     Calculate the efficiency of rerolling vs locking a line.
@@ -1515,6 +1704,8 @@ def calculate_reroll_efficiency(
         level_config: HeroPowerLevelConfig with tier rates and costs
         calc_dps_func: Callback to calculate DPS from stats dict
         get_stats_func: Callback to get current stats dict
+        value_table: Pre-built table from get_line_value_table (built if None)
+        context: get_line_value_table cache key for a table built here
 
     Returns:
         Dict with:
@@ -1529,7 +1720,7 @@ def calculate_reroll_efficiency(
     """
     # Get probability and expected value of improvement
     p_better, expected_dps_if_better = calculate_probability_of_improvement(
-        current_line_dps, level_config, calc_dps_func, get_stats_func
+        current_line_dps, level_config, calc_dps_func, get_stats_func, value_table, context,
     )
 
     # Calculate cost with current number of locks
@@ -1578,6 +1769,8 @@ def analyze_lock_strategy(
     level_config: HeroPowerLevelConfig,
     calc_dps_func: Optional[Callable] = None,
     get_stats_func: Optional[Callable] = None,
+    value_table: Optional['HeroPowerLineValueTable'] = None,
+    context: Optional[Tuple] = None,
 ) -> Dict:
     """
     Analyze the optimal lock/reroll strategy for a Hero Power configuration.
@@ -1599,6 +1792,8 @@ def analyze_lock_strategy(
         level_config: HeroPowerLevelConfig with tier rates and costs
         calc_dps_func: Callback to calculate DPS from stats dict
         get_stats_func: Callback to get current stats dict
+        value_table: Pre-built table from get_line_value_table (built if None)
+        context: get_line_value_table cache key for a table built here
 
     Returns:
         Dict with:
@@ -1610,6 +1805,13 @@ def analyze_lock_strategy(
         - efficiency_analysis: List of per-line analysis dicts
         - cost_per_reroll: Medal cost per reroll with final lock count
     """
+    # Aggregate stats once; every per-line call below reuses them
+    current_stats = get_stats_func() if calc_dps_func and get_stats_func else None
+    if current_stats is not None:
+        get_stats_func = lambda: current_stats
+    if value_table is None:
+        value_table = get_line_value_table(current_stats, calc_dps_func, level_config, context=context)
+
     # Calculate DPS value for each line
     line_analysis = []
     for line in config.lines:
@@ -1640,7 +1842,8 @@ def analyze_lock_strategy(
             num_locked,
             level_config,
             calc_dps_func,
-            get_stats_func
+            get_stats_func,
+            value_table,
         )
         la['efficiency_result'] = efficiency_result
 
@@ -1711,30 +1914,30 @@ def calculate_hypothetical_line_dps_value(
 
     Caller pre-computes current_stats and current_dps once so this helper can
     be called many times cheaply (just one extra DPS call per evaluation).
+    Pass current_stats as a StatVector to skip the per-call conversion.
     """
     stats_key = STAT_TO_STATS_KEY.get(line.stat_type)
     if not stats_key or current_dps <= 0:
         return 0.0
 
-    test_stats = copy.deepcopy(current_stats)
+    current = StatVector.from_dict(current_stats)
 
     if stats_key == 'def_pen':
         # Multiplicative source list — append as a new source
         # decimal value, priority 50 (matches existing hero power lines)
-        test_stats.setdefault('def_pen_sources', []).append(
-            ('hypothetical_hero_power', line.value / 100, 50)
+        test_stats = current.with_source(
+            'def_pen_sources', ('hypothetical_hero_power', line.value / 100, 50)
         )
     elif stats_key == 'attack_speed':
-        test_stats.setdefault('attack_speed_sources', []).append(
-            ('hypothetical_hero_power', line.value)
+        test_stats = current.with_source(
+            'attack_speed_sources', ('hypothetical_hero_power', line.value)
         )
     elif stats_key == 'main_stat_flat':
         # Resolves to job-specific flat key (dex_flat, str_flat, etc.)
-        main_stat_type = test_stats.get('main_stat_type', 'dex')
-        actual_key = f'{main_stat_type}_flat'
-        test_stats[actual_key] = test_stats.get(actual_key, 0) + line.value
+        main_stat_type = current.get('main_stat_type', 'dex')
+        test_stats = current.with_delta(f'{main_stat_type}_flat', line.value)
     else:
-        test_stats[stats_key] = test_stats.get(stats_key, 0) + line.value
+        test_stats = current.with_delta(stats_key, line.value)
 
     try:
         test_dps = calc_dps_func(test_stats)
@@ -1744,17 +1947,272 @@ def calculate_hypothetical_line_dps_value(
     return max(0.0, (test_dps / current_dps - 1) * 100)
 
 
+# =============================================================================
+# SHARED LINE VALUE TABLE
+# =============================================================================
+# Every lock/reroll analysis needs the DPS value of a freshly rolled line for
+# each (tier, stat, value). Those DPS calls are the expensive part, so they are
+# made once per (stats fingerprint, replaced slot line, evaluator) at the low /
+# mid / high "knots" of each tier range and cached. Sample values inside a
+# range are interpolated piecewise-linearly between knots, so the uniform
+# within-range value distribution can use many samples at no extra DPS cost.
+
+# Default number of equal-probability samples per (tier, stat) value range
+LINE_VALUE_SAMPLES_PER_RANGE = 16
+
+# Knot DPS evaluations kept per process (LRU)
+_LINE_VALUE_KNOT_CACHE_SIZE = 32
+_line_value_knot_cache = LRUCache(maxsize=_LINE_VALUE_KNOT_CACHE_SIZE)
+
+
+def _stats_fingerprint(stats: Mapping) -> Tuple:
+    """
+    Hashable canonical form of a stats dict or StatVector (nested lists,
+    dicts and dataclasses such as companion skills become tuples).
+    """
+    def _t(x):
+        if isinstance(x, Mapping):
+            return tuple(sorted((str(k), _t(v)) for k, v in x.items()))
+        if isinstance(x, (list, tuple)):
+            return tuple(_t(item) for item in x)
+        if isinstance(x, Enum):
+            return x.value
+        if is_dataclass(x) and not isinstance(x, type):
+            return (type(x).__name__,) + tuple(_t(getattr(x, f.name)) for f in fields(x))
+        return x
+
+    return _t(stats)
+
+
+def _remove_line_from_stats(stats: Mapping, line: HeroPowerLine) -> StatVector:
+    """StatVector of `stats` with an existing hero power line's contribution removed."""
+    baseline_stats = StatVector.from_dict(stats)
+    stats_key = STAT_TO_STATS_KEY.get(line.stat_type)
+    if not stats_key:
+        return baseline_stats
+
+    # Stats stored as source lists (multiplicative stats) need special handling
+    source_list_stats = {
+        'def_pen': 'def_pen_sources',      # List of (source, value/100, priority)
+        'attack_speed': 'attack_speed_sources',  # List of (source, value)
+    }
+    if stats_key in source_list_stats:
+        source_list_key = source_list_stats[stats_key]
+        if source_list_key in baseline_stats:
+            # Source names are like 'hero_power_line1' (no underscore before number)
+            line_source_name = f'hero_power_line{line.slot}'
+            return baseline_stats.with_values({source_list_key: [
+                entry for entry in baseline_stats[source_list_key]
+                if entry[0].lower() != line_source_name
+            ]})
+        return baseline_stats
+    if stats_key == 'main_stat_flat':
+        # Resolves to job-specific flat key (dex_flat, str_flat, etc.)
+        main_stat_type = baseline_stats.get('main_stat_type', 'dex')
+        return baseline_stats.with_delta(f'{main_stat_type}_flat', -line.value)
+    return baseline_stats.with_delta(stats_key, -line.value)
+
+
+def _range_knots(lo: float, hi: float) -> Tuple[float, ...]:
+    """Values inside a tier range where the DPS function is evaluated exactly."""
+    return (lo, (lo + hi) / 2, hi) if hi > lo else (lo,)
+
+
+@dataclass
+class HeroPowerLineValueTable:
+    """
+    DPS value of one freshly rolled hero power line, shared by all analyses.
+
+    Values are % DPS gain over the baseline (current stats, or current stats
+    minus the replaced slot's line). `atoms` is the discrete fresh-roll
+    distribution as sorted (dps_value, probability) pairs, including utility
+    stats at dps=0 for their share of probability mass.
+    """
+    baseline_dps: float
+    replaced_slot: Optional[int]
+    samples_per_range: int
+    # (tier, stat) -> {knot value: dps gain %}
+    knots: Dict[Tuple[HeroPowerTier, HeroPowerStatType], Dict[float, float]]
+    atoms: List[Tuple[float, float]]
+    dps_evaluations: int = 0
+
+    def __post_init__(self):
+        self._dps = np.array([d for d, _ in self.atoms], dtype=float)
+        self._probs = np.array([p for _, p in self.atoms], dtype=float)
+
+    def line_value(self, stat_type: HeroPowerStatType, tier: HeroPowerTier, value: float) -> float:
+        """% DPS gain of a rolled line, interpolated between evaluated knots."""
+        knots = self.knots.get((tier, stat_type))
+        if not knots:
+            return 0.0
+        xs = sorted(knots)
+        return float(np.interp(value, xs, [knots[x] for x in xs]))
+
+    def probability_above(self, threshold: float) -> float:
+        """P(fresh line DPS > threshold)."""
+        return float(self._probs[self._dps > threshold].sum())
+
+    def mean_above(self, threshold: float) -> float:
+        """E[fresh line DPS | DPS > threshold] (0 if unreachable)."""
+        mask = self._dps > threshold
+        mass = self._probs[mask].sum()
+        return float((self._dps[mask] * self._probs[mask]).sum() / mass) if mass > 0 else 0.0
+
+    def mean(self) -> float:
+        """E[fresh line DPS]."""
+        return float((self._dps * self._probs).sum())
+
+
+def _evaluate_line_value_knots(
+    base_stats: Optional[Mapping],
+    base_dps: float,
+    calc_dps_func: Optional[Callable],
+) -> Tuple[Dict[Tuple[HeroPowerTier, HeroPowerStatType], Dict[float, float]], int]:
+    """DPS gain at every range knot; falls back to heuristics without a DPS func."""
+    knots: Dict[Tuple[HeroPowerTier, HeroPowerStatType], Dict[float, float]] = {}
+    evaluated: Dict[Tuple[HeroPowerStatType, float], float] = {}
+    if base_stats is not None:
+        base_stats = StatVector.from_dict(base_stats)
+    for tier, ranges in HERO_POWER_STAT_RANGES.items():
+        for stat_type, (lo, hi) in ranges.items():
+            values: Dict[float, float] = {}
+            for val in _range_knots(lo, hi):
+                key = (stat_type, val)
+                if key not in evaluated:
+                    line = HeroPowerLine(slot=0, stat_type=stat_type, value=val, tier=tier)
+                    if calc_dps_func is not None and base_stats is not None:
+                        evaluated[key] = calculate_hypothetical_line_dps_value(
+                            line, base_stats, base_dps, calc_dps_func,
+                        )
+                    else:
+                        evaluated[key] = calculate_line_dps_value(line)
+                values[val] = evaluated[key]
+            knots[(tier, stat_type)] = values
+    if calc_dps_func is None or base_stats is None:
+        return knots, 0
+    return knots, sum(1 for stat_type, _ in evaluated if STAT_TO_STATS_KEY.get(stat_type))
+
+
+def get_line_value_table(
+    current_stats: Optional[Dict],
+    calc_dps_func: Optional[Callable],
+    level_config: 'HeroPowerLevelConfig',
+    replaced_line: Optional[HeroPowerLine] = None,
+    samples_per_range: int = LINE_VALUE_SAMPLES_PER_RANGE,
+    context: Optional[Tuple] = None,
+) -> HeroPowerLineValueTable:
+    """
+    Build (or fetch from cache) the fresh-roll line value table.
+
+    Args:
+        current_stats: Aggregated stats dict (None → heuristic values)
+        calc_dps_func: Callback to calculate DPS from stats dict (None → heuristic)
+        level_config: Tier rates for the fresh-roll probabilities
+        replaced_line: Existing line whose slot the fresh roll replaces. Its
+            contribution is removed from the baseline first. None values a
+            line added on top of current stats.
+        samples_per_range: Equal-probability samples per (tier, stat) range
+        context: Hashable description of everything calc_dps_func reads
+            besides the stats dict (combat mode, enemy defense, ...). Knot
+            evaluations are cached only when it is given; a callback alone
+            says nothing about what it computes.
+
+    Returns:
+        HeroPowerLineValueTable
+    """
+    use_real_dps = calc_dps_func is not None and bool(current_stats)
+    base_stats = None
+    base_dps = 0.0
+    knots = None
+    n_calls = 0
+
+    if use_real_dps:
+        slot_key = (
+            (replaced_line.slot, replaced_line.stat_type.value, replaced_line.value, replaced_line.tier.value)
+            if replaced_line is not None else None
+        )
+        cache_key = (
+            (_stats_fingerprint(current_stats), slot_key, context)
+            if context is not None else None
+        )
+        cached = _line_value_knot_cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            base_dps, knots = cached['baseline_dps'], cached['knots']
+        else:
+            base_stats = (
+                _remove_line_from_stats(current_stats, replaced_line)
+                if replaced_line is not None else current_stats
+            )
+            base_dps = calc_dps_func(base_stats)
+            if base_dps > 0:
+                knots, n_calls = _evaluate_line_value_knots(base_stats, base_dps, calc_dps_func)
+                n_calls += 1
+                if cache_key is not None:
+                    _line_value_knot_cache.set(cache_key, {'baseline_dps': base_dps, 'knots': knots})
+
+    if knots is None:
+        knots, _ = _evaluate_line_value_knots(None, 0.0, None)
+
+    # Assemble the fresh-roll distribution (cheap; not cached)
+    tier_rates = level_config.get_tier_rates()
+    n_samples = max(1, int(samples_per_range))
+    merged: Dict[float, float] = defaultdict(float)
+    for tier, ranges in HERO_POWER_STAT_RANGES.items():
+        tier_rate = tier_rates.get(tier, 0.0)
+        if tier_rate <= 0:
+            continue
+        n_total = STATS_PER_GRADE.get(tier, len(ranges))
+        if n_total <= 0:
+            continue
+        per_sample = tier_rate / n_total / n_samples
+        for stat_type, (lo, hi) in ranges.items():
+            tier_knots = knots[(tier, stat_type)]
+            xs = sorted(tier_knots)
+            ys = [tier_knots[x] for x in xs]
+            # Midpoints of equal-probability bins of the uniform value range
+            sample_values = lo + (np.arange(n_samples) + 0.5) / n_samples * (hi - lo)
+            for dps in np.interp(sample_values, xs, ys):
+                merged[round(float(dps), 9)] += per_sample  # tiny rounding to merge near-duplicates
+        # Untracked utility stats contribute dps=0 with their probability share
+        n_untracked = n_total - len(ranges)
+        if n_untracked > 0:
+            merged[0.0] += tier_rate * n_untracked / n_total
+
+    return HeroPowerLineValueTable(
+        baseline_dps=base_dps,
+        replaced_slot=replaced_line.slot if replaced_line is not None else None,
+        samples_per_range=n_samples,
+        knots=knots,
+        atoms=sorted(merged.items()),
+        dps_evaluations=n_calls,
+    )
+
+
+def clear_line_value_cache() -> None:
+    """Drop all cached knot evaluations (e.g. after the DPS model changes)."""
+    _line_value_knot_cache.clear()
+
+
 def compute_dps_reference_table_for_character(
     calc_dps_func: Callable,
     get_stats_func: Callable,
+    value_table: Optional[HeroPowerLineValueTable] = None,
+    context: Optional[Tuple] = None,
 ) -> Dict[str, List[Dict]]:
     """
     Build a per-tier DPS reference table using the user's actual character
     stats. Same shape as DPS_REFERENCE_TABLE but populated with real numbers.
+    Low/mid/high values are the line value table's exact knots (a table
+    built here is cached under `context`, see get_line_value_table).
     """
-    current_stats = get_stats_func()
-    current_dps = calc_dps_func(current_stats) if current_stats else 0
-    if current_dps <= 0:
+    if value_table is None:
+        current_stats = get_stats_func()
+        if not current_stats:
+            return {}
+        value_table = get_line_value_table(
+            current_stats, calc_dps_func, HeroPowerLevelConfig(), context=context,
+        )
+    if value_table.baseline_dps <= 0:
         return {}
 
     result: Dict[str, List[Dict]] = {}
@@ -1771,25 +2229,15 @@ def compute_dps_reference_table_for_character(
         entries: List[Dict] = []
         for stat_type, (low, high) in ranges.items():
             mid = (low + high) / 2
-
-            def _eval(val: float) -> float:
-                line = HeroPowerLine(
-                    slot=0, stat_type=stat_type, value=val,
-                    tier=tier, is_locked=False,
-                )
-                return calculate_hypothetical_line_dps_value(
-                    line, current_stats, current_dps, calc_dps_func,
-                )
-
             entries.append({
                 'stat': STAT_DISPLAY_NAMES.get(stat_type, stat_type.value),
                 'stat_type': stat_type,
                 'low': low,
                 'mid': mid,
                 'high': high,
-                'dps_low': _eval(low),
-                'dps_mid': _eval(mid),
-                'dps_high': _eval(high),
+                'dps_low': value_table.line_value(stat_type, tier, low),
+                'dps_mid': value_table.line_value(stat_type, tier, mid),
+                'dps_high': value_table.line_value(stat_type, tier, high),
                 'note': NOTES.get(stat_type, ''),
             })
         result[tier_name] = entries
@@ -1801,17 +2249,25 @@ def compute_best_lines_ranking_for_character(
     get_stats_func: Callable,
     level_config: Optional['HeroPowerLevelConfig'] = None,
     top_n: int = 10,
+    value_table: Optional[HeroPowerLineValueTable] = None,
+    context: Optional[Tuple] = None,
 ) -> List[Dict]:
     """
     Rank top-N best (tier, stat) combinations to roll for, based on the user's
-    actual character stats. Same shape as BEST_LINES_RANKING.
+    actual character stats. Same shape as BEST_LINES_RANKING. A table built
+    here is cached under `context` (see get_line_value_table).
 
     Probability per line ≈ tier_rate / number_of_stats_at_that_tier
     (uniform-within-tier assumption matches the hardcoded table).
     """
-    current_stats = get_stats_func()
-    current_dps = calc_dps_func(current_stats) if current_stats else 0
-    if current_dps <= 0:
+    if value_table is None:
+        current_stats = get_stats_func()
+        if not current_stats:
+            return []
+        value_table = get_line_value_table(
+            current_stats, calc_dps_func, level_config or HeroPowerLevelConfig(), context=context,
+        )
+    if value_table.baseline_dps <= 0:
         return []
 
     # Map tier → rate from level config (% per roll). Default to a reasonable
@@ -1840,13 +2296,7 @@ def compute_best_lines_ranking_for_character(
         per_line_prob = tier_rate / stats_at_tier
 
         for stat_type, (low, high) in ranges.items():
-            line = HeroPowerLine(
-                slot=0, stat_type=stat_type, value=high,
-                tier=tier, is_locked=False,
-            )
-            max_dps = calculate_hypothetical_line_dps_value(
-                line, current_stats, current_dps, calc_dps_func,
-            )
+            max_dps = value_table.line_value(stat_type, tier, high)
             # Format max value
             if stat_type in (HeroPowerStatType.MAIN_STAT_FLAT, HeroPowerStatType.MAX_HP):
                 max_value_str = f"{high:.0f}"
@@ -1880,62 +2330,6 @@ def compute_best_lines_ranking_for_character(
 # reservation values at each potential lock count is also returned so the user
 # can see the aggressive-early / lenient-late lock threshold curve.
 
-def _build_fresh_roll_distribution(
-    current_stats: Dict,
-    current_dps: float,
-    calc_dps_func: Callable,
-    level_config: 'HeroPowerLevelConfig',
-) -> List[Tuple[float, float]]:
-    """
-    Returns the discrete distribution of DPS contribution from one fresh-rolled
-    hero power line, as a list of (dps_value, probability) tuples sorted by dps.
-    Includes utility/defensive stats (dps=0) for their share of probability mass.
-    """
-    tier_rates_decimal = {
-        HeroPowerTier.MYSTIC: level_config.mystic_rate / 100,
-        HeroPowerTier.LEGENDARY: level_config.legendary_rate / 100,
-        HeroPowerTier.UNIQUE: level_config.unique_rate / 100,
-        HeroPowerTier.EPIC: level_config.epic_rate / 100,
-        HeroPowerTier.RARE: level_config.rare_rate / 100,
-        HeroPowerTier.COMMON: level_config.common_rate / 100,
-    }
-
-    raw: List[Tuple[float, float]] = []
-    for tier, ranges in HERO_POWER_STAT_RANGES.items():
-        tier_rate = tier_rates_decimal.get(tier, 0.0)
-        if tier_rate <= 0:
-            continue
-        n_total = STATS_PER_GRADE.get(tier, len(ranges))
-        if n_total <= 0:
-            continue
-        n_tracked = len(ranges)
-        # 3 sample points per stat range, uniform-within-stat assumption
-        per_sample = tier_rate * (1.0 / n_total) * (1.0 / 3)
-        for stat_type, (lo, hi) in ranges.items():
-            mid = (lo + hi) / 2
-            for val in (lo, mid, hi):
-                line = HeroPowerLine(
-                    slot=0, stat_type=stat_type, value=val,
-                    tier=tier, is_locked=False,
-                )
-                dps = calculate_hypothetical_line_dps_value(
-                    line, current_stats, current_dps, calc_dps_func,
-                )
-                raw.append((dps, per_sample))
-        # Untracked utility stats contribute dps=0 with their probability share
-        n_untracked = n_total - n_tracked
-        if n_untracked > 0:
-            utility_prob = tier_rate * n_untracked / n_total
-            raw.append((0.0, utility_prob))
-
-    # Merge duplicate dps values to keep the CDF clean
-    from collections import defaultdict
-    merged: Dict[float, float] = defaultdict(float)
-    for d, p in raw:
-        merged[round(d, 9)] += p  # tiny rounding to merge near-duplicates
-    return sorted(merged.items())
-
-
 def _expected_max_of_current_and_best_of_n(
     current: float,
     N: int,
@@ -1980,6 +2374,8 @@ def analyze_budget(
     budget_medals: float,
     calc_dps_func: Callable,
     get_stats_func: Callable,
+    value_table: Optional[HeroPowerLineValueTable] = None,
+    context: Optional[Tuple] = None,
 ) -> Dict:
     """
     Budget-driven hero power optimizer.
@@ -2008,6 +2404,10 @@ def analyze_budget(
 
     User-explicit locks (line.is_locked=True) are forced locked.
 
+    The fresh-roll distribution comes from `value_table` (shared with the
+    other analyses); it is built from get_line_value_table (cached under
+    `context`) when omitted.
+
     See plan: C:/Users/ianpr/.claude/plans/sorted-nibbling-meteor.md
     """
     current_stats = get_stats_func()
@@ -2021,14 +2421,14 @@ def analyze_budget(
     per_slot_dps: Dict[int, float] = {}
     for line in config.lines:
         per_slot_dps[line.slot] = calculate_line_dps_value(
-            line, calc_dps_func, get_stats_func,
+            line, calc_dps_func, lambda: current_stats,
         )
     current_total_dps_pct = sum(per_slot_dps.values())
 
     # 2) Fresh-roll DPS distribution
-    distribution = _build_fresh_roll_distribution(
-        current_stats, current_dps, calc_dps_func, level_config,
-    )
+    if value_table is None:
+        value_table = get_line_value_table(current_stats, calc_dps_func, level_config, context=context)
+    distribution = value_table.atoms
 
     # 3) Cascade ladder. N_K = budget / cost_K (one slot's perspective —
     #    each reroll counts as one attempt for every unlocked slot).
@@ -2177,6 +2577,305 @@ def analyze_budget(
     }
 
 
+# =============================================================================
+# DYNAMIC-PROGRAMMING LOCK/REROLL POLICY
+# =============================================================================
+# Exact-ish alternative to the threshold heuristics above. Lines are
+# exchangeable once rolled, so after the first decision the (lock subset ×
+# line values) state collapses to (number of open slots, remaining budget):
+# locked values are banked additively and every open slot is redrawn from the
+# same fresh-roll distribution. After each roll the action is a lock
+# threshold over value buckets ("lock every fresh line worth >= tau"); the
+# reroll cost follows the resulting lock count. Only the very first decision
+# needs the full 2^6 lock subsets, because the current lines are not
+# exchangeable.
+
+# Default resolution of the budget grid and the fresh-roll value buckets
+REROLL_POLICY_BUDGET_STEPS = 2000
+REROLL_POLICY_VALUE_BUCKETS = 48
+
+
+def _bucket_fresh_roll_distribution(
+    atoms: List[Tuple[float, float]],
+    n_buckets: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge (dps, prob) atoms into equal-width value buckets at their conditional means."""
+    values = np.array([d for d, _ in atoms], dtype=float)
+    probs = np.array([p for _, p in atoms], dtype=float)
+    probs = probs / probs.sum()
+    lo, hi = values.min(), values.max()
+    if hi <= lo or len(values) <= n_buckets:
+        return values, probs
+    idx = np.minimum(((values - lo) / (hi - lo) * n_buckets).astype(int), n_buckets - 1)
+    mass = np.bincount(idx, weights=probs, minlength=n_buckets)
+    total = np.bincount(idx, weights=probs * values, minlength=n_buckets)
+    keep = mass > 0
+    return total[keep] / mass[keep], mass[keep]
+
+
+@dataclass
+class HeroPowerRerollPolicy:
+    """
+    Solved lock/reroll policy for one budget.
+
+    values[m, i] is the expected final DPS% summed over m open slots right
+    after they were (re)rolled with budget_grid[i] medals still available.
+    thresholds[m, i] is the optimal "lock a fresh line if its DPS% >= tau"
+    action in that state (inf = lock nothing and reroll all).
+    """
+    budget_grid: np.ndarray
+    values: np.ndarray
+    thresholds: np.ndarray
+    bucket_values: np.ndarray
+    bucket_probs: np.ndarray
+    reroll_costs: List[int]   # index = locked lines
+
+    def _interp(self, row: np.ndarray, budget: float) -> float:
+        return float(np.interp(budget, self.budget_grid, row))
+
+    def expected_value(self, open_slots: int, budget: float) -> float:
+        """Expected final DPS% of `open_slots` freshly rolled slots with `budget` left."""
+        if open_slots <= 0:
+            return 0.0
+        return self._interp(self.values[open_slots], budget)
+
+    def lock_threshold(self, open_slots: int, budget: float) -> float:
+        """Optimal lock threshold (DPS%) after rolling `open_slots` with `budget` left."""
+        if open_slots <= 0:
+            return 0.0
+        i = int(np.searchsorted(self.budget_grid, budget, side='right')) - 1
+        return float(self.thresholds[open_slots, max(0, min(i, len(self.budget_grid) - 1))])
+
+
+def solve_reroll_policy(
+    value_table: HeroPowerLineValueTable,
+    level_config: 'HeroPowerLevelConfig',
+    budget_medals: float,
+    budget_steps: int = REROLL_POLICY_BUDGET_STEPS,
+    value_buckets: int = REROLL_POLICY_VALUE_BUCKETS,
+) -> HeroPowerRerollPolicy:
+    """
+    Backward induction over (open slots, remaining budget).
+
+    With J ~ Binomial(m, P(x >= tau)) fresh lines locked at threshold tau, the
+    state value is
+        W(m, b) = max_tau E[ J * E[x | x >= tau] + C(m - J, b) ]
+    where C(r, b) = W(r, b - cost(6 - r)) if that reroll is affordable, else
+    the r sub-threshold lines are kept (r * E[x | x < tau]). The budget axis is
+    a uniform grid interpolated linearly; when a reroll costs less than one
+    grid step the self-transition is solved in closed form.
+
+    Args:
+        value_table: Shared fresh-roll table (get_line_value_table)
+        level_config: Supplies reroll costs per locked-line count
+        budget_medals: Largest budget the policy must cover
+        budget_steps: Number of budget grid intervals
+        value_buckets: Fresh-roll value buckets (threshold candidates)
+
+    Returns:
+        HeroPowerRerollPolicy
+    """
+    vals, probs = _bucket_fresh_roll_distribution(value_table.atoms, value_buckets)
+    n_vals = len(vals)
+    costs = [level_config.get_reroll_cost(k) for k in range(7)]
+
+    # Threshold candidate t locks bucket indices >= t (t = n_vals locks nothing)
+    tail_mass = np.concatenate([np.cumsum(probs[::-1])[::-1], [0.0]])
+    tail_sum = np.concatenate([np.cumsum((vals * probs)[::-1])[::-1], [0.0]])
+    p_plus = np.clip(tail_mass, 0.0, 1.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mu_plus = np.where(tail_mass > 0, tail_sum / tail_mass, 0.0)
+        head_mass = 1.0 - tail_mass
+        mu_minus = np.where(head_mass > 1e-15, (tail_sum[0] - tail_sum) / head_mass, 0.0)
+    thresholds_by_t = np.concatenate([vals, [np.inf]])
+
+    # binom[m][t, J] = P(J of m fresh lines reach threshold t)
+    binom = {}
+    for m in range(1, 7):
+        j = np.arange(m + 1)
+        coeff = np.array([math.comb(m, int(x)) for x in j], dtype=float)
+        binom[m] = coeff * p_plus[:, None] ** j * (1.0 - p_plus[:, None]) ** (m - j)
+
+    budget = max(0.0, float(budget_medals))
+    step = max(1.0, budget / max(1, budget_steps))
+    n_points = int(math.ceil(budget / step)) + 1
+    grid = np.arange(n_points) * step
+    W = np.zeros((7, n_points))
+    policy = np.full((7, n_points), np.inf)
+
+    for i in range(n_points):
+        b = grid[i]
+        for m in range(1, 7):
+            P = binom[m]
+            J = np.arange(m + 1)
+            # Banked value of the J locked lines, per threshold
+            total = P * (J[None, :] * mu_plus[:, None])
+            self_coeff = np.zeros(n_vals + 1)
+            for jj in range(m + 1):
+                r = m - jj
+                if r == 0:
+                    continue
+                c = costs[6 - r]
+                if b < c:
+                    total[:, jj] += P[:, jj] * r * mu_minus
+                    continue
+                x = (b - c) / step
+                lo = int(math.floor(x))
+                w = x - lo
+                if r < m or lo + 1 < i or w == 0:
+                    hi_val = W[r, min(lo + 1, n_points - 1)]
+                    total[:, jj] += P[:, jj] * ((1 - w) * W[r, lo] + w * hi_val)
+                else:
+                    # Self-transition lands inside the current grid cell
+                    total[:, jj] += P[:, jj] * (1 - w) * W[m, lo]
+                    self_coeff = P[:, jj] * w
+            candidate = total.sum(axis=1) / (1.0 - self_coeff)
+            best = int(np.argmax(candidate))
+            W[m, i] = candidate[best]
+            policy[m, i] = thresholds_by_t[best]
+
+    return HeroPowerRerollPolicy(
+        budget_grid=grid,
+        values=W,
+        thresholds=policy,
+        bucket_values=vals,
+        bucket_probs=probs,
+        reroll_costs=costs[:6],
+    )
+
+
+def analyze_budget_policy(
+    config: 'HeroPowerConfig',
+    level_config: 'HeroPowerLevelConfig',
+    budget_medals: float,
+    calc_dps_func: Callable,
+    get_stats_func: Callable,
+    value_table: Optional[HeroPowerLineValueTable] = None,
+    budget_steps: int = REROLL_POLICY_BUDGET_STEPS,
+    value_buckets: int = REROLL_POLICY_VALUE_BUCKETS,
+    context: Optional[Tuple] = None,
+) -> Dict:
+    """
+    Budget optimizer backed by solve_reroll_policy.
+
+    Enumerates every lock subset of the current lines (user locks forced),
+    scoring each as "keep the locked contributions + expected value of
+    rerolling the rest under the optimal policy", and returns the best one.
+    Output keys match analyze_budget so the pages can swap between them; the
+    cascade thresholds are the DP's lock thresholds at the full budget, and
+    'policy' carries the solved HeroPowerRerollPolicy for later states. A
+    value table built here is cached under `context` (see get_line_value_table).
+    """
+    current_stats = get_stats_func()
+    if not current_stats:
+        return {'budget_medals': budget_medals, 'error': 'no current stats'}
+    if calc_dps_func(current_stats) <= 0:
+        return {'budget_medals': budget_medals, 'error': 'current dps is zero'}
+
+    per_slot_dps: Dict[int, float] = {
+        line.slot: calculate_line_dps_value(line, calc_dps_func, lambda: current_stats)
+        for line in config.lines
+    }
+    current_total_dps_pct = sum(per_slot_dps.values())
+
+    if value_table is None:
+        value_table = get_line_value_table(current_stats, calc_dps_func, level_config, context=context)
+    policy = solve_reroll_policy(
+        value_table, level_config, budget_medals,
+        budget_steps=budget_steps, value_buckets=value_buckets,
+    )
+    budget = float(budget_medals)
+
+    # Root decision over all lock subsets of the (non-exchangeable) current lines
+    slots = [line.slot for line in config.lines]
+    user_locked = {line.slot for line in config.lines if line.is_locked}
+    best_locked, best_value = set(slots), current_total_dps_pct
+    for mask in range(1 << len(slots)):
+        locked = {s for bit, s in enumerate(slots) if mask >> bit & 1}
+        if not user_locked <= locked or len(locked) == len(slots):
+            continue
+        cost = level_config.get_reroll_cost(len(locked))
+        if budget < cost:
+            continue
+        value = (
+            sum(per_slot_dps[s] for s in locked)
+            + policy.expected_value(len(slots) - len(locked), budget - cost)
+        )
+        if value > best_value + 1e-12:
+            best_locked, best_value = locked, value
+
+    def _threshold(locks_held: int, remaining: float) -> Optional[float]:
+        tau = policy.lock_threshold(6 - locks_held, remaining)
+        return tau if math.isfinite(tau) else None
+
+    cascade = []
+    for K in range(6):
+        cost_K = level_config.get_reroll_cost(K)
+        cascade.append({
+            'locks_held': K,
+            'cost_per_reroll': cost_K,
+            'rerolls_in_budget': int(budget / cost_K) if cost_K > 0 else 0,
+            'reservation_dps_pct': _threshold(K, budget - cost_K) if budget >= cost_K else None,
+            'reservation_half_budget_pct': (
+                _threshold(K, budget / 2 - cost_K) if budget / 2 >= cost_K else None
+            ),
+        })
+
+    final_K = len(best_locked)
+    final_cost = level_config.get_reroll_cost(final_K)
+    rerolling = final_K < len(slots)
+    final_tau = _threshold(final_K, budget - final_cost) if rerolling else None
+    fresh_p_above = (
+        value_table.probability_above(final_tau) if final_tau is not None else 0.0
+    )
+
+    line_analysis = []
+    for line in config.lines:
+        slot = line.slot
+        C = per_slot_dps[slot]
+        if slot in best_locked:
+            recommendation, stop_value, p_improve = 'LOCK', None, None
+            reason = (
+                f"User-locked. Contributes {C:.2f}% DPS." if slot in user_locked
+                else f"Keeping {C:.2f}% beats rerolling this slot within the budget."
+            )
+        else:
+            recommendation, stop_value, p_improve = 'REROLL', final_tau, fresh_p_above
+            if final_tau is not None:
+                reason = (
+                    f"Current {C:.2f}% is worth less than a reroll at {final_K} locks. "
+                    f"Lock fresh lines at >= {final_tau:.2f}% (threshold relaxes as "
+                    f"the budget runs down)."
+                )
+            else:
+                reason = f"Current {C:.2f}% is worth less than a reroll at {final_K} locks."
+        line_analysis.append({
+            'slot': slot,
+            'stat': STAT_DISPLAY_NAMES.get(line.stat_type, line.stat_type.value),
+            'tier': line.tier.value.capitalize(),
+            'value': line.value,
+            'current_dps_pct': C,
+            'recommendation': recommendation,
+            'reasoning': reason,
+            'stop_value_pct': stop_value,
+            'p_improvement_per_reroll': p_improve,
+        })
+
+    return {
+        'budget_medals': budget,
+        'recommended_locks': sorted(best_locked) if rerolling else sorted(slots),
+        'cost_per_reroll': final_cost,
+        'expected_rerolls': int(budget / final_cost) if rerolling and final_cost > 0 else 0,
+        'expected_medals_spent': budget if rerolling else 0.0,
+        'current_total_dps_pct': current_total_dps_pct,
+        'expected_total_dps_pct': best_value,
+        'expected_gain_pct': best_value - current_total_dps_pct,
+        'cascade': cascade,
+        'line_analysis': line_analysis,
+        'policy': policy,
+    }
+
+
 # =============================================================================
 # MAIN (Testing)
 # =============================================================================
@@ -7031,6 +7031,64 @@ class DPSCalculator:
 
         return total
 
+    def get_effective_crit_damage(
+        self,
+        eff_crit_damage: float,
+        crit_dmg_bonus: float = 0.0,
+        active_buffs: Optional[Set[str]] = None,
+        stat_override: Optional['PlayerStatSnapshot'] = None,
+    ) -> float:
+        """
+        Crit damage % a hit deals with: `eff_crit_damage` plus `crit_dmg_bonus`
+        (from active buffs) plus Concentration stacks, Smokescreen mastery and
+        Sharp Eyes' share of own crit damage. With active_buffs=None the
+        Smokescreen and Sharp Eyes bonuses are weighted by buff uptime.
+
+        Also works elementwise on a NumPy array of `eff_crit_damage`.
+        """
+        # Concentration (crit damage stacks) - PASSIVE_BUFF so not in char stats.
+        # Snapshot path can override the implicit 7-stack assumption: the
+        # companion-summon path forces max stacks ("optimal pre-stack" — see
+        # plan Phase 4) regardless of what the player can actually maintain.
+        conc_per_stack = self.get_skill_bonus_value("concentration", "crit_damage")
+        if stat_override is not None and stat_override.concentration_forced_stacks is not None:
+            conc_stacks = stat_override.concentration_forced_stacks
+        else:
+            conc_stacks = 7
+        crit_dmg_bonus += conc_per_stack * conc_stacks
+
+        # Smokescreen mastery: +crit damage while Smokescreen is active
+        sm_crit = self.get_mastery_bonus("smokescreen", "skill_effect")
+        if sm_crit > 0 and self.char.is_skill_unlocked("smokescreen"):
+            if active_buffs is not None and "smokescreen" in active_buffs:
+                # During simulation: buff is explicitly active
+                crit_dmg_bonus += sm_crit
+            elif active_buffs is None:
+                # Outside simulation: weight by buff uptime
+                from libs.cooldown_calc import calculate_buff_uptime
+                sm_skill = self._skills["smokescreen"]
+                sm_cd = self.char.get_effective_skill_cooldown(sm_skill.cooldown, 0)
+                sm_dur = self.get_effective_buff_duration("smokescreen")
+                sm_uptime = calculate_buff_uptime(
+                    cooldown=sm_cd, buff_duration=sm_dur, fight_duration=60.0)
+                crit_dmg_bonus += sm_crit * sm_uptime
+
+        # Sharp Eyes: +20% of own crit_damage (self is an allied player)
+        se_skill = self._skills.get("sharp_eyes")
+        if se_skill and se_skill.self_crit_damage_pct > 0 and self.char.is_skill_unlocked("sharp_eyes"):
+            se_pct = se_skill.self_crit_damage_pct / 100
+            if active_buffs is not None:
+                if "sharp_eyes" in active_buffs:
+                    crit_dmg_bonus += se_pct * eff_crit_damage
+            else:
+                from libs.cooldown_calc import calculate_buff_uptime
+                se_cd = self.char.get_effective_skill_cooldown(se_skill.cooldown, 0)
+                se_dur = self.get_effective_buff_duration("sharp_eyes")
+                se_uptime = calculate_buff_uptime(se_cd, se_dur, 60.0)
+                crit_dmg_bonus += se_pct * eff_crit_damage * se_uptime
+
+        return eff_crit_damage + crit_dmg_bonus
+
     def calculate_hit_damage(
         self,
         skill_damage_pct: float,
@@ -7243,49 +7301,7 @@ class DPSCalculator:
                 buff_final_damage += fd_value
 
         crit_rate = min((eff_crit_rate + crit_rate_bonus) / 100, 1.0)
-
-        # Concentration (crit damage stacks) - PASSIVE_BUFF so not in char stats.
-        # Snapshot path can override the implicit 7-stack assumption: the
-        # companion-summon path forces max stacks ("optimal pre-stack" — see
-        # plan Phase 4) regardless of what the player can actually maintain.
-        conc_per_stack = self.get_skill_bonus_value("concentration", "crit_damage")
-        if stat_override is not None and stat_override.concentration_forced_stacks is not None:
-            conc_stacks = stat_override.concentration_forced_stacks
-        else:
-            conc_stacks = 7
-        crit_dmg_bonus += conc_per_stack * conc_stacks
-
-        # Smokescreen mastery: +crit damage while Smokescreen is active
-        sm_crit = self.get_mastery_bonus("smokescreen", "skill_effect")
-        if sm_crit > 0 and self.char.is_skill_unlocked("smokescreen"):
-            if active_buffs is not None and "smokescreen" in active_buffs:
-                # During simulation: buff is explicitly active
-                crit_dmg_bonus += sm_crit
-            elif active_buffs is None:
-                # Outside simulation: weight by buff uptime
-                from libs.cooldown_calc import calculate_buff_uptime
-                sm_skill = self._skills["smokescreen"]
-                sm_cd = self.char.get_effective_skill_cooldown(sm_skill.cooldown, 0)
-                sm_dur = self.get_effective_buff_duration("smokescreen")
-                sm_uptime = calculate_buff_uptime(
-                    cooldown=sm_cd, buff_duration=sm_dur, fight_duration=60.0)
-                crit_dmg_bonus += sm_crit * sm_uptime
-
-        # Sharp Eyes: +20% of own crit_damage (self is an allied player)
-        se_skill = self._skills.get("sharp_eyes")
-        if se_skill and se_skill.self_crit_damage_pct > 0 and self.char.is_skill_unlocked("sharp_eyes"):
-            se_pct = se_skill.self_crit_damage_pct / 100
-            if active_buffs is not None:
-                if "sharp_eyes" in active_buffs:
-                    crit_dmg_bonus += se_pct * eff_crit_damage
-            else:
-                from libs.cooldown_calc import calculate_buff_uptime
-                se_cd = self.char.get_effective_skill_cooldown(se_skill.cooldown, 0)
-                se_dur = self.get_effective_buff_duration("sharp_eyes")
-                se_uptime = calculate_buff_uptime(se_cd, se_dur, 60.0)
-                crit_dmg_bonus += se_pct * eff_crit_damage * se_uptime
-
-        crit_damage = eff_crit_damage + crit_dmg_bonus
+        crit_damage = self.get_effective_crit_damage(eff_crit_damage, crit_dmg_bonus, active_buffs, stat_override)
         crit_mult = 1 + crit_rate * (crit_damage / 100)
 
         def_pen_mult = eff_def_pen_mult
@@ -16,7 +16,13 @@ The tier distributions use whole-number ratios that produce exact percentages.
 Rarity totals are set so that rarity * tier_pct rounds to wiki values.
 """
 
-from typing import Dict, List, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from engine.cache import LRUCache
 
 
 # =============================================================================
@@ -1376,6 +1382,199 @@ def calculate_weapon_drop_value(
     return result
 
 
+# =============================================================================
+# PRECOMPUTED SUMMON VALUE TABLES
+# =============================================================================
+# Drop rates are fixed per summoning level and each weapon's drop value only
+# depends on that weapon's own state (plus the equipped weapon for brand-new
+# drops and the promotion target for A5 weapons). Both are kept as arrays
+# over every (rarity, tier); when the inventory changes only the affected
+# entries are recomputed from the previous table.
+
+SUMMON_WEAPONS: Tuple[Tuple[str, int], ...] = tuple(
+    (rarity, tier) for rarity in RARITY_ORDER for tier in (4, 3, 2, 1)
+)
+_SUMMON_WEAPON_INDEX = {f"{rarity}_{tier}": i for i, (rarity, tier) in enumerate(SUMMON_WEAPONS)}
+_MAX_SUMMON_LEVEL = 17
+
+_SUMMON_VALUE_TABLE_CACHE_SIZE = 32
+_summon_value_tables = LRUCache(maxsize=_SUMMON_VALUE_TABLE_CACHE_SIZE)
+
+
+@lru_cache(maxsize=1)
+def _summon_rate_table() -> Tuple[np.ndarray, Tuple[np.ndarray, ...]]:
+    """
+    Drop rates as an array (row = summoning level, column = SUMMON_WEAPONS)
+    and, per level, the column order get_all_weapon_rates lists them in.
+    """
+    rates = np.zeros((_MAX_SUMMON_LEVEL + 1, len(SUMMON_WEAPONS)))
+    orders = [np.zeros(0, dtype=int)]
+    for level in range(1, _MAX_SUMMON_LEVEL + 1):
+        order = []
+        for (rarity, tier), rate in get_all_weapon_rates(level).items():
+            i = _SUMMON_WEAPON_INDEX[f"{rarity}_{tier}"]
+            rates[level, i] = rate
+            order.append(i)
+        orders.append(np.array(order, dtype=int))
+    rates.setflags(write=False)
+    return rates, tuple(orders)
+
+
+def _weapon_fingerprint(weapon_data: Dict) -> Tuple[int, int, int]:
+    return (
+        weapon_data.get('level', 0),
+        weapon_data.get('awakening', 0),
+        weapon_data.get('duplicates', 0),
+    )
+
+
+def _atk_to_dps(atk_percent, current_total_atk_percent: float):
+    """Diminishing returns: ATK% gain -> DPS% gain at the current total ATK%."""
+    if current_total_atk_percent > 0:
+        return atk_percent / (1 + current_total_atk_percent / 100)
+    return atk_percent
+
+
+def _summon_weapon_value(
+    rarity: str,
+    tier: int,
+    fingerprint: Tuple[int, int, int],
+    is_equipped: bool,
+) -> float:
+    """ATK% value of one drop in the level-progression model (0 once maxed)."""
+    from optimizers.weapon_optimizer import calculate_atk_at_level
+    from game.weapons import get_inventory_ratio
+
+    existing_level, existing_awakening, _ = fingerprint
+    if existing_awakening >= 5:
+        return 0.0  # Skip maxed weapons
+
+    inv_ratio = get_inventory_ratio(rarity)
+
+    if existing_level <= 0:
+        # Level 1 inventory ATK%
+        return calculate_atk_at_level(rarity, tier, 1) * inv_ratio
+
+    # Awakening value (simplified as inventory ATK% gain)
+    current_max = 100 + existing_awakening * 20
+    new_max = current_max + 20
+    atk_gain = calculate_atk_at_level(rarity, tier, new_max) - calculate_atk_at_level(rarity, tier, current_max)
+    weapon_value = atk_gain * (1 + inv_ratio) if is_equipped else atk_gain * inv_ratio
+
+    # Scale by investment ratio
+    investment = min(1.0, existing_level / current_max) if current_max > 0 else 0
+    return weapon_value * investment
+
+
+@dataclass
+class WeaponSummonValueTable:
+    """
+    Per-weapon drop values for one inventory, aligned with SUMMON_WEAPONS.
+
+    Values are raw ATK% (before dividing by total ATK%), so one table serves
+    any current_total_atk_percent.
+    """
+    equipped_weapon_key: str
+    equipped_fingerprint: Tuple[int, int, int]
+    fingerprints: Tuple[Tuple[int, int, int], ...]
+    drop_results: Dict[str, Dict]       # weapon key -> calculate_weapon_drop_value result
+    drop_values: np.ndarray             # Per-ticket model value of each drop
+    summon_values: np.ndarray           # Level-progression model value of each drop
+    drop_level_values: np.ndarray       # Per-ticket expected ATK% at each summoning level
+    summon_level_values: np.ndarray     # Progression-model expected ATK% at each level
+
+
+def _build_summon_value_table(
+    weapons_data: Dict[str, Dict],
+    equipped_weapon_key: str,
+    equipped_fingerprint: Tuple[int, int, int],
+    fingerprints: Tuple[Tuple[int, int, int], ...],
+    base: Optional[WeaponSummonValueTable] = None,
+) -> WeaponSummonValueTable:
+    """Table for this inventory, recomputing only what differs from `base`."""
+    n = len(SUMMON_WEAPONS)
+    equipped_index = _SUMMON_WEAPON_INDEX.get(equipped_weapon_key)
+
+    if base is None:
+        dirty = set(range(n))
+    else:
+        dirty = {i for i in range(n) if fingerprints[i] != base.fingerprints[i]}
+        old_index = _SUMMON_WEAPON_INDEX.get(base.equipped_weapon_key)
+        if (base.equipped_weapon_key, base.equipped_fingerprint) != (equipped_weapon_key, equipped_fingerprint):
+            # Brand-new drops are compared against the equipped weapon
+            dirty.update(i for i in range(n) if fingerprints[i][0] <= 0)
+            dirty.update(i for i in (equipped_index, old_index) if i is not None)
+
+    summon_values = np.zeros(n) if base is None else base.summon_values.copy()
+    for i in dirty:
+        rarity, tier = SUMMON_WEAPONS[i]
+        summon_values[i] = _summon_weapon_value(rarity, tier, fingerprints[i], i == equipped_index)
+
+    # Owned A5 weapons take their value from the promotion target
+    promoted_from: Dict[int, List[int]] = {}
+    for i, (rarity, tier) in enumerate(SUMMON_WEAPONS):
+        level, awakening, _ = fingerprints[i]
+        promo_rarity, promo_tier = get_promotion_result(rarity, tier)
+        if level > 0 and awakening >= 5 and promo_rarity is not None:
+            promoted_from.setdefault(_SUMMON_WEAPON_INDEX[f"{promo_rarity}_{promo_tier}"], []).append(i)
+    stack = list(dirty)
+    while stack:
+        for i in promoted_from.get(stack.pop(), ()):
+            if i not in dirty:
+                dirty.add(i)
+                stack.append(i)
+
+    drop_results = {} if base is None else {
+        key: result for key, result in base.drop_results.items()
+        if _SUMMON_WEAPON_INDEX[key] not in dirty
+    }
+    for i in sorted(dirty):
+        rarity, tier = SUMMON_WEAPONS[i]
+        calculate_weapon_drop_value(rarity, tier, weapons_data, equipped_weapon_key, 0.0, drop_results)
+    drop_values = np.array([drop_results[f"{rarity}_{tier}"]['value'] for rarity, tier in SUMMON_WEAPONS])
+
+    rates, _ = _summon_rate_table()
+    for values in (drop_values, summon_values):
+        values.setflags(write=False)
+    return WeaponSummonValueTable(
+        equipped_weapon_key=equipped_weapon_key,
+        equipped_fingerprint=equipped_fingerprint,
+        fingerprints=fingerprints,
+        drop_results=drop_results,
+        drop_values=drop_values,
+        summon_values=summon_values,
+        drop_level_values=rates @ drop_values,
+        summon_level_values=rates @ summon_values,
+    )
+
+
+def get_summon_value_table(
+    weapons_data: Dict[str, Dict],
+    equipped_weapon_key: str,
+) -> WeaponSummonValueTable:
+    """
+    Summon value table for an inventory, cached by its fingerprint.
+
+    A new inventory is derived from the most recently used table, so a
+    single levelled or awakened weapon only recomputes that weapon (and
+    whatever promotes into it).
+    """
+    fingerprints = tuple(
+        _weapon_fingerprint(weapons_data.get(f"{rarity}_{tier}", {}))
+        for rarity, tier in SUMMON_WEAPONS
+    )
+    equipped_fingerprint = _weapon_fingerprint(weapons_data.get(equipped_weapon_key, {}))
+    cache_key = (equipped_weapon_key, equipped_fingerprint, fingerprints)
+    table = _summon_value_tables.get(cache_key)
+    if table is None:
+        table = _build_summon_value_table(
+            weapons_data, equipped_weapon_key, equipped_fingerprint, fingerprints,
+            _summon_value_tables.most_recent(),
+        )
+        _summon_value_tables.set(cache_key, table)
+    return table
+
+
 def calculate_expected_value_per_ticket(
     summoning_level: int,
     weapons_data: Dict[str, Dict],
@@ -1396,42 +1595,31 @@ def calculate_expected_value_per_ticket(
         - efficiency: DPS% per 1000 diamonds
         - breakdown: list of (weapon, rate, value, contribution)
     """
-    all_rates = get_all_weapon_rates(summoning_level)
-
-    total_expected_value = 0.0
-    breakdown = []
+    table = get_summon_value_table(weapons_data, equipped_weapon_key)
+    rates, orders = _summon_rate_table()
+    level = min(max(summoning_level, 1), _MAX_SUMMON_LEVEL)
 
-    # Shared cache for all weapon value calculations (avoids recalculating promotions)
-    value_cache = {}
+    values = _atk_to_dps(table.drop_values, current_total_atk_percent)
+    contributions = rates[level] * values
+    total_expected_value = float(contributions.sum())
 
-    for (rarity, tier), drop_rate in all_rates.items():
-        if drop_rate <= 0:
+    breakdown = []
+    for i in orders[level]:
+        if values[i] <= 0 or rates[level, i] <= 0:
             continue
-
-        # Calculate value if we get this weapon
-        drop_value = calculate_weapon_drop_value(
-            rarity, tier,
-            weapons_data, equipped_weapon_key,
-            current_total_atk_percent,
-            value_cache
-        )
-
-        # Expected contribution = P(drop) × Value(drop)
-        contribution = drop_rate * drop_value['value']
-        total_expected_value += contribution
-
-        if drop_value['value'] > 0:
-            breakdown.append({
-                'weapon': f"{rarity}_{tier}",
-                'rarity': rarity,
-                'tier': tier,
-                'drop_rate': drop_rate,
-                'drop_rate_pct': drop_rate * 100,
-                'value': drop_value['value'],
-                'contribution': contribution,
-                'reason': drop_value['reason'],
-                'triggers_promotion': drop_value.get('triggers_promotion', False),
-            })
+        rarity, tier = SUMMON_WEAPONS[i]
+        drop_value = table.drop_results[f"{rarity}_{tier}"]
+        breakdown.append({
+            'weapon': f"{rarity}_{tier}",
+            'rarity': rarity,
+            'tier': tier,
+            'drop_rate': float(rates[level, i]),
+            'drop_rate_pct': float(rates[level, i]) * 100,
+            'value': float(values[i]),
+            'contribution': float(contributions[i]),
+            'reason': drop_value['reason'],
+            'triggers_promotion': drop_value.get('triggers_promotion', False),
+        })
 
     # Sort breakdown by contribution (highest first)
     breakdown.sort(key=lambda x: -x['contribution'])
@@ -1616,60 +1804,15 @@ def calculate_expected_value_per_summon(
     Returns:
         Dict with expected_value_per_summon, breakdown, etc.
     """
-    from optimizers.weapon_optimizer import calculate_atk_at_level
-    from game.weapons import get_inventory_ratio
-
     # =========================================================================
-    # Phase 1: Calculate immediate weapon drop value at each level
+    # Phase 1: Immediate weapon drop value at each level (precomputed table)
     # =========================================================================
 
-    level_drop_values = {}  # level -> expected ATK% per summon from drops
-
-    for level in range(1, 18):
-        drop_value = 0.0
-        rates = get_all_weapon_rates(level)
-
-        for (rarity, tier), rate in rates.items():
-            if rate <= 0:
-                continue
-
-            weapon_key = f"{rarity}_{tier}"
-            existing = weapons_data.get(weapon_key, {})
-            existing_level = existing.get('level', 0)
-            existing_awakening = existing.get('awakening', 0)
-            is_new = existing_level <= 0
-
-            if existing_awakening >= 5:
-                continue  # Skip maxed weapons
-
-            inv_ratio = get_inventory_ratio(rarity)
-
-            # Calculate weapon value
-            if is_new:
-                # Level 1 inventory ATK%
-                level_1_atk = calculate_atk_at_level(rarity, tier, 1)
-                weapon_value = level_1_atk * inv_ratio
-            else:
-                # Awakening value (simplified as inventory ATK% gain)
-                current_max = 100 + existing_awakening * 20
-                new_max = current_max + 20
-                atk_gain = calculate_atk_at_level(rarity, tier, new_max) - calculate_atk_at_level(rarity, tier, current_max)
-
-                is_equipped = weapon_key == equipped_weapon_key
-                if is_equipped:
-                    weapon_value = atk_gain * (1 + inv_ratio)
-                else:
-                    weapon_value = atk_gain * inv_ratio
-
-                # Scale by investment ratio
-                investment = min(1.0, existing_level / current_max) if current_max > 0 else 0
-                weapon_value *= investment
-
-            # Weight by drop rate
-            drop_value += weapon_value * rate
-
-        # Convert to DPS%
-        level_drop_values[level] = drop_value / (1 + current_total_atk_percent / 100) if current_total_atk_percent > 0 else drop_value
+    table = get_summon_value_table(weapons_data, equipped_weapon_key)
+    level_drop_values = {
+        level: float(_atk_to_dps(table.summon_level_values[level], current_total_atk_percent))
+        for level in range(1, _MAX_SUMMON_LEVEL + 1)
+    }
 
     # =========================================================================
     # Phase 2: Backward induction to calculate total value at each level
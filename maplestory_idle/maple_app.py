@@ -60,6 +60,7 @@ from game.hero_power import (
     HERO_POWER_REROLL_COSTS, HERO_POWER_TIER_RATES, HERO_POWER_STAT_RANGES,
     STAT_DISPLAY_NAMES, TIER_COLORS, VALUABLE_STATS,
     simulate_hero_power_reroll, check_target_achieved, run_custom_target_simulation,
+    solve_custom_target_exact,
     HeroPowerLevelConfig, create_default_level_config, score_hero_power_line, get_line_score_category,
     STAT_DPS_WEIGHTS, TIER_SCORE_MULTIPLIERS
 )
@@ -7922,10 +7923,11 @@ Regular Cubes:                          Bonus Cubes:
         self.root.update()
 
         try:
-            result = run_custom_target_simulation(
+            # Exact solution; run_custom_target_simulation remains available
+            # as a Monte Carlo cross-check.
+            result = solve_custom_target_exact(
                 target=target,
                 locked_lines=locked_slots,
-                iterations=10000,
                 max_rerolls=50000
             )
 
@@ -8030,7 +8032,7 @@ Regular Cubes:                          Bonus Cubes:
     def _display_simulation_results(self, result: HeroPowerSimulationResult):
         """Display simulation results in the UI."""
         lines = [
-            f"Iterations: {result.iterations:,}",
+            "Exact solution" if result.is_exact else f"Iterations: {result.iterations:,}",
             f"Success Rate: {result.success_rate * 100:.1f}%",
             "",
             f"Expected Rerolls: {result.expected_rerolls:,.0f}",
@@ -8044,9 +8046,33 @@ Regular Cubes:                          Bonus Cubes:
             lines.append("")
             lines.append(f"WARNING: {result.capped_iterations} iterations hit max rerolls")
             lines.append("(Target may be unrealistic)")
+        elif result.is_exact and result.capped_probability > 0.001:
+            lines.append("")
+            lines.append(f"WARNING: {result.capped_probability * 100:.1f}% chance to hit max rerolls")
+            lines.append("(Target may be unrealistic)")
 
         self.hero_sim_results_label.config(text="\n".join(lines))
 
+        # Exact results: bucket the probability mass function directly
+        if result.is_exact and len(result.reroll_pmf) > 1:
+            pmf = result.reroll_pmf
+            min_val = next(k for k, p in enumerate(pmf) if p > 0)
+            max_val = len(pmf) - 1
+            if max_val > min_val:
+                bucket_size = (max_val - min_val) / 5
+                buckets = [0.0] * 5
+                for k in range(min_val, max_val + 1):
+                    buckets[min(4, int((k - min_val) / bucket_size))] += pmf[k]
+
+                chart_data = []
+                for i, mass in enumerate(buckets):
+                    low = int(min_val + i * bucket_size)
+                    high = int(min_val + (i + 1) * bucket_size)
+                    chart_data.append((f"{low}-{high}", mass * 100, "#4a9eff"))
+
+                self.hero_sim_chart.update(chart_data)
+            return
+
         # Update distribution chart
         if result.reroll_distribution:
             # Create histogram buckets
@@ -12143,6 +12169,7 @@ Tier Scaling: Higher tiers have 1.3x multiplier per tier
                 hero_power_level_config=self.hero_power_level_config,
                 hero_power_presets=self.hero_power_presets,
                 combat_mode=self.combat_mode.value,
+                main_stat_flat_key="dex_flat",  # _get_damage_stats is DEX-based
             )
 
             # Analyze all options
@@ -0,0 +1,926 @@
+"""
+Account-level upgrade analyses behind the Upgrade Optimizer page and the
+/api/upgrade-analysis endpoint.
+
+Each analyser is a module-level task over an AccountSnapshot - the account,
+its baseline stats and baseline DPS results, and the DPS settings - so the
+tasks pickle and run on a process pool (see run_analyses / analysis_pool in
+optimizers.upgrade_optimizer). The analysers are pure Python and CPU-bound;
+on threads the GIL serialises them.
+
+    snapshot = build_snapshot(user_data)
+    for event in run_analyses(analysis_tasks(snapshot), executor=analysis_pool()):
+        output = event.result      # AnalysisOutput(result, report)
+
+Every task scores through its own EvaluationContext built from the snapshot
+and returns that context's report (DPS evaluations per analyser, baseline
+and sim cache reuse) next to its result, for EvaluationContext.merge_report.
+
+The cube and tier-up analysers also return the candidate builds they scored
+as stat deltas; after an edit elsewhere on the account, analysis_rerank
+rebuilds those on the new baseline and batch-scores them instead of
+aggregating each one again.
+"""
+import copy
+import functools
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from core.constants import ENEMY_DEFENSE_VALUES, EQUIPMENT_SLOTS
+from core.stat_vector import StatDelta, StatVector
+from engine.dps_calculator import (
+    EvaluationContext,
+    LegacyBatchEvaluator,
+    aggregate_stats,
+    calculate_dps,
+    evaluate_companion_level_changes,
+)
+from game.artifacts import ARTIFACTS, calculate_resonance_max_level
+from game.companion_summoning import get_companion_ticket_recommendation_for_optimizer
+from game.equipment import get_amplify_multiplier
+from game.hero_power import (
+    analyze_budget as analyze_hero_power_budget,
+    HeroPowerConfig, HeroPowerLevelConfig, HeroPowerLine,
+    HeroPowerStatType, HeroPowerTier, _stats_fingerprint,
+)
+from game.job_classes import JobClass
+from game.weapon_summoning import get_summon_recommendations_for_optimizer
+from optimizers.artifact_optimizer import get_artifact_recommendations_for_optimizer
+from optimizers.starforce_optimizer import calculate_cost_distribution, find_optimal_per_stage_strategy
+from optimizers.upgrade_optimizer import evaluate_starforce_dps_gains
+from optimizers.weapon_optimizer import get_weapon_upgrade_for_optimizer, calculate_total_weapon_atk_percent
+from streamlit_app.utils.cube_analyzer import (
+    analyze_all_cube_priorities, analyze_all_tier_upgrades, format_stat_display,
+)
+
+MEDAL_TO_DIAMOND = 10
+
+# DPS weights for stats
+STAT_DPS_WEIGHTS = {
+    'damage': 1.5,
+    'boss_damage': 2.0,
+    'normal_damage': 1.0,
+    'crit_damage': 1.8,
+    'def_pen': 2.2,
+    'final_damage': 2.5,
+    'dex_pct': 1.2,
+    'str_pct': 1.2,
+    'int_pct': 1.2,
+    'luk_pct': 1.2,
+    'attack_pct': 1.5,
+    'crit_rate': 1.5,
+    'min_dmg_mult': 0.8,
+    'max_dmg_mult': 0.8,
+    'all_skills': 1.0,
+}
+
+
+
+# =============================================================================
+# SNAPSHOT
+# =============================================================================
+
+@dataclass
+class AccountSnapshot:
+    """
+    Read-only inputs shared by every analyser of one run. Plain data, so it
+    pickles to worker processes; each task builds its EvaluationContext
+    from it with context().
+    """
+    user_data: Any
+    baseline_stats: Dict[str, Any]
+    baseline_results: Dict[str, Dict[str, Any]]   # combat mode -> calculate_dps result
+    enemy_def: float
+    use_realistic_dps: bool = False
+    boss_importance: float = 0.7
+    boss_damage_multiplier: float = 1.0
+    key: Hashable = None                           # digest of the baseline and settings
+
+    @property
+    def combat_mode(self) -> str:
+        return self.user_data.combat_mode
+
+    @property
+    def job_class(self) -> JobClass:
+        return JobClass(self.user_data.job_class)
+
+    @property
+    def baseline_dps(self) -> float:
+        return self.baseline_results[self.combat_mode]['total']
+
+    def calculate_dps(self, stats: Dict[str, Any], combat_mode: str = 'stage',
+                      enemy_def: Optional[float] = None) -> Dict[str, Any]:
+        """calculate_dps with the account's job class and DPS settings."""
+        return calculate_dps(
+            stats, combat_mode, self.enemy_def if enemy_def is None else enemy_def,
+            job_class=self.job_class,
+            use_realistic_dps=self.use_realistic_dps,
+            boss_importance=self.boss_importance,
+            boss_damage_multiplier=self.boss_damage_multiplier,
+        )
+
+    def context(self) -> EvaluationContext:
+        """
+        A fresh EvaluationContext seeded with the snapshot's baseline results.
+
+        The FastDPSEvaluator is only wired in when the realistic DPS path is
+        active — otherwise the legacy path is already fast and the wrapper
+        would add overhead with no benefit — and not in 'stage' mode (the
+        phase-weighted helper path doesn't fit the evaluator's "one calc_dps
+        call per evaluation" contract; covering it cleanly needs a follow-up).
+        """
+        fast_evaluator_kwargs = None
+        if self.use_realistic_dps and self.combat_mode != 'stage':
+            fast_evaluator_kwargs = {
+                'enemy_def': self.enemy_def,
+                'calculate_dps_fn': calculate_dps,
+                'extra_kwargs': {
+                    'job_class': self.job_class,
+                    'boss_importance': self.boss_importance,
+                    'boss_damage_multiplier': self.boss_damage_multiplier,
+                },
+            }
+        return EvaluationContext(
+            self.baseline_stats, self.combat_mode, self.calculate_dps,
+            baseline_results=self.baseline_results,
+            fast_evaluator_kwargs=fast_evaluator_kwargs,
+        )
+
+
+def build_snapshot(
+    user_data,
+    baseline_stats: Optional[Dict[str, Any]] = None,
+    baseline_result: Optional[Dict[str, Any]] = None,
+) -> AccountSnapshot:
+    """
+    Snapshot of `user_data` with its DPS settings. Computes the baseline
+    stats and DPS unless given, plus the chapter_hunt / boss phase baselines
+    in stage mode, so no worker recomputes them.
+    """
+    snapshot = AccountSnapshot(
+        user_data=user_data,
+        baseline_stats=baseline_stats if baseline_stats is not None else aggregate_stats(user_data),
+        baseline_results={},
+        enemy_def=ENEMY_DEFENSE_VALUES.get(getattr(user_data, 'chapter', 'Chapter 27'), 0.752),
+        use_realistic_dps=bool(getattr(user_data, 'use_realistic_dps', False)),
+        boss_importance=getattr(user_data, 'boss_importance', 70) / 100.0,
+        boss_damage_multiplier=getattr(user_data, 'boss_damage_multiplier', 1.0),
+    )
+    mode = snapshot.combat_mode
+    modes = [mode, 'chapter_hunt', 'boss'] if mode == 'stage' else [mode]
+    for phase in modes:
+        if phase == mode and baseline_result is not None:
+            snapshot.baseline_results[phase] = baseline_result
+        elif phase not in snapshot.baseline_results:
+            snapshot.baseline_results[phase] = snapshot.calculate_dps(snapshot.baseline_stats, phase)
+    snapshot.key = (
+        _stats_fingerprint(snapshot.baseline_stats), mode, snapshot.enemy_def,
+        snapshot.use_realistic_dps, snapshot.boss_importance, snapshot.boss_damage_multiplier,
+    )
+    return snapshot
+
+
+# =============================================================================
+# TASKS
+# =============================================================================
+
+@dataclass
+class AnalysisOutput:
+    """
+    What a task sends back: its result and its context's report(), plus for
+    the slot potential analysers the candidates they scored (see
+    CandidateScorer), from which analysis_rerank re-scores the result.
+    """
+    result: Any
+    report: Dict[str, Any] = field(default_factory=dict)
+    candidates: Optional[Dict[Hashable, StatDelta]] = None
+
+
+def run_analysis_task(snapshot: AccountSnapshot, analyser: str, task: Callable, *args, **kwargs) -> AnalysisOutput:
+    """Run task(snapshot, ctx, *args) with its DPS evaluations attributed to `analyser`."""
+    ctx = snapshot.context()
+    with ctx.analyser(analyser):
+        output = task(snapshot, ctx, *args, **kwargs)
+    if not isinstance(output, AnalysisOutput):
+        output = AnalysisOutput(output)
+    output.report = ctx.report()
+    return output
+
+
+def rerank_analysis_task(snapshot: AccountSnapshot, analyser: str, task: Callable, args: tuple,
+                         previous: AnalysisOutput) -> AnalysisOutput:
+    """Re-run task on `snapshot` with `previous`'s candidates scored up front."""
+    return run_analysis_task(snapshot, analyser, task, *args, candidates=previous.candidates)
+
+
+def _hashable(value: Any) -> Hashable:
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _potentials_key(user_data, slot: str) -> Tuple:
+    return tuple(sorted(user_data.equipment_potentials.get(slot, {}).items()))
+
+
+class CandidateScorer:
+    """
+    aggregate_stats_func / calculate_dps_func for the slot potential
+    analysers, which swap each candidate's lines into `user_data` (a private
+    copy of the account) and score the build.
+
+    Every candidate is keyed by the slot's potentials and recorded in
+    `candidates` as its StatDelta from the snapshot baseline. One scored
+    before is answered without aggregating again: earlier in this run, or
+    - given the `candidates` of a run against another baseline, after an
+    edit elsewhere on the account - rebuilt on this baseline and scored in
+    one LegacyBatchEvaluator call per mode (on the realistic path, or for
+    stats the batch does not cover, with calculate_dps when asked for).
+    """
+
+    def __init__(self, snapshot: AccountSnapshot, ctx: EvaluationContext, user_data, slot: str,
+                 candidates: Optional[Dict[Hashable, StatDelta]] = None):
+        self._snapshot = snapshot
+        self._ctx = ctx
+        self._user_data = user_data
+        self._slot = slot
+        self._baseline = StatVector.from_dict(snapshot.baseline_stats)
+        self.candidates: Dict[Hashable, StatDelta] = {}
+        self._totals: Dict[Hashable, float] = {}
+        self._unscored: Dict[Hashable, StatVector] = {}
+        if candidates:
+            self._score(candidates)
+
+    def _key(self, combat_mode: Optional[str] = None) -> Hashable:
+        return combat_mode or self._user_data.combat_mode, _potentials_key(self._user_data, self._slot)
+
+    def _score(self, candidates: Dict[Hashable, StatDelta]) -> None:
+        by_mode: Dict[str, List[Tuple[Hashable, StatVector]]] = {}
+        for key, delta in candidates.items():
+            try:
+                build = delta.apply(self._baseline)
+            except ValueError:
+                continue  # a source entry it replaced is gone; score it afresh
+            self.candidates[key] = delta
+            by_mode.setdefault(key[0], []).append((key, build))
+
+        if not self._snapshot.use_realistic_dps:
+            for mode, builds in by_mode.items():
+                self._batch_score(mode, builds)
+        for builds in by_mode.values():
+            self._unscored.update((key, build) for key, build in builds if key not in self._totals)
+
+    def _batch_score(self, mode: str, builds: List[Tuple[Hashable, StatVector]]) -> None:
+        # The batch formulas cover the uniform legacy stats; candidates that
+        # also move others (a slot's special potential, attack speed) are
+        # grouped by those values and batched on an anchor build carrying
+        # them. A lone candidate is left to calculate_dps.
+        supported = LegacyBatchEvaluator.supported_keys_for(self._snapshot.job_class)
+        groups: Dict[Hashable, List[Tuple[Hashable, StatVector]]] = {}
+        for key, build in builds:
+            others = sorted(build.changed_keys(self._baseline) - supported)
+            anchor = tuple((stat, _hashable(build.get(stat))) for stat in others)
+            groups.setdefault(anchor, []).append((key, build))
+
+        for anchor, members in groups.items():
+            if anchor and (len(members) < 2 or any(value is None for _, value in anchor)):
+                continue
+            base = members[0][1] if anchor else self._baseline
+            if anchor:
+                base = self._baseline.with_values({stat: base.get(stat) for stat, _ in anchor})
+            batch = LegacyBatchEvaluator(base, mode, self._snapshot.enemy_def, self._snapshot.job_class)
+            totals = batch.evaluate([build for _, build in members])
+            self._totals.update(zip((key for key, _ in members), totals.tolist()))
+
+    def aggregate_stats(self, star_overrides: Optional[Dict[str, int]] = None):
+        key = self._key()
+        if star_overrides is None and (key in self._totals or key in self._unscored):
+            # Seen before: calculate_dps answers from its total, or scores the
+            # rebuilt candidate
+            return self._unscored.get(key)
+        return aggregate_stats(self._user_data, star_overrides)
+
+    def calculate_dps(self, stats, combat_mode: Optional[str] = None) -> Dict[str, float]:
+        key = self._key(combat_mode)
+        total = self._totals.get(key)
+        if total is None:
+            total = self._totals[key] = self._ctx.calculate_dps(stats, combat_mode)['total']
+            if self._unscored.pop(key, None) is not None:
+                return {'total': total}
+            delta = StatDelta.between(stats, self._baseline)
+            if delta is not None:
+                self.candidates[key] = delta
+        return {'total': total}
+
+
+def _slot_potential_analysis(analyse: Callable, snapshot: AccountSnapshot, ctx: EvaluationContext,
+                             slot: str, candidates: Optional[Dict[Hashable, StatDelta]]) -> AnalysisOutput:
+    # The analysers swap candidate potentials into the user data while
+    # testing them, so each gets its own copy and the other tasks keep
+    # aggregating the real build.
+    private = copy.deepcopy(snapshot.user_data)
+    scorer = CandidateScorer(snapshot, ctx, private, slot, candidates)
+    result = analyse(
+        user_data=private,
+        aggregate_stats_func=scorer.aggregate_stats,
+        calculate_dps_func=scorer.calculate_dps,
+        slots=[slot],
+    )
+    return AnalysisOutput(result, candidates=scorer.candidates)
+
+
+def cube_analysis(snapshot: AccountSnapshot, ctx: EvaluationContext, slot: str,
+                  candidates: Optional[Dict[Hashable, StatDelta]] = None) -> AnalysisOutput:
+    """Cube priorities of one slot (regular and bonus potential)."""
+    return _slot_potential_analysis(analyze_all_cube_priorities, snapshot, ctx, slot, candidates)
+
+
+def tier_upgrade_analysis(snapshot: AccountSnapshot, ctx: EvaluationContext, slot: str,
+                          candidates: Optional[Dict[Hashable, StatDelta]] = None) -> AnalysisOutput:
+    """Tier upgrade value of one slot."""
+    return _slot_potential_analysis(analyze_all_tier_upgrades, snapshot, ctx, slot, candidates)
+
+
+def starforce_analysis(snapshot: AccountSnapshot, ctx: EvaluationContext):
+    """(gains, detailed analysis); the gains are shared with the budget plan."""
+    gains = evaluate_starforce_gains(snapshot.user_data, ctx)
+    return gains, analyze_starforce_detailed(snapshot.user_data, snapshot.baseline_dps, gains)
+
+
+def hero_power_analysis(snapshot: AccountSnapshot, ctx: EvaluationContext):
+    """
+    Hero power analysis. Uses analyze_budget (real DPS-based) under the hood
+    and shapes the output to match the heuristic's keys, which it falls back
+    to when the budget analysis can't run.
+    """
+    analysis = _build_hero_power_reroll_analysis(
+        snapshot.user_data, snapshot.baseline_stats, snapshot.baseline_dps, ctx,
+        context=(snapshot.job_class.value, snapshot.key),
+    )
+    if analysis is None:
+        analysis = analyze_hero_power_detailed(snapshot.user_data)
+    return analysis
+
+
+def _weapons(user_data) -> Tuple[Dict, str]:
+    return getattr(user_data, 'weapons_data', {}) or {}, getattr(user_data, 'equipped_weapon_key', '') or ''
+
+
+def weapon_analysis(snapshot: AccountSnapshot, ctx: EvaluationContext):
+    weapons_data, equipped_weapon = _weapons(snapshot.user_data)
+    if weapons_data:
+        return get_weapon_upgrade_for_optimizer(weapons_data, equipped_weapon)
+    return []
+
+
+def summon_analysis(snapshot: AccountSnapshot, ctx: EvaluationContext):
+    """Weapon summon recommendations."""
+    weapons_data, equipped_weapon = _weapons(snapshot.user_data)
+    if weapons_data:
+        # Calculate current total weapon ATK% for diminishing returns
+        current_weapon_atk = calculate_total_weapon_atk_percent(weapons_data, equipped_weapon)
+        return get_summon_recommendations_for_optimizer(
+            weapons_data,
+            equipped_weapon,
+            getattr(snapshot.user_data, 'summoning_level', 15),
+            current_weapon_atk,
+        )
+    return []
+
+
+def companion_ticket_analysis(snapshot: AccountSnapshot, ctx: EvaluationContext):
+    """
+    Companion ticket recommendation: the expected DPS gain per batch of 100
+    tickets from (a) direct pulls (new companion or level-up progress on an
+    in-progress one) and (b) cascading promotion EV from maxed-companion
+    extras.
+    """
+    return _build_companion_ticket_recommendation(
+        snapshot.user_data, snapshot.baseline_stats, snapshot.baseline_dps, ctx,
+    )
+
+
+def artifact_analysis(snapshot: AccountSnapshot, ctx: EvaluationContext):
+    """Artifact awakening / acquisition / resonance recommendations."""
+    data = snapshot.user_data
+    artifacts_inventory = getattr(data, 'artifacts_inventory', {}) or {}
+    artifacts_equipped = getattr(data, 'artifacts_equipped', {}) or {}
+    artifacts_resonance = getattr(data, 'artifacts_resonance', {}) or {}
+
+    # Build owned artifacts dict from inventory
+    owned_artifacts = {}
+    for art_key, art_data in artifacts_inventory.items():
+        if isinstance(art_data, dict):
+            owned_artifacts[art_key] = {
+                'stars': art_data.get('stars', 0),
+                'dupes': art_data.get('dupes', 0),
+                'potentials': art_data.get('potentials', []),
+            }
+
+    # Get equipped artifact keys by looking up names
+    artifact_key_by_name = {defn.name: key for key, defn in ARTIFACTS.items()}
+    equipped_artifact_keys = []
+    for i in range(4):
+        slot_data = artifacts_equipped.get(f'slot{i}', {})
+        if isinstance(slot_data, dict):
+            name = slot_data.get('name', '')
+            if name and name != '(Empty)':
+                key = artifact_key_by_name.get(name)
+                if key:
+                    equipped_artifact_keys.append(key)
+
+    current_resonance = artifacts_resonance.get('resonance_level', 1)
+    # Calculate max resonance from total artifact stars
+    total_stars = sum(a.get('stars', 0) for a in owned_artifacts.values())
+    max_resonance = calculate_resonance_max_level(total_stars)
+
+    if not owned_artifacts:
+        return []
+
+    return get_artifact_recommendations_for_optimizer(
+        owned_artifacts=owned_artifacts,
+        equipped_artifact_keys=equipped_artifact_keys,
+        current_resonance_level=current_resonance,
+        resonance_max_level=max_resonance,
+        current_stats=snapshot.baseline_stats,
+        calculate_dps_func=ctx.calculate_dps,
+        scenario=snapshot.combat_mode,
+    )
+
+
+# (task name, analyser name for evaluation counts, task, extra args), in
+# display order. Per-slot tasks let a one-slot edit re-run only that slot.
+ANALYSIS_TASKS: List[Tuple[str, str, Callable, tuple]] = [
+    *((f"Cubes:{slot}", "Cubes", cube_analysis, (slot,)) for slot in EQUIPMENT_SLOTS),
+    *((f"Tier Upgrades:{slot}", "Tier Upgrades", tier_upgrade_analysis, (slot,)) for slot in EQUIPMENT_SLOTS),
+    ("Starforce", "Starforce", starforce_analysis, ()),
+    ("Hero Power", "Hero Power", hero_power_analysis, ()),
+    ("Weapons", "Weapons", weapon_analysis, ()),
+    ("Summons", "Summons", summon_analysis, ()),
+    ("Companion Tickets", "Companion Tickets", companion_ticket_analysis, ()),
+    ("Artifacts", "Artifacts", artifact_analysis, ()),
+]
+
+# Analysers whose output carries its scored candidates (see CandidateScorer)
+RERANKED_ANALYSERS = frozenset({"Cubes", "Tier Upgrades"})
+
+
+def analysis_task(snapshot: AccountSnapshot, name: str) -> Callable[[], AnalysisOutput]:
+    """The picklable zero-argument task for ANALYSIS_TASKS entry `name`."""
+    for task_name, analyser, task, args in ANALYSIS_TASKS:
+        if task_name == name:
+            return functools.partial(run_analysis_task, snapshot, analyser, task, *args)
+    raise KeyError(name)
+
+
+def analysis_rerank(snapshot: AccountSnapshot, name: str) -> Optional[Callable[[AnalysisOutput], AnalysisOutput]]:
+    """
+    Picklable task re-scoring a previous AnalysisOutput of `name` on this
+    snapshot's baseline (AnalysisUnit.rerank), or None when the analyser
+    keeps no candidates and must simply re-run.
+    """
+    for task_name, analyser, task, args in ANALYSIS_TASKS:
+        if task_name == name:
+            if analyser not in RERANKED_ANALYSERS:
+                return None
+            return functools.partial(rerank_analysis_task, snapshot, analyser, task, args)
+    raise KeyError(name)
+
+
+def analysis_tasks(snapshot: AccountSnapshot) -> List[Tuple[str, Callable[[], AnalysisOutput]]]:
+    """(name, task) for every analyser, ready for run_analyses."""
+    return [(name, analysis_task(snapshot, name)) for name, _, _, _ in ANALYSIS_TASKS]
+
+
+# =============================================================================
+# STARFORCE
+# =============================================================================
+
+def analyze_starforce_detailed(user_data, baseline_dps: float, dps_gains: Dict[str, Dict[int, float]]) -> List[Dict]:
+    """
+    Analyze starforce upgrades for each equipment slot.
+
+    Evaluates EACH star level (not just milestones) to find the most efficient
+    next upgrade. This properly accounts for diminishing returns where going
+    17→18 is much cheaper than 19→20 for similar DPS gain.
+
+    Uses:
+    - Markov chain analysis from starforce_optimizer for accurate cost estimates
+    - Actual DPS calculations to determine real gain from stat amplification,
+      evaluated for all slots and stars in one batch
+
+    Args:
+        user_data: The account (equipment_items supplies each slot's stars)
+        baseline_dps: The current total DPS (calculated once and passed in)
+        dps_gains: evaluate_starforce_gains() result
+    """
+    results = []
+
+    for slot in EQUIPMENT_SLOTS:
+        item = user_data.equipment_items.get(slot, {})
+        current_stars = int(item.get('stars', 0))
+
+        if slot not in dps_gains:
+            continue
+
+        # Evaluate EACH possible target star (not just milestones)
+        # This finds the most efficient next step
+        best_upgrade = None
+        best_efficiency = -1
+
+        # Consider each star from current+1 to 25
+        for target_stars in range(current_stars + 1, 26):
+            if target_stars <= current_stars:
+                continue
+
+            # Use Markov chain analysis for accurate cost estimate
+            # This calculates the full path cost (e.g., 19→22 includes 19→20→21→22)
+            stage_strategies, markov_result = find_optimal_per_stage_strategy(current_stars, target_stars)
+
+            # Total cost in diamonds from Markov analysis
+            total_cost = markov_result.total_cost
+            destroy_prob = markov_result.destroy_probability
+
+            # REAL DPS gain from the batched baseline-vs-upgraded evaluation
+            dps_gain = dps_gains[slot][target_stars]
+            upgraded_dps = baseline_dps * (1 + dps_gain / 100)
+
+            # Calculate efficiency: DPS% gain per 1000 diamonds (same formula as cube efficiency)
+            # efficiency = dps_gain / (total_cost / 1000) = dps_gain * 1000 / total_cost
+            efficiency = dps_gain / (total_cost / 1000) if total_cost > 0 else 0
+
+            # Track best option based on efficiency
+            if efficiency > best_efficiency:
+                best_efficiency = efficiency
+
+                # Get amplify multipliers for display
+                current_amp = get_amplify_multiplier(current_stars, is_sub=True)
+                target_amp = get_amplify_multiplier(target_stars, is_sub=True)
+
+                # Risk level based on destruction probability
+                if destroy_prob <= 0:
+                    risk = "Safe"
+                    risk_color = "🟢"
+                elif destroy_prob < 0.05:
+                    risk = f"Low ({destroy_prob*100:.0f}%)"
+                    risk_color = "🟡"
+                elif destroy_prob < 0.15:
+                    risk = f"Medium ({destroy_prob*100:.0f}%)"
+                    risk_color = "🟠"
+                elif destroy_prob < 0.30:
+                    risk = f"High ({destroy_prob*100:.0f}%)"
+                    risk_color = "🔴"
+                else:
+                    risk = f"Very High ({destroy_prob*100:.0f}%)"
+                    risk_color = "🔴"
+
+                # Get the actual sub-stats being amplified for display
+                sub_stats_detail = []
+                if item.get('sub_boss_damage', 0) > 0:
+                    sub_stats_detail.append(f"Boss {item['sub_boss_damage']:.1f}%")
+                if item.get('sub_crit_damage', 0) > 0:
+                    sub_stats_detail.append(f"CD {item['sub_crit_damage']:.1f}%")
+                if item.get('sub_crit_rate', 0) > 0:
+                    sub_stats_detail.append(f"CR {item['sub_crit_rate']:.1f}%")
+                if item.get('sub_attack_flat', 0) > 0:
+                    sub_stats_detail.append(f"ATK {item['sub_attack_flat']:.0f}")
+                if item.get('is_special', False) and item.get('special_stat_value', 0) > 0:
+                    special_type = item.get('special_stat_type', 'damage_pct')
+                    special_name = {'damage_pct': 'Dmg%', 'final_damage': 'FD%', 'all_skills': 'AllSkill', 'skill_damage': 'SkDmg%', 'basic_attack_dmg': 'BA%'}.get(special_type, special_type)
+                    sub_stats_detail.append(f"{special_name} {item['special_stat_value']:.1f}")
+
+                # Get optimal strategy for display (uses the first stage's strategy)
+                optimal_strat = stage_strategies.get(current_stars, 'none')
+
+                best_upgrade = {
+                    'slot': slot,
+                    'current_stars': current_stars,
+                    'target_stars': target_stars,
+                    'total_cost': total_cost,
+                    'destroy_prob': destroy_prob,
+                    'optimal_strategy': optimal_strat,
+                    'stage_strategies': stage_strategies,
+                    'dps_gain': dps_gain,
+                    'efficiency': efficiency,
+                    'risk': risk,
+                    'risk_color': risk_color,
+                    'amp_before': current_amp,
+                    'amp_after': target_amp,
+                    'baseline_dps': baseline_dps,
+                    'upgraded_dps': upgraded_dps,
+                    'sub_stats_detail': sub_stats_detail,
+                }
+
+        # Only add the best upgrade for this slot
+        if best_upgrade:
+            # Attempts and spend spread for the chosen step only
+            distribution = calculate_cost_distribution(
+                current_stars, best_upgrade['target_stars'],
+                best_upgrade['stage_strategies'], resolution=200,
+            )
+            best_upgrade['expected_attempts'] = distribution.expected_attempts
+            best_upgrade['cost_p50'] = distribution.cost_percentile(50)
+            best_upgrade['cost_p90'] = distribution.cost_percentile(90)
+            results.append(best_upgrade)
+
+    results.sort(key=lambda x: x['efficiency'], reverse=True)
+    return results
+
+
+def starforce_stars(user_data) -> Dict[str, int]:
+    """Current stars of every equipment slot."""
+    return {
+        slot: int(user_data.equipment_items.get(slot, {}).get('stars', 0))
+        for slot in EQUIPMENT_SLOTS
+    }
+
+
+def evaluate_starforce_gains(user_data, ctx: EvaluationContext) -> Dict[str, Dict[int, float]]:
+    """
+    DPS gain % of every slot at every higher star level, via
+    aggregate_stats(star_overrides=...). Scored through the context's fast
+    DPS evaluator when the realistic path is active, otherwise with the
+    same mode-aware gain as the other analyses.
+    """
+    evaluator = ctx.fast_evaluator
+    if evaluator is not None:
+        anchor = evaluator.baseline_realistic_dps
+
+        def dps_gain(stats):
+            return (evaluator.evaluate(stats) / anchor - 1) * 100 if anchor > 0 else 0
+    else:
+        dps_gain = ctx.gain_pct
+
+    return evaluate_starforce_dps_gains(
+        starforce_stars(user_data),
+        lambda overrides: aggregate_stats(user_data, star_overrides=overrides),
+        dps_gain,
+        min_stars=10,
+    )
+
+
+# =============================================================================
+# HERO POWER
+# =============================================================================
+
+def analyze_hero_power_detailed(user_data) -> Dict:
+    """Analyze hero power lines with detailed recommendations."""
+    lines = user_data.hero_power_lines
+    preset = user_data.active_hero_power_preset or "1"
+
+    good_stats = {'damage', 'boss_damage', 'crit_damage', 'def_pen'}
+    great_tiers = {'Mystic', 'Legendary'}
+
+    line_analysis = []
+    total_dps = 0
+    lines_to_lock = []
+    lines_to_reroll = []
+
+    for i in range(1, 7):
+        line = lines.get(f'line{i}', {})
+        stat = line.get('stat', '')
+        value = float(line.get('value', 0))
+        tier = line.get('tier', 'Common')
+        locked = line.get('locked', False)
+
+        # Calculate DPS contribution
+        weight = STAT_DPS_WEIGHTS.get(stat, 0.2)
+        dps = value * weight * 0.5  # Hero power weight
+
+        # Tier multiplier
+        tier_mult = {'Mystic': 1.5, 'Legendary': 1.2, 'Unique': 1.0, 'Epic': 0.8, 'Rare': 0.6, 'Common': 0.4}.get(tier, 0.5)
+
+        # Calculate score (0-100)
+        is_good_stat = stat in good_stats
+        is_great_tier = tier in great_tiers
+
+        if is_good_stat and is_great_tier:
+            score = 80 + (value * 0.5)
+            recommendation = "LOCK"
+            indicator = "🟢"
+            lines_to_lock.append(i)
+        elif is_good_stat:
+            score = 50 + (value * 0.5)
+            recommendation = "LOCK"
+            indicator = "🟡"
+            lines_to_lock.append(i)
+        elif is_great_tier:
+            score = 40 + (value * 0.3)
+            recommendation = "CONSIDER"
+            indicator = "🟡"
+        else:
+            score = 10 + (value * 0.2)
+            recommendation = "REROLL"
+            indicator = "🔴"
+            lines_to_reroll.append(i)
+
+        total_dps += dps
+
+        stat_display = format_stat_display(stat) if stat else "(empty)"
+        line_analysis.append({
+            'line': i,
+            'stat': stat,
+            'stat_display': stat_display,
+            'value': value,
+            'tier': tier,
+            'dps': dps,
+            'score': min(100, score),
+            'recommendation': recommendation,
+            'indicator': indicator,
+            'locked': locked,
+        })
+
+    # Calculate reroll cost
+    num_locks = len(lines_to_lock)
+    hp_level = user_data.hero_power_level or {}
+    base_cost = hp_level.get('base_cost', 89)
+    cost_per_reroll = base_cost + (num_locks * 43)
+
+    # Expected improvement
+    avg_weak_score = sum(l['score'] for l in line_analysis if l['recommendation'] == 'REROLL') / max(1, len(lines_to_reroll))
+    expected_gain = (50 - avg_weak_score) * 0.02 * len(lines_to_reroll)  # Rough estimate
+
+    # Estimated rerolls
+    if lines_to_reroll:
+        estimated_rerolls = 50 + (avg_weak_score * 2)  # More rerolls if already decent
+    else:
+        estimated_rerolls = 0
+
+    total_medal_cost = estimated_rerolls * cost_per_reroll
+    diamond_equivalent = total_medal_cost * MEDAL_TO_DIAMOND
+
+    return {
+        'preset': preset,
+        'lines': line_analysis,
+        'total_dps': total_dps,
+        'lines_to_lock': lines_to_lock,
+        'lines_to_reroll': lines_to_reroll,
+        'num_locks': num_locks,
+        'cost_per_reroll': cost_per_reroll,
+        'estimated_rerolls': estimated_rerolls,
+        'total_medal_cost': total_medal_cost,
+        'diamond_equivalent': diamond_equivalent,
+        'expected_gain': expected_gain,
+    }
+
+
+# Default budget for hero power reroll analysis — small enough to compete
+# with cubes/starforce/companion tickets on absolute cost (5000 diamonds at
+# 10 diamonds/medal), big enough that the lock cascade has room to converge.
+_HERO_POWER_REROLL_BUDGET_MEDALS = 500
+
+
+def _build_hp_config_from_data(data) -> HeroPowerConfig:
+    """Translate `data.hero_power_lines` into a HeroPowerConfig the same way
+    the Hero Power page does."""
+    lines = []
+    raw = data.hero_power_lines or {}
+    for i in range(1, 7):
+        line_data = raw.get(f'line{i}', {})
+        stat_str = line_data.get('stat', '') or ''
+        tier_str = (line_data.get('tier', 'common') or 'common').lower()
+        value = float(line_data.get('value', 0) or 0)
+        locked = bool(line_data.get('locked', False))
+        try:
+            stat_type = HeroPowerStatType(stat_str) if stat_str else HeroPowerStatType.DAMAGE
+        except ValueError:
+            stat_type = HeroPowerStatType.DAMAGE
+        try:
+            tier = HeroPowerTier(tier_str)
+        except ValueError:
+            tier = HeroPowerTier.COMMON
+        lines.append(HeroPowerLine(
+            slot=i, stat_type=stat_type, value=value, tier=tier, is_locked=locked,
+        ))
+    return HeroPowerConfig(lines=lines)
+
+
+def _build_hp_level_config_from_data(data) -> HeroPowerLevelConfig:
+    """Translate `data.hero_power_level` into a HeroPowerLevelConfig."""
+    lc = data.hero_power_level or {}
+    return HeroPowerLevelConfig(
+        level=lc.get('level', 15),
+        mystic_rate=lc.get('mystic_rate', 0.14),
+        legendary_rate=lc.get('legendary_rate', 1.63),
+        unique_rate=lc.get('unique_rate', 3.3),
+        epic_rate=lc.get('epic_rate', 37.93),
+        rare_rate=lc.get('rare_rate', 32.0),
+        common_rate=lc.get('common_rate', 25.0),
+        base_cost=lc.get('base_cost', 89),
+    )
+
+
+def _build_hero_power_reroll_analysis(data, current_stats, current_dps, ctx: EvaluationContext,
+                                      context: Optional[Tuple] = None):
+    """
+    Real DPS-based hero power reroll analysis. Wraps `analyze_budget` from
+    game/hero_power.py and shapes the result into the same dict keys the
+    optimizer's all_upgrades block already reads (`expected_gain`,
+    `diamond_equivalent`, `num_locks`, `lines_to_reroll`, `total_medal_cost`,
+    `estimated_rerolls`).
+
+    `context` describes what ctx.score reads besides the stats, so the line
+    value knots are cached across runs (see get_line_value_table).
+
+    Returns None when the hero power state is too incomplete to analyze
+    (no lines / no level config) — caller falls back to the heuristic.
+    """
+    if not data.hero_power_lines:
+        return None
+    if current_dps <= 0:
+        return None
+
+    config = _build_hp_config_from_data(data)
+    level_config = _build_hp_level_config_from_data(data)
+
+    # analyze_budget needs (calc_dps_func, get_stats_func) callables with
+    # specific signatures. Wire them to the run's shared evaluation context.
+    result = analyze_hero_power_budget(
+        config=config,
+        level_config=level_config,
+        budget_medals=float(_HERO_POWER_REROLL_BUDGET_MEDALS),
+        calc_dps_func=ctx.score,
+        get_stats_func=ctx.get_stat_vector,
+        context=context,
+    )
+    if 'error' in result:
+        return None
+
+    medals_spent = float(result.get('expected_medals_spent', 0))
+    if medals_spent <= 0 or result.get('expected_gain_pct', 0) <= 0:
+        # Nothing worth recommending (all slots already pass thresholds).
+        return None
+
+    # Slots NOT in recommended_locks are slots the budget analysis says to
+    # reroll. User-locked slots are forced-locked inside analyze_budget so
+    # they show up in recommended_locks too.
+    recommended_locks = result.get('recommended_locks', [])
+    lines_to_reroll = [slot for slot in range(1, 7) if slot not in recommended_locks]
+    num_locks = len(recommended_locks)
+    return {
+        'preset': data.active_hero_power_preset or "1",
+        'lines': result.get('line_analysis', []),
+        'lines_to_lock': recommended_locks,
+        'lines_to_reroll': lines_to_reroll,
+        'num_locks': num_locks,
+        'cost_per_reroll': result.get('cost_per_reroll', 0),
+        'estimated_rerolls': result.get('expected_rerolls', 0),
+        'total_medal_cost': medals_spent,
+        'diamond_equivalent': medals_spent * MEDAL_TO_DIAMOND,
+        'expected_gain': result.get('expected_gain_pct', 0),
+        # Real-DPS-based: cascade detail useful for the rendering blocks.
+        'cascade': result.get('cascade', []),
+        'current_total_dps_pct': result.get('current_total_dps_pct', 0),
+        'expected_total_dps_pct': result.get('expected_total_dps_pct', 0),
+    }
+
+
+# =============================================================================
+# COMPANION TICKETS
+# =============================================================================
+
+def _build_companion_ticket_recommendation(data, baseline_stats, baseline_dps, ctx: EvaluationContext):
+    """
+    Construct the optimizer's "Companion Tickets (×100)" recommendation.
+
+    Forces the legacy (closed-form) DPS path for per-candidate evaluations
+    even when the user has realistic DPS enabled. Companion level changes
+    only touch inventory stats (attack_flat / damage_pct / main_stat_flat
+    / etc.) — none of those are sequence-affecting, so the legacy path
+    preserves the relative ranking between candidates. Using realistic
+    per-candidate would multiply runtime by ~30× (the sim is much slower).
+
+    Every candidate companion state is scored by
+    evaluate_companion_level_changes: stage mode is phase-weighted (mob ×
+    0.6 + boss × 0.4), and the candidates that only move uniform stats go
+    through one NumPy batch call per phase. Results are cached per account
+    fingerprint across reruns. Returns None only when baseline DPS is zero.
+    """
+    if baseline_dps <= 0:
+        return None
+
+    enemy_def = ENEMY_DEFENSE_VALUES.get(getattr(data, 'chapter', 'Chapter 27'), 0.752)
+    mode = data.combat_mode
+    current_levels = {k: int(v) for k, v in (data.companion_levels or {}).items() if v > 0}
+
+    def _marginal_dps_batch(state_deltas):
+        # Absolute DPS gain over the legacy baseline. The recommendation
+        # scales it against the user-facing baseline_dps (which may be
+        # realistic and a different number) so percentages match.
+        changes = [next(iter(delta.items())) for delta in state_deltas]
+        legacy_baseline, dps = evaluate_companion_level_changes(
+            data, baseline_stats, mode, enemy_def, changes,
+            calculate_dps_fn=ctx.counted(calculate_dps),
+        )
+        return (dps - legacy_baseline).tolist()
+
+    user_state = {
+        'owned': current_levels,
+        'equipped': list(data.equipped_companions or []),
+    }
+    return get_companion_ticket_recommendation_for_optimizer(
+        user_state=user_state,
+        marginal_dps_fn=None,
+        baseline_dps=baseline_dps,
+        batch_size=100,
+        marginal_dps_batch_fn=_marginal_dps_batch,
+        cache_key=(mode, enemy_def, data.job_class, _stats_fingerprint(baseline_stats)),
+    )
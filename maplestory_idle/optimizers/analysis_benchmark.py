@@ -0,0 +1,107 @@
+"""
+Benchmark of the account analysers behind the Upgrade Optimizer.
+
+Times every analyser of optimizers.account_analysis run one after another,
+then the whole set on a thread pool and on process pools of each worker
+count. The analysers are pure Python and hold the GIL, so threads stay
+near the serial time while processes approach the slowest analyser (or
+serial / workers, whichever is larger) up to the number of cores.
+
+    python -m optimizers.analysis_benchmark
+    python -m optimizers.analysis_benchmark --username alice --workers 2 4 8
+"""
+import argparse
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+from optimizers.account_analysis import AccountSnapshot, analysis_tasks, build_snapshot
+from optimizers.upgrade_optimizer import create_analysis_pool, run_analyses
+
+DEFAULT_ACCOUNT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'streamlit_app', 'data', 'default_character.csv')
+
+
+def _default_worker_counts() -> List[int]:
+    cores = os.cpu_count() or 1
+    counts, workers = [], 2
+    while workers < cores:
+        counts.append(workers)
+        workers *= 2
+    return counts + [max(cores, 2)]
+
+
+def _timed_run(tasks, **kwargs) -> float:
+    start = time.perf_counter()
+    for event in run_analyses(tasks, **kwargs):
+        if event.error is not None:
+            raise event.error
+    return time.perf_counter() - start
+
+
+def run_benchmark(snapshot: AccountSnapshot, worker_counts: Sequence[int],
+                  names: Optional[Sequence[str]] = None) -> Dict[str, Dict]:
+    """
+    {'analysers': {name: s}, 'serial': {1: s}, 'threads': {workers: s},
+    'processes': {workers: s}} — wall-clock seconds for one run of the
+    analysers in `names` (default all).
+    """
+    tasks = [(name, task) for name, task in analysis_tasks(snapshot) if names is None or name in names]
+    analysers = {}
+    for name, task in tasks:  # also warms this process's caches for the thread runs
+        start = time.perf_counter()
+        task()
+        analysers[name] = time.perf_counter() - start
+
+    results = {
+        'analysers': analysers,
+        'serial': {1: sum(analysers.values())},
+        'threads': {},
+        'processes': {},
+    }
+    for workers in worker_counts:
+        results['threads'][workers] = _timed_run(tasks, max_workers=workers)
+        pool = create_analysis_pool(workers)
+        try:
+            _timed_run(tasks, executor=pool)  # start the workers and warm their caches
+            results['processes'][workers] = _timed_run(tasks, executor=pool)
+        finally:
+            pool.shutdown()
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Time the upgrade analysers serially, on threads and on processes.")
+    parser.add_argument('--workers', type=int, nargs='+', default=_default_worker_counts())
+    parser.add_argument('--username', help="Saved account to use (default: the demo character)")
+    parser.add_argument('--combat-mode', choices=['stage', 'boss', 'world_boss', 'chapter_hunt'])
+    parser.add_argument('--realistic', action='store_true', help="Use the realistic DPS simulation")
+    parser.add_argument('--analysers', nargs='+', help="Analysers to run, e.g. Starforce 'Cubes:hat' (default: all)")
+    args = parser.parse_args(argv)
+
+    from streamlit_app.utils.data_manager import import_user_data_csv, load_user_data
+    if args.username:
+        user_data = load_user_data(args.username)
+    else:
+        with open(DEFAULT_ACCOUNT, encoding='utf-8') as f:
+            user_data = import_user_data_csv(f.read(), 'benchmark')
+    if args.combat_mode:
+        user_data.combat_mode = args.combat_mode
+    if args.realistic:
+        user_data.use_realistic_dps = True
+
+    results = run_benchmark(build_snapshot(user_data), args.workers, args.analysers)
+    analysers = results['analysers']
+    slowest = max(analysers, key=analysers.get)
+    serial = results['serial'][1]
+    print(f"{len(analysers)} analysers ({user_data.combat_mode}), {os.cpu_count()} cores: "
+          f"serial {serial:.2f}s, slowest {slowest} {analysers[slowest]:.2f}s")
+    print(f"{'mode':>10} {'workers':>8} {'seconds':>8} {'speedup':>8}")
+    print(f"{'serial':>10} {1:>8} {serial:>8.2f} {1:>7.2f}x")
+    for mode in ('threads', 'processes'):
+        for workers, seconds in results[mode].items():
+            print(f"{mode:>10} {workers:>8} {seconds:>8.2f} {serial / seconds:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -52,7 +52,7 @@ from game.artifacts import (
     calculate_bottle_of_emotions_fd,
 )
 
-from streamlit_app.utils.dps_calculator import (
+from engine.dps_calculator import (
     compute_phase_dps,
     stage_weighted_gain_pct,
     compute_stage_weighted_gain_pct,
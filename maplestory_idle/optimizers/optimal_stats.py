@@ -5,7 +5,11 @@
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Tuple, Callable, Any
 from enum import Enum
+import bisect
 import copy
+import math
+
+from core.stat_vector import StatVector
 
 # Module-level map to avoid rebuilding on every call
 _STAT_KEY_MAP: Dict[str, str] = {
@@ -47,6 +51,19 @@ def _apply_stat_to_dict(stats: Dict[str, float], stat_type: str, amount: float)
         stats[stats_key] = stats.get(stats_key, 0) + amount
 
 
+def _with_stat(stats: StatVector, stat_type: str, amount: float) -> StatVector:
+    """_apply_stat_to_dict for a StatVector: a copy with `amount` of `stat_type` applied."""
+    stats_key = _STAT_KEY_MAP.get(stat_type, stat_type)
+    category = STAT_CATEGORIES.get(stat_type, StatCategory.ADDITIVE_OTHER)
+    if category == StatCategory.MULTIPLICATIVE_DEF:
+        current_remaining = 1 - (stats.get(stats_key, 0) / 100)
+        return stats.with_values({stats_key: (1 - current_remaining * (1 - amount / 100)) * 100})
+    if category == StatCategory.MULTIPLICATIVE_FD:
+        current_mult = 1 + stats.get(stats_key, 0) / 100
+        return stats.with_values({stats_key: (current_mult * (1 + amount / 100) - 1) * 100})
+    return stats.with_delta(stats_key, amount)
+
+
 # =============================================================================
 # STAT CATEGORIES (How stats combine in DPS formula)
 # =============================================================================
@@ -307,7 +324,7 @@ def calculate_marginal_dps_value(
 
     Pass `baseline_dps` to skip recomputing it when the caller already has it.
 
-    If `fast_evaluator` is provided (a `utils.dps_calculator.FastDPSEvaluator`),
+    If `fast_evaluator` is provided (an `engine.dps_calculator.FastDPSEvaluator`),
     the candidate's DPS is computed via the fast path when `stat_type` is not
     sequence-affecting — skipping the realistic-DPS simulator entirely.
     Otherwise behaves identically to the no-evaluator case.
@@ -316,8 +333,7 @@ def calculate_marginal_dps_value(
         baseline_dps = calc_dps_func(current_stats)
     if baseline_dps <= 0:
         return 0
-    modified_stats = copy.deepcopy(current_stats)
-    _apply_stat_to_dict(modified_stats, stat_type, amount)
+    modified_stats = _with_stat(StatVector.from_dict(current_stats), stat_type, amount)
     if fast_evaluator is not None:
         new_dps = fast_evaluator.evaluate(modified_stats, changed_stat=stat_type)
     else:
@@ -500,6 +516,571 @@ def calculate_source_ranking(
     return results
 
 
+# =============================================================================
+# LOCAL DPS MODEL
+# =============================================================================
+# The distribution solver scores candidate builds against a multiplicative
+# model fitted around an anchor build rather than calling calc_dps_func per
+# candidate:
+#
+#     log(DPS / DPS_anchor) ~= sum_f curve_f(amount_f) + sum(line gains)
+#
+# Additive stats feed a per-factor curve sampled at the anchor (Damage, Boss
+# and Normal Damage share one factor, weighted by their sampled gradients).
+# Final Damage and Def Pen lines each multiply DPS by their own sampled gain.
+# Curves are concave hulls of the samples, so caps (crit rate, attack speed)
+# show up as flat tails instead of over-allocating.
+
+_DAMAGE_FACTOR = 'damage'
+
+# Curve samples sit at the anchor +/- this many of the factor's largest line
+_CURVE_SAMPLE_LINES = (1, 4, 16)
+
+
+def _is_multiplicative(stat_type: str) -> bool:
+    """True for stats where each line multiplies DPS on its own (FD, Def Pen)."""
+    return STAT_CATEGORIES.get(stat_type) in (
+        StatCategory.MULTIPLICATIVE_FD, StatCategory.MULTIPLICATIVE_DEF,
+    )
+
+
+def _stat_factor(stat_type: str) -> str:
+    """DPS-formula factor an additive stat feeds into."""
+    if STAT_CATEGORIES.get(stat_type) == StatCategory.ADDITIVE_DAMAGE:
+        return _DAMAGE_FACTOR
+    return _STAT_KEY_MAP.get(stat_type, stat_type)
+
+
+class _ConcaveCurve:
+    """Upper concave hull of sampled (amount, log gain) points, linear in between."""
+
+    def __init__(self, points: List[Tuple[float, float]]):
+        hull: List[Tuple[float, float]] = []
+        for x, y in sorted(points):
+            while len(hull) >= 2:
+                (x1, y1), (x2, y2) = hull[-2], hull[-1]
+                if (y2 - y1) * (x - x1) <= (y - y1) * (x2 - x1):
+                    hull.pop()
+                else:
+                    break
+            hull.append((x, y))
+        self.xs = [x for x, _ in hull]
+        self.ys = [y for _, y in hull]
+        self.slopes = [
+            (self.ys[i + 1] - self.ys[i]) / (self.xs[i + 1] - self.xs[i])
+            for i in range(len(hull) - 1)
+        ] or [0.0]
+
+    def _segment(self, x: float) -> int:
+        i = bisect.bisect_right(self.xs, x) - 1
+        if i < 0:
+            return 0
+        return i if i < len(self.slopes) else len(self.slopes) - 1
+
+    def __call__(self, x: float) -> float:
+        i = self._segment(x)
+        return self.ys[i] + self.slopes[i] * (x - self.xs[i])
+
+    def slope(self, x: float) -> float:
+        """A supergradient at `x` (the slope of the segment containing it)."""
+        return self.slopes[self._segment(x)]
+
+    @property
+    def is_flat(self) -> bool:
+        return max(self.ys) - min(self.ys) < 1e-12
+
+
+@dataclass
+class LocalDPSModel:
+    """Multiplicative DPS model fitted around an anchor build."""
+    anchor_dps: float
+    curves: Dict[str, _ConcaveCurve]             # factor -> curve over factor amount
+    weights: Dict[str, Tuple[str, float]]        # additive stat -> (factor, amount per point)
+    line_gains: Dict[Tuple[str, float], float]   # (multiplicative stat, value) -> log gain
+    evaluations: int = 0
+
+    def line_effect(self, stat_type: str, value: float) -> Tuple[Optional[str], float, float]:
+        """(factor, factor amount, log gain) of one line; factor is None for FD/Def Pen or inert stats."""
+        if _is_multiplicative(stat_type):
+            return None, 0.0, self.line_gains.get((stat_type, value), 0.0)
+        factor, weight = self.weights.get(stat_type, (None, 0.0))
+        if factor not in self.curves:
+            return None, 0.0, 0.0
+        return factor, weight * value, 0.0
+
+
+def _build_line_classes(
+    sources: List[StatSource], tier: str,
+) -> List[Tuple[List[StatSource], List[Tuple[str, float]]]]:
+    """Group sources that offer identical (stat, value) options at `tier`."""
+    classes: Dict[Tuple, List[StatSource]] = {}
+    for source in sources:
+        options = tuple(
+            (stat, source.get_max_value(stat, tier))
+            for stat in source.available_stats
+            if source.get_max_value(stat, tier) > 0
+        )
+        if options:
+            classes.setdefault(options, []).append(source)
+    return [(members, list(options)) for options, members in classes.items()]
+
+
+def fit_local_dps_model(
+    base_stats: Dict[str, float],
+    anchor_lines: List[Tuple[str, float]],
+    line_classes: List[Tuple[List[StatSource], List[Tuple[str, float]]]],
+    calc_dps_func: Callable,
+) -> Optional[LocalDPSModel]:
+    """
+    Fit a LocalDPSModel around `base_stats` plus `anchor_lines`.
+
+    Costs one DPS call for the anchor, one per curve sample and one per
+    distinct FD/Def Pen line. Returns None when the anchor has no DPS.
+    """
+    stats = StatVector.from_dict(base_stats)
+    for stat, value in anchor_lines:
+        stats = _with_stat(stats, stat, value)
+    anchor_dps = calc_dps_func(stats)
+    if anchor_dps <= 0:
+        return None
+    evaluations = 1
+
+    def log_gain(key: str, delta: float) -> float:
+        nonlocal evaluations
+        modified = stats.with_delta(key, delta)
+        evaluations += 1
+        return math.log(max(calc_dps_func(modified) / anchor_dps, 1e-12))
+
+    # Largest single line per stat key, grouped by factor
+    steps: Dict[str, Dict[str, float]] = {}
+    multiplicative = set()
+    for _, options in line_classes:
+        for stat, value in options:
+            if _is_multiplicative(stat):
+                multiplicative.add((stat, value))
+            else:
+                key = _STAT_KEY_MAP.get(stat, stat)
+                factor_steps = steps.setdefault(_stat_factor(stat), {})
+                factor_steps[key] = max(factor_steps.get(key, 0), value)
+
+    curves: Dict[str, _ConcaveCurve] = {}
+    key_weights: Dict[str, float] = {}
+    for factor, key_steps in steps.items():
+        # Shared factors weight each key by its gradient relative to the
+        # steepest one, and sample the curve along that key
+        known: Dict[float, float] = {}   # samples already taken, relative to the anchor
+        if len(key_steps) > 1:
+            gains = {key: log_gain(key, step) for key, step in key_steps.items()}
+            rep = max(gains, key=lambda k: gains[k] / key_steps[k])
+            if gains[rep] <= 0:
+                continue
+            rep_gradient = gains[rep] / key_steps[rep]
+            weights = {k: max(g / key_steps[k], 0) / rep_gradient for k, g in gains.items()}
+            known[key_steps[rep]] = gains[rep]
+        else:
+            rep = next(iter(key_steps))
+            weights = {rep: 1.0}
+
+        anchor_amount = sum(
+            weights.get(_STAT_KEY_MAP.get(stat, stat), 0) * value
+            for stat, value in anchor_lines
+            if not _is_multiplicative(stat) and _stat_factor(stat) == factor
+        )
+        reach = sum(
+            len(members) * max(
+                (weights.get(_STAT_KEY_MAP.get(stat, stat), 0) * value
+                 for stat, value in options
+                 if not _is_multiplicative(stat) and _stat_factor(stat) == factor),
+                default=0,
+            )
+            for members, options in line_classes
+        )
+        step = max(weights[k] * s for k, s in key_steps.items())
+        points = {
+            anchor_amount + delta: y for delta, y in known.items() if anchor_amount + delta <= reach
+        }
+        points[anchor_amount] = 0.0
+        targets = {0.0, reach}
+        for n in _CURVE_SAMPLE_LINES:
+            targets.update((anchor_amount - n * step, anchor_amount + n * step))
+        for x in sorted(targets):
+            if 0 <= x <= reach and x not in points:
+                points[x] = log_gain(rep, x - anchor_amount)
+        curve = _ConcaveCurve(list(points.items()))
+        if not curve.is_flat:
+            curves[factor] = curve
+            key_weights.update({k: w for k, w in weights.items() if w > 0})
+
+    line_gains = {}
+    for stat, value in multiplicative:
+        modified = _with_stat(stats, stat, value)
+        evaluations += 1
+        line_gains[(stat, value)] = math.log(max(calc_dps_func(modified) / anchor_dps, 1e-12))
+
+    weights_by_stat = {}
+    for _, options in line_classes:
+        for stat, _ in options:
+            factor = _stat_factor(stat)
+            key = _STAT_KEY_MAP.get(stat, stat)
+            if not _is_multiplicative(stat) and factor in curves and key in key_weights:
+                weights_by_stat[stat] = (factor, key_weights[key])
+
+    return LocalDPSModel(
+        anchor_dps=anchor_dps,
+        curves=curves,
+        weights=weights_by_stat,
+        line_gains=line_gains,
+        evaluations=evaluations,
+    )
+
+
+# =============================================================================
+# EXACT LINE ASSIGNMENT
+# =============================================================================
+# Under a LocalDPSModel every line picks one (factor, amount, gain) option and
+# the objective is separable concave in the factor amounts. Sources offering
+# identical options are merged into groups of interchangeable lines; the
+# largest group (the shared equipment pool) is filled greedily, which is exact
+# for identical lines under a concave objective, and branch and bound runs
+# over the counts of the remaining groups. Groups that offer everything the
+# pool does plus extras (slot special potentials) only branch on the extras;
+# their other lines join the pool. Each node's greedy completion (polished by
+# single-line moves) is a candidate build, and a Lagrangian bound that prices
+# each factor prunes nodes that cannot beat the best candidate.
+
+_SEARCH_TOLERANCE = 1e-9   # log-DPS; closer than this counts as a tie
+_MAX_SEARCH_NODES = 2000
+
+
+class _LineGroup:
+    """Interchangeable lines and the options they share."""
+
+    def __init__(self, options: Tuple[Tuple[int, float, float], ...]):
+        self.options = options   # (factor index or -1, amount, log gain)
+        self.members: List[Tuple[StatSource, Dict[Tuple, Tuple[str, float]]]] = []
+        self.branch: List[int] = []   # option indices searched over
+        self.feeds_pool = False       # unsearched lines join the pool
+
+    @property
+    def count(self) -> int:
+        return len(self.members)
+
+
+def _group_lines(line_classes, model: LocalDPSModel, factors: Dict[str, int]) -> List[_LineGroup]:
+    """Reduce each class to its undominated options and merge identical classes."""
+    model_curves = list(model.curves.values())
+    groups: Dict[Tuple, _LineGroup] = {}
+    for members, options in line_classes:
+        by_option: Dict[Tuple[int, float, float], Tuple[str, float]] = {}
+        best_amount: Dict[int, float] = {}
+        best_gain = None
+        for stat, value in options:
+            factor, amount, gain = model.line_effect(stat, value)
+            if factor is not None:
+                j = factors[factor]
+                if amount > best_amount.get(j, 0):
+                    best_amount[j] = amount
+                    by_option[(j, amount, 0.0)] = (stat, value)
+            elif best_gain is None or gain > best_gain:
+                best_gain = gain
+                by_option[(-1, 0.0, gain)] = (stat, value)
+        kept = [(j, amount, 0.0) for j, amount in sorted(best_amount.items())]
+        # A non-positive fixed gain never beats a factor that never loses DPS
+        if best_gain is not None and best_gain <= 0 and any(
+            model_curves[j].slopes[-1] >= 0 for j in best_amount
+        ):
+            best_gain = None
+        if best_gain is not None:
+            kept.append((-1, 0.0, best_gain))
+        key = tuple(kept)
+        group = groups.setdefault(key, _LineGroup(key))
+        stats = {option: by_option[option] for option in kept}
+        group.members.extend((source, stats) for source in members)
+    return list(groups.values())
+
+
+def _greedy_fill(buckets, D, curves):
+    """
+    Fill buckets of (count, options) one line at a time by best marginal gain.
+
+    Returns (objective gain, per-bucket option counts, factor slopes at the
+    filled amounts).
+    """
+    D = list(D)
+    level = [curve(D[j]) for j, curve in enumerate(curves)]
+    remaining = [count for count, _ in buckets]
+    counts = [dict() for _ in buckets]
+    entries = [(b, option) for b, (count, options) in enumerate(buckets) if count for option in options]
+    by_factor = [[] for _ in curves]
+    for i, (_, (j, _, _)) in enumerate(entries):
+        if j >= 0:
+            by_factor[j].append(i)
+
+    def marginal(option):
+        j, amount, gain = option
+        return gain if j < 0 else curves[j](D[j] + amount) - level[j]
+
+    gains = [marginal(option) for _, option in entries]
+    total = 0.0
+    for _ in range(sum(remaining)):
+        i = max(range(len(entries)), key=gains.__getitem__)
+        b, option = entries[i]
+        j, amount, _ = option
+        # A fixed-gain option stays the best for its bucket once it is
+        # ahead, since factor gains only shrink as amounts grow
+        n = 1 if j >= 0 else remaining[b]
+        counts[b][option] = counts[b].get(option, 0) + n
+        remaining[b] -= n
+        total += gains[i] * n
+        if not remaining[b]:
+            for k, (owner, _) in enumerate(entries):
+                if owner == b:
+                    gains[k] = -math.inf
+        if j >= 0:
+            D[j] += amount
+            level[j] = curves[j](D[j])
+            for k in by_factor[j]:
+                if remaining[entries[k][0]]:
+                    gains[k] = marginal(entries[k][1])
+        if not any(remaining):
+            break
+
+    # Greedy order can strand lines on options that stopped paying; move single
+    # lines to another option of their bucket while that gains anything
+    improved = True
+    while improved:
+        improved = False
+        for b, (_, options) in enumerate(buckets):
+            for option in [o for o, n in counts[b].items() if n]:
+                j, amount, gain = option
+                removed = gain if j < 0 else level[j] - curves[j](D[j] - amount)
+                for other in options:
+                    k, other_amount, other_gain = other
+                    if other == option:
+                        continue
+                    if k < 0:
+                        added = other_gain
+                    elif k == j:
+                        added = curves[k](D[k] - amount + other_amount) - (level[j] - removed)
+                    else:
+                        added = curves[k](D[k] + other_amount) - level[k]
+                    if added - removed > 1e-12:
+                        counts[b][option] -= 1
+                        counts[b][other] = counts[b].get(other, 0) + 1
+                        total += added - removed
+                        if j >= 0:
+                            D[j] -= amount
+                            level[j] = curves[j](D[j])
+                        if k >= 0:
+                            D[k] += other_amount
+                            level[k] = curves[k](D[k])
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved:
+                break
+
+    slopes = [curve.slope(D[j]) for j, curve in enumerate(curves)]
+    return total, counts, slopes
+
+
+def _dual_bound(buckets, D, curves, prices, sweeps: int = 2) -> Tuple[float, List[float]]:
+    """
+    Lagrangian upper bound on the gain of filling `buckets` on top of `D`.
+
+    Pricing factor j at prices[j] splits the problem into one concave
+    maximisation per factor plus each line taking its best priced option;
+    any non-negative prices give a valid bound. Coordinate descent over
+    the prices' breakpoints tightens it. Returns the bound and the prices.
+    """
+    prices = list(prices)
+    live = [(count, options) for count, options in buckets if count]
+
+    # Each factor's best priced amount lies at D or a curve breakpoint above it
+    peaks = []
+    for j, curve in enumerate(curves):
+        start = curve(D[j])
+        peaks.append([(x - D[j], y - start) for x, y in zip(curve.xs, curve.ys) if x > D[j]])
+
+    def factor_term(j, price):
+        return max([0.0] + [gain - price * dx for dx, gain in peaks[j]])
+
+    terms = [factor_term(j, price) for j, price in enumerate(prices)]
+    for _ in range(sweeps):
+        for j, curve in enumerate(curves):
+            # Each bucket pays count * max(best option off factor j, price * amount on j)
+            split = []
+            for count, options in live:
+                other, amount = -math.inf, 0.0
+                for k, a, gain in options:
+                    if k == j:
+                        amount = max(amount, a)
+                    else:
+                        other = max(other, gain if k < 0 else prices[k] * a)
+                split.append((count, other, amount))
+            candidates = {prices[j], 0.0}
+            candidates.update(slope for slope in curve.slopes if slope > 0)
+            candidates.update(other / amount for _, other, amount in split if amount > 0 and other > 0)
+            best_total, best_price = math.inf, prices[j]
+            for price in candidates:
+                total = factor_term(j, price) + sum(
+                    count * max(other, price * amount) for count, other, amount in split
+                )
+                if total < best_total:
+                    best_total, best_price = total, price
+            prices[j] = best_price
+            terms[j] = factor_term(j, best_price)
+
+    bound = sum(terms) + sum(
+        count * max(gain if j < 0 else prices[j] * amount for j, amount, gain in options)
+        for count, options in live
+    )
+    return bound, prices
+
+
+def solve_line_assignment(
+    line_classes: List[Tuple[List[StatSource], List[Tuple[str, float]]]],
+    model: LocalDPSModel,
+    max_nodes: int = _MAX_SEARCH_NODES,
+) -> Tuple[List[Tuple[StatSource, str, float]], bool]:
+    """
+    Assign one (stat, value) to every source, maximising the model's DPS.
+
+    Returns the assignments and whether the search proved optimality
+    (False only if it ran out of `max_nodes`).
+    """
+    factors = {factor: j for j, factor in enumerate(model.curves)}
+    curves = list(model.curves.values())
+    groups = _group_lines(line_classes, model, factors)
+    if not groups:
+        return [], True
+
+    pool = max(groups, key=lambda g: g.count)
+    pool_options = set(pool.options)
+    searched = []
+    for group in groups:
+        if group is pool:
+            continue
+        if pool_options <= set(group.options):
+            group.feeds_pool = True
+            group.branch = [i for i, o in enumerate(group.options) if o not in pool_options]
+        else:
+            group.branch = list(range(len(group.options) - 1))
+        searched.append(group)
+    searched.sort(key=lambda g: (len(g.branch), g.count))
+
+    best = {'value': -math.inf, 'counts': None}
+    nodes = 0
+    exhausted = False
+
+    def open_options(group, b):
+        """Options the group's undecided lines may still take."""
+        rest = [group.options[i] for i in group.branch[b:]]
+        if group.feeds_pool:
+            return rest + list(pool.options)
+        return rest + [group.options[-1]]
+
+    def visit(g, b, r, D, value, pool_lines, fixed, prices):
+        nonlocal nodes, exhausted
+        nodes += 1
+        buckets = []
+        if g < len(searched):
+            buckets.append((r, open_options(searched[g], b)))
+            buckets.extend((group.count, open_options(group, 0)) for group in searched[g + 1:])
+        buckets.append((pool_lines, pool.options))
+
+        # Children start from their parent's prices; most are pruned at those
+        # prices outright, and one sweep re-tightens the bound for the rest
+        if prices is not None and g < len(searched):
+            for sweeps in (0, 1):
+                bound, prices = _dual_bound(buckets, D, curves, prices, sweeps=sweeps)
+                if value + bound <= best['value'] + _SEARCH_TOLERANCE:
+                    return
+
+        gain, fills, slopes = _greedy_fill(buckets, D, curves)
+        if value + gain > best['value']:
+            counts = dict(fixed)
+            owners = searched[g:] + [pool] if g < len(searched) else [pool]
+            for owner, used in zip(owners, fills):
+                for option, n in used.items():
+                    counts[(id(owner), option)] = counts.get((id(owner), option), 0) + n
+            best['value'], best['counts'] = value + gain, counts
+
+        if g == len(searched):
+            return
+        if prices is None:
+            bound, prices = _dual_bound(buckets, D, curves, slopes)
+            if value + bound <= best['value'] + _SEARCH_TOLERANCE:
+                return
+        if nodes >= max_nodes:
+            exhausted = True
+            return
+
+        group = searched[g]
+        if b == len(group.branch):
+            # Unsearched lines go to the pool or to the group's last option
+            next_r = searched[g + 1].count if g + 1 < len(searched) else 0
+            if group.feeds_pool:
+                visit(g + 1, 0, next_r, D, value, pool_lines + r, fixed, prices)
+            else:
+                option = group.options[-1]
+                D2, value2 = _add_lines(D, value, option, r, curves)
+                visit(g + 1, 0, next_r, D2, value2, pool_lines,
+                      _with_count(fixed, group, option, r), prices)
+            return
+
+        option = group.options[group.branch[b]]
+        hint = fills[0].get(option, 0)
+        for n in sorted(range(r + 1), key=lambda n: (abs(n - hint), -n)):
+            D2, value2 = _add_lines(D, value, option, n, curves)
+            visit(g, b + 1, r - n, D2, value2, pool_lines,
+                  _with_count(fixed, group, option, n), prices)
+
+    visit(0, 0, searched[0].count if searched else 0, [0.0] * len(curves), 0.0, pool.count, {}, None)
+
+    # Hand out each group's counted options to its own sources; lines left
+    # in feeder groups were pooled and take the pool's options
+    counts = best['counts']
+    assignments = []
+    pooled = []
+    for group in groups:
+        members = iter(group.members)
+        if group is not pool:
+            for option in group.options:
+                for _ in range(counts.get((id(group), option), 0)):
+                    source, stats = next(members)
+                    assignments.append((source, *stats[option]))
+        pooled.extend(members)
+    pooled = iter(pooled)
+    for option in pool.options:
+        for _ in range(counts.get((id(pool), option), 0)):
+            source, stats = next(pooled)
+            assignments.append((source, *stats[option]))
+    return assignments, not exhausted
+
+
+def _add_lines(D, value, option, n, curves):
+    """Add `n` lines of `option` to factor amounts `D` and objective `value`."""
+    j, amount, gain = option
+    if n == 0:
+        return D, value
+    if j < 0:
+        return D, value + gain * n
+    D = list(D)
+    value += curves[j](D[j] + amount * n) - curves[j](D[j])
+    D[j] += amount * n
+    return D, value
+
+
+def _with_count(fixed, group, option, n):
+    if n == 0:
+        return fixed
+    counts = dict(fixed)
+    counts[(id(group), option)] = n
+    return counts
+
+
 # =============================================================================
 # OPTIMAL DISTRIBUTION CALCULATION
 # =============================================================================
@@ -509,76 +1090,67 @@ def calculate_optimal_distribution(
     calc_dps_func: Callable,
     tier_mode: str = "mystic",
     include_artifacts: bool = True,
-    max_iterations: int = 500,
+    max_relinearisations: int = 4,
 ) -> OptimalBuild:
     """
-    Calculate theoretically optimal stat distribution using greedy marginal value.
+    Calculate the theoretically optimal stat distribution.
+
+    Fits a LocalDPSModel around the current stats, assigns every line
+    exactly under that model, then re-fits around the solution and solves
+    again until the assignment stops changing. Each solution is verified
+    with `calc_dps_func` and the best verified build is returned.
 
     Args:
         base_stats: Fixed stats from non-configurable sources
         calc_dps_func: Function to calculate DPS from stats
         tier_mode: "mystic" for theoretical max, or tier name for constrained
         include_artifacts: Whether to include artifact potentials
-        max_iterations: Maximum allocation iterations
+        max_relinearisations: Maximum model re-fits after the first solve
 
     Returns:
         OptimalBuild with allocations and analysis
     """
     sources = generate_all_sources(include_artifacts)
-    current_stats = copy.deepcopy(base_stats)
-    allocations = []
-    used_sources = set()
-
-    for iteration in range(max_iterations):
-        remaining = [s for s in sources if s.source_id not in used_sources]
-        if not remaining:
-            break
-
-        # Compute baseline DPS once per iteration (shared across all sources)
-        baseline_dps = calc_dps_func(current_stats)
-        if baseline_dps <= 0:
+    line_classes = _build_line_classes(sources, tier_mode)
+    model = fit_local_dps_model(base_stats, [], line_classes, calc_dps_func) if line_classes else None
+    if model is None:
+        return OptimalBuild(
+            allocations=[],
+            total_stats=copy.deepcopy(base_stats),
+            estimated_dps_gain=0.0,
+            efficiency_by_source={},
+            tier_mode=tier_mode,
+        )
+    base_dps = model.anchor_dps
+
+    best_dps, best_assignments, best_model = -math.inf, [], model
+    seen = set()
+    for refit in range(max_relinearisations + 1):
+        assignments, _ = solve_line_assignment(line_classes, model)
+        signature = tuple(sorted((source.source_id, stat) for source, stat, _ in assignments))
+        if signature in seen:
             break
+        seen.add(signature)
 
-        # Collect unique stat types across remaining sources and their max reference amount.
-        # DPS-per-unit for a stat type depends only on current_stats, not on which source
-        # provides it, so we compute it once per stat type instead of once per source.
-        unique_stat_ref: Dict[str, float] = {}
-        for source in remaining:
-            for stat in source.available_stats:
-                max_val = source.get_max_value(stat, tier_mode)
-                if max_val > 0 and (stat not in unique_stat_ref or max_val > unique_stat_ref[stat]):
-                    unique_stat_ref[stat] = max_val
-
-        # ONE DPS call per unique stat type (vs. one per source × stat previously)
-        stat_dps_per_unit: Dict[str, float] = {}
-        for stat_type, ref_amount in unique_stat_ref.items():
-            modified = copy.deepcopy(current_stats)
-            _apply_stat_to_dict(modified, stat_type, ref_amount)
-            new_dps = calc_dps_func(modified)
-            gain = ((new_dps / baseline_dps) - 1) * 100
-            stat_dps_per_unit[stat_type] = gain / ref_amount if ref_amount > 0 else 0
-
-        # Rank (source, stat) pairs using pre-computed per-unit efficiency
-        best_option = None
-        best_efficiency = -1
-        for source in remaining:
-            for stat in source.available_stats:
-                max_val = source.get_max_value(stat, tier_mode)
-                if max_val <= 0 or stat not in stat_dps_per_unit:
-                    continue
-                efficiency = stat_dps_per_unit[stat]
-                if stat in source.exclusive_stats:
-                    efficiency *= 1.5
-                if efficiency > best_efficiency:
-                    best_efficiency = efficiency
-                    best_option = (source, stat, max_val, efficiency)
-
-        if best_option is None:
+        # Re-fitting around the solution also verifies it: the anchor DPS is a full calculation
+        lines = [(stat, value) for _, stat, value in assignments]
+        if refit < max_relinearisations:
+            next_model = fit_local_dps_model(base_stats, lines, line_classes, calc_dps_func)
+            dps = next_model.anchor_dps if next_model else 0.0
+        else:
+            next_model = None
+            dps = calc_dps_func(_stats_with_lines(base_stats, lines))
+        if dps > best_dps:
+            best_dps, best_assignments, best_model = dps, assignments, model
+        if next_model is None:
             break
+        model = next_model
 
-        source, stat, value, eff = best_option
-        _apply_stat_to_dict(current_stats, stat, value)
-        allocations.append(StatAllocation(
+    order = {source.source_id: i for i, source in enumerate(sources)}
+    best_assignments = sorted(best_assignments, key=lambda a: order[a[0].source_id])
+    efficiency = _line_efficiencies(best_assignments, best_model)
+    allocations = [
+        StatAllocation(
             source_id=source.source_id,
             source_type=source.source_type,
             slot=source.slot,
@@ -588,28 +1160,45 @@ def calculate_optimal_distribution(
             is_exclusive=stat in source.exclusive_stats,
             max_possible=value,
             efficiency_score=eff,
-        ))
-        used_sources.add(source.source_id)
-
-    # Calculate total DPS gain (baseline computed once for all allocations)
-    base_baseline = calc_dps_func(base_stats)
-    total_dps_gain = sum(
-        calculate_marginal_dps_value(base_stats, a.stat_type, a.value, calc_dps_func, baseline_dps=base_baseline)
-        for a in allocations
-    )
-
-    # Build efficiency map
-    efficiency_by_source = {a.source_id: a.efficiency_score for a in allocations}
+        )
+        for (source, stat, value), eff in zip(best_assignments, efficiency)
+    ]
 
     return OptimalBuild(
         allocations=allocations,
-        total_stats=current_stats,
-        estimated_dps_gain=total_dps_gain,
-        efficiency_by_source=efficiency_by_source,
+        total_stats=_stats_with_lines(base_stats, [(a.stat_type, a.value) for a in allocations]),
+        estimated_dps_gain=((best_dps / base_dps) - 1) * 100,
+        efficiency_by_source={a.source_id: a.efficiency_score for a in allocations},
         tier_mode=tier_mode,
     )
 
 
+def _stats_with_lines(base_stats: Dict[str, float], lines: List[Tuple[str, float]]) -> Dict[str, float]:
+    stats = copy.deepcopy(base_stats)
+    for stat, value in lines:
+        _apply_stat_to_dict(stats, stat, value)
+    return stats
+
+
+def _line_efficiencies(assignments, model: LocalDPSModel) -> List[float]:
+    """% DPS each line adds on top of the rest of the build, per stat point."""
+    amounts: Dict[str, float] = {}
+    effects = []
+    for _, stat, value in assignments:
+        factor, amount, gain = model.line_effect(stat, value)
+        effects.append((factor, amount, gain))
+        if factor is not None:
+            amounts[factor] = amounts.get(factor, 0) + amount
+
+    efficiencies = []
+    for (_, _, value), (factor, amount, gain) in zip(assignments, effects):
+        if factor is not None:
+            curve = model.curves[factor]
+            gain = curve(amounts[factor]) - curve(amounts[factor] - amount)
+        efficiencies.append((math.exp(gain) - 1) * 100 / value if value > 0 else 0)
+    return efficiencies
+
+
 # =============================================================================
 # CURRENT VS OPTIMAL COMPARISON
 # =============================================================================
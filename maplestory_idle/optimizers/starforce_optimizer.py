@@ -8,6 +8,10 @@ Uses Markov chain analysis to properly account for:
 2. Destruction probability (more attempts = more destruction rolls)
 3. Restart costs (destruction resets to star 12)
 
+The (stage, pity) chain is solved directly as a linear system (memoised per
+strategy vector) and the optimal per-stage protection comes from policy
+iteration over that chain.
+
 Key mechanics:
 - Decrease Mitigation: +100% cost, sets decrease to 0%
 - Destruction Mitigation: +100% cost, halves destruction chance
@@ -27,7 +31,12 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 
 from dataclasses import dataclass
+from functools import lru_cache
+import math
 from typing import Dict, List, Tuple, Optional
+
+import numpy as np
+
 from game.equipment import STARFORCE_TABLE, StarforceStage
 
 # Destruction costs
@@ -70,6 +79,210 @@ def calculate_diamond_cost(meso: float, scrolls: float) -> float:
 # MARKOV CHAIN ANALYSIS
 # =============================================================================
 
+# Protection strategy name -> (use_decrease_prot, use_destroy_prot)
+PROTECTION_STRATEGIES: Dict[str, Tuple[bool, bool]] = {
+    'none': (False, False),
+    'decrease': (True, False),
+    'destroy': (False, True),
+    'both': (True, True),
+}
+_STRATEGY_NAMES: Dict[Tuple[bool, bool], str] = {v: k for k, v in PROTECTION_STRATEGIES.items()}
+
+# Destruction protection is not offered on the last three stages
+NO_DESTROY_PROT_STAGES = {22, 23, 24}
+
+# Number of pity states per stage: consecutive decreases 0, 1, 2
+# (after 2 decreases in a row the next attempt is guaranteed)
+_PITY_STATES = 3
+
+
+def _stage_transition(
+    stage: int,
+    use_decrease_prot: bool,
+    use_destroy_prot: bool,
+) -> Tuple[float, float, float, float, float]:
+    """
+    (success, decrease, destroy, maintain, diamond cost per attempt) for a stage.
+
+    Stages missing from STARFORCE_TABLE are treated as a free guaranteed success.
+    """
+    p, d, x, m, meso, stones = _stage_attempt(stage, use_decrease_prot, use_destroy_prot)
+    return p, d, x, m, calculate_diamond_cost(meso, stones)
+
+
+def _stage_attempt(
+    stage: int,
+    use_decrease_prot: bool,
+    use_destroy_prot: bool,
+) -> Tuple[float, float, float, float, float, float]:
+    """(success, decrease, destroy, maintain, meso, scrolls) for one attempt at a stage."""
+    data = STARFORCE_TABLE.get(stage)
+    if not data:
+        return 1.0, 0.0, 0.0, 0.0, 0.0, 0.0
+    can_use_destroy_prot = use_destroy_prot and stage not in NO_DESTROY_PROT_STAGES
+
+    p = data.success_rate
+    d = 0.0 if use_decrease_prot else data.decrease_rate
+    x = data.destroy_rate * (0.5 if can_use_destroy_prot else 1.0)
+    m = 1.0 - p - d - x  # maintain rate
+
+    cost_mult = 1.0
+    if use_decrease_prot and data.decrease_rate > 0:
+        cost_mult += 1.0
+    if can_use_destroy_prot and data.destroy_rate > 0:
+        cost_mult += 1.0
+    return p, d, x, m, data.meso * cost_mult, data.stones * cost_mult
+
+
+def _chain_base(start_stage: int, with_restarts: bool) -> int:
+    """Lowest stage in the chain: restarts rebuild from ★12 when starting above it."""
+    if with_restarts and start_stage > DESTRUCTION_RESET_STAR:
+        return DESTRUCTION_RESET_STAR
+    return start_stage
+
+
+# Outcome columns of the per-state transition table
+_OUTCOME_SUCCESS, _OUTCOME_DECREASE, _OUTCOME_MAINTAIN, _OUTCOME_DESTROY = range(4)
+# Outcome targets that leave the chain
+_REACHED_TARGET = -1
+_RUN_FAILED = -2
+
+
+@dataclass(frozen=True)
+class _ChainOutcomes:
+    """Per-state outcome table of the (stage, pity) chain."""
+    base: int
+    meso: np.ndarray       # (n,) meso per attempt
+    scrolls: np.ndarray    # (n,) scrolls per attempt
+    targets: np.ndarray    # (n, 4) next state index, or _REACHED_TARGET / _RUN_FAILED
+    probs: np.ndarray      # (n, 4) outcome probabilities
+    with_restarts: bool
+
+    @property
+    def attempt_cost(self) -> np.ndarray:
+        """Diamonds per attempt (destruction fee excluded)."""
+        return calculate_diamond_cost(self.meso, self.scrolls)
+
+    def index(self, stage: int, pity: int = 0) -> int:
+        return (stage - self.base) * _PITY_STATES + pity
+
+
+@lru_cache(maxsize=4096)
+def _chain_outcomes(
+    start_stage: int,
+    target_stage: int,
+    strategy: Tuple[Tuple[bool, bool], ...],
+    with_restarts: bool,
+) -> _ChainOutcomes:
+    """
+    Outcome table for the (stage, pity) chain.
+
+    `strategy` holds one (use_dec, use_dest) pair per stage from the chain base
+    up to target_stage - 1. Decreases never drop below start_stage (below ★12
+    while rebuilding). Without restarts destruction ends the run; with
+    restarts it pays the fee and jumps to (base, 0).
+    """
+    base = _chain_base(start_stage, with_restarts)
+    n = (target_stage - base) * _PITY_STATES
+    meso = np.zeros(n)
+    scrolls = np.zeros(n)
+    targets = np.full((n, 4), _RUN_FAILED, dtype=int)
+    probs = np.zeros((n, 4))
+
+    def idx(stage: int, pity: int) -> int:
+        if stage == target_stage:
+            return _REACHED_TARGET
+        return (stage - base) * _PITY_STATES + pity
+
+    for offset, stage in enumerate(range(base, target_stage)):
+        p, d, x, m, attempt_meso, attempt_scrolls = _stage_attempt(stage, *strategy[offset])
+        floor = start_stage if stage >= start_stage else base
+        dec_target = max(floor, stage - 1)
+        for pity in range(_PITY_STATES):
+            i = idx(stage, pity)
+            meso[i] = attempt_meso
+            scrolls[i] = attempt_scrolls
+            targets[i, _OUTCOME_SUCCESS] = idx(stage + 1, 0)
+            if pity == _PITY_STATES - 1:
+                probs[i, _OUTCOME_SUCCESS] = 1.0  # guaranteed success
+                continue
+            probs[i] = (p, d, m, x)
+            targets[i, _OUTCOME_DECREASE] = idx(dec_target, pity + 1)
+            targets[i, _OUTCOME_MAINTAIN] = idx(stage, 0)  # maintain resets the streak
+            if with_restarts:
+                targets[i, _OUTCOME_DESTROY] = idx(base, 0)
+
+    for array in (meso, scrolls, targets, probs):
+        array.setflags(write=False)
+    return _ChainOutcomes(base, meso, scrolls, targets, probs, with_restarts)
+
+
+def _assemble_chain(
+    start_stage: int,
+    target_stage: int,
+    strategy: Tuple[Tuple[bool, bool], ...],
+    with_restarts: bool,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build the transient part of the (stage, pity) chain.
+
+    With restarts the expected destruction fee is folded into each state's
+    cost, so the solved cost is the full expected spend to reach the target.
+
+    Returns:
+        (Q, cost, success): Q[i, j] transient transition probabilities,
+        cost[i] expected diamonds per attempt, success[i] one-step probability
+        of reaching target_stage.
+    """
+    chain = _chain_outcomes(start_stage, target_stage, strategy, with_restarts)
+    n = len(chain.meso)
+    rows = np.repeat(np.arange(n), 4)
+    cols = chain.targets.ravel()
+    vals = chain.probs.ravel()
+    transient = (cols >= 0) & (vals > 0)
+
+    Q = np.zeros((n, n))
+    np.add.at(Q, (rows[transient], cols[transient]), vals[transient])
+    success = np.where(chain.targets == _REACHED_TARGET, chain.probs, 0.0).sum(axis=1)
+    cost = chain.attempt_cost.copy()
+    if with_restarts:
+        cost += chain.probs[:, _OUTCOME_DESTROY] * DESTRUCTION_FEE_DIAMONDS
+    return Q, cost, success
+
+
+@lru_cache(maxsize=4096)
+def _solve_chain(
+    start_stage: int,
+    target_stage: int,
+    strategy: Tuple[Tuple[bool, bool], ...],
+    with_restarts: bool = False,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Direct solve of (I - Q) C = cost and (I - Q) P = success.
+
+    Memoised per (start, target, strategy vector). Returned arrays are shared
+    between callers and must not be mutated.
+    """
+    Q, cost, success = _assemble_chain(start_stage, target_stage, strategy, with_restarts)
+    solution = np.linalg.solve(np.eye(len(cost)) - Q, np.column_stack([cost, success]))
+    C, P = solution[:, 0], solution[:, 1]
+    C.setflags(write=False)
+    P.setflags(write=False)
+    return C, P
+
+
+def _strategy_vector(
+    base: int,
+    target_stage: int,
+    stage_strategies: Dict[int, Tuple[bool, bool]],
+) -> Tuple[Tuple[bool, bool], ...]:
+    """Hashable per-stage strategy vector (unspecified stages = no protection)."""
+    return tuple(
+        tuple(bool(flag) for flag in stage_strategies.get(stage, (False, False)))
+        for stage in range(base, target_stage)
+    )
+
+
 def solve_markov_chain(
     start_stage: int,
     target_stage: int,
@@ -118,87 +331,22 @@ def solve_markov_chain_per_stage(
     After 2 consecutive decreases (pity=2) the next attempt is guaranteed to succeed.
     Any non-decrease result (success, maintain, destroy) resets pity to 0.
 
+    The chain is one run (destruction is absorbing) and is solved directly as
+    a linear system; solutions are memoised per (start, target, strategy vector).
+
     Returns C and P_s keyed by stage (pity=0 values, which is always the starting state).
     """
-    stages = list(range(start_stage, target_stage))
-
-    # State: (stage, pity). Initialize boundary: at target, done.
-    C: Dict = {(target_stage, 0): 0.0}
-    P_s: Dict = {(target_stage, 0): 1.0}
-
-    for stage in stages:
-        data = STARFORCE_TABLE.get(stage)
-        if data:
-            p = data.success_rate
-            cost_per_attempt = calculate_diamond_cost(data.meso, data.stones)
-            for pity in range(3):
-                C[(stage, pity)] = cost_per_attempt / p if p > 0 else float('inf')
-                P_s[(stage, pity)] = 0.9
-        else:
-            for pity in range(3):
-                C[(stage, pity)] = 0.0
-                P_s[(stage, pity)] = 1.0
-
-    # Iterate until convergence (Gauss-Seidel over (stage, pity) states)
-    for _ in range(1000):
-        max_change = 0.0
-
-        for stage in reversed(stages):
-            data = STARFORCE_TABLE.get(stage)
-            if not data:
-                continue
-
-            use_decrease_prot, use_destroy_prot = stage_strategies.get(stage, (False, False))
-            can_use_destroy_prot = use_destroy_prot and stage not in {22, 23, 24}
-
-            p = data.success_rate
-            d = 0.0 if use_decrease_prot else data.decrease_rate
-            x = data.destroy_rate * (0.5 if can_use_destroy_prot else 1.0)
-            m = 1.0 - p - d - x  # maintain rate
-
-            cost_mult = 1.0
-            if use_decrease_prot and data.decrease_rate > 0:
-                cost_mult += 1.0
-            if can_use_destroy_prot and data.destroy_rate > 0:
-                cost_mult += 1.0
-            cost = calculate_diamond_cost(data.meso * cost_mult, data.stones * cost_mult)
-
-            dec_target = max(start_stage, stage - 1)
-            next_stage = stage + 1
+    C_out = {target_stage: 0.0}
+    P_s_out = {target_stage: 1.0}
+    if target_stage <= start_stage:
+        return C_out, P_s_out
 
-            # pity=2: guaranteed success, no rolls needed
-            new_C2 = cost + C.get((next_stage, 0), 0.0)
-            new_P2 = P_s.get((next_stage, 0), 1.0)
-
-            # pity=0: maintain is self-referential (maintain → same state (stage,0))
-            # C[s,0] = (cost + p*C[s+1,0] + d*C[dec,1]) / (p+d+x)
-            denom = p + d + x
-            if denom > 0:
-                new_C0 = (cost + p * C.get((next_stage, 0), 0.0) + d * C.get((dec_target, 1), C.get((stage, 0), 0.0))) / denom
-                new_P0 = (p * P_s.get((next_stage, 0), 1.0) + d * P_s.get((dec_target, 1), P_s.get((stage, 0), 0.0))) / denom
-            else:
-                new_C0, new_P0 = float('inf'), 0.0
-
-            # pity=1: maintain resets to (stage,0), not self-referential
-            # C[s,1] = cost + p*C[s+1,0] + d*C[dec,2] + m*C[s,0]
-            new_C1 = cost + p * C.get((next_stage, 0), 0.0) + d * C.get((dec_target, 2), 0.0) + m * new_C0
-            new_P1 = p * P_s.get((next_stage, 0), 1.0) + d * P_s.get((dec_target, 2), 0.0) + m * new_P0
-
-            for pity, new_C, new_P in ((0, new_C0, new_P0), (1, new_C1, new_P1), (2, new_C2, new_P2)):
-                max_change = max(max_change,
-                                 abs(new_C - C.get((stage, pity), 0.0)),
-                                 abs(new_P - P_s.get((stage, pity), 0.0)))
-                C[(stage, pity)] = new_C
-                P_s[(stage, pity)] = new_P
-
-        if max_change < 1e-10:
-            break
-
-    # Return pity=0 values (always the starting state) for backward compatibility
-    C_out = {stage: C.get((stage, 0), 0.0) for stage in range(start_stage, target_stage + 1)}
-    P_s_out = {stage: P_s.get((stage, 0), 0.0) for stage in range(start_stage, target_stage + 1)}
-    C_out[target_stage] = 0.0
-    P_s_out[target_stage] = 1.0
+    strategy = _strategy_vector(start_stage, target_stage, stage_strategies)
+    C, P_s = _solve_chain(start_stage, target_stage, strategy)
+    for stage in range(start_stage, target_stage):
+        i = (stage - start_stage) * _PITY_STATES
+        C_out[stage] = float(C[i])
+        P_s_out[stage] = float(P_s[i])
 
     return C_out, P_s_out
 
@@ -302,101 +450,142 @@ def calculate_total_cost_per_stage(
     )
 
 
-def build_optimal_strategy_table() -> Tuple[Dict[int, str], Dict[int, float], Dict[int, float]]:
+def solve_optimal_protection_policy(
+    start_stage: int,
+    target_stage: int,
+) -> Tuple[Dict[int, str], float]:
+    """
+    Optimal per-stage protection via MDP policy iteration.
+
+    The decision process is the restart chain (destruction pays the fee and
+    rebuilds from ★12), so the minimised quantity is the full expected diamond
+    spend from start_stage to target_stage, rebuild included. The action is
+    one protection option per stage, shared by that stage's pity states.
+    Each sweep evaluates the policy with a direct solve and then switches
+    every stage to the option with the lowest visit-weighted Q-value; this
+    converges in a handful of solves instead of enumerating 4^stages
+    strategy combinations.
+
+    Returns:
+        (strategies, total_cost): stage -> 'none'/'decrease'/'destroy'/'both'
+        for every stage from the rebuild base (★12 when starting above it)
+        to target_stage - 1, and the optimal expected total cost.
     """
-    Build a lookup table of optimal strategies for each stage using full Markov chain.
+    names, total_cost = _solve_optimal_policy(start_stage, target_stage)
+    return dict(names), total_cost
 
-    For each target star level, we test all 4 uniform strategies using the accurate
-    Markov chain solver, then record the best strategy for each stage.
 
-    This properly handles the recursive nature of decrease chains - when you decrease
-    from stage N to N-1, redoing N-1→N might itself result in another decrease, etc.
+@lru_cache(maxsize=512)
+def _solve_optimal_policy(
+    start_stage: int,
+    target_stage: int,
+) -> Tuple[Tuple[Tuple[int, str], ...], float]:
+    """Memoised policy iteration behind solve_optimal_protection_policy."""
+    if target_stage <= start_stage:
+        return (), 0.0
+    base = _chain_base(start_stage, True)
+    stages = list(range(base, target_stage))
+    policy = {stage: (False, False) for stage in stages}
+    start_index = (start_stage - base) * _PITY_STATES
+
+    def candidates(stage: int) -> List[Tuple[bool, bool]]:
+        data = STARFORCE_TABLE.get(stage)
+        options = [(False, False)]
+        if not data:
+            return options
+        if data.decrease_rate > 0:
+            options.append((True, False))
+        if data.destroy_rate > 0 and stage not in NO_DESTROY_PROT_STAGES:
+            options.append((False, True))
+            if data.decrease_rate > 0:
+                options.append((True, True))
+        return options
+
+    for _ in range(4 * len(stages) + 1):
+        strategy = tuple(policy[stage] for stage in stages)
+        V, _unused = _solve_chain(start_stage, target_stage, strategy, True)
+        Q, _cost, _succ = _assemble_chain(start_stage, target_stage, strategy, True)
+        visits = np.linalg.solve((np.eye(len(V)) - Q).T, np.eye(len(V))[start_index])
+
+        def value(stage: int, pity: int) -> float:
+            return 0.0 if stage == target_stage else V[(stage - base) * _PITY_STATES + pity]
+
+        changed = False
+        for stage in stages:
+            floor = start_stage if stage >= start_stage else base
+            dec_target = max(floor, stage - 1)
+            weights = visits[(stage - base) * _PITY_STATES:(stage - base + 1) * _PITY_STATES]
+            scores = {}
+            for option in candidates(stage):
+                p, d, x, m, attempt_cost = _stage_transition(stage, *option)
+                restart = x * (DESTRUCTION_FEE_DIAMONDS + value(base, 0))
+                q = [
+                    attempt_cost + p * value(stage + 1, 0) + d * value(dec_target, pity + 1)
+                    + m * value(stage, 0) + restart
+                    for pity in range(_PITY_STATES - 1)
+                ]
+                q.append(attempt_cost + value(stage + 1, 0))
+                scores[option] = float(np.dot(weights, q))
+            best = min(scores, key=scores.get)
+            current = scores[policy[stage]]
+            if scores[best] < current - 1e-12 * max(1.0, abs(current)):
+                policy[stage] = best
+                changed = True
+        if not changed:
+            break
+
+    strategy = tuple(policy[stage] for stage in stages)
+    V, _unused = _solve_chain(start_stage, target_stage, strategy, True)
+    return (
+        tuple((stage, _STRATEGY_NAMES[policy[stage]]) for stage in stages),
+        float(V[start_index]),
+    )
+
+
+def optimal_rebuild_cost(start_stage: int) -> float:
+    """Expected cost to rebuild from ★12 back to start_stage after a destruction."""
+    if start_stage <= DESTRUCTION_RESET_STAR:
+        return 0.0
+    return solve_optimal_protection_policy(DESTRUCTION_RESET_STAR, start_stage)[1]
+
+
+def build_optimal_strategy_table() -> Tuple[Dict[int, str], Dict[int, float], Dict[int, float]]:
+    """
+    Build a lookup table of optimal strategies for each stage from ★12.
+
+    For each target star level the policy-iteration solver gives the optimal
+    per-stage protection from ★12; the table records the strategy chosen for
+    the last stage (target-1 → target) together with the optimal cumulative
+    cost. Each entry is an independent memoised solve, so callers that need a
+    single (start, target) pair should use solve_optimal_protection_policy
+    directly rather than building the whole table.
 
     Returns:
         Tuple of (optimal_strategies, C_to, P_to)
         - optimal_strategies: Dict mapping stage -> best strategy name for that stage
         - C_to: Dict mapping stage -> expected cost from ★12 to that stage
         - P_to: Dict mapping stage -> probability of reaching that stage from ★12
+          in one run (no destruction)
     """
-    strategy_options = [
-        ('none', False, False),
-        ('decrease', True, False),
-        ('destroy', False, True),
-        ('both', True, True),
-    ]
-
     BASE_STAGE = DESTRUCTION_RESET_STAR  # Always compute from ★12
 
     optimal_strategies: Dict[int, str] = {}
     C_to: Dict[int, float] = {BASE_STAGE: 0.0}
     P_to: Dict[int, float] = {BASE_STAGE: 1.0}
 
-    # For each target stage, find the best uniform strategy using full Markov chain
-    # Then record both the strategy and the incremental cost for that stage
     for target in range(BASE_STAGE + 1, 26):
-        best_cost = float('inf')
-        best_strat_name = 'none'
-        best_result = None
-
-        for name, use_dec, use_dest in strategy_options:
-            # Run full Markov chain from BASE_STAGE to target
-            result = calculate_total_cost_markov(BASE_STAGE, target, use_dec, use_dest)
-
-            if result.total_cost < best_cost:
-                best_cost = result.total_cost
-                best_strat_name = name
-                best_result = result
-
-        # For the incremental approach, we need to know what strategy is best
-        # for just the last stage (target-1 → target)
-        # Test which strategy at the last stage minimizes cost
-        last_stage = target - 1
-        best_last_stage_strat = 'none'
-        best_last_stage_cost = float('inf')
-
-        for name, use_dec, use_dest in strategy_options:
-            # Build per-stage strategy dict: use previous optimal for earlier stages,
-            # test this strategy for the last stage
-            stage_strategies = {}
-            for s in range(BASE_STAGE, last_stage):
-                prev_strat = optimal_strategies.get(s, 'none')
-                stage_strategies[s] = {
-                    'none': (False, False),
-                    'decrease': (True, False),
-                    'destroy': (False, True),
-                    'both': (True, True),
-                }[prev_strat]
-            stage_strategies[last_stage] = (use_dec, use_dest)
-
-            result = calculate_total_cost_per_stage(BASE_STAGE, target, stage_strategies)
-
-            if result.total_cost < best_last_stage_cost:
-                best_last_stage_cost = result.total_cost
-                best_last_stage_strat = name
-
-        optimal_strategies[last_stage] = best_last_stage_strat
-
-        # Update cumulative costs using the best per-stage strategies
-        stage_strategies = {}
-        for s in range(BASE_STAGE, target):
-            strat = optimal_strategies.get(s, 'none')
-            stage_strategies[s] = {
-                'none': (False, False),
-                'decrease': (True, False),
-                'destroy': (False, True),
-                'both': (True, True),
-            }[strat]
-
-        final_result = calculate_total_cost_per_stage(BASE_STAGE, target, stage_strategies)
-        # Store total_cost (includes restarts) for use as rebuild_cost
-        # When rebuilding from 12→target, you might get destroyed and restart at 12
-        C_to[target] = final_result.total_cost
-        P_to[target] = 1 - final_result.destroy_probability
+        names, total_cost = solve_optimal_protection_policy(BASE_STAGE, target)
+        optimal_strategies[target - 1] = names[target - 1]
+        C_to[target] = total_cost
+        _, P_s = solve_markov_chain_per_stage(
+            BASE_STAGE, target, {s: PROTECTION_STRATEGIES[n] for s, n in names.items()},
+        )
+        P_to[target] = P_s[BASE_STAGE]
 
     return optimal_strategies, C_to, P_to
 
 
-# Cache the optimal strategy table (computed once)
+# Cache the optimal strategy table (computed on first request)
 _OPTIMAL_STRATEGY_CACHE: Optional[Tuple[Dict[int, str], Dict[int, float], Dict[int, float]]] = None
 
 
@@ -415,8 +604,8 @@ def find_optimal_per_stage_strategy(
     """
     Find the optimal protection strategy for EACH stage.
 
-    Uses a precomputed lookup table based on ★12 as the reference point,
-    ensuring consistent recommendations regardless of starting stage.
+    Solved on request for this (start, target) pair with MDP policy iteration
+    (see solve_optimal_protection_policy).
 
     The actual cost is computed using the full Markov chain solver which
     properly handles the recursive nature of decrease chains.
@@ -428,27 +617,18 @@ def find_optimal_per_stage_strategy(
         (stage_strategy_names, result)
         stage_strategy_names: Dict mapping stage -> 'none'/'decrease'/'destroy'/'both'
     """
-    optimal_strategies, C_to, _ = get_optimal_strategy_table()
+    policy, _ = solve_optimal_protection_policy(start_stage, target_stage)
 
-    # Extract strategies for the requested range
     best_names = {}
     stage_strategies = {}
     for stage in range(start_stage, target_stage):
-        strat_name = optimal_strategies.get(stage, 'none')
+        strat_name = policy.get(stage, 'none')
         best_names[stage] = strat_name
-        stage_strategies[stage] = {
-            'none': (False, False),
-            'decrease': (True, False),
-            'destroy': (False, True),
-            'both': (True, True),
-        }[strat_name]
+        stage_strategies[stage] = PROTECTION_STRATEGIES[strat_name]
 
     # Calculate rebuild cost (cost to go from star 12 to start_stage)
     # This is needed because destruction resets to star 12
-    rebuild_cost = 0.0
-    if start_stage > DESTRUCTION_RESET_STAR:
-        # Get the cost from 12 to start_stage using optimal strategies
-        rebuild_cost = C_to.get(start_stage, 0)
+    rebuild_cost = optimal_rebuild_cost(start_stage)
 
     # Compute actual costs using full Markov chain
     result = calculate_total_cost_per_stage(start_stage, target_stage, stage_strategies, rebuild_cost)
@@ -469,25 +649,15 @@ def find_optimal_strategy(
     Returns:
         (best_strategy_name, best_result, all_results)
     """
-    strategies = {
-        "none": (False, False),
-        "decrease": (True, False),
-        "destroy": (False, True),
-        "both": (True, True),
-    }
-
     # Calculate rebuild cost (cost to go from star 12 to start_stage)
     # This is needed because destruction resets to star 12
-    rebuild_cost = 0.0
-    if start_stage > DESTRUCTION_RESET_STAR:
-        _, C_to, _ = get_optimal_strategy_table()
-        rebuild_cost = C_to.get(start_stage, 0)
+    rebuild_cost = optimal_rebuild_cost(start_stage)
 
     all_results = {}
     best_strat = "none"
     best_cost = float('inf')
 
-    for name, (use_dec, use_dest) in strategies.items():
+    for name, (use_dec, use_dest) in PROTECTION_STRATEGIES.items():
         result = calculate_total_cost_markov(start_stage, target_stage, use_dec, use_dest, rebuild_cost)
         all_results[name] = result
 
@@ -497,6 +667,314 @@ def find_optimal_strategy(
 
     return best_strat, all_results[best_strat], all_results
 
+# =============================================================================
+# COST DISTRIBUTION
+# =============================================================================
+# Expected cost alone hides the tail: for budgeting we need P(cost <= budget),
+# percentiles and the chance of a destruction. Both tools below run on the
+# restart chain (destruction pays the fee and rebuilds from ★12), so their
+# means agree with find_optimal_per_stage_strategy's total_cost.
+
+# Cost lattice resolution: the expected cost lands around this many bins
+COST_DISTRIBUTION_RESOLUTION = 1000
+
+
+def _resolve_strategy_vector(
+    start_stage: int,
+    target_stage: int,
+    stage_strategies: Optional[Dict[int, str]] = None,
+) -> Tuple[Tuple[bool, bool], ...]:
+    """Restart-chain strategy vector: given names where provided, optimal policy elsewhere."""
+    optimal, _ = solve_optimal_protection_policy(start_stage, target_stage)
+    names = dict(optimal)
+    names.update(stage_strategies or {})
+    base = _chain_base(start_stage, True)
+    return tuple(
+        PROTECTION_STRATEGIES[names.get(stage, 'none')]
+        for stage in range(base, target_stage)
+    )
+
+
+def _lattice_pmf(
+    chain: _ChainOutcomes,
+    rewards: np.ndarray,
+    quantum: float,
+    start_index: int,
+    tol: float,
+    max_bins: int,
+) -> Tuple[np.ndarray, float]:
+    """
+    Distribution of the total reward accumulated until the target is reached.
+
+    Rewards (per state and outcome) are placed on a lattice of width `quantum`,
+    split between the two neighbouring lattice points so the mean is exact.
+    Mass is pushed through the transient chain bin by bin; zero-shift
+    transitions are closed within a bin with (I - M_0)^-1.
+
+    Returns:
+        (pmf, truncated_mass): pmf[b] = P(total ≈ b * quantum), and the
+        transient mass left when max_bins was hit.
+    """
+    n = len(chain.meso)
+    shift = rewards / quantum
+    lo = np.floor(shift).astype(int)
+    frac = shift - lo
+    K = int(lo.max()) + 2
+
+    M = np.zeros((K, n, n))
+    R = np.zeros((K, n))
+    rows = np.repeat(np.arange(n)[:, None], 4, axis=1)
+    for k_offset, weight in ((0, 1.0 - frac), (1, frac)):
+        mass = chain.probs * weight
+        k = lo + k_offset
+        moving = (chain.targets >= 0) & (mass > 0)
+        np.add.at(M, (k[moving], rows[moving], chain.targets[moving]), mass[moving])
+        done = (chain.targets == _REACHED_TARGET) & (mass > 0)
+        np.add.at(R, (k[done], rows[done]), mass[done])
+
+    settle = np.linalg.inv(np.eye(n) - M[0])
+    forward = M[1:].transpose(1, 0, 2).reshape(n, (K - 1) * n)
+    finish = R.T
+
+    pending = np.zeros((K, n))
+    pending[0, start_index] = 1.0
+    finished = np.zeros(K)
+    ahead = np.arange(1, K)
+    pmf: List[float] = []
+    for b in range(max_bins):
+        slot = b % K
+        settled = pending[slot] @ settle
+        pending[slot] = 0.0
+        pending[(b + ahead) % K] += (settled @ forward).reshape(K - 1, n)
+        finished[(b + np.arange(K)) % K] += settled @ finish
+        pmf.append(finished[slot])
+        finished[slot] = 0.0
+        if pending.sum() < tol:
+            break
+    truncated = float(pending.sum())
+    # Flush success mass already committed to later bins
+    for b in range(len(pmf), len(pmf) + K - 1):
+        pmf.append(finished[b % K])
+        finished[b % K] = 0.0
+    return np.array(pmf), truncated
+
+
+@dataclass
+class StarforceCostDistribution:
+    """Distribution of the total spend (and attempts) from start to target."""
+    start_stage: int
+    target_stage: int
+    expected_cost: float
+    expected_attempts: float
+    cost_quantum: float          # cost_pmf[b] is P(cost ≈ b * cost_quantum)
+    cost_pmf: np.ndarray
+    attempts_quantum: float      # attempts_pmf[b] is P(attempts ≈ b * attempts_quantum)
+    attempts_pmf: np.ndarray
+    destroy_probability: float   # P(at least one destruction)
+    expected_destructions: float
+    truncated_mass: float        # probability mass beyond the computed tail
+
+    def probability_within(self, budget: float) -> float:
+        """P(total cost <= budget)."""
+        b = int(math.floor(budget / self.cost_quantum + 1e-9))
+        if b < 0:
+            return 0.0
+        return float(min(1.0, self.cost_pmf[:b + 1].sum()))
+
+    def cost_percentile(self, pct: float) -> float:
+        """Smallest cost c with P(cost <= c) >= pct/100."""
+        return _lattice_percentile(self.cost_pmf, self.cost_quantum, pct)
+
+    def attempts_percentile(self, pct: float) -> float:
+        """Smallest attempt count n with P(attempts <= n) >= pct/100."""
+        return _lattice_percentile(self.attempts_pmf, self.attempts_quantum, pct)
+
+
+def _lattice_percentile(pmf: np.ndarray, quantum: float, pct: float) -> float:
+    cdf = np.cumsum(pmf)
+    b = int(np.searchsorted(cdf, pct / 100.0 - 1e-12))
+    return float(min(b, len(pmf) - 1) * quantum)
+
+
+def calculate_cost_distribution(
+    start_stage: int,
+    target_stage: int,
+    stage_strategies: Optional[Dict[int, str]] = None,
+    resolution: int = COST_DISTRIBUTION_RESOLUTION,
+    tol: float = 1e-6,
+) -> StarforceCostDistribution:
+    """
+    Cost and attempt distribution of going from start_stage to target_stage.
+
+    Transient-matrix (phase-type) analysis of the restart chain: the number
+    of attempts and the accumulated diamonds are pushed through the chain
+    on a lattice until less than `tol` probability is still in flight.
+
+    Args:
+        start_stage: Starting star level
+        target_stage: Target star level
+        stage_strategies: stage -> strategy name; stages not given (including
+            the ★12 rebuild stages) use the optimal policy
+        resolution: Lattice bins per expected cost / expected attempts
+        tol: Stop once this much probability has not yet reached the target
+    """
+    if target_stage <= start_stage:
+        return StarforceCostDistribution(
+            start_stage, target_stage, 0.0, 0.0, 1.0, np.array([1.0]), 1.0,
+            np.array([1.0]), 0.0, 0.0, 0.0,
+        )
+    strategy = _resolve_strategy_vector(start_stage, target_stage, stage_strategies)
+    return _cost_distribution(start_stage, target_stage, strategy, resolution, tol)
+
+
+@lru_cache(maxsize=256)
+def _cost_distribution(
+    start_stage: int,
+    target_stage: int,
+    strategy: Tuple[Tuple[bool, bool], ...],
+    resolution: int,
+    tol: float,
+) -> StarforceCostDistribution:
+    """Memoised body of calculate_cost_distribution (arrays are read-only)."""
+    chain = _chain_outcomes(start_stage, target_stage, strategy, True)
+    start_index = chain.index(start_stage)
+    Q, cost, _ = _assemble_chain(start_stage, target_stage, strategy, True)
+    visits = np.linalg.solve((np.eye(len(cost)) - Q).T, np.eye(len(cost))[start_index])
+
+    expected_cost = float(visits @ cost)
+    expected_attempts = float(visits.sum())
+    expected_destructions = float(visits @ chain.probs[:, _OUTCOME_DESTROY])
+
+    cost_rewards = chain.attempt_cost[:, None] + np.where(
+        np.arange(4) == _OUTCOME_DESTROY, DESTRUCTION_FEE_DIAMONDS, 0.0,
+    )
+    max_bins = 200 * resolution
+    cost_quantum = max(1.0, expected_cost / resolution)
+    cost_pmf, cost_truncated = _lattice_pmf(
+        chain, cost_rewards, cost_quantum, start_index, tol, max_bins,
+    )
+    attempts_quantum = max(1.0, expected_attempts / resolution)
+    attempts_pmf, attempts_truncated = _lattice_pmf(
+        chain, np.ones_like(cost_rewards), attempts_quantum, start_index, tol, max_bins,
+    )
+
+    # First run is the plain (no restart) chain from start_stage
+    run_strategy = strategy[start_stage - chain.base:]
+    _, P_s = _solve_chain(start_stage, target_stage, run_strategy)
+    cost_pmf.setflags(write=False)
+    attempts_pmf.setflags(write=False)
+
+    return StarforceCostDistribution(
+        start_stage=start_stage,
+        target_stage=target_stage,
+        expected_cost=expected_cost,
+        expected_attempts=expected_attempts,
+        cost_quantum=cost_quantum,
+        cost_pmf=cost_pmf,
+        attempts_quantum=attempts_quantum,
+        attempts_pmf=attempts_pmf,
+        destroy_probability=float(1.0 - P_s[0]),
+        expected_destructions=expected_destructions,
+        truncated_mass=max(cost_truncated, attempts_truncated),
+    )
+
+
+@dataclass
+class SimulatedCostDistribution:
+    """Per-run results of simulate_cost_distribution."""
+    meso: np.ndarray
+    scrolls: np.ndarray
+    attempts: np.ndarray
+    destructions: np.ndarray
+
+    @property
+    def diamonds(self) -> np.ndarray:
+        return calculate_diamond_cost(
+            self.meso + self.destructions * DESTRUCTION_FEE_MESO, self.scrolls,
+        )
+
+    @property
+    def expected_cost(self) -> float:
+        return float(self.diamonds.mean())
+
+    @property
+    def destroy_probability(self) -> float:
+        return float((self.destructions > 0).mean())
+
+    def probability_within(self, budget: float) -> float:
+        return float((self.diamonds <= budget).mean())
+
+    def cost_percentile(self, pct: float) -> float:
+        return float(np.percentile(self.diamonds, pct))
+
+    def attempts_percentile(self, pct: float) -> float:
+        return float(np.percentile(self.attempts, pct))
+
+
+def simulate_cost_distribution(
+    start_stage: int,
+    target_stage: int,
+    stage_strategies: Optional[Dict[int, str]] = None,
+    runs: int = 100_000,
+    seed: Optional[int] = None,
+) -> SimulatedCostDistribution:
+    """
+    Vectorised Monte Carlo of the restart chain, all runs in parallel.
+
+    Every step advances each unfinished run by one non-maintain outcome:
+    the run of maintains at pity 0 is drawn at once from a geometric
+    distribution, so the loop length tracks decreases/successes rather than
+    raw attempts. Costs use the same per-attempt meso/scrolls as the Markov
+    chain; each destruction adds the meso fee.
+
+    Args:
+        start_stage: Starting star level
+        target_stage: Target star level
+        stage_strategies: stage -> strategy name (optimal policy where omitted)
+        runs: Number of parallel runs (10^6 is practical below ★23)
+        seed: Optional RNG seed
+    """
+    rng = np.random.default_rng(seed)
+    zeros = np.zeros(runs)
+    if target_stage <= start_stage:
+        return SimulatedCostDistribution(zeros, zeros.copy(), zeros.astype(np.int64), zeros.astype(np.int64))
+
+    strategy = _resolve_strategy_vector(start_stage, target_stage, stage_strategies)
+    chain = _chain_outcomes(start_stage, target_stage, strategy, True)
+    n = len(chain.meso)
+
+    # Split out the maintain self-loop, renormalise the remaining outcomes
+    self_loop = np.where(
+        chain.targets[:, _OUTCOME_MAINTAIN] == np.arange(n),
+        chain.probs[:, _OUTCOME_MAINTAIN], 0.0,
+    )
+    leave = chain.probs.copy()
+    leave[self_loop > 0, _OUTCOME_MAINTAIN] = 0.0
+    cum_leave = np.cumsum(leave, axis=1) / leave.sum(axis=1, keepdims=True)
+
+    meso = np.zeros(runs)
+    scrolls = np.zeros(runs)
+    attempts = np.zeros(runs, dtype=np.int64)
+    destructions = np.zeros(runs, dtype=np.int64)
+    active = np.arange(runs)
+    state = np.full(runs, chain.index(start_stage))
+
+    while active.size:
+        tries = rng.geometric(1.0 - self_loop[state])
+        meso[active] += tries * chain.meso[state]
+        scrolls[active] += tries * chain.scrolls[state]
+        attempts[active] += tries
+
+        u = rng.random(active.size)[:, None]
+        outcome = np.minimum((u > cum_leave[state]).sum(axis=1), 3)
+        destructions[active] += outcome == _OUTCOME_DESTROY
+        state = chain.targets[state, outcome]
+
+        still = state >= 0
+        active, state = active[still], state[still]
+
+    return SimulatedCostDistribution(meso, scrolls, attempts, destructions)
+
 
 # =============================================================================
 # OUTPUT AND DISPLAY
@@ -548,7 +1026,7 @@ def print_stage_breakdown(start_stage: int, target_stage: int, strategy_name: st
 
         d = 0 if use_dec else data.decrease_rate
         # Destruction protection not available for last 3 stages (22, 23, 24)
-        can_use_destroy_prot = use_dest and stage not in {22, 23, 24}
+        can_use_destroy_prot = use_dest and stage not in NO_DESTROY_PROT_STAGES
         x = data.destroy_rate * (0.5 if can_use_destroy_prot else 1.0)
 
         print(f"{stage}->{stage+1:<5} {data.success_rate*100:<9.1f} {d*100:<9.0f} {x*100:<9.1f} "
@@ -695,7 +1173,7 @@ def simulate_to_target(
                 break
 
             # Destruction protection not available for last 3 stages (22, 23, 24)
-            can_use_destroy_prot = use_destroy_prot and current not in {22, 23, 24}
+            can_use_destroy_prot = use_destroy_prot and current not in NO_DESTROY_PROT_STAGES
 
             p = 1.0 if pity >= 2 else data.success_rate
             d = 0.0 if (use_decrease_prot or pity >= 2) else data.decrease_rate
@@ -1,9 +1,19 @@
 ﻿# upgrade_optimizer.py - Budget-Constrained Upgrade Path Optimizer
 
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple, Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterator, List, Optional, Sequence, Tuple
 from enum import Enum
+import atexit
 import copy
+import functools
+import math
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
 
 # Cube analysis imports for enhanced recommendations
 from game.cubes import (
@@ -32,6 +42,8 @@ from game.artifacts import (
 # Starforce imports - use accurate Markov chain calculations
 from optimizers.starforce_optimizer import (
     find_optimal_per_stage_strategy,
+    calculate_cost_distribution,
+    DESTRUCTION_RESET_STAR,
     MESO_TO_DIAMOND as SF_MESO_TO_DIAMOND,
     SCROLL_DIAMOND_COST as SF_SCROLL_COST,
     DESTRUCTION_FEE_DIAMONDS as SF_DESTRUCTION_FEE
@@ -42,8 +54,9 @@ from game.hero_power import (
     HeroPowerConfig, HeroPowerLine, HeroPowerTier, HeroPowerStatType,
     HeroPowerLevelConfig, score_hero_power_line, get_line_score_category,
     score_hero_power_line_for_mode, score_config_for_mode,
-    calculate_line_dps_value, calculate_config_total_dps,
+    calculate_line_dps_value, calculate_config_total_dps, _stats_fingerprint,
     rank_all_possible_lines_by_dps, format_line_ranking_for_display,
+    get_line_value_table, HeroPowerLineValueTable,
     STAT_DPS_WEIGHTS, STAT_DISPLAY_NAMES as HP_STAT_DISPLAY_NAMES,
     MODE_STAT_ADJUSTMENTS, STAT_TO_STATS_KEY,
     # Efficiency-based optimization functions
@@ -90,6 +103,12 @@ class UpgradeOption:
     # Current state info
     current_state: str = ""             # e.g., "★15 → ★17" or "Legendary → Mystic"
 
+    # Additive changes this upgrade makes to the get_stats() dict, when known.
+    # get_optimal_path scores such options against its working stats;
+    # fixed_gain_pct is the estimated part of the gain they do not cover.
+    stat_changes: Dict[str, float] = field(default_factory=dict)
+    fixed_gain_pct: float = 0.0
+
     def __post_init__(self):
         if self.cost_diamonds > 0:
             self.efficiency = self.expected_dps_gain_pct / (self.cost_diamonds / 1000)
@@ -104,6 +123,8 @@ class UpgradePath:
     total_cost: float
     total_dps_gain: float
     budget: float
+    # Compounded DPS gain (%) after each step of `upgrades`
+    cumulative_dps_gain: List[float] = field(default_factory=list)
 
     @property
     def remaining_budget(self) -> float:
@@ -145,6 +166,32 @@ DESTRUCTION_FEE = 4000       # 1M meso = 4000 diamonds
 # Medals are earned through gameplay, estimate ~10 diamonds per medal equivalent
 MEDAL_TO_DIAMOND = 10
 
+# Artifact effect stat -> (stats dict key, scale), as maple_app maps them
+# into its damage stats. Effects outside this table (hex stacks, conditional
+# final damage, def pen) have no additive stats key.
+ARTIFACT_STAT_KEYS = {
+    "damage": ("damage_percent", 100),
+    "boss_damage": ("boss_damage", 100),
+    "crit_damage": ("crit_damage", 100),
+    "attack_flat": ("attack_flat", 1),
+}
+
+
+def _artifact_stat_changes(definition, active_gain: float, inventory_gain: float) -> Dict[str, float]:
+    """
+    stat_changes for an artifact's active + inventory effect gains, or {}
+    when either gain is in a stat without an additive stats key.
+    """
+    changes: Dict[str, float] = {}
+    for stat, gain in ((definition.active_stat, active_gain), (definition.inventory_stat, inventory_gain)):
+        if not gain:
+            continue
+        if stat not in ARTIFACT_STAT_KEYS:
+            return {}
+        key, scale = ARTIFACT_STAT_KEYS[stat]
+        changes[key] = changes.get(key, 0.0) + gain * scale
+    return changes
+
 
 # =============================================================================
 # CUBE TIER-UP CALCULATIONS
@@ -223,14 +270,6 @@ STARFORCE_DATA = {
     24: (0.04, 0.10, 620000),
 }
 
-# Sub-stat amplification by star level
-STARFORCE_SUB_AMPLIFY = {
-    0: 0, 5: 0, 10: 0.10, 12: 0.15, 13: 0.20, 14: 0.25,
-    15: 0.35, 16: 0.45, 17: 0.55, 18: 0.70, 19: 0.85, 20: 1.00,
-    21: 1.10, 22: 1.35, 23: 1.65, 24: 2.00, 25: 2.50
-}
-
-
 def calculate_starforce_cost(current_stars: int, target_stars: int,
                             use_protection: bool = True) -> Tuple[float, str]:
     """
@@ -283,33 +322,216 @@ def calculate_starforce_cost(current_stars: int, target_stars: int,
     return total_cost, protection_strategy
 
 
-def calculate_starforce_dps_gain(current_stars: int, target_stars: int,
-                                 current_sub_stats_pct: float) -> float:
+# =============================================================================
+# STARFORCE BUDGET PLANNER
+# =============================================================================
+# Starforce gains are measured, not estimated: every (slot, target star)
+# override is rebuilt into a stats dict and scored with the caller's DPS
+# function. Costs come from the restart chain in starforce_optimizer, so a
+# destruction (reset to DESTRUCTION_RESET_STAR) and the climb back are
+# already part of every segment's price.
+
+STARFORCE_MAX_STARS = 25
+
+# Lattice bins per expected cost when combining the plan's spend distribution
+STARFORCE_PLAN_RESOLUTION = 200
+
+
+def evaluate_starforce_dps_gains(
+    current_stars: Dict[str, int],
+    stats_for_stars: Callable[[Dict[str, int]], Dict],
+    dps_gain_func: Callable[[Dict], float],
+    max_stars_ahead: Optional[int] = None,
+    min_stars: int = DESTRUCTION_RESET_STAR,
+) -> Dict[str, Dict[int, float]]:
     """
-    Estimate DPS gain from starforce upgrade based on sub-stat amplification.
-    current_sub_stats_pct: total % stats from potentials (damage%, boss%, etc.)
+    Real DPS gain of raising each slot to each higher star level.
+
+    The whole batch of overrides is turned into stats first, then the DPS
+    function runs once per distinct stats dict (slots whose stars move no
+    stat share one evaluation).
+
+    Args:
+        current_stars: slot -> current stars; slots below min_stars or already
+            at STARFORCE_MAX_STARS are skipped
+        stats_for_stars: star overrides (slot -> stars) -> full stats dict
+        dps_gain_func: stats dict -> DPS gain % over the current build
+        max_stars_ahead: only evaluate up to this many stars past current
+        min_stars: lowest current star level to plan from
+
+    Returns:
+        slot -> {target_stars: dps_gain_pct}
     """
-    if current_stars >= target_stars:
-        return 0
+    candidates = []
+    for slot, stars in current_stars.items():
+        if stars < min_stars or stars >= STARFORCE_MAX_STARS:
+            continue
+        top = STARFORCE_MAX_STARS
+        if max_stars_ahead is not None:
+            top = min(top, stars + max_stars_ahead)
+        candidates.extend((slot, target) for target in range(stars + 1, top + 1))
+
+    stats_batch = [stats_for_stars({slot: target}) for slot, target in candidates]
+
+    gains: Dict[str, Dict[int, float]] = {}
+    evaluated: Dict = {}
+    for (slot, target), stats in zip(candidates, stats_batch):
+        key = _stats_key(stats)
+        if key is None:
+            gain = dps_gain_func(stats)
+        elif key in evaluated:
+            gain = evaluated[key]
+        else:
+            gain = evaluated[key] = dps_gain_func(stats)
+        gains.setdefault(slot, {})[target] = gain
+    return gains
 
-    current_amp = STARFORCE_SUB_AMPLIFY.get(current_stars, 0)
-    target_amp = STARFORCE_SUB_AMPLIFY.get(target_stars, current_amp)
 
-    # Sub stats are multiplied by (1 + amp)
-    # DPS scales roughly linearly with these stats
-    current_mult = 1 + current_amp
-    target_mult = 1 + target_amp
+def _stats_key(stats: Dict) -> Optional[Tuple]:
+    """Hashable identity for a stats dict, or None if it holds unhashable values."""
+    key = _stats_fingerprint(stats)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
 
-    # Estimate: if you have X% sub stats, going from 1.5x to 2.0x amp
-    # gives you roughly (X * 0.5) / (100 + X * 1.5) additional DPS %
-    # Simplified: assume sub stats contribute ~50% of DPS multiplier
 
-    if current_mult > 0:
-        dps_gain = ((target_mult / current_mult) - 1) * 100 * 0.3  # 30% scaling factor
-    else:
-        dps_gain = (target_mult - 1) * 100 * 0.3
+@dataclass
+class StarforcePlanStep:
+    """One segment of a starforce plan: take `slot` from start to target stars."""
+    slot: str
+    start_stars: int
+    target_stars: int
+    expected_cost: float                # Diamonds, rebuilds after destruction included
+    dps_gain_pct: float                 # Gain over the slot's previous stars
+    destroy_probability: float          # P(at least one destruction on the way)
+    stage_strategies: Dict[int, str]    # stage -> protection strategy name
+
+    @property
+    def efficiency(self) -> float:
+        return self.dps_gain_pct / (self.expected_cost / 1000) if self.expected_cost > 0 else 0
 
-    return dps_gain
+
+@dataclass
+class StarforcePlan:
+    """Cross-item starforce spending plan for a diamond budget."""
+    budget: float
+    steps: List[StarforcePlanStep]
+    final_stars: Dict[str, int]
+    expected_cost: float
+    dps_gain_pct: float                 # Sum of the steps' single-slot gains
+    cost_quantum: float                 # cost_pmf[b] is P(plan cost ≈ b * cost_quantum)
+    cost_pmf: np.ndarray
+
+    def probability_within(self, budget: Optional[float] = None) -> float:
+        """P(the whole plan costs <= budget); defaults to the plan's budget."""
+        budget = self.budget if budget is None else budget
+        b = int(math.floor(budget / self.cost_quantum + 1e-9))
+        if b < 0:
+            return 0.0
+        return float(min(1.0, self.cost_pmf[:b + 1].sum()))
+
+    def cost_percentile(self, pct: float) -> float:
+        """Smallest cost c with P(plan cost <= c) >= pct/100."""
+        cdf = np.cumsum(self.cost_pmf)
+        b = int(np.searchsorted(cdf, pct / 100.0 - 1e-12))
+        return float(min(b, len(self.cost_pmf) - 1) * self.cost_quantum)
+
+
+def plan_starforce_budget(
+    current_stars: Dict[str, int],
+    dps_gains: Dict[str, Dict[int, float]],
+    budget: float,
+    resolution: int = STARFORCE_PLAN_RESOLUTION,
+) -> StarforcePlan:
+    """
+    Spend a diamond budget on starforce across all items.
+
+    Greedy by DPS gain per diamond over segments (slot, stars -> any higher
+    star), so a dead star that only pays off one level later is still
+    reachable. After a segment is taken its slot continues from the new
+    stars. Segment costs are the optimal-protection restart-chain costs,
+    which price in destruction back to ★12 and the rebuild.
+
+    Args:
+        current_stars: slot -> current stars
+        dps_gains: slot -> {target_stars: gain %} (see evaluate_starforce_dps_gains)
+        budget: Diamonds available; expected plan cost stays within it
+        resolution: Lattice bins per expected cost for the spend distribution
+    """
+    stars = {slot: current_stars[slot] for slot in dps_gains if slot in current_stars}
+    remaining = budget
+    steps: List[StarforcePlanStep] = []
+
+    while True:
+        best = None
+        best_efficiency = 0.0
+        for slot, start in stars.items():
+            gains = dps_gains[slot]
+            start_gain = gains.get(start, 0.0)
+            for target in range(start + 1, max(gains, default=start) + 1):
+                stage_strategies, result = find_optimal_per_stage_strategy(start, target)
+                cost = result.total_cost
+                if cost > remaining:
+                    break  # Longer segments only cost more
+                gain = gains.get(target, start_gain) - start_gain
+                if gain <= 0:
+                    continue
+                efficiency = gain / cost
+                if efficiency > best_efficiency:
+                    best_efficiency = efficiency
+                    best = StarforcePlanStep(
+                        slot=slot, start_stars=start, target_stars=target,
+                        expected_cost=cost, dps_gain_pct=gain,
+                        destroy_probability=result.destroy_probability,
+                        stage_strategies=stage_strategies,
+                    )
+        if best is None:
+            break
+        steps.append(best)
+        stars[best.slot] = best.target_stars
+        remaining -= best.expected_cost
+
+    expected_cost = sum(step.expected_cost for step in steps)
+    cost_quantum, cost_pmf = _combine_step_distributions(steps, expected_cost, resolution)
+    return StarforcePlan(
+        budget=budget,
+        steps=steps,
+        final_stars=stars,
+        expected_cost=expected_cost,
+        dps_gain_pct=sum(step.dps_gain_pct for step in steps),
+        cost_quantum=cost_quantum,
+        cost_pmf=cost_pmf,
+    )
+
+
+def _combine_step_distributions(
+    steps: List[StarforcePlanStep],
+    expected_cost: float,
+    resolution: int,
+) -> Tuple[float, np.ndarray]:
+    """Spend distribution of the whole plan: convolution of the steps' lattices."""
+    if not steps:
+        return 1.0, np.array([1.0])
+    distributions = [
+        calculate_cost_distribution(
+            step.start_stars, step.target_stars, step.stage_strategies, resolution=resolution,
+        )
+        for step in steps
+    ]
+    quantum = max([expected_cost / resolution] + [d.cost_quantum for d in distributions])
+    pmf = np.array([1.0])
+    for dist in distributions:
+        # Re-bin onto the common lattice, splitting mass so the mean is kept
+        shift = np.arange(len(dist.cost_pmf)) * (dist.cost_quantum / quantum)
+        lo = np.floor(shift).astype(int)
+        frac = shift - lo
+        rebinned = np.zeros(lo[-1] + 2)
+        np.add.at(rebinned, lo, dist.cost_pmf * (1.0 - frac))
+        np.add.at(rebinned, lo + 1, dist.cost_pmf * frac)
+        pmf = np.convolve(pmf, rebinned)
+    return quantum, pmf
 
 
 # =============================================================================
@@ -340,6 +562,238 @@ def calculate_hero_power_upgrade_cost(target_improvement_pct: float,
     return diamonds_equivalent
 
 
+# =============================================================================
+# CONCURRENT ANALYSIS
+# =============================================================================
+# The optimizer's analysers only read the baseline (stats, DPS callbacks), so
+# they run side by side on a worker pool. Events stream back in completion
+# order so callers can render partial rankings while the slowest analyser is
+# still running.
+#
+# The analysers are pure Python and hold the GIL, so threads only overlap
+# their waiting, not their work. Picklable tasks (module-level functions over
+# plain data, see optimizers.account_analysis) go to analysis_pool()'s worker
+# processes instead; closures over live callbacks stay on threads.
+
+@dataclass
+class AnalysisEvent:
+    """Emitted once per analyser as it finishes."""
+    name: str
+    result: Any
+    completed: int                      # analysers finished so far (incl. this one)
+    total: int
+    elapsed: float                      # seconds since dispatch
+    error: Optional[BaseException] = None
+
+    @property
+    def done(self) -> bool:
+        return self.completed == self.total
+
+
+_analysis_pool: Optional[ProcessPoolExecutor] = None
+_analysis_pool_lock = threading.Lock()
+
+
+def _warm_analysis_worker() -> None:
+    """Worker initializer: import the analysers and the engine they score with."""
+    import optimizers.account_analysis  # noqa: F401
+
+
+def create_analysis_pool(workers: int) -> ProcessPoolExecutor:
+    """A process pool of `workers` processes that have imported the analysers."""
+    # spawn: same behaviour on every platform, and no fork of a process running threads
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_warm_analysis_worker,
+    )
+
+
+def analysis_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Shared process pool for picklable analysis tasks, started on first use
+    with one worker per core. None on a single core, where worker processes
+    add pickling and start-up cost without any parallelism — callers fall
+    back to run_analyses' thread pool.
+    """
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is None:
+            workers = os.cpu_count() or 1
+            if workers < 2:
+                return None
+            _analysis_pool = create_analysis_pool(workers)
+            atexit.register(_analysis_pool.shutdown, wait=False, cancel_futures=True)
+        return _analysis_pool
+
+
+def run_analyses(
+    tasks: Sequence[Tuple[str, Callable[[], Any]]],
+    max_workers: Optional[int] = None,
+    initializer: Optional[Callable[[], None]] = None,
+    executor: Optional[Executor] = None,
+) -> Iterator[AnalysisEvent]:
+    """
+    Run independent (name, fn) analysers concurrently and yield an
+    AnalysisEvent for each as it completes.
+
+    Analysers must not mutate shared state — give mutating ones private
+    copies. A failing analyser yields an event with `error` set and result
+    None; the rest keep running. Closing the iterator early cancels
+    analysers that have not started.
+
+    `executor` runs the tasks on a caller-owned pool (e.g. analysis_pool(),
+    which needs picklable tasks) and is left running afterwards. Without
+    one, the tasks run on a private thread pool of `max_workers` threads,
+    calling `initializer` once per thread.
+    """
+    total = len(tasks)
+    if total == 0:
+        return
+    start = time.perf_counter()
+    pool = executor or ThreadPoolExecutor(max_workers=max_workers or total, initializer=initializer)
+    futures = {pool.submit(fn): name for name, fn in tasks}
+    try:
+        for completed, future in enumerate(as_completed(futures), 1):
+            error = future.exception()
+            yield AnalysisEvent(
+                name=futures[future],
+                result=None if error is not None else future.result(),
+                completed=completed,
+                total=total,
+                elapsed=time.perf_counter() - start,
+                error=error,
+            )
+    finally:
+        if executor is None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        else:
+            for future in futures:
+                future.cancel()
+
+
+# =============================================================================
+# INCREMENTAL RE-ANALYSIS
+# =============================================================================
+# An account edit (one cubed item, one artifact star) usually touches one stat
+# source. Each analysis unit records the fingerprints of the sources it read,
+# so the next refresh re-runs only the units whose inputs moved, plus those
+# ranked against the baseline DPS when the baseline itself moved.
+
+@dataclass
+class AnalysisUnit:
+    """One independently re-runnable piece of an optimizer run."""
+    name: str
+    run: Callable[[], Any]
+    reads: FrozenSet[str] = frozenset()  # stat sources the result depends on
+    uses_baseline: bool = False          # ranked against the baseline DPS
+    # Re-scores the last result against a moved baseline, run instead of
+    # `run` when only the baseline changed
+    rerank: Optional[Callable[[Any], Any]] = None
+
+
+@dataclass
+class _UnitRecord:
+    result: Any
+    inputs: Dict[str, Optional[str]]     # source -> fingerprint when it ran
+    baseline: Optional[Hashable]
+
+
+class IncrementalAnalysis:
+    """
+    Last results of an optimizer run with the dependency map from each unit
+    to the stat sources it read.
+
+    `fingerprints` maps source name -> digest of that source's current state
+    (a source missing from the map counts as changed); `baseline` is any
+    hashable key of the baseline build, e.g. a stats digest.
+    """
+
+    def __init__(self):
+        self._records: Dict[str, _UnitRecord] = {}
+
+    @property
+    def results(self) -> Dict[str, Any]:
+        """Latest result of every unit that has completed, by unit name."""
+        return {name: record.result for name, record in self._records.items()}
+
+    def clear(self) -> None:
+        self._records.clear()
+
+    def _plan(
+        self,
+        units: Sequence[AnalysisUnit],
+        fingerprints: Dict[str, str],
+        baseline: Optional[Hashable],
+    ) -> List[Tuple[AnalysisUnit, bool]]:
+        """(unit, rerank) for every stale unit; rerank when only the baseline moved."""
+        plan = []
+        for unit in units:
+            record = self._records.get(unit.name)
+            if record is None or any(fingerprints.get(source) != fp for source, fp in record.inputs.items()):
+                plan.append((unit, False))
+            elif unit.uses_baseline and record.baseline != baseline:
+                plan.append((unit, unit.rerank is not None))
+        return plan
+
+    def stale(
+        self,
+        units: Sequence[AnalysisUnit],
+        fingerprints: Dict[str, str],
+        baseline: Optional[Hashable] = None,
+    ) -> List[str]:
+        """Names of the units that must re-run or re-rank, in `units` order."""
+        return [unit.name for unit, _ in self._plan(units, fingerprints, baseline)]
+
+    def reranked(
+        self,
+        units: Sequence[AnalysisUnit],
+        fingerprints: Dict[str, str],
+        baseline: Optional[Hashable] = None,
+    ) -> List[str]:
+        """The stale units that only re-rank their last result (see AnalysisUnit.rerank)."""
+        return [unit.name for unit, rerank in self._plan(units, fingerprints, baseline) if rerank]
+
+    def refresh(
+        self,
+        units: Sequence[AnalysisUnit],
+        fingerprints: Dict[str, str],
+        baseline: Optional[Hashable] = None,
+        max_workers: Optional[int] = None,
+        initializer: Optional[Callable[[], None]] = None,
+        executor: Optional[Executor] = None,
+    ) -> Iterator[AnalysisEvent]:
+        """
+        Re-run the stale units concurrently (see run_analyses), yielding an
+        AnalysisEvent per unit; a unit whose inputs are unchanged but whose
+        baseline moved runs its rerank on its last result instead, when it
+        has one. Units that fail keep no record, so the next refresh retries
+        them; records of units no longer listed are dropped.
+        """
+        by_name = {unit.name: unit for unit in units}
+        for name in list(self._records):
+            if name not in by_name:
+                del self._records[name]
+
+        tasks = [
+            (unit.name, functools.partial(unit.rerank, self._records[unit.name].result) if rerank else unit.run)
+            for unit, rerank in self._plan(units, fingerprints, baseline)
+        ]
+        for event in run_analyses(
+            tasks, max_workers=max_workers, initializer=initializer, executor=executor,
+        ):
+            unit = by_name[event.name]
+            if event.error is None:
+                self._records[unit.name] = _UnitRecord(
+                    result=event.result,
+                    inputs={source: fingerprints.get(source) for source in unit.reads},
+                    baseline=baseline if unit.uses_baseline else None,
+                )
+            else:
+                self._records.pop(unit.name, None)
+            yield event
+
+
 # =============================================================================
 # UPGRADE OPTIMIZER
 # =============================================================================
@@ -362,7 +816,10 @@ class UpgradeOptimizer:
                  hero_power_presets: Optional[Dict[str, HeroPowerConfig]] = None,
                  combat_mode: str = "stage",
                  resonance_level: int = 1,
-                 resonance_max_level: int = 705):
+                 resonance_max_level: int = 705,
+                 get_stats_with_stars_func: Optional[Callable[[Dict[str, int]], Dict]] = None,
+                 evaluation_context=None,
+                 main_stat_flat_key: Optional[str] = None):
         """
         Initialize optimizer with callbacks to main app.
 
@@ -379,6 +836,14 @@ class UpgradeOptimizer:
         combat_mode: Current combat mode ("stage", "boss", or "world_boss")
         resonance_level: Current artifact resonance level
         resonance_max_level: Maximum achievable resonance level (based on artifact stars)
+        get_stats_with_stars_func: Function to get the stats dict with star overrides
+            (slot -> stars) applied; defaults to re-reading get_stats_func with the
+            equipment_items' stars temporarily changed
+        evaluation_context: Shared EvaluationContext (engine.dps_calculator); when
+            given, its score replaces calc_dps_func and each analyser's DPS
+            evaluations are attributed to it by name
+        main_stat_flat_key: Stats dict key of flat main stat (e.g. "dex_flat");
+            when given, resonance options carry their main stat as stat_changes
         """
         self.calc_dps = calc_dps_func
         self.get_stats = get_stats_func
@@ -393,24 +858,134 @@ class UpgradeOptimizer:
         self.combat_mode = combat_mode
         self.resonance_level = resonance_level
         self.resonance_max_level = resonance_max_level
+        self.get_stats_with_stars = get_stats_with_stars_func
+        self.evaluation_context = evaluation_context
+        self.main_stat_flat_key = main_stat_flat_key
+        if evaluation_context is not None:
+            self.calc_dps = evaluation_context.score
 
         self.upgrade_options: List[UpgradeOption] = []
+        # Hero power line value table of the current stats, keyed by their
+        # fingerprint; _run_analyser's shallow copies share the dict and lock
+        self._value_tables: Dict[str, HeroPowerLineValueTable] = {}
+        self._value_table_lock = threading.Lock()
+
+    def _analysers(self) -> List[Tuple[str, str]]:
+        """(name, method) for every analyser analyze_all_upgrades runs, in ranking order."""
+        return [
+            ("cubes", "_analyze_cube_upgrades"),
+            ("starforce", "_analyze_starforce_upgrades"),
+            ("hero_power", "_analyze_hero_power_upgrades"),
+            ("hero_power_presets", "_analyze_hero_power_presets"),  # Multi-preset mode optimization
+            ("hero_power_line_ranking", "_analyze_hero_power_line_ranking"),  # Simple line ranking by DPS
+            ("artifacts", "_analyze_artifact_upgrades"),
+            ("resonance", "_analyze_resonance_upgrades"),  # Artifact resonance leveling
+            # Note: Artifact potential rerolling disabled - needs proper implementation
+            # ("artifact_potentials", "_analyze_artifact_potential_upgrades"),
+            # Note: Hero power potential rerolling disabled for now
+            # ("hero_power_potentials", "_analyze_hero_power_potential_upgrades"),
+        ]
+
+    def _run_analyser(self, method: str, get_stats: Optional[Callable] = None,
+                      name: Optional[str] = None) -> List[UpgradeOption]:
+        """Run one analyser on a shallow copy so workers never share an options list."""
+        worker = copy.copy(self)
+        worker.upgrade_options = []
+        if get_stats is not None:
+            worker.get_stats = get_stats
+        if self.evaluation_context is None or name is None:
+            getattr(worker, method)()
+        else:
+            with self.evaluation_context.analyser(name):
+                getattr(worker, method)()
+        return worker.upgrade_options
+
+    def _hero_power_value_table(self) -> HeroPowerLineValueTable:
+        """
+        The fresh-roll line value table every hero power analyser of a run
+        reads, built on first use from the run's stats and DPS callback (the
+        evaluation context's score when given). get_line_value_table only
+        caches with a context key, which live callbacks cannot supply.
+        """
+        stats = self.get_stats()
+        key = _stats_fingerprint(stats) if stats else ""
+        with self._value_table_lock:
+            table = self._value_tables.get(key)
+            if table is None:
+                table = get_line_value_table(stats, self.calc_dps, self.hero_power_level_config)
+                self._value_tables.clear()
+                self._value_tables[key] = table
+        return table
+
+    def iter_analysis(self, max_workers: Optional[int] = None) -> Iterator[AnalysisEvent]:
+        """
+        Run every analyser concurrently, yielding an AnalysisEvent (result =
+        that analyser's options) as each finishes.
+
+        Workers share one baseline stats snapshot. The analysers are methods
+        over the caller's live callbacks (calc_dps_func, get_stats_func), which
+        do not pickle, so they run on threads rather than analysis_pool().
+        Without a get_stats_with_stars_func, starforce evaluation re-reads stats by
+        temporarily changing equipment_items' stars, so it runs first on the
+        calling thread instead of alongside the others.
+        """
+        baseline_stats = self.get_stats()
+
+        def read_baseline():
+            return baseline_stats
 
-    def analyze_all_upgrades(self) -> List[UpgradeOption]:
-        """Analyze all possible upgrades and return sorted by efficiency."""
-        self.upgrade_options = []
-
-        self._analyze_cube_upgrades()
-        self._analyze_starforce_upgrades()
-        self._analyze_hero_power_upgrades()
-        self._analyze_hero_power_presets()  # Multi-preset mode optimization
-        self._analyze_hero_power_line_ranking()  # Simple line ranking by DPS
-        self._analyze_artifact_upgrades()
-        self._analyze_resonance_upgrades()  # Artifact resonance leveling
-        # Note: Artifact potential rerolling disabled - needs proper implementation
-        # self._analyze_artifact_potential_upgrades()
-        # Note: Hero power potential rerolling disabled for now
-        # self._analyze_hero_power_potential_upgrades()
+        tasks = []
+        serial = []
+        for name, method in self._analysers():
+            if method == "_analyze_starforce_upgrades":
+                task = (name, lambda m=method, n=name: self._run_analyser(m, name=n))
+                (tasks if self.get_stats_with_stars is not None else serial).append(task)
+            else:
+                tasks.append((name, lambda m=method, n=name: self._run_analyser(m, read_baseline, n)))
+
+        total = len(tasks) + len(serial)
+        start = time.perf_counter()
+        for completed, (name, fn) in enumerate(serial, 1):
+            try:
+                result, error = fn(), None
+            except Exception as e:
+                result, error = None, e
+            yield AnalysisEvent(name, result, completed, total, time.perf_counter() - start, error)
+
+        offset = time.perf_counter() - start
+        for event in run_analyses(tasks, max_workers=max_workers):
+            event.completed += len(serial)
+            event.total = total
+            event.elapsed += offset
+            yield event
+
+    def analyze_all_upgrades(
+        self,
+        progress_callback: Optional[Callable[[AnalysisEvent], None]] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[UpgradeOption]:
+        """
+        Analyze all possible upgrades and return sorted by efficiency.
+
+        Analysers run concurrently (see iter_analysis); `progress_callback`
+        receives each AnalysisEvent as it arrives. The first analyser error
+        is re-raised once every analyser has finished.
+        """
+        results: Dict[str, List[UpgradeOption]] = {}
+        first_error: Optional[BaseException] = None
+        for event in self.iter_analysis(max_workers):
+            if event.error is not None:
+                first_error = first_error or event.error
+            results[event.name] = event.result or []
+            if progress_callback is not None:
+                progress_callback(event)
+        if first_error is not None:
+            raise first_error
+
+        # Merge in analyser order so efficiency ties rank as before
+        self.upgrade_options = [
+            option for name, _ in self._analysers() for option in results.get(name, [])
+        ]
 
         # Sort by efficiency (best first)
         self.upgrade_options.sort(key=lambda x: x.efficiency, reverse=True)
@@ -530,14 +1105,44 @@ class UpgradeOptimizer:
             }
         ))
 
+    def _stats_with_star_overrides(self, overrides: Dict[str, int]) -> Dict:
+        """Stats dict with the given slots' stars replaced."""
+        if self.get_stats_with_stars is not None:
+            return self.get_stats_with_stars(overrides)
+        saved = {slot: self.equipment_items[slot].stars for slot in overrides}
+        try:
+            for slot, stars in overrides.items():
+                self.equipment_items[slot].stars = stars
+            return self.get_stats()
+        finally:
+            for slot, stars in saved.items():
+                self.equipment_items[slot].stars = stars
+
+    def _starforce_dps_gain_pct(self, stats: Dict) -> float:
+        if self.current_dps <= 0:
+            return 0.0
+        return (self.calc_dps(stats) / self.current_dps - 1) * 100
+
+    def evaluate_starforce_gains(self, max_stars_ahead: Optional[int] = None) -> Dict[str, Dict[int, float]]:
+        """Real DPS gain (%) of each slot at each higher star level."""
+        return evaluate_starforce_dps_gains(
+            {slot: item.stars for slot, item in self.equipment_items.items()},
+            self._stats_with_star_overrides,
+            self._starforce_dps_gain_pct,
+            max_stars_ahead=max_stars_ahead,
+        )
+
+    def get_starforce_plan(self, budget: float) -> StarforcePlan:
+        """Cross-item starforce spending plan for a diamond budget."""
+        return plan_starforce_budget(
+            {slot: item.stars for slot, item in self.equipment_items.items()},
+            self.evaluate_starforce_gains(),
+            budget,
+        )
+
     def _analyze_starforce_upgrades(self):
         """Analyze starforce upgrade options - only next star for each item."""
-        # Estimate current sub-stats from potentials for DPS gain calc
-        total_sub_stats = 0
-        for equip in self.equipment.values():
-            for line in equip.lines + equip.bonus_lines:
-                if hasattr(line, 'value'):
-                    total_sub_stats += line.value
+        dps_gains = self.evaluate_starforce_gains(max_stars_ahead=1)
 
         # Analyze upgrades for each equipment item based on current stars
         for slot, item in self.equipment_items.items():
@@ -548,58 +1153,71 @@ class UpgradeOptimizer:
                 continue
 
             # Only recommend the NEXT star upgrade (not multiple)
-            target_stars = current_stars + 1
-
-            # Determine risk level based on target star
-            if target_stars <= 15:
-                note = "Safe (no destruction)"
-            elif target_stars <= 17:
-                note = "Low risk"
-            elif target_stars <= 20:
-                note = "Moderate risk"
-            elif target_stars <= 22:
-                note = "High risk"
-            else:
-                note = "Very high risk"
-
-            # Use accurate Markov chain calculation from starforce_optimizer
-            try:
-                stage_strategies, result = find_optimal_per_stage_strategy(
-                    current_stars, target_stars
-                )
-                cost = result.total_cost
+            self.upgrade_options.append(
+                self._starforce_option(slot, current_stars, dps_gains[slot][current_stars + 1])
+            )
 
-                # Build protection strategy string from per-stage strategies
-                strat_summary = set(stage_strategies.values())
-                if len(strat_summary) == 1:
-                    protection = list(strat_summary)[0]
-                else:
-                    protection = "mixed"
+    def _starforce_option(self, slot: str, current_stars: int, dps_gain: float) -> UpgradeOption:
+        """UpgradeOption for taking `slot` from current_stars to the next star."""
+        target_stars = current_stars + 1
+
+        # Determine risk level based on target star
+        if target_stars <= 15:
+            note = "Safe (no destruction)"
+        elif target_stars <= 17:
+            note = "Low risk"
+        elif target_stars <= 20:
+            note = "Moderate risk"
+        elif target_stars <= 22:
+            note = "High risk"
+        else:
+            note = "Very high risk"
 
-                destroy_prob = result.destroy_probability
-            except Exception:
-                # Fallback to simplified calculation if Markov fails
-                cost, protection = calculate_starforce_cost(current_stars, target_stars)
-                destroy_prob = 0
+        # Use accurate Markov chain calculation from starforce_optimizer
+        try:
+            stage_strategies, result = find_optimal_per_stage_strategy(
+                current_stars, target_stars
+            )
+            cost = result.total_cost
 
-            dps_gain = calculate_starforce_dps_gain(current_stars, target_stars, total_sub_stats)
+            # Build protection strategy string from per-stage strategies
+            strat_summary = set(stage_strategies.values())
+            if len(strat_summary) == 1:
+                protection = list(strat_summary)[0]
+            else:
+                protection = "mixed"
 
-            self.upgrade_options.append(UpgradeOption(
-                upgrade_type=UpgradeType.STARFORCE,
-                description=f"{slot.capitalize()} ★{current_stars} → ★{target_stars} ({note})",
-                target=f"{slot}_sf",
-                cost_diamonds=cost,
-                expected_dps_gain_pct=dps_gain,
-                protection_strategy=protection,
-                current_state=f"★{current_stars} → ★{target_stars}",
-                details={
-                    "slot": slot,
-                    "start": current_stars,
-                    "end": target_stars,
-                    "protection": protection,
-                    "destroy_prob": destroy_prob,
-                }
-            ))
+            destroy_prob = result.destroy_probability
+            # Spend distribution for budgeting (coarse lattice is plenty here)
+            distribution = calculate_cost_distribution(
+                current_stars, target_stars, stage_strategies, resolution=200,
+            )
+            cost_percentiles = {
+                f"cost_p{pct}": distribution.cost_percentile(pct) for pct in (50, 90, 99)
+            }
+        except Exception:
+            # Fallback to simplified calculation if Markov fails
+            cost, protection = calculate_starforce_cost(current_stars, target_stars)
+            destroy_prob = 0
+            cost_percentiles = {}
+
+        return UpgradeOption(
+            upgrade_type=UpgradeType.STARFORCE,
+            description=f"{slot.capitalize()} ★{current_stars} → ★{target_stars} ({note})",
+            target=f"{slot}_sf",
+            cost_diamonds=cost,
+            expected_dps_gain_pct=dps_gain,
+            protection_strategy=protection,
+            current_state=f"★{current_stars} → ★{target_stars}",
+            details={
+                "slot": slot,
+                "start": current_stars,
+                "end": target_stars,
+                "protection": protection,
+                "destroy_prob": destroy_prob,
+                **cost_percentiles,
+            }
+        )
 
     def _analyze_hero_power_upgrades(self):
         """
@@ -625,6 +1243,7 @@ class UpgradeOptimizer:
             self.hero_power_level_config,
             self.calc_dps,
             self.get_stats,
+            value_table=self._hero_power_value_table(),
         )
 
         # Calculate total current DPS value
@@ -907,7 +1526,9 @@ class UpgradeOptimizer:
         independent of current presets. Useful when preset analysis is complex.
         """
         # Generate the ranking using DPS callbacks
-        rankings = rank_all_possible_lines_by_dps(self.calc_dps, self.get_stats)
+        rankings = rank_all_possible_lines_by_dps(
+            self.calc_dps, self.get_stats, value_table=self._hero_power_value_table(),
+        )
 
         # Format for display
         ranking_text = format_line_ranking_for_display(rankings, top_n=10)
@@ -1031,7 +1652,8 @@ class UpgradeOptimizer:
                         "artifact": artifact_key,
                         "chests_needed": expected_chests,
                         "tier": tier_label,
-                    }
+                    },
+                    stat_changes=_artifact_stat_changes(definition, active_value_0, inv_value_0),
                 ))
 
             # Option 2: Awaken existing artifact
@@ -1069,10 +1691,12 @@ class UpgradeOptimizer:
                                inv_gain * 100 * inv_dps_mult)
 
                     # Add bonus for potential slot unlocks
+                    unlock_gain = 0.0
                     if target_stars >= 3 and current_stars < 3:
-                        dps_gain += 2.0  # Bonus for 2nd potential slot
+                        unlock_gain += 2.0  # Bonus for 2nd potential slot
                     if target_stars >= 5 and current_stars < 5:
-                        dps_gain += 3.0  # Bonus for 3rd potential (legendary only)
+                        unlock_gain += 3.0  # Bonus for 3rd potential (legendary only)
+                    dps_gain += unlock_gain
 
                     # Cap at reasonable values
                     dps_gain = min(max(dps_gain, 0.5), 10.0)
@@ -1090,7 +1714,9 @@ class UpgradeOptimizer:
                             "chests_needed": result.get("expected_chests", 0),
                             "duplicates": result.get("duplicates_needed", 0),
                             "tier": tier_label,
-                        }
+                        },
+                        stat_changes=_artifact_stat_changes(definition, active_gain, inv_gain),
+                        fixed_gain_pct=unlock_gain,
                     ))
 
     def _analyze_resonance_upgrades(self):
@@ -1102,9 +1728,15 @@ class UpgradeOptimizer:
 
         Evaluates upgrading in batches of 10 levels to find efficient upgrade points.
         """
+        self.upgrade_options.extend(self._resonance_options(self.resonance_level))
+
+    def _resonance_options(self, resonance_level: int) -> List[UpgradeOption]:
+        """Resonance batch options starting from `resonance_level`."""
+        options: List[UpgradeOption] = []
+
         # Skip if already at max level
-        if self.resonance_level >= self.resonance_max_level:
-            return
+        if resonance_level >= self.resonance_max_level:
+            return options
 
         # Cost constants
         ENHANCER_TO_DIAMOND = 1500 / 10000  # 0.15 diamonds per enhancer
@@ -1113,25 +1745,25 @@ class UpgradeOptimizer:
         batch_sizes = [10, 25, 50, 100]
 
         for batch in batch_sizes:
-            target_level = min(self.resonance_level + batch, self.resonance_max_level)
-            actual_levels = target_level - self.resonance_level
+            target_level = min(resonance_level + batch, self.resonance_max_level)
+            actual_levels = target_level - resonance_level
 
             if actual_levels <= 0:
                 continue
 
             # Calculate stat gains
-            current_main = calculate_resonance_main_stat(self.resonance_level)
+            current_main = calculate_resonance_main_stat(resonance_level)
             target_main = calculate_resonance_main_stat(target_level)
             main_stat_gain = target_main - current_main
 
-            current_hp = calculate_resonance_hp(self.resonance_level)
+            current_hp = calculate_resonance_hp(resonance_level)
             target_hp = calculate_resonance_hp(target_level)
             hp_gain = target_hp - current_hp
 
             # Calculate total enhancer cost
             total_enhancers = sum(
                 calculate_resonance_upgrade_cost(lvl)
-                for lvl in range(self.resonance_level, target_level)
+                for lvl in range(resonance_level, target_level)
             )
             diamond_cost = total_enhancers * ENHANCER_TO_DIAMOND
 
@@ -1156,11 +1788,11 @@ class UpgradeOptimizer:
 
             # Format description
             if batch <= 10:
-                desc = f"Resonance +{actual_levels} levels (L{self.resonance_level}→L{target_level})"
+                desc = f"Resonance +{actual_levels} levels (L{resonance_level}→L{target_level})"
             else:
-                desc = f"Resonance +{actual_levels} (L{self.resonance_level}→L{target_level})"
+                desc = f"Resonance +{actual_levels} (L{resonance_level}→L{target_level})"
 
-            self.upgrade_options.append(UpgradeOption(
+            options.append(UpgradeOption(
                 upgrade_type=UpgradeType.ARTIFACT_RESONANCE,
                 description=desc,
                 target=f"resonance_{target_level}",
@@ -1168,16 +1800,21 @@ class UpgradeOptimizer:
                 expected_dps_gain_pct=dps_gain_pct,
                 current_state=f"+{main_stat_gain} Main Stat, +{hp_gain} HP",
                 details={
-                    "current_level": self.resonance_level,
+                    "current_level": resonance_level,
                     "target_level": target_level,
                     "max_level": self.resonance_max_level,
                     "main_stat_gain": main_stat_gain,
                     "hp_gain": hp_gain,
                     "enhancer_cost": total_enhancers,
                     "levels_gained": actual_levels,
-                }
+                },
+                stat_changes=(
+                    {self.main_stat_flat_key: main_stat_gain} if self.main_stat_flat_key else {}
+                ),
             ))
 
+        return options
+
     def _analyze_artifact_potential_upgrades(self):
         """Analyze artifact potential reroll options."""
         if not self.artifact_config:
@@ -1391,42 +2028,122 @@ class UpgradeOptimizer:
             }
         ))
 
+    @staticmethod
+    def _option_group(option: UpgradeOption) -> str:
+        """
+        Options in one group start from the same state (one slot's stars, one
+        artifact's awakening, the resonance level), so only one can be taken.
+        """
+        if option.upgrade_type == UpgradeType.STARFORCE:
+            return f"starforce_{option.details.get('slot', option.target)}"
+        if option.upgrade_type == UpgradeType.ARTIFACT and 'artifact' in option.details:
+            return f"artifact_{option.details['artifact']}"
+        if option.upgrade_type == UpgradeType.ARTIFACT_RESONANCE:
+            return "artifact_resonance"
+        return f"{option.upgrade_type.value}_{option.target}"
+
+    @staticmethod
+    def _with_stat_changes(stats: Dict, changes: Dict[str, float]) -> Dict:
+        """Copy of `stats` with additive `changes` applied."""
+        stats = dict(stats)
+        for key, value in changes.items():
+            stats[key] = stats.get(key, 0) + value
+        return stats
+
+    def _path_dps_func(self) -> Callable[[Dict], float]:
+        """DPS of a planned stats dict: the context's fast evaluator when it has one."""
+        evaluator = self.evaluation_context.fast_evaluator if self.evaluation_context is not None else None
+        return evaluator.evaluate_changed if evaluator is not None else self.calc_dps
+
     def get_optimal_path(self, budget: float) -> UpgradePath:
         """
-        Get the optimal upgrade path within budget.
-        Uses greedy algorithm: always pick highest efficiency option that fits.
+        Get the upgrade path within budget, re-evaluated after every step.
+
+        Greedy by efficiency over a working state - the star overrides and
+        stat_changes of every step taken so far:
+        - Starforce steps and options with stat_changes are scored with real
+          DPS against the working stats. A step that moves the stats
+          re-scores all of them, since a gain can grow as well as shrink
+          (crit damage after crit rate), through the evaluation context's
+          fast evaluator when it has one.
+        - Taking a step queues its successors (the slot's next star, the next
+          resonance batches), so a target can be upgraded several times.
+        - Options with only an estimated gain (cube and hero power rerolls)
+          act as independent multipliers: they compound into total_dps_gain
+          but leave the working stats unchanged.
         """
         if not self.upgrade_options:
             self.analyze_all_upgrades()
 
-        selected = []
-        remaining_budget = budget
-        used_targets = set()  # Track which slots/systems already upgraded
-
-        # Sort by efficiency
-        sorted_options = sorted(self.upgrade_options,
-                               key=lambda x: x.efficiency, reverse=True)
+        dps_of = self._path_dps_func()
+        star_overrides: Dict[str, int] = {}
+        stat_changes: Dict[str, float] = {}
 
-        for option in sorted_options:
-            # Skip if already upgraded this target
-            target_key = f"{option.upgrade_type.value}_{option.target}"
-            if target_key in used_targets:
-                continue
+        def working_stats(overrides: Dict[str, int]) -> Dict:
+            return self._with_stat_changes(self._stats_with_star_overrides(overrides), stat_changes)
 
-            # Check if fits budget
-            if option.cost_diamonds <= remaining_budget:
-                selected.append(option)
-                remaining_budget -= option.cost_diamonds
-                used_targets.add(target_key)
+        working = working_stats(star_overrides)
+        working_dps = dps_of(working)
 
-        total_cost = sum(opt.cost_diamonds for opt in selected)
-        total_gain = sum(opt.expected_dps_gain_pct for opt in selected)
+        def score(option: UpgradeOption) -> UpgradeOption:
+            if option.upgrade_type == UpgradeType.STARFORCE:
+                stats = working_stats({**star_overrides, option.details['slot']: option.details['end']})
+            elif option.stat_changes:
+                stats = self._with_stat_changes(working, option.stat_changes)
+            else:
+                return option
+            growth = dps_of(stats) / working_dps if working_dps > 0 else 1.0
+            gain = (growth * (1 + option.fixed_gain_pct / 100) - 1) * 100
+            return replace(option, expected_dps_gain_pct=gain)
+
+        pending = [score(option) for option in self.upgrade_options]
+        selected: List[UpgradeOption] = []
+        cumulative: List[float] = []
+        remaining_budget = budget
+        growth = 1.0
+
+        while True:
+            affordable = [
+                option for option in pending
+                if option.expected_dps_gain_pct > 0 and option.cost_diamonds <= remaining_budget
+            ]
+            if not affordable:
+                break
+            # max() keeps the first of equally efficient options (analyser order)
+            option = max(affordable, key=lambda o: o.efficiency)
+
+            selected.append(option)
+            remaining_budget -= option.cost_diamonds
+            growth *= 1 + option.expected_dps_gain_pct / 100
+            cumulative.append((growth - 1) * 100)
+
+            # Options in one group start from the same state; only one is taken
+            group = self._option_group(option)
+            pending = [other for other in pending if self._option_group(other) != group]
+
+            successors: List[UpgradeOption] = []
+            if option.upgrade_type == UpgradeType.STARFORCE:
+                slot, stars = option.details['slot'], option.details['end']
+                star_overrides[slot] = stars
+                if stars < 25:
+                    successors.append(self._starforce_option(slot, stars, 0.0))
+            elif option.upgrade_type == UpgradeType.ARTIFACT_RESONANCE:
+                successors.extend(self._resonance_options(option.details['target_level']))
+            for key, value in option.stat_changes.items():
+                stat_changes[key] = stat_changes.get(key, 0) + value
+
+            if option.upgrade_type == UpgradeType.STARFORCE or option.stat_changes:
+                working = working_stats(star_overrides)
+                working_dps = dps_of(working)
+                pending = [score(other) for other in pending]
+            pending.extend(score(successor) for successor in successors)
 
         return UpgradePath(
             upgrades=selected,
-            total_cost=total_cost,
-            total_dps_gain=total_gain,
-            budget=budget
+            total_cost=budget - remaining_budget,
+            total_dps_gain=cumulative[-1] if cumulative else 0.0,
+            budget=budget,
+            cumulative_dps_gain=cumulative,
         )
 
     def get_equipment_summary(self) -> List[EquipmentSummary]:
@@ -12,11 +12,12 @@ Key concepts:
 - Efficiency: DPS% gain per 1000 diamonds spent
 """
 
+import heapq
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
 from game.weapons import (
     get_base_atk, get_level_multiplier, get_inventory_ratio,
-    calculate_level_cost, DIAMONDS_TO_ENHANCERS, BASE_ATK
+    calculate_level_cost, calculate_total_cost, DIAMONDS_TO_ENHANCERS, BASE_ATK
 )
 
 
@@ -165,6 +166,167 @@ class WeaponOptimizerResult:
     best_weapon_key: str     # Which weapon has highest ATK% potential
 
 
+# =============================================================================
+# INCREMENTAL UPGRADE ENGINE
+# =============================================================================
+
+class _WeaponLevelHeap:
+    """
+    Max-heap of each owned weapon's next-level efficiency (effective ATK% per
+    enhancer), kept up to date incrementally.
+
+    Total ATK% divides every weapon's DPS gain by the same factor, so the
+    ranking only depends on effective ATK% per enhancer: buying a level only
+    re-keys the weapon that was levelled, and switching the equipped weapon
+    re-keys the old and new equipped weapons. Outdated heap entries are
+    skipped lazily on peek.
+    """
+
+    def __init__(self, weapons_data: Dict[str, Dict], equipped_key: str):
+        self.equipped_key = equipped_key
+        self.total_atk = calculate_total_weapon_atk_percent(weapons_data, equipped_key)
+        self.start_levels: Dict[str, int] = {}
+        self.levels: Dict[str, int] = {}
+        # key -> (rarity, tier, max_level, awakening, order)
+        self._weapons: Dict[str, Tuple[str, int, int, int, int]] = {}
+        self._heap: List[Tuple[float, int, int, str]] = []
+        self._version: Dict[str, int] = {}
+        self._crossover_floor: Dict[str, Optional[int]] = {}
+
+        for order, (key, data) in enumerate(weapons_data.items()):
+            level = data.get('level', 0)
+            if level <= 0:
+                continue
+            parts = key.rsplit('_', 1)
+            if len(parts) != 2:
+                continue
+            awakening = data.get('awakening', 0)
+            self._weapons[key] = (parts[0], int(parts[1]), get_max_level(awakening), awakening, order)
+            self.start_levels[key] = level
+            self.levels[key] = level
+            self._version[key] = 0
+            self._push(key)
+
+        self._equipped_reference = self._reference_atk(weapons_data.get(equipped_key, {}))
+
+    def _reference_atk(self, equipped_data: Dict):
+        """Max on-equip ATK% of the equipped weapon; 0.0 if none is owned, None if unknown."""
+        if equipped_data.get('level', 0) <= 0:
+            return 0.0
+        parts = self.equipped_key.rsplit('_', 1)
+        if len(parts) != 2:
+            return None
+        max_level = get_max_level(equipped_data.get('awakening', 0))
+        return calculate_atk_at_level(parts[0], int(parts[1]), max_level)
+
+    def effective_mult(self, key: str) -> float:
+        """Share of on-equip ATK% a level of this weapon is worth."""
+        inv_ratio = get_inventory_ratio(self._weapons[key][0])
+        return 1.0 + inv_ratio if key == self.equipped_key else inv_ratio
+
+    def next_level(self, key: str) -> Tuple[int, float]:
+        """(enhancer cost, effective ATK% gain) of this weapon's next level."""
+        rarity, tier = self._weapons[key][:2]
+        level = self.levels[key]
+        cost = calculate_level_cost(rarity, tier, level)
+        gain = calculate_atk_gain_for_level(rarity, tier, level) * self.effective_mult(key)
+        return cost, gain
+
+    def _push(self, key: str):
+        self._version[key] += 1
+        if self.levels[key] >= self._weapons[key][2]:
+            return
+        cost, gain = self.next_level(key)
+        ratio = gain / cost if cost > 0 else 0.0
+        heapq.heappush(self._heap, (-ratio, self._weapons[key][4], self._version[key], key))
+
+    def peek(self) -> Optional[str]:
+        """Weapon whose next level has the best efficiency, or None."""
+        while self._heap:
+            _, _, version, key = self._heap[0]
+            if version == self._version[key]:
+                return key
+            heapq.heappop(self._heap)
+        return None
+
+    def discard(self, key: str):
+        """Stop offering this weapon (e.g. its next level is unaffordable)."""
+        self._version[key] += 1
+
+    def crossover_level(self, key: str) -> Optional[int]:
+        """Level at which this weapon overtakes the equipped one (see find_crossover_level)."""
+        if key == self.equipped_key:
+            return None
+        reference = self._equipped_reference
+        if reference is None:
+            return None
+        if reference == 0.0:
+            return 1  # Any weapon beats no weapon
+        if key not in self._crossover_floor:
+            rarity, tier, max_level = self._weapons[key][:3]
+            self._crossover_floor[key] = next(
+                (lvl for lvl in range(1, max_level + 1)
+                 if calculate_atk_at_level(rarity, tier, lvl) > reference),
+                None,
+            )
+        floor = self._crossover_floor[key]
+        # On-equip ATK% rises with level, so the first level past the
+        # reference at or above the current level is max(current, floor)
+        return None if floor is None else max(self.levels[key], floor)
+
+    def recommendation(self, key: str) -> WeaponUpgradeRecommendation:
+        """Single-level recommendation for this weapon at the current state."""
+        rarity, tier, max_level, awakening, _ = self._weapons[key]
+        level = self.levels[key]
+        cost_enhancers, atk_gain = self.next_level(key)
+        dps_gain = calculate_dps_gain(atk_gain, self.total_atk)
+        cost_diamonds = cost_enhancers / DIAMONDS_TO_ENHANCERS
+        is_equipped = key == self.equipped_key
+        crossover_level = self.crossover_level(key)
+        return WeaponUpgradeRecommendation(
+            weapon_key=key,
+            rarity=rarity,
+            tier=tier,
+            current_level=level,
+            target_level=level + 1,
+            max_level=max_level,
+            awakening=awakening,
+            atk_gain=atk_gain,
+            dps_gain_percent=dps_gain,
+            cost_enhancers=cost_enhancers,
+            cost_diamonds=cost_diamonds,
+            efficiency=(dps_gain / cost_diamonds) * 1000 if cost_diamonds > 0 else 0,
+            is_equipped=is_equipped,
+            uses_inventory_only=not is_equipped,
+            can_become_best=crossover_level is not None,
+            crossover_level=crossover_level,
+        )
+
+    def upgrade(self, key: str):
+        """Buy one level of this weapon."""
+        _, gain = self.next_level(key)
+        self.levels[key] += 1
+        self.total_atk += gain
+        self._push(key)
+
+    def equip(self, key: str):
+        """Make this weapon the equipped one and re-key both affected weapons."""
+        old_key = self.equipped_key
+        if old_key == key:
+            return
+        rarity, tier, max_level = self._weapons[key][:3]
+        self.total_atk += calculate_atk_at_level(rarity, tier, self.levels[key])
+        if old_key in self._weapons:
+            old_rarity, old_tier = self._weapons[old_key][:2]
+            self.total_atk -= calculate_atk_at_level(old_rarity, old_tier, self.levels[old_key])
+        self.equipped_key = key
+        self._equipped_reference = calculate_atk_at_level(rarity, tier, max_level)
+        self._crossover_floor.clear()
+        self._push(key)
+        if old_key in self._weapons:
+            self._push(old_key)
+
+
 # =============================================================================
 # MAIN OPTIMIZER
 # =============================================================================
@@ -420,10 +582,11 @@ def generate_weapon_upgrade_path(
 
     This simulates upgrading weapons one level at a time, always picking
     the highest efficiency option, until budget is exhausted or efficiency
-    drops below threshold.
+    drops below threshold. Each level is popped from an incremental heap,
+    so only the upgraded (and newly equipped) weapons are re-scored.
 
     Args:
-        weapons_data: Current weapon state (will be copied, not modified)
+        weapons_data: Current weapon state (not modified)
         equipped_key: Currently equipped weapon
         budget_diamonds: Maximum diamonds to spend
         stop_efficiency: Stop when best option drops below this efficiency
@@ -431,21 +594,17 @@ def generate_weapon_upgrade_path(
     Returns:
         List of upgrades in order they should be performed
     """
-    import copy
-
-    working_data = copy.deepcopy(weapons_data)
-    working_equipped = equipped_key
+    engine = _WeaponLevelHeap(weapons_data, equipped_key)
 
     path = []
     spent = 0.0
 
     while spent < budget_diamonds:
-        result = analyze_all_weapon_upgrades(working_data, working_equipped)
-
-        if not result.recommendations:
+        best_key = engine.peek()
+        if best_key is None:
             break
 
-        best = result.recommendations[0]
+        best = engine.recommendation(best_key)
 
         if best.efficiency < stop_efficiency:
             break
@@ -456,14 +615,12 @@ def generate_weapon_upgrade_path(
         # Apply the upgrade
         path.append(best)
         spent += best.cost_diamonds
-
-        # Update working data
-        working_data[best.weapon_key]['level'] = best.target_level
+        engine.upgrade(best_key)
 
         # Check if we should switch equipped weapon
         if best.can_become_best and best.crossover_level:
             if best.target_level >= best.crossover_level:
-                working_equipped = best.weapon_key
+                engine.equip(best_key)
 
     return path
 
@@ -542,6 +699,7 @@ def calculate_optimal_enhancer_allocation(
     Uses greedy algorithm: always upgrade the weapon with best ATK%/enhancer.
     This is provably optimal because all weapons have diminishing returns
     (cost increases but ATK gain per level stays constant within level ranges).
+    Runs on the same incremental heap as generate_weapon_upgrade_path.
 
     Args:
         weapons_data: Dict mapping "rarity_tier" -> {level, awakening, duplicates}
@@ -559,107 +717,50 @@ def calculate_optimal_enhancer_allocation(
     if equipped_weapon_key is None:
         equipped_weapon_key = find_best_potential_weapon(weapons_data)
 
-    # Build working copy of weapon data
-    owned_weapons: Dict[str, Dict] = {}
-
-    for weapon_key, weapon_data in weapons_data.items():
-        current_level = weapon_data.get('level', 0)
-        if current_level <= 0:
-            continue  # Not owned
-
-        awakening = weapon_data.get('awakening', 0)
-        max_level = get_max_level(awakening)
-
-        if current_level >= max_level:
-            continue  # Already at max
-
-        parts = weapon_key.rsplit('_', 1)
-        if len(parts) != 2:
-            continue
-
-        rarity, tier = parts[0], int(parts[1])
-        is_equipped = (weapon_key == equipped_weapon_key)
-        inv_ratio = get_inventory_ratio(rarity)
-
-        # Effective multiplier: equipped weapons get full ATK + inventory
-        # Non-equipped weapons only get inventory contribution
-        if is_equipped:
-            effective_mult = 1.0 + inv_ratio
-        else:
-            effective_mult = inv_ratio
-
-        owned_weapons[weapon_key] = {
-            'rarity': rarity,
-            'tier': tier,
-            'start_level': current_level,
-            'current_level': current_level,
-            'max_level': max_level,
-            'effective_mult': effective_mult,
-            'is_equipped': is_equipped,
-        }
-
-    if not owned_weapons:
-        return [], equipped_weapon_key
-
+    engine = _WeaponLevelHeap(weapons_data, equipped_weapon_key)
     remaining = available_enhancers
 
-    # Greedy: repeatedly pick the weapon with best efficiency for next level
+    # Greedy: repeatedly take the best next level that still fits
     while remaining > 0:
-        best_key = None
-        best_efficiency = 0.0
-        best_cost = 0
-
-        for weapon_key, w in owned_weapons.items():
-            if w['current_level'] >= w['max_level']:
-                continue
-
-            # Cost for next single level
-            cost = calculate_level_cost(w['rarity'], w['tier'], w['current_level'])
-            if cost > remaining:
-                continue
-
-            # ATK gain for this level (adjusted for inventory/equipped)
-            atk_gain = calculate_atk_gain_for_level(w['rarity'], w['tier'], w['current_level'])
-            effective_gain = atk_gain * w['effective_mult']
-
-            efficiency = effective_gain / cost if cost > 0 else 0
-            if efficiency > best_efficiency:
-                best_efficiency = efficiency
-                best_key = weapon_key
-                best_cost = cost
-
+        best_key = engine.peek()
         if best_key is None:
-            break  # No affordable upgrades remaining
+            break  # No upgradable weapons left
+
+        cost, effective_gain = engine.next_level(best_key)
+        if effective_gain <= 0:
+            break  # Everything left is worthless
+        if cost > remaining:
+            # Costs only grow and the budget only shrinks: never affordable again
+            engine.discard(best_key)
+            continue
 
-        # Upgrade this weapon by 1 level
-        owned_weapons[best_key]['current_level'] += 1
-        remaining -= best_cost
+        engine.upgrade(best_key)
+        remaining -= cost
 
     # Build recommendations from upgrades made
     recommendations: List[EnhancerAllocationResult] = []
 
-    for weapon_key, w in owned_weapons.items():
-        if w['current_level'] > w['start_level']:
-            # Calculate total cost and gain
-            total_cost = 0
-            for lvl in range(w['start_level'], w['current_level']):
-                total_cost += calculate_level_cost(w['rarity'], w['tier'], lvl)
+    for weapon_key, start_level in engine.start_levels.items():
+        end_level = engine.levels[weapon_key]
+        if end_level > start_level:
+            rarity, tier_str = weapon_key.rsplit('_', 1)
+            tier = int(tier_str)
+            total_cost = calculate_total_cost(rarity, tier, start_level, end_level)
 
-            atk_before = calculate_atk_at_level(w['rarity'], w['tier'], w['start_level'])
-            atk_after = calculate_atk_at_level(w['rarity'], w['tier'], w['current_level'])
-            raw_gain = atk_after - atk_before
-            effective_gain = raw_gain * w['effective_mult']
+            atk_before = calculate_atk_at_level(rarity, tier, start_level)
+            atk_after = calculate_atk_at_level(rarity, tier, end_level)
+            effective_gain = (atk_after - atk_before) * engine.effective_mult(weapon_key)
 
             # Format display name
-            display_name = f"{w['rarity'].capitalize()} T{w['tier']}"
-            if w['is_equipped']:
+            display_name = f"{rarity.capitalize()} T{tier}"
+            if weapon_key == equipped_weapon_key:
                 display_name += " (Equipped)"
 
             recommendations.append(EnhancerAllocationResult(
                 weapon_key=weapon_key,
                 display_name=display_name,
-                from_level=w['start_level'],
-                to_level=w['current_level'],
+                from_level=start_level,
+                to_level=end_level,
                 cost=total_cost,
                 atk_gain=effective_gain,
             ))
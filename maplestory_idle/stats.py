@@ -12,6 +12,8 @@ Core Classes:
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, TYPE_CHECKING
 
+import numpy as np
+
 if TYPE_CHECKING:
     from game.job_classes import JobClass
 
@@ -697,6 +699,43 @@ def calculate_attack_speed_dps_value(current_as_pct: float, as_gain: float) -> f
     return dps_gain_pct
 
 
+def get_animation_frames_batch(attack_speed_pct) -> np.ndarray:
+    """
+    Batched get_animation_frames over an array of attack speed percentages.
+
+    Args:
+        attack_speed_pct: Array of total attack speed percentages
+
+    Returns:
+        Integer array of animation frame counts
+    """
+    attack_speed_pct = np.asarray(attack_speed_pct, dtype=float)
+    return np.select(
+        [attack_speed_pct >= threshold for threshold, _, _ in ATTACK_SPEED_BREAKPOINTS],
+        [frames for _, frames, _ in ATTACK_SPEED_BREAKPOINTS],
+        default=ATTACK_SPEED_BREAKPOINTS[-1][1],
+    )
+
+
+def calculate_attack_speed_dps_value_batch(current_as_pct, as_gain) -> np.ndarray:
+    """
+    Batched calculate_attack_speed_dps_value; arguments broadcast together.
+
+    Args:
+        current_as_pct: Array of current total attack speed %
+        as_gain: Array of attack speed gains
+
+    Returns:
+        Array of DPS gains as percentages (0.0 where no breakpoint is crossed)
+    """
+    current_as_pct = np.asarray(current_as_pct, dtype=float)
+    new_as_pct = np.minimum(current_as_pct + as_gain, ATTACK_SPEED_CAP)
+
+    old_frames = get_animation_frames_batch(current_as_pct)
+    new_frames = get_animation_frames_batch(new_as_pct)
+    return np.where(new_frames < old_frames, (old_frames / new_frames - 1) * 100, 0.0)
+
+
 def get_attack_speed_summary(attack_speed_pct: float) -> Dict[str, any]:
     """
     Get a complete summary of attack speed status for UI display.
@@ -141,6 +141,8 @@ def main_app():
     # Sidebar with user info and navigation
     with st.sidebar:
         st.markdown(f'<div class="user-info">👤 Logged in as: {st.session_state.username}</div>', unsafe_allow_html=True)
+        if st.session_state.user_data.load_failed:
+            st.error("Your saved data could not be loaded, so changes will not be saved. Log out and back in to retry.")
         st.divider()
 
         if st.button("💾 Save Data"):
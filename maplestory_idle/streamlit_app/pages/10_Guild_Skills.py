@@ -16,7 +16,7 @@ from game.guild import (
     GuildSkillType, GUILD_SKILL_DATA, SKILL_DISPLAY_NAMES,
     GuildConfig
 )
-from utils.data_manager import save_user_data
+from utils.data_manager import queue_user_data_save
 
 st.set_page_config(page_title="Guild Skills", page_icon="⚔️", layout="wide")
 
@@ -28,7 +28,7 @@ data = st.session_state.user_data
 
 
 def auto_save():
-    save_user_data(st.session_state.username, data)
+    queue_user_data_save(st.session_state.username, data)
 
 
 # Initialize guild_skills if needed
@@ -4,7 +4,7 @@ Calculate expected costs and run Monte Carlo simulations for starforce enhanceme
 Matches the original Tkinter app starforce tab.
 """
 import streamlit as st
-import random
+import numpy as np
 import sys
 import os
 
@@ -16,9 +16,12 @@ from optimizers.starforce_optimizer import (
     find_optimal_per_stage_strategy,
     find_optimal_strategy,
     calculate_total_cost_markov,
+    calculate_cost_distribution,
+    simulate_cost_distribution,
     MESO_TO_DIAMOND,
     SCROLL_DIAMOND_COST,
     DESTRUCTION_FEE_DIAMONDS,
+    DESTRUCTION_FEE_MESO,
 )
 
 st.set_page_config(page_title="Starforce Calculator", page_icon="⭐", layout="wide")
@@ -67,9 +70,12 @@ if 'logged_in' not in st.session_state or not st.session_state.logged_in:
     st.stop()
 
 
-def simulate_starforce(start: int, target: int, stage_strategies: dict, iterations: int = 1000) -> dict:
+SIMULATION_RUNS = 100_000
+
+
+def simulate_starforce(start: int, target: int, stage_strategies: dict, iterations: int = SIMULATION_RUNS) -> dict:
     """
-    Run Monte Carlo simulation for starforce enhancement using optimal per-stage strategies.
+    Run the vectorised Monte Carlo simulation using per-stage strategies.
 
     Args:
         start: Starting star level
@@ -77,93 +83,24 @@ def simulate_starforce(start: int, target: int, stage_strategies: dict, iteratio
         stage_strategies: Dict mapping stage -> strategy name ('none', 'decrease', 'destroy', 'both')
         iterations: Number of simulation runs
     """
-    results = []
-
-    for _ in range(iterations):
-        stars = start
-        meso = 0
-        stones = 0
-        attempts = 0
-        destructions = 0
-        max_attempts = 10000
-        pity = 0  # consecutive decrease counter; at 2 next attempt is guaranteed
-
-        while stars < target and attempts < max_attempts:
-            if stars not in STARFORCE_TABLE:
-                break
-
-            stage = STARFORCE_TABLE[stars]
-
-            # Get strategy for current stage
-            strat = stage_strategies.get(stars, 'none')
-            protect_dec = strat in ('decrease', 'both')
-            protect_dest = strat in ('destroy', 'both')
-
-            # Calculate cost with protections
-            cost_mult = 1.0
-            if protect_dec and stage.decrease_rate > 0:
-                cost_mult += 1.0
-            if protect_dest and stage.destroy_rate > 0:
-                cost_mult += 1.0
-
-            meso += int(stage.meso * cost_mult)
-            stones += int(stage.stones * cost_mult)
-            attempts += 1
-
-            # Pity: after 2 consecutive decreases, next attempt is guaranteed success
-            if pity >= 2:
-                stars += 1
-                pity = 0
-                continue
-
-            # Adjust probabilities based on protection
-            success_rate = stage.success_rate
-            maintain_rate = stage.maintain_rate
-            decrease_rate = 0 if protect_dec else stage.decrease_rate
-            destroy_rate = stage.destroy_rate * (0.5 if protect_dest else 1.0)
-
-            # Maintain rate absorbs the protected decrease
-            if protect_dec and stage.decrease_rate > 0:
-                maintain_rate += stage.decrease_rate
-
-            roll = random.random()
-
-            if roll < success_rate:
-                stars += 1
-                pity = 0
-            elif roll < success_rate + maintain_rate:
-                pity = 0  # maintain resets streak
-            elif roll < success_rate + maintain_rate + decrease_rate:
-                stars = max(start, stars - 1)
-                pity += 1
-            else:
-                destructions += 1
-                meso += 1_000_000  # Destruction fee
-                stars = 12  # Reset to 12
-                pity = 0
-
-        results.append({
-            "meso": meso, "stones": stones, "attempts": attempts,
-            "destructions": destructions, "success": stars >= target
-        })
-
-    # Calculate statistics
-    mesos = [r['meso'] for r in results]
-    stones_list = [r['stones'] for r in results]
-    attempts_list = [r['attempts'] for r in results]
-    destructions_list = [r['destructions'] for r in results]
+    sim = simulate_cost_distribution(start, target, stage_strategies, runs=iterations)
+    mesos = sim.meso + sim.destructions * DESTRUCTION_FEE_MESO
 
     return {
-        "avg_meso": sum(mesos) / len(mesos),
-        "med_meso": sorted(mesos)[len(mesos) // 2],
-        "min_meso": min(mesos),
-        "max_meso": max(mesos),
-        "p95_meso": sorted(mesos)[int(len(mesos) * 0.95)],
-        "avg_stones": sum(stones_list) / len(stones_list),
-        "avg_attempts": sum(attempts_list) / len(attempts_list),
-        "avg_destructions": sum(destructions_list) / len(destructions_list),
-        "total_destructions": sum(destructions_list),
-        "success_rate": sum(1 for r in results if r['success']) / len(results) * 100,
+        "avg_meso": float(mesos.mean()),
+        "med_meso": float(np.median(mesos)),
+        "min_meso": float(mesos.min()),
+        "max_meso": float(mesos.max()),
+        "p95_meso": float(np.percentile(mesos, 95)),
+        "avg_stones": float(sim.scrolls.mean()),
+        "avg_attempts": float(sim.attempts.mean()),
+        "avg_destructions": float(sim.destructions.mean()),
+        "total_destructions": int(sim.destructions.sum()),
+        "p_any_destruction": sim.destroy_probability,
+        "diamonds_p50": sim.cost_percentile(50),
+        "diamonds_p90": sim.cost_percentile(90),
+        "diamonds_p99": sim.cost_percentile(99),
+        "success_rate": 100.0,  # the restart chain always reaches the target
         "iterations": iterations,
     }
 
@@ -193,7 +130,7 @@ with col_calc:
     with col1:
         calc_btn = st.button("Calculate", type="primary", use_container_width=True)
     with col2:
-        sim_btn = st.button("Simulate (1000x)", use_container_width=True)
+        sim_btn = st.button(f"Simulate ({SIMULATION_RUNS:,}x)", use_container_width=True)
 
     # Process Calculate button
     if calc_btn:
@@ -254,6 +191,9 @@ with col_calc:
                     "stage_names": stage_names,
                     "all_results": all_results,
                     "per_stage_costs": per_stage_costs,
+                    "distribution": calculate_cost_distribution(
+                        current_stars, target_stars, stage_names,
+                    ),
                 }
 
     # Process Simulate button
@@ -261,10 +201,10 @@ with col_calc:
         if target_stars <= current_stars:
             st.error("Target must be higher than current!")
         else:
-            with st.spinner("Running 1000 simulations..."):
+            with st.spinner(f"Running {SIMULATION_RUNS:,} simulations..."):
                 # Get optimal strategies first
                 stage_names, _ = find_optimal_per_stage_strategy(current_stars, target_stars)
-                result = simulate_starforce(current_stars, target_stars, stage_names, 1000)
+                result = simulate_starforce(current_stars, target_stars, stage_names)
                 st.session_state.sf_sim_result = result
                 st.session_state.sf_sim_result['current'] = current_stars
                 st.session_state.sf_sim_result['target'] = target_stars
@@ -289,6 +229,33 @@ with col_calc:
     else:
         st.info("Click **Calculate** to see expected costs")
 
+    # Cost Distribution Section
+    st.markdown("---")
+    st.markdown("<div class='section-header'>COST DISTRIBUTION</div>", unsafe_allow_html=True)
+    st.caption("Exact spread of the total spend (including destruction rebuilds), not just the average")
+
+    if 'sf_calc_result' in st.session_state and 'distribution' in st.session_state.sf_calc_result:
+        r = st.session_state.sf_calc_result
+        dist = r['distribution']
+        budget = st.number_input(
+            "Diamond budget", min_value=0, value=int(round(dist.expected_cost, -3)),
+            step=10_000, key="sf_budget",
+        )
+        st.markdown(f"""
+        <div class='result-box'>
+        P(cost ≤ {budget:,.0f}): <span class='stat-value'>{dist.probability_within(budget)*100:.1f}%</span><br>
+        ───────────────────<br>
+        Median: <span class='stat-value'>{dist.cost_percentile(50):,.0f}</span><br>
+        90th %ile: <span class='warning-orange'>{dist.cost_percentile(90):,.0f}</span><br>
+        99th %ile: <span class='danger-red'>{dist.cost_percentile(99):,.0f}</span><br>
+        Attempts (median / 90th): {dist.attempts_percentile(50):,.0f} / {dist.attempts_percentile(90):,.0f}<br>
+        P(at least one destruction): <span class='danger-red'>{dist.destroy_probability*100:.1f}%</span><br>
+        Expected destructions: {dist.expected_destructions:.2f}
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.info("Click **Calculate** to see the cost distribution")
+
     # Optimal Strategy Section
     st.markdown("---")
     st.markdown("<div class='section-header'>OPTIMAL STRATEGY (Markov Analysis)</div>", unsafe_allow_html=True)
@@ -464,14 +431,18 @@ with col_calc:
         &nbsp;&nbsp;Average: {r['avg_stones']:.0f}<br><br>
         <strong>ATTEMPTS:</strong><br>
         &nbsp;&nbsp;Average: {r['avg_attempts']:.1f}<br><br>
+        <strong>DIAMONDS:</strong><br>
+        &nbsp;&nbsp;Median: <span class='stat-value'>{r['diamonds_p50']:,.0f}</span><br>
+        &nbsp;&nbsp;90th / 99th %ile: <span class='warning-orange'>{r['diamonds_p90']:,.0f}</span> / <span class='danger-red'>{r['diamonds_p99']:,.0f}</span><br><br>
         <strong>DESTRUCTIONS:</strong><br>
         &nbsp;&nbsp;Average: <span class='danger-red'>{r['avg_destructions']:.2f}</span><br>
+        &nbsp;&nbsp;P(at least one): <span class='danger-red'>{r['p_any_destruction']*100:.1f}%</span><br>
         &nbsp;&nbsp;Total across runs: {r['total_destructions']}<br><br>
         <strong>SUCCESS RATE:</strong> <span class='success-green'>{r['success_rate']:.1f}%</span>
         </div>
         """, unsafe_allow_html=True)
     else:
-        st.info("Click **Simulate (1000x)** to run Monte Carlo simulation")
+        st.info(f"Click **Simulate ({SIMULATION_RUNS:,}x)** to run Monte Carlo simulation")
 
 # Reference Tables (Right Column)
 with col_ref:
@@ -13,11 +13,12 @@ Key principle: Calculate REAL DPS gains by actually running damage formulas,
 not arbitrary weights or estimates.
 """
 import streamlit as st
-from typing import Dict, List, Any, Optional, Tuple
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from typing import Dict, Any, Optional, Tuple
 import sys
 import os
+import threading
 from pathlib import Path
-import copy
 from datetime import datetime
 
 # Add parent directory to path for imports
@@ -36,12 +37,12 @@ from core import (
     EQUIPMENT_SLOTS,
     ENEMY_DEFENSE_VALUES,
 )
-from utils.data_manager import save_user_data
+from utils.data_manager import save_user_data, source_fingerprints, slot_source, CHARACTER_SOURCE
 from utils.cube_analyzer import (
-    analyze_all_cube_priorities, CubeRecommendation,
+    rank_cube_recommendations, CubeRecommendation,
     format_stat_display, REGULAR_DIAMOND_PER_CUBE, BONUS_DIAMOND_PER_CUBE,
     get_distribution_data_for_slot,
-    analyze_all_tier_upgrades, TierUpgradeRecommendation,
+    TierUpgradeRecommendation,
 )
 from utils.distribution_chart import create_dps_distribution_chart, get_percentile_label, get_percentile_color
 from optimizers.optimal_stats import (
@@ -51,23 +52,17 @@ from optimizers.optimal_stats import (
 )
 from optimizers.starforce_optimizer import (
     calculate_total_cost_markov,
-    find_optimal_per_stage_strategy,
     MESO_TO_DIAMOND as SF_MESO_TO_DIAMOND,
     SCROLL_DIAMOND_COST as SF_SCROLL_COST,
 )
-from game.equipment import STARFORCE_TABLE, get_amplify_multiplier
-from optimizers.weapon_optimizer import get_weapon_upgrade_for_optimizer, calculate_total_weapon_atk_percent
-from game.weapon_summoning import get_summon_recommendations_for_optimizer
-from game.companion_summoning import get_companion_ticket_recommendation_for_optimizer
 from game.companions import COMPANIONS
-from game.job_classes import JobClass
-from game.hero_power import (
-    analyze_budget as analyze_hero_power_budget,
-    HeroPowerConfig, HeroPowerLevelConfig, HeroPowerLine,
-    HeroPowerStatType, HeroPowerTier,
+from game.hero_power import _stats_fingerprint
+from optimizers.upgrade_optimizer import (
+    plan_starforce_budget, AnalysisUnit, IncrementalAnalysis, analysis_pool,
+)
+from optimizers.account_analysis import (
+    STAT_DPS_WEIGHTS, analysis_rerank, analysis_task, build_snapshot, starforce_stars,
 )
-from optimizers.artifact_optimizer import get_artifact_recommendations_for_optimizer
-from game.artifacts import calculate_resonance_max_level
 from utils.dps_calculator import (
     aggregate_stats as shared_aggregate_stats,
     calculate_dps as shared_calculate_dps,
@@ -79,10 +74,6 @@ from utils.dps_calculator import (
     calculate_crit_rate_dps_value,
     BASE_MIN_DMG,
     BASE_MAX_DMG,
-    compute_phase_dps,
-    compute_stage_weighted_gain_pct,
-    STAGE_MOB_FRACTION,
-    STAGE_BOSS_FRACTION,
 )
 
 
@@ -138,26 +129,6 @@ STARFORCE_SUB_AMPLIFY = {
 MESO_TO_DIAMOND = 0.004
 SCROLL_COST = 300
 DESTRUCTION_FEE = 4000
-MEDAL_TO_DIAMOND = 10
-
-# DPS weights for stats
-STAT_DPS_WEIGHTS = {
-    'damage': 1.5,
-    'boss_damage': 2.0,
-    'normal_damage': 1.0,
-    'crit_damage': 1.8,
-    'def_pen': 2.2,
-    'final_damage': 2.5,
-    'dex_pct': 1.2,
-    'str_pct': 1.2,
-    'int_pct': 1.2,
-    'luk_pct': 1.2,
-    'attack_pct': 1.5,
-    'crit_rate': 1.5,
-    'min_dmg_mult': 0.8,
-    'max_dmg_mult': 0.8,
-    'all_skills': 1.0,
-}
 
 # Best stats to target by slot
 SLOT_TARGET_STATS = {
@@ -266,244 +237,6 @@ def calculate_best_possible_dps(slot: str, tier: str) -> float:
 # Now using analyze_all_cube_priorities from cube_analyzer.py (same as Tkinter app)
 
 
-def analyze_starforce_detailed(baseline_dps: float) -> List[Dict]:
-    """
-    Analyze starforce upgrades for each equipment slot.
-
-    Evaluates EACH star level (not just milestones) to find the most efficient
-    next upgrade. This properly accounts for diminishing returns where going
-    17→18 is much cheaper than 19→20 for similar DPS gain.
-
-    Uses:
-    - Markov chain analysis from starforce_optimizer for accurate cost estimates
-    - Actual DPS calculations to determine real gain from stat amplification
-
-    Args:
-        baseline_dps: The current total DPS (calculated once and passed in)
-    """
-    results = []
-
-    for slot in EQUIPMENT_SLOTS:
-        item = data.equipment_items.get(slot, {})
-        current_stars = int(item.get('stars', 0))
-
-        if current_stars >= 25 or current_stars < 10:
-            continue
-
-        # Evaluate EACH possible target star (not just milestones)
-        # This finds the most efficient next step
-        best_upgrade = None
-        best_efficiency = -1
-
-        # Consider each star from current+1 to 25
-        for target_stars in range(current_stars + 1, 26):
-            if target_stars <= current_stars:
-                continue
-
-            # Use Markov chain analysis for accurate cost estimate
-            # This calculates the full path cost (e.g., 19→22 includes 19→20→21→22)
-            stage_strategies, markov_result = find_optimal_per_stage_strategy(current_stars, target_stars)
-
-            # Total cost in diamonds from Markov analysis
-            total_cost = markov_result.total_cost
-            destroy_prob = markov_result.destroy_probability
-
-            # Calculate REAL DPS gain by comparing baseline vs upgraded
-            base_stats = aggregate_stats()
-            upgraded_stats = aggregate_stats(star_overrides={slot: target_stars})
-
-            upgraded_dps = calculate_dps(upgraded_stats, data.combat_mode)['total']
-            if data.combat_mode == 'stage':
-                dps_gain = compute_stage_weighted_gain_pct(
-                    base_stats, upgraded_stats,
-                    lambda s, md: calculate_dps(s, md)['total'],
-                )
-            else:
-                dps_gain = ((upgraded_dps / baseline_dps) - 1) * 100 if baseline_dps > 0 else 0
-
-            # Calculate efficiency: DPS% gain per 1000 diamonds (same formula as cube efficiency)
-            # efficiency = dps_gain / (total_cost / 1000) = dps_gain * 1000 / total_cost
-            efficiency = dps_gain / (total_cost / 1000) if total_cost > 0 else 0
-
-            # Track best option based on efficiency
-            if efficiency > best_efficiency:
-                best_efficiency = efficiency
-
-                # Get amplify multipliers for display
-                current_amp = get_amplify_multiplier(current_stars, is_sub=True)
-                target_amp = get_amplify_multiplier(target_stars, is_sub=True)
-
-                # Risk level based on destruction probability
-                if destroy_prob <= 0:
-                    risk = "Safe"
-                    risk_color = "🟢"
-                elif destroy_prob < 0.05:
-                    risk = f"Low ({destroy_prob*100:.0f}%)"
-                    risk_color = "🟡"
-                elif destroy_prob < 0.15:
-                    risk = f"Medium ({destroy_prob*100:.0f}%)"
-                    risk_color = "🟠"
-                elif destroy_prob < 0.30:
-                    risk = f"High ({destroy_prob*100:.0f}%)"
-                    risk_color = "🔴"
-                else:
-                    risk = f"Very High ({destroy_prob*100:.0f}%)"
-                    risk_color = "🔴"
-
-                # Get the actual sub-stats being amplified for display
-                sub_stats_detail = []
-                if item.get('sub_boss_damage', 0) > 0:
-                    sub_stats_detail.append(f"Boss {item['sub_boss_damage']:.1f}%")
-                if item.get('sub_crit_damage', 0) > 0:
-                    sub_stats_detail.append(f"CD {item['sub_crit_damage']:.1f}%")
-                if item.get('sub_crit_rate', 0) > 0:
-                    sub_stats_detail.append(f"CR {item['sub_crit_rate']:.1f}%")
-                if item.get('sub_attack_flat', 0) > 0:
-                    sub_stats_detail.append(f"ATK {item['sub_attack_flat']:.0f}")
-                if item.get('is_special', False) and item.get('special_stat_value', 0) > 0:
-                    special_type = item.get('special_stat_type', 'damage_pct')
-                    special_name = {'damage_pct': 'Dmg%', 'final_damage': 'FD%', 'all_skills': 'AllSkill', 'skill_damage': 'SkDmg%', 'basic_attack_dmg': 'BA%'}.get(special_type, special_type)
-                    sub_stats_detail.append(f"{special_name} {item['special_stat_value']:.1f}")
-
-                # Get optimal strategy for display (uses the first stage's strategy)
-                optimal_strat = stage_strategies.get(current_stars, 'none')
-
-                # Estimate expected attempts (rough estimate for display)
-                sf_data = STARFORCE_TABLE.get(current_stars)
-                if sf_data:
-                    success_rate = sf_data.success_rate
-                    expected_attempts = 1 / success_rate if success_rate > 0 else 100
-                else:
-                    expected_attempts = 2
-
-                best_upgrade = {
-                    'slot': slot,
-                    'current_stars': current_stars,
-                    'target_stars': target_stars,
-                    'total_cost': total_cost,
-                    'expected_attempts': expected_attempts,
-                    'destroy_prob': destroy_prob,
-                    'optimal_strategy': optimal_strat,
-                    'dps_gain': dps_gain,
-                    'efficiency': efficiency,
-                    'risk': risk,
-                    'risk_color': risk_color,
-                    'amp_before': current_amp,
-                    'amp_after': target_amp,
-                    'baseline_dps': baseline_dps,
-                    'upgraded_dps': upgraded_dps,
-                    'sub_stats_detail': sub_stats_detail,
-                }
-
-        # Only add the best upgrade for this slot
-        if best_upgrade:
-            results.append(best_upgrade)
-
-    results.sort(key=lambda x: x['efficiency'], reverse=True)
-    return results
-
-
-def analyze_hero_power_detailed() -> Dict:
-    """Analyze hero power lines with detailed recommendations."""
-    lines = data.hero_power_lines
-    preset = data.active_hero_power_preset or "1"
-
-    good_stats = {'damage', 'boss_damage', 'crit_damage', 'def_pen'}
-    great_tiers = {'Mystic', 'Legendary'}
-
-    line_analysis = []
-    total_dps = 0
-    lines_to_lock = []
-    lines_to_reroll = []
-
-    for i in range(1, 7):
-        line = lines.get(f'line{i}', {})
-        stat = line.get('stat', '')
-        value = float(line.get('value', 0))
-        tier = line.get('tier', 'Common')
-        locked = line.get('locked', False)
-
-        # Calculate DPS contribution
-        weight = STAT_DPS_WEIGHTS.get(stat, 0.2)
-        dps = value * weight * 0.5  # Hero power weight
-
-        # Tier multiplier
-        tier_mult = {'Mystic': 1.5, 'Legendary': 1.2, 'Unique': 1.0, 'Epic': 0.8, 'Rare': 0.6, 'Common': 0.4}.get(tier, 0.5)
-
-        # Calculate score (0-100)
-        is_good_stat = stat in good_stats
-        is_great_tier = tier in great_tiers
-
-        if is_good_stat and is_great_tier:
-            score = 80 + (value * 0.5)
-            recommendation = "LOCK"
-            indicator = "🟢"
-            lines_to_lock.append(i)
-        elif is_good_stat:
-            score = 50 + (value * 0.5)
-            recommendation = "LOCK"
-            indicator = "🟡"
-            lines_to_lock.append(i)
-        elif is_great_tier:
-            score = 40 + (value * 0.3)
-            recommendation = "CONSIDER"
-            indicator = "🟡"
-        else:
-            score = 10 + (value * 0.2)
-            recommendation = "REROLL"
-            indicator = "🔴"
-            lines_to_reroll.append(i)
-
-        total_dps += dps
-
-        stat_display = format_stat_display(stat) if stat else "(empty)"
-        line_analysis.append({
-            'line': i,
-            'stat': stat,
-            'stat_display': stat_display,
-            'value': value,
-            'tier': tier,
-            'dps': dps,
-            'score': min(100, score),
-            'recommendation': recommendation,
-            'indicator': indicator,
-            'locked': locked,
-        })
-
-    # Calculate reroll cost
-    num_locks = len(lines_to_lock)
-    hp_level = data.hero_power_level or {}
-    base_cost = hp_level.get('base_cost', 89)
-    cost_per_reroll = base_cost + (num_locks * 43)
-
-    # Expected improvement
-    avg_weak_score = sum(l['score'] for l in line_analysis if l['recommendation'] == 'REROLL') / max(1, len(lines_to_reroll))
-    expected_gain = (50 - avg_weak_score) * 0.02 * len(lines_to_reroll)  # Rough estimate
-
-    # Estimated rerolls
-    if lines_to_reroll:
-        estimated_rerolls = 50 + (avg_weak_score * 2)  # More rerolls if already decent
-    else:
-        estimated_rerolls = 0
-
-    total_medal_cost = estimated_rerolls * cost_per_reroll
-    diamond_equivalent = total_medal_cost * MEDAL_TO_DIAMOND
-
-    return {
-        'preset': preset,
-        'lines': line_analysis,
-        'total_dps': total_dps,
-        'lines_to_lock': lines_to_lock,
-        'lines_to_reroll': lines_to_reroll,
-        'num_locks': num_locks,
-        'cost_per_reroll': cost_per_reroll,
-        'estimated_rerolls': estimated_rerolls,
-        'total_medal_cost': total_medal_cost,
-        'diamond_equivalent': diamond_equivalent,
-        'expected_gain': expected_gain,
-    }
-
-
 # ==============================================================================
 # Main Page
 # ==============================================================================
@@ -513,18 +246,15 @@ st.markdown("Detailed upgrade recommendations with specific targets and DPS impa
 # Current DPS display - use cached stats if available and not stale
 # We cache in session_state to avoid recalculating on every page rerender
 
-# Create a cache key from data that affects stats (simplified version)
+# Digest of every stat source (one per equipment slot's item / potentials, hero
+# power, artifacts, ...). Any edit made elsewhere in the app changes the digest
+# of the source it touched.
+_sources = source_fingerprints(data)
+
+
 def _get_stats_cache_key():
-    """Generate a cache key based on relevant user data."""
-    # Use a hash of key attributes that affect DPS
-    key_parts = [
-        getattr(data, 'character_level', 100),
-        getattr(data, 'combat_mode', 'stage'),
-        getattr(data, 'all_skills', 0),
-        # Equipment stars (summarized)
-        sum(data.equipment_items.get(s, {}).get('stars', 0) for s in EQUIPMENT_SLOTS[:5]),
-    ]
-    return tuple(key_parts)
+    """Generate a cache key covering every stat source of the user data."""
+    return tuple(sorted(_sources.items()))
 
 cache_key = _get_stats_cache_key()
 cached_key = st.session_state.get('optimizer_stats_cache_key', None)
@@ -533,242 +263,17 @@ if cached_key == cache_key and 'optimizer_current_stats' in st.session_state:
     # Use cached values
     current_stats = st.session_state.optimizer_current_stats
     current_dps = st.session_state.optimizer_current_dps
+    current_dps_result = st.session_state.get('optimizer_current_dps_result')
 else:
     # Calculate fresh and cache
     current_stats = aggregate_stats()
-    current_dps = calculate_dps(current_stats, data.combat_mode)['total']
+    current_dps_result = calculate_dps(current_stats, data.combat_mode)
+    current_dps = current_dps_result['total']
     st.session_state.optimizer_current_stats = current_stats
     st.session_state.optimizer_current_dps = current_dps
+    st.session_state.optimizer_current_dps_result = current_dps_result
     st.session_state.optimizer_stats_cache_key = cache_key
 
-def calc_dps_for_optimizer(stats: Dict[str, float], mode: str = None) -> float:
-    m = mode if mode is not None else data.combat_mode
-    if m == 'stage':
-        mob, boss = compute_phase_dps(stats, lambda s, md: calculate_dps(s, md)['total'])
-        return mob * STAGE_MOB_FRACTION + boss * STAGE_BOSS_FRACTION
-    return calculate_dps(stats, m)['total']
-
-
-def _build_fast_evaluator():
-    """
-    Construct a FastDPSEvaluator anchored on the current build, ONLY when
-    the realistic DPS path is active — otherwise the legacy path is already
-    fast and the wrapper would add overhead with no benefit.
-
-    Returns None when realistic DPS is disabled OR when the combat mode is
-    'stage' (the phase-weighted helper path doesn't fit the evaluator's
-    "one calc_dps call per evaluation" contract; covering it cleanly needs
-    a follow-up).
-    """
-    from utils.dps_calculator import FastDPSEvaluator
-    if not getattr(data, 'use_realistic_dps', False):
-        return None
-    if data.combat_mode == 'stage':
-        return None
-    return FastDPSEvaluator(
-        baseline_stats=current_stats,
-        combat_mode=data.combat_mode,
-        enemy_def=ENEMY_DEFENSE_VALUES.get(getattr(data, 'chapter', 'Chapter 27'), 0.752),
-        calculate_dps_fn=shared_calculate_dps,
-        extra_kwargs={
-            'job_class': JobClass(data.job_class),
-            'boss_importance': getattr(data, 'boss_importance', 70) / 100.0,
-            'boss_damage_multiplier': getattr(data, 'boss_damage_multiplier', 1.0),
-        },
-    )
-
-
-# Default budget for hero power reroll analysis — small enough to compete
-# with cubes/starforce/companion tickets on absolute cost (5000 diamonds at
-# 10 diamonds/medal), big enough that the lock cascade has room to converge.
-_HERO_POWER_REROLL_BUDGET_MEDALS = 500
-
-
-def _build_hp_config_from_data(data) -> HeroPowerConfig:
-    """Translate `data.hero_power_lines` into a HeroPowerConfig the same way
-    the Hero Power page does. Kept inline so the page doesn't need a
-    cross-module helper import."""
-    lines = []
-    raw = data.hero_power_lines or {}
-    for i in range(1, 7):
-        line_data = raw.get(f'line{i}', {})
-        stat_str = line_data.get('stat', '') or ''
-        tier_str = (line_data.get('tier', 'common') or 'common').lower()
-        value = float(line_data.get('value', 0) or 0)
-        locked = bool(line_data.get('locked', False))
-        try:
-            stat_type = HeroPowerStatType(stat_str) if stat_str else HeroPowerStatType.DAMAGE
-        except ValueError:
-            stat_type = HeroPowerStatType.DAMAGE
-        try:
-            tier = HeroPowerTier(tier_str)
-        except ValueError:
-            tier = HeroPowerTier.COMMON
-        lines.append(HeroPowerLine(
-            slot=i, stat_type=stat_type, value=value, tier=tier, is_locked=locked,
-        ))
-    return HeroPowerConfig(lines=lines)
-
-
-def _build_hp_level_config_from_data(data) -> HeroPowerLevelConfig:
-    """Translate `data.hero_power_level` into a HeroPowerLevelConfig."""
-    lc = data.hero_power_level or {}
-    return HeroPowerLevelConfig(
-        level=lc.get('level', 15),
-        mystic_rate=lc.get('mystic_rate', 0.14),
-        legendary_rate=lc.get('legendary_rate', 1.63),
-        unique_rate=lc.get('unique_rate', 3.3),
-        epic_rate=lc.get('epic_rate', 37.93),
-        rare_rate=lc.get('rare_rate', 32.0),
-        common_rate=lc.get('common_rate', 25.0),
-        base_cost=lc.get('base_cost', 89),
-    )
-
-
-def _build_hero_power_reroll_analysis(data, current_stats, current_dps):
-    """
-    Real DPS-based hero power reroll analysis. Wraps `analyze_budget` from
-    game/hero_power.py and shapes the result into the same dict keys the
-    optimizer's all_upgrades block already reads (`expected_gain`,
-    `diamond_equivalent`, `num_locks`, `lines_to_reroll`, `total_medal_cost`,
-    `estimated_rerolls`).
-
-    Returns None when the hero power state is too incomplete to analyze
-    (no lines / no level config) — caller falls back to the heuristic.
-    """
-    if not data.hero_power_lines:
-        return None
-    if current_dps <= 0:
-        return None
-
-    config = _build_hp_config_from_data(data)
-    level_config = _build_hp_level_config_from_data(data)
-
-    # analyze_budget needs (calc_dps_func, get_stats_func) callables with
-    # specific signatures. Wire them to the optimizer's existing closures.
-    result = analyze_hero_power_budget(
-        config=config,
-        level_config=level_config,
-        budget_medals=float(_HERO_POWER_REROLL_BUDGET_MEDALS),
-        calc_dps_func=calc_dps_for_optimizer,
-        get_stats_func=aggregate_stats,
-    )
-    if 'error' in result:
-        return None
-
-    medals_spent = float(result.get('expected_medals_spent', 0))
-    if medals_spent <= 0 or result.get('expected_gain_pct', 0) <= 0:
-        # Nothing worth recommending (all slots already pass thresholds).
-        return None
-
-    # Slots NOT in recommended_locks are slots the budget analysis says to
-    # reroll. User-locked slots are forced-locked inside analyze_budget so
-    # they show up in recommended_locks too.
-    recommended_locks = result.get('recommended_locks', [])
-    lines_to_reroll = [slot for slot in range(1, 7) if slot not in recommended_locks]
-    num_locks = len(recommended_locks)
-    return {
-        'preset': data.active_hero_power_preset or "1",
-        'lines': result.get('line_analysis', []),
-        'lines_to_lock': recommended_locks,
-        'lines_to_reroll': lines_to_reroll,
-        'num_locks': num_locks,
-        'cost_per_reroll': result.get('cost_per_reroll', 0),
-        'estimated_rerolls': result.get('expected_rerolls', 0),
-        'total_medal_cost': medals_spent,
-        'diamond_equivalent': medals_spent * MEDAL_TO_DIAMOND,
-        'expected_gain': result.get('expected_gain_pct', 0),
-        # Real-DPS-based: cascade detail useful for the rendering blocks.
-        'cascade': result.get('cascade', []),
-        'current_total_dps_pct': result.get('current_total_dps_pct', 0),
-        'expected_total_dps_pct': result.get('expected_total_dps_pct', 0),
-    }
-
-
-def _build_companion_ticket_recommendation(data, baseline_stats, baseline_dps):
-    """
-    Construct the optimizer's "Companion Tickets (×100)" recommendation.
-
-    Forces the legacy (closed-form) DPS path for per-candidate evaluations
-    even when the user has realistic DPS enabled. Companion level changes
-    only touch inventory stats (attack_flat / damage_pct / main_stat_flat
-    / etc.) — none of those are sequence-affecting, so the legacy path
-    preserves the relative ranking between candidates. Using realistic
-    per-candidate would multiply runtime by ~30× (the sim is much slower).
-
-    Stage mode is phase-weighted manually here (mob × 0.6 + boss × 0.4)
-    so we stay on the legacy path consistently. Returns None only when
-    baseline DPS is zero — every other case yields a recommendation.
-    """
-    if baseline_dps <= 0:
-        return None
-
-    from utils.dps_calculator import (
-        aggregate_stats as shared_aggregate_stats,
-        calculate_dps as shared_calculate_dps,
-    )
-
-    enemy_def = ENEMY_DEFENSE_VALUES.get(getattr(data, 'chapter', 'Chapter 27'), 0.752)
-    job_class_enum = JobClass(data.job_class)
-    mode = data.combat_mode
-
-    def _legacy_dps(stats, m):
-        # Force legacy path regardless of data.use_realistic_dps — inventory
-        # stat changes don't need the simulator.
-        return shared_calculate_dps(
-            stats, m, enemy_def,
-            job_class=job_class_enum,
-            use_realistic_dps=False,
-            include_companion_summon=True,
-        )['total']
-
-    def _eval_in_current_mode(stats):
-        if mode == 'stage':
-            mob, boss = compute_phase_dps(stats, _legacy_dps)
-            return mob * STAGE_MOB_FRACTION + boss * STAGE_BOSS_FRACTION
-        return _legacy_dps(stats, mode)
-
-    # We need a baseline computed via the SAME legacy path so the marginal
-    # delta is internally consistent (the user-facing `baseline_dps` may be
-    # realistic and a different number).
-    baseline_legacy_dps = _eval_in_current_mode(baseline_stats)
-
-    def _stats_with_companion_levels_overridden(overrides):
-        import copy
-        synthetic = copy.copy(data)
-        synthetic.companion_levels = dict(data.companion_levels or {})
-        for k, lvl in overrides.items():
-            if lvl <= 0:
-                synthetic.companion_levels.pop(k, None)
-            else:
-                synthetic.companion_levels[k] = lvl
-        return shared_aggregate_stats(synthetic)
-
-    _dps_cache = {}
-
-    def _dps_at(overrides):
-        key = tuple(sorted(overrides.items()))
-        if key not in _dps_cache:
-            candidate_stats = _stats_with_companion_levels_overridden(overrides)
-            _dps_cache[key] = _eval_in_current_mode(candidate_stats)
-        return _dps_cache[key]
-
-    def _marginal_dps_fn(overrides):
-        # Absolute DPS gain over the legacy baseline. We scale below
-        # against the user-facing baseline_dps so percentages match.
-        return _dps_at(overrides) - baseline_legacy_dps
-
-    user_state = {
-        'owned': {k: int(v) for k, v in (data.companion_levels or {}).items() if v > 0},
-        'equipped': list(data.equipped_companions or []),
-    }
-    return get_companion_ticket_recommendation_for_optimizer(
-        user_state=user_state,
-        marginal_dps_fn=_marginal_dps_fn,
-        baseline_dps=baseline_dps,
-        batch_size=100,
-    )
-
 
 col1, col2, col3, col4 = st.columns(4)
 with col1:
@@ -805,168 +310,167 @@ refresh_col1, refresh_col2 = st.columns([1, 4])
 with refresh_col1:
     refresh_clicked = st.button("🔄 Run Analysis", help="Run all upgrade analyses with latest data")
 
-# Only run analysis when button is clicked (not on page load)
+# The full analysis only runs when the button is clicked (not on page load).
+# Its results are kept with the stat sources each analysis read, so after an
+# account edit elsewhere in the app only the analyses reading an edited source
+# (plus those ranked against the baseline DPS, when that moved) re-run.
+_incremental = st.session_state.get('optimizer_incremental')
 if refresh_clicked:
-    # Cube analysis using original Tkinter app system
-    cube_analysis = analyze_all_cube_priorities(
-        user_data=data,
-        aggregate_stats_func=aggregate_stats,
-        calculate_dps_func=calculate_dps,
-    )
-
-    # Starforce analysis
-    sf_analysis = analyze_starforce_detailed(current_dps)
-
-    # Hero power analysis. Uses analyze_budget (real DPS-based) under the
-    # hood and shapes the output to match the existing heuristic for the
-    # all_upgrades wiring downstream.
-    hp_analysis = _build_hero_power_reroll_analysis(data, current_stats, current_dps)
-    if hp_analysis is None:
-        # Fall back to heuristic if budget analysis can't run.
-        hp_analysis = analyze_hero_power_detailed()
-
-    # Tier upgrade analysis
-    tier_upgrade_analysis = analyze_all_tier_upgrades(
-        user_data=data,
-        aggregate_stats_func=aggregate_stats,
-        calculate_dps_func=calculate_dps,
-    )
+    _incremental = IncrementalAnalysis()
+    st.session_state.optimizer_incremental = _incremental
+_baseline_key = _stats_fingerprint(current_stats)
+
+_stale = []
+if _incremental is not None:
+    # Read-only inputs every analyser shares: the account, its baseline stats
+    # and DPS results, and the DPS settings. Plain data, so the analysers run
+    # in worker processes (see optimizers.account_analysis). Each analyser
+    # scores against the snapshot's baseline, evaluated once here; their DPS
+    # evaluations are merged into _ctx's report.
+    _snapshot = build_snapshot(data, current_stats, current_dps_result)
+    _ctx = _snapshot.context()
+
+    def _unit(name, sources, uses_baseline=False):
+        # Every analysis also reads the character source (level, job, combat
+        # settings, ...); a change there re-runs everything.
+        return AnalysisUnit(
+            name, analysis_task(_snapshot, name),
+            reads=frozenset((CHARACTER_SOURCE, *sources)),
+            uses_baseline=uses_baseline,
+            rerank=analysis_rerank(_snapshot, name),
+        )
 
-    # Weapon upgrade analysis
-    weapons_data = getattr(data, 'weapons_data', {}) or {}
-    equipped_weapon = getattr(data, 'equipped_weapon_key', '') or ''
-    if weapons_data:
-        weapon_analysis = get_weapon_upgrade_for_optimizer(weapons_data, equipped_weapon)
-    else:
-        weapon_analysis = []
-
-    # Weapon summon analysis
-    if weapons_data:
-        # Calculate current total weapon ATK% for diminishing returns
-        current_weapon_atk = calculate_total_weapon_atk_percent(weapons_data, equipped_weapon)
-        summon_analysis = get_summon_recommendations_for_optimizer(
-            weapons_data,
-            equipped_weapon,
-            summoning_level,
-            current_weapon_atk,
+    _units = [
+        # Cube / tier / starforce / hero power / companion / artifact gains are
+        # measured against the baseline build, so they update whenever it
+        # moves. The cube and tier units of untouched slots only re-score the
+        # candidates they kept on the new baseline (analysis_rerank).
+        *(
+            _unit(f"Cubes:{slot}", [slot_source('potentials', slot), slot_source('equipment', slot)],
+                  uses_baseline=True)
+            for slot in EQUIPMENT_SLOTS
+        ),
+        *(
+            _unit(f"Tier Upgrades:{slot}", [slot_source('potentials', slot), slot_source('equipment', slot)],
+                  uses_baseline=True)
+            for slot in EQUIPMENT_SLOTS
+        ),
+        _unit("Starforce", [slot_source('equipment', slot) for slot in EQUIPMENT_SLOTS], uses_baseline=True),
+        _unit("Hero Power", ['hero_power'], uses_baseline=True),
+        _unit("Weapons", ['weapons']),
+        _unit("Summons", ['weapons']),
+        _unit("Companion Tickets", ['companions'], uses_baseline=True),
+        _unit("Artifacts", ['artifacts'], uses_baseline=True),
+    ]
+    _stale = _incremental.stale(_units, _sources, _baseline_key)
+
+if _stale:
+    _script_ctx = get_script_run_ctx()
+
+    def _attach_script_ctx():
+        # Worker threads need the script context for st.cache_data lookups
+        add_script_run_ctx(threading.current_thread(), _script_ctx)
+
+    # The analysers are CPU-bound, so they run in worker processes when there
+    # is more than one core; on a single core, on threads in this process.
+    _progress = st.progress(0.0, text="Running upgrade analyses...")
+    for _event in _incremental.refresh(_units, _sources, _baseline_key,
+                                       initializer=_attach_script_ctx, executor=analysis_pool()):
+        if _event.error is not None:
+            _progress.empty()
+            # Don't retry automatically on every rerun; the next Run Analysis does
+            st.session_state.optimizer_incremental = None
+            raise _event.error
+        _ctx.merge_report(_event.result.report)
+        _progress.progress(
+            _event.completed / _event.total,
+            text=f"{_event.name} done ({_event.completed}/{_event.total}, {_event.elapsed:.1f}s)",
         )
-    else:
-        summon_analysis = []
-
-    # Companion ticket recommendation. Computes the expected DPS gain per
-    # batch of 100 tickets factoring in (a) direct pulls (new companion or
-    # level-up progress on an in-progress one) and (b) cascading promotion
-    # EV from maxed-companion extras. Uses the fast-path evaluator built
-    # earlier so per-candidate DPS lookups are cheap.
-    companion_ticket_rec = _build_companion_ticket_recommendation(
-        data, current_stats, current_dps,
+    _progress.empty()
+
+    _results = {name: output.result for name, output in _incremental.results.items()}
+    cube_analysis = rank_cube_recommendations(
+        [rec for slot in EQUIPMENT_SLOTS for rec in _results[f"Cubes:{slot}"]]
     )
-    if companion_ticket_rec:
-        summon_analysis = list(summon_analysis or [])
-        summon_analysis.append(companion_ticket_rec)
-
-    # Artifact analysis - use the actual data attributes
-    artifacts_inventory = getattr(data, 'artifacts_inventory', {}) or {}
-    artifacts_equipped = getattr(data, 'artifacts_equipped', {}) or {}
-    artifacts_resonance = getattr(data, 'artifacts_resonance', {}) or {}
-
-    # Build owned artifacts dict from inventory
-    owned_artifacts = {}
-    for art_key, art_data in artifacts_inventory.items():
-        if isinstance(art_data, dict):
-            owned_artifacts[art_key] = {
-                'stars': art_data.get('stars', 0),
-                'dupes': art_data.get('dupes', 0),
-                'potentials': art_data.get('potentials', []),
-            }
-
-    # Get equipped artifact keys by looking up names
-    # Import ARTIFACTS to map names to keys
-    from game.artifacts import ARTIFACTS
-    ARTIFACT_KEY_BY_NAME = {defn.name: key for key, defn in ARTIFACTS.items()}
-
-    equipped_artifact_keys = []
-    for i in range(4):
-        slot_data = artifacts_equipped.get(f'slot{i}', {})
-        if isinstance(slot_data, dict):
-            name = slot_data.get('name', '')
-            if name and name != '(Empty)':
-                key = ARTIFACT_KEY_BY_NAME.get(name)
-                if key:
-                    equipped_artifact_keys.append(key)
-
-    current_resonance = artifacts_resonance.get('resonance_level', 1)
-    # Calculate max resonance from total artifact stars
-    total_stars = sum(a.get('stars', 0) for a in owned_artifacts.values())
-    max_resonance = calculate_resonance_max_level(total_stars)
-
-    if owned_artifacts:
-        # Create a DPS function wrapper for artifact optimizer
-        def artifact_dps_func(stats, mode):
-            return calculate_dps(stats, mode)
-
-        artifact_analysis = get_artifact_recommendations_for_optimizer(
-            owned_artifacts=owned_artifacts,
-            equipped_artifact_keys=equipped_artifact_keys,
-            current_resonance_level=current_resonance,
-            resonance_max_level=max_resonance,
-            current_stats=current_stats,
-            calculate_dps_func=artifact_dps_func,
-            scenario=data.combat_mode,
-        )
-    else:
-        artifact_analysis = []
+    tier_upgrade_analysis = sorted(
+        (rec for slot in EQUIPMENT_SLOTS for rec in _results[f"Tier Upgrades:{slot}"]),
+        key=lambda rec: rec.efficiency, reverse=True,
+    )
+    sf_gains, sf_analysis = _results["Starforce"]
+    hp_analysis = _results["Hero Power"]
+    weapon_analysis = _results["Weapons"]
+    summon_analysis = list(_results["Summons"] or [])
+    if _results["Companion Tickets"]:
+        summon_analysis.append(_results["Companion Tickets"])
+    artifact_analysis = _results["Artifacts"]
 
     # Cache results in session state
     st.session_state.optimizer_cube_analysis = cube_analysis
     st.session_state.optimizer_sf_analysis = sf_analysis
+    st.session_state.optimizer_sf_gains = sf_gains
     st.session_state.optimizer_hp_analysis = hp_analysis
     st.session_state.optimizer_tier_upgrade_analysis = tier_upgrade_analysis
     st.session_state.optimizer_weapon_analysis = weapon_analysis
     st.session_state.optimizer_summon_analysis = summon_analysis
     st.session_state.optimizer_artifact_analysis = artifact_analysis
 
+if refresh_clicked:
     # Advanced: Optimal Stat Distribution — heavy computation, only runs on button click
     _tier_mode = st.session_state.get('optimizer_tier_mode', 'mystic')
     _include_artifacts = st.session_state.get('optimizer_include_artifacts', True)
-    _efficiency_stats = current_stats.copy()
-
-    # Build the fast-DPS evaluator once per analysis run. Non-sequence
-    # candidates (most stats) get scored via the legacy + ratio fast path
-    # instead of re-running the realistic simulator per candidate.
-    _fast_evaluator = _build_fast_evaluator()
-    st.session_state.optimizer_slot_efficiency = {
-        slot: calculate_slot_efficiency(
-            slot, _efficiency_stats, calc_dps_for_optimizer, _tier_mode,
-            fast_evaluator=_fast_evaluator,
-        )
-        for slot in ['shoulder', 'gloves', 'cape', 'bottom', 'ring', 'necklace', 'top', 'hat']
-    }
-
-    st.session_state.optimizer_source_ranking = {
-        stat: calculate_source_ranking(stat, _efficiency_stats, calc_dps_for_optimizer, _tier_mode, _include_artifacts)
-        for stat in ['def_pen', 'crit_damage', 'final_atk_dmg', 'damage', 'boss_damage']
-    }
-
-    try:
-        st.session_state.optimizer_optimal_build = calculate_optimal_distribution(
-            current_stats, calc_dps_for_optimizer, _tier_mode, _include_artifacts
-        )
-    except Exception:
-        st.session_state.optimizer_optimal_build = None
-
-    st.session_state.optimizer_gap_analysis = {
-        slot: get_optimal_stat_for_slot(slot, _efficiency_stats, calc_dps_for_optimizer, _tier_mode)
-        for slot in EQUIPMENT_SLOTS
-    }
-
+    # Candidates are derived from the shared baseline vector with
+    # with_delta() instead of deep-copying the stats dict per evaluation.
+    _efficiency_stats = _ctx.get_stat_vector()
+
+    # The context's fast-DPS evaluator is shared with the starforce analyser
+    # above. Non-sequence candidates (most stats) get scored via the legacy +
+    # ratio fast path instead of re-running the realistic simulator.
+    with _ctx.analyser("Slot Efficiency"):
+        st.session_state.optimizer_slot_efficiency = {
+            slot: calculate_slot_efficiency(
+                slot, _efficiency_stats, _ctx.score, _tier_mode,
+                fast_evaluator=_ctx.fast_evaluator,
+            )
+            for slot in ['shoulder', 'gloves', 'cape', 'bottom', 'ring', 'necklace', 'top', 'hat']
+        }
+
+    with _ctx.analyser("Source Ranking"):
+        st.session_state.optimizer_source_ranking = {
+            stat: calculate_source_ranking(stat, _efficiency_stats, _ctx.score, _tier_mode, _include_artifacts)
+            for stat in ['def_pen', 'crit_damage', 'final_atk_dmg', 'damage', 'boss_damage']
+        }
+
+    with _ctx.analyser("Optimal Build"):
+        try:
+            st.session_state.optimizer_optimal_build = calculate_optimal_distribution(
+                current_stats, _ctx.score, _tier_mode, _include_artifacts
+            )
+        except Exception:
+            st.session_state.optimizer_optimal_build = None
+
+    with _ctx.analyser("Gap Analysis"):
+        st.session_state.optimizer_gap_analysis = {
+            slot: get_optimal_stat_for_slot(slot, _efficiency_stats, _ctx.score, _tier_mode)
+            for slot in EQUIPMENT_SLOTS
+        }
+
+if _stale:
+    st.session_state.optimizer_evaluation_report = _ctx.report()
     st.session_state.optimizer_analysis_time = datetime.now()
 
-    st.success(f"Analysis complete! Found {len(cube_analysis or [])} cube, {len(tier_upgrade_analysis or [])} tier-up, {len(weapon_analysis)} weapon, {len(summon_analysis)} summon, {len(artifact_analysis)} artifact recommendations.")
+    if refresh_clicked:
+        st.success(f"Analysis complete! Found {len(cube_analysis or [])} cube, {len(tier_upgrade_analysis or [])} tier-up, {len(weapon_analysis)} weapon, {len(summon_analysis)} summon, {len(artifact_analysis)} artifact recommendations.")
+    else:
+        st.info(
+            f"Account changed since the last analysis: refreshed {len(_stale)} of {len(_units)} "
+            f"analyses ({', '.join(_stale)}). Click 'Run Analysis' to also re-check "
+            f"the optimal stat distribution."
+        )
 else:
     # Use cached results
     cube_analysis = st.session_state.get('optimizer_cube_analysis', [])
     sf_analysis = st.session_state.get('optimizer_sf_analysis', [])
+    sf_gains = st.session_state.get('optimizer_sf_gains', {})
     hp_analysis = st.session_state.get('optimizer_hp_analysis', {})
     tier_upgrade_analysis = st.session_state.get('optimizer_tier_upgrade_analysis', [])
     weapon_analysis = st.session_state.get('optimizer_weapon_analysis', [])
@@ -981,6 +485,22 @@ with refresh_col2:
     else:
         st.caption("Click 'Run Analysis' to generate recommendations")
 
+# DPS evaluations made by the last run, per analyser
+_evaluation_report = st.session_state.get('optimizer_evaluation_report')
+if _evaluation_report:
+    with st.expander(f"📊 DPS Evaluations (last run: {_evaluation_report['total']:,})"):
+        st.dataframe(
+            [{'Analyser': name, 'DPS Evaluations': count}
+             for name, count in _evaluation_report['evaluations'].items()],
+            hide_index=True, use_container_width=True,
+        )
+        st.caption(
+            f"Baseline modes evaluated: {', '.join(_evaluation_report['baseline_modes']) or '-'} · "
+            f"baseline reuses: {_evaluation_report['baseline_hits']:,} · "
+            f"sim cache hits/misses: {_evaluation_report['sim_cache_hits']:,}/"
+            f"{_evaluation_report['sim_cache_misses']:,}"
+        )
+
 # ==============================================================================
 # DEBUG: Cube Analysis Raw Values
 # ==============================================================================
@@ -1065,6 +585,8 @@ for sf in sf_analysis:
             'risk': sf['risk'],
             'attempts': sf['expected_attempts'],
             'destroy_prob': sf['destroy_prob'],
+            'cost_p50': sf['cost_p50'],
+            'cost_p90': sf['cost_p90'],
             'optimal_strategy': sf['optimal_strategy'],
             'current_stars': sf['current_stars'],
             'target_stars': sf['target_stars'],
@@ -1298,6 +820,11 @@ if selected:
                     st.markdown(f"- Difficulty: {upg['details']['difficulty']}")
                 if 'risk' in upg['details']:
                     st.markdown(f"- Risk: {upg['details']['risk']}")
+                if 'cost_p90' in upg['details']:
+                    st.markdown(
+                        f"- Spend: median {upg['details']['cost_p50']:,.0f}, "
+                        f"90% of the time ≤ {upg['details']['cost_p90']:,.0f} diamonds"
+                    )
                 if 'rerolls' in upg['details']:
                     st.markdown(f"- ~{upg['details']['rerolls']:.0f} rerolls")
                 if 'current_pity' in upg['details'] and 'pity_threshold' in upg['details']:
@@ -1360,6 +887,39 @@ else:
 
 st.divider()
 
+# ==============================================================================
+# STARFORCE BUDGET PLAN
+# ==============================================================================
+if sf_gains:
+    sf_plan = plan_starforce_budget(starforce_stars(data), sf_gains, budget)
+    with st.expander("⭐ Starforce Budget Plan (whole budget on starforce)"):
+        if sf_plan.steps:
+            st.caption(
+                "Best DPS per diamond across all items, step by step. Costs include "
+                "rebuilding from ★12 after destruction."
+            )
+            st.dataframe([
+                {
+                    "Item": step.slot.title(),
+                    "Stars": f"★{step.start_stars}→★{step.target_stars}",
+                    "DPS Gain": f"+{step.dps_gain_pct:.2f}%",
+                    "Expected Cost": f"{step.expected_cost:,.0f}💎",
+                    "Boom Risk": f"{step.destroy_probability*100:.1f}%",
+                    "Efficiency": f"{step.efficiency:.4f}",
+                }
+                for step in sf_plan.steps
+            ], hide_index=True, use_container_width=True)
+            plan_col1, plan_col2, plan_col3 = st.columns(3)
+            plan_col1.metric("Total DPS Gain", f"≈ +{sf_plan.dps_gain_pct:.2f}%")
+            plan_col2.metric("Expected Cost", f"{sf_plan.expected_cost:,.0f}💎")
+            plan_col3.metric("Chance Within Budget", f"{sf_plan.probability_within()*100:.0f}%")
+            st.caption(
+                f"Spend: median {sf_plan.cost_percentile(50):,.0f}💎, "
+                f"90% of the time ≤ {sf_plan.cost_percentile(90):,.0f}💎"
+            )
+        else:
+            st.info("No starforce step fits within this budget.")
+
 # ==============================================================================
 # ALL OPTIONS RANKED
 # ==============================================================================
@@ -6,11 +6,15 @@ All Skills bonus is auto-calculated from equipment sources.
 import streamlit as st
 import sys
 import os
+from datetime import datetime
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from utils.data_manager import save_user_data, export_user_data_csv, import_user_data_csv, EQUIPMENT_SLOTS
+from utils.data_manager import (
+    save_user_data, queue_user_data_save, export_user_data_csv, import_user_data_csv, EQUIPMENT_SLOTS,
+    user_history, diff_user_versions, restore_user_version,
+)
 from utils.dps_calculator import (
     aggregate_stats as shared_aggregate_stats,
     calculate_dps as shared_calculate_dps,
@@ -39,7 +43,7 @@ data = st.session_state.user_data
 
 def auto_save():
     """Save data after changes."""
-    save_user_data(st.session_state.username, data)
+    queue_user_data_save(st.session_state.username, data)
 
 
 def calculate_all_skills() -> int:
@@ -546,7 +550,7 @@ with imp_col:
                 # Update session state
                 st.session_state.user_data = imported_data
                 # Save to file
-                save_user_data(st.session_state.username, imported_data)
+                save_user_data(st.session_state.username, imported_data, label="CSV import")
                 st.success("Build imported successfully! Refresh the page to see changes.")
                 st.rerun()
             else:
@@ -558,3 +562,39 @@ st.info("""
 2. Share the CSV file with friends
 3. They can upload it using "Import Build" to load your stats
 """)
+
+# ============================================================================
+# SAVE HISTORY
+# ============================================================================
+
+st.subheader("Save History")
+st.caption("Every save is kept. Compare two versions or roll back to an earlier one.")
+
+history = user_history(st.session_state.username)
+if len(history) < 2:
+    st.info("No earlier versions yet.")
+else:
+    def _version_name(version):
+        saved_at = datetime.fromtimestamp(version.saved_at).strftime('%Y-%m-%d %H:%M:%S')
+        return f"v{version.version} - {saved_at}" + (f" ({version.label})" if version.label else "")
+
+    by_number = {version.version: version for version in history}
+    numbers = list(reversed(by_number))
+    hist_col1, hist_col2 = st.columns(2)
+    with hist_col1:
+        from_version = st.selectbox("From", numbers, index=1, format_func=lambda n: _version_name(by_number[n]),
+                                    key="history_from")
+    with hist_col2:
+        to_version = st.selectbox("To", numbers, index=0, format_func=lambda n: _version_name(by_number[n]),
+                                  key="history_to")
+
+    changed = diff_user_versions(st.session_state.username, from_version, to_version)
+    if changed:
+        st.markdown("**Changed:** " + ", ".join(changed))
+    else:
+        st.markdown("No differences.")
+
+    if st.button(f"Restore v{from_version}", help="Saved as a new version; nothing is deleted"):
+        st.session_state.user_data = restore_user_version(st.session_state.username, from_version)
+        st.success(f"Restored version {from_version}.")
+        st.rerun()
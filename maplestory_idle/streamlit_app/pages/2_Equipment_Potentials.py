@@ -11,7 +11,7 @@ from datetime import datetime
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from core import ENEMY_DEFENSE_VALUES
-from utils.data_manager import save_user_data, EQUIPMENT_SLOTS
+from utils.data_manager import queue_user_data_save, EQUIPMENT_SLOTS
 from utils.cube_analyzer import analyze_all_cube_priorities, format_stat_display, CubeRecommendation, get_distribution_data_for_slot
 from utils.dps_calculator import (
     aggregate_stats, calculate_dps, calculate_effective_attack_speed_with_sources,
@@ -298,7 +298,7 @@ def calculate_stat_priorities(pot_totals: dict) -> list:
 
 def auto_save():
     """Save data and update last save timestamp."""
-    save_user_data(st.session_state.username, data)
+    queue_user_data_save(st.session_state.username, data)
     st.session_state.last_equip_save_time = datetime.now()
 
 
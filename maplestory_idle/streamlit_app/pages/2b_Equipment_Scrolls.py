@@ -11,7 +11,7 @@ from datetime import datetime
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from utils.data_manager import save_user_data, EQUIPMENT_SLOTS
+from utils.data_manager import queue_user_data_save, EQUIPMENT_SLOTS
 
 st.set_page_config(page_title="Equipment Scrolls", page_icon="📜", layout="wide")
 
@@ -86,7 +86,7 @@ def ensure_scroll_fields(scroll_data: dict) -> dict:
 
 def auto_save():
     """Save data and update timestamp."""
-    save_user_data(st.session_state.username, data)
+    queue_user_data_save(st.session_state.username, data)
     st.session_state.last_scroll_save_time = datetime.now()
 
 
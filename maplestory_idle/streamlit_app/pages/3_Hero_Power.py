@@ -12,7 +12,7 @@ from typing import Dict, Any
 # Add parent directory to path for core imports
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from utils.data_manager import save_user_data
+from utils.data_manager import queue_user_data_save
 from utils.dps_calculator import (
     aggregate_stats, calculate_dps,
     compute_phase_dps, STAGE_MOB_FRACTION, STAGE_BOSS_FRACTION,
@@ -30,7 +30,8 @@ from game.hero_power import (
     calculate_line_dps_value,
     compute_dps_reference_table_for_character,
     compute_best_lines_ranking_for_character,
-    analyze_budget,
+    analyze_budget_policy,
+    get_line_value_table,
 )
 
 st.set_page_config(page_title="Hero Power", page_icon="*", layout="wide")
@@ -57,7 +58,7 @@ PRESET_COUNT = 10
 
 
 def auto_save():
-    save_user_data(st.session_state.username, data)
+    queue_user_data_save(st.session_state.username, data)
 
 
 # DPS calculation wrappers (same pattern as other pages)
@@ -117,6 +118,26 @@ def calc_dps_from_stats(stats: Dict[str, Any]) -> float:
     return _dps_result(stats, combat_mode).get('total', 0)
 
 
+def get_page_line_value_table(level_config: HeroPowerLevelConfig):
+    """
+    Fresh-roll line value table shared by every analysis on this page.
+
+    Keyed on the stats plus everything calc_dps_from_stats reads from
+    settings, so reruns with unchanged inputs skip the DPS evaluations.
+    """
+    context = (
+        data.job_class,
+        getattr(data, 'combat_mode', 'stage'),
+        getattr(data, 'chapter', 'Chapter 27'),
+        getattr(data, 'use_realistic_dps', False),
+        getattr(data, 'boss_importance', 70),
+        getattr(data, 'boss_damage_multiplier', 1.0),
+    )
+    return get_line_value_table(
+        get_stats_for_dps(), calc_dps_from_stats, level_config, context=context,
+    )
+
+
 def get_value_range(tier_str: str, stat_str: str) -> tuple:
     """Get min/max value range for a stat at a given tier."""
     if not tier_str or not stat_str:
@@ -428,7 +449,11 @@ with tab2:
     level_config = get_level_config()
 
     # Analyze lock strategy with real DPS callbacks
-    analysis = analyze_lock_strategy(hp_config, level_config, calc_dps_from_stats, get_stats_for_dps)
+    line_value_table = get_page_line_value_table(level_config)
+    analysis = analyze_lock_strategy(
+        hp_config, level_config, calc_dps_from_stats, get_stats_for_dps,
+        value_table=line_value_table,
+    )
 
     st.markdown("### Current Lines Analysis")
 
@@ -484,7 +509,9 @@ with tab2:
     st.markdown("### Best Lines to Target")
     st.caption("Shows the most valuable lines to aim for when rerolling")
 
-    rankings = rank_all_possible_lines_by_dps(calc_dps_from_stats, get_stats_for_dps)
+    rankings = rank_all_possible_lines_by_dps(
+        calc_dps_from_stats, get_stats_for_dps, value_table=line_value_table,
+    )
     mode_rankings = rankings.get(analysis_mode, [])
 
     top_lines = []
@@ -800,9 +827,10 @@ with tab5:
 with tab6:
     st.markdown("**Hero Power Optimizer** — budget-driven")
     st.caption(
-        "Enter your medal budget. The optimizer picks a lock pattern that "
-        "maximizes expected DPS gain within that budget. Aggressive at low "
-        "lock counts (cheap rerolls), lenient as locks add up (rerolls get expensive)."
+        "Enter your medal budget. The optimizer solves the lock/reroll decision "
+        "exactly over every lock pattern and remaining budget, then picks the lock "
+        "pattern with the highest expected DPS. Aggressive at low lock counts "
+        "(cheap rerolls), lenient as locks add up or the budget runs down."
     )
 
     hp_config = build_hero_power_config(data.hero_power_lines)
@@ -819,9 +847,11 @@ with tab6:
         )
 
     with st.spinner("Computing optimal lock recommendation..."):
-        budget_result = analyze_budget(
+        line_value_table = get_page_line_value_table(level_config)
+        budget_result = analyze_budget_policy(
             hp_config, level_config, budget_medals,
             calc_dps_from_stats, get_stats_for_dps,
+            value_table=line_value_table,
         )
 
     if budget_result.get('error'):
@@ -853,13 +883,17 @@ with tab6:
             "locks accumulate — because each lock raises the per-reroll cost, "
             "shrinking the remaining budget."
         )
+        def _fmt_threshold(value):
+            return f"{value:.2f}%" if value is not None else "—"
+
         cascade_rows = []
         for c in budget_result['cascade']:
             cascade_rows.append({
                 "Locks held": c['locks_held'],
                 "Cost / reroll": f"{c['cost_per_reroll']:,}",
                 "Rerolls left in budget": f"{c['rerolls_in_budget']:,}",
-                "Lock next line if DPS >=": f"{c['reservation_dps_pct']:.2f}%",
+                "Lock next line if DPS >=": _fmt_threshold(c['reservation_dps_pct']),
+                "…with half the budget left": _fmt_threshold(c['reservation_half_budget_pct']),
             })
         st.dataframe(cascade_rows, use_container_width=True, hide_index=True)
 
@@ -895,7 +929,9 @@ with tab6:
     st.caption(f"Real DPS gain for each tier/stat/value combination against your current build (combat mode: {COMBAT_MODE_DISPLAY.get(getattr(data, 'combat_mode', 'stage'), 'Stage')}).")
 
     # Build the computed table once (used by both the per-tier display and the ranking)
-    computed_ref = compute_dps_reference_table_for_character(calc_dps_from_stats, get_stats_for_dps)
+    computed_ref = compute_dps_reference_table_for_character(
+        calc_dps_from_stats, get_stats_for_dps, value_table=line_value_table,
+    )
 
     tier_tabs = st.tabs(["Rare", "Epic", "Unique", "Legendary", "Mystic"])
     tier_order = ['rare', 'epic', 'unique', 'legendary', 'mystic']
@@ -937,6 +973,7 @@ with tab6:
 
     computed_ranking = compute_best_lines_ranking_for_character(
         calc_dps_from_stats, get_stats_for_dps, level_config, top_n=10,
+        value_table=line_value_table,
     )
     ranking_rows = []
     for entry in computed_ranking:
@@ -10,7 +10,7 @@ import os
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from utils.data_manager import save_user_data
+from utils.data_manager import queue_user_data_save
 from game.artifacts import (
     ARTIFACTS, ArtifactTier, PotentialTier, CombatScenario,
     ArtifactDefinition, ArtifactInstance, ArtifactConfig, ArtifactPotentialLine,
@@ -150,7 +150,7 @@ def get_potential_value(stat: str, tier: str) -> float:
 
 
 def auto_save():
-    save_user_data(st.session_state.username, data)
+    queue_user_data_save(st.session_state.username, data)
 
 
 def ensure_artifact_data():
@@ -3,7 +3,7 @@ Companions Page
 Configure companion inventory levels and equipped companions.
 """
 import streamlit as st
-from utils.data_manager import save_user_data
+from utils.data_manager import queue_user_data_save
 from utils.dps_calculator import aggregate_stats, calculate_dps
 from core import ENEMY_DEFENSE_VALUES
 from game.companions import (
@@ -23,7 +23,7 @@ data = st.session_state.user_data
 
 
 def auto_save():
-    save_user_data(st.session_state.username, data)
+    queue_user_data_save(st.session_state.username, data)
 
 
 # Initialize companion_levels if not present
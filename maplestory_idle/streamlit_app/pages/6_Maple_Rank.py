@@ -4,7 +4,7 @@ Track Maple Rank progression, main stat accumulation, and stat bonuses.
 Uses verified main stat scaling formulas from maple_rank.py.
 """
 import streamlit as st
-from utils.data_manager import save_user_data
+from utils.data_manager import queue_user_data_save
 from game.maple_rank import (
     MapleRankStatType, MapleRankConfig, MAPLE_RANK_STATS,
     STAT_DISPLAY_NAMES, MAIN_STAT_SPECIAL,
@@ -22,7 +22,7 @@ data = st.session_state.user_data
 
 
 def auto_save():
-    save_user_data(st.session_state.username, data)
+    queue_user_data_save(st.session_state.username, data)
 
 
 def build_maple_rank_config() -> MapleRankConfig:
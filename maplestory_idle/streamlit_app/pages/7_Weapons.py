@@ -3,7 +3,7 @@ Weapons Page - Predefined weapons with level and awakening tracking.
 All 28 weapons (7 rarities × 4 tiers) are shown.
 """
 import streamlit as st
-from utils.data_manager import save_user_data
+from utils.data_manager import queue_user_data_save
 from game.weapons import calculate_weapon_atk_str, BASE_ATK
 from game.weapon_mastery import (
     ALL_WEAPONS, WEAPON_MASTERY_REWARDS, RARITIES,
@@ -34,7 +34,7 @@ RARITY_COLORS = {
 
 
 def auto_save():
-    save_user_data(st.session_state.username, data)
+    queue_user_data_save(st.session_state.username, data)
 
 
 # Initialize weapons_data if not present
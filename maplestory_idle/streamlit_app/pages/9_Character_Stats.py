@@ -7,7 +7,7 @@ Adjustments are applied to DPS calculations throughout the app.
 """
 import streamlit as st
 from typing import Dict, Any, List, Tuple
-from utils.data_manager import save_user_data, EQUIPMENT_SLOTS
+from utils.data_manager import queue_user_data_save, EQUIPMENT_SLOTS
 from utils.dps_calculator import (
     aggregate_stats as shared_aggregate_stats,
     calculate_dps as shared_calculate_dps,
@@ -16,6 +16,7 @@ from utils.dps_calculator import (
     calculate_effective_attack_speed_with_sources,
     BASE_MIN_DMG,
     BASE_MAX_DMG,
+    last_aggregation_report,
 )
 from game.equipment import get_amplify_multiplier
 from game.job_classes import JobClass, get_main_stat_name, get_secondary_stat_name
@@ -99,7 +100,7 @@ BASE_CRIT_RATE = 0.0
 
 
 def auto_save():
-    save_user_data(st.session_state.username, data)
+    queue_user_data_save(st.session_state.username, data)
 
 
 def get_stat_sources(stat_key: str, raw_stats: Dict, job_class: JobClass = None, debug: bool = False) -> List[Tuple[str, float]]:
@@ -978,6 +979,7 @@ st.markdown("---")
 
 # Get calculated stats (with job class)
 calculated_stats, raw_stats, current_job_class = get_calculated_stats()
+aggregation_report = last_aggregation_report()
 
 # Get stat definitions for this job class
 STAT_DEFINITIONS = get_stat_definitions(current_job_class)
@@ -1604,3 +1606,30 @@ with st.expander("🔬 **Debug: StatAggregator Validation** (compare new unified
         import traceback
         st.error(f"Error running StatAggregator validation: {e}")
         st.code(traceback.format_exc())
+
+# ============================================================================
+# AGGREGATION BLOCKS - which parts of the account were recomputed
+# ============================================================================
+
+with st.expander("🧱 **Debug: Aggregation Blocks** (recomputed vs cached)"):
+    st.markdown("""
+    `aggregate_stats()` builds the stats from one cached block per subsystem
+    (per slot for equipment). A block is only recomputed when its part of your
+    data changed since it was last computed.
+    """)
+    if aggregation_report is None:
+        st.write("(no aggregation on this run)")
+    else:
+        recomputed = set(aggregation_report.recomputed)
+        st.markdown(
+            f"**{len(recomputed)} of {len(aggregation_report.blocks)} blocks recomputed** "
+            f"for this page's raw stats."
+        )
+        st.dataframe(
+            [
+                {"Block": name, "Status": "🔄 Recomputed" if name in recomputed else "✅ Cached"}
+                for name in aggregation_report.blocks
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
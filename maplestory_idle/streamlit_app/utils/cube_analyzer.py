@@ -3,10 +3,12 @@ Cube Analyzer - Bridge between Streamlit data and cubes.py analysis functions.
 
 Provides cube priority recommendations using the original DPS calculation methods.
 """
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Sequence
 from dataclasses import dataclass
 from copy import deepcopy
 
+import numpy as np
+
 # Import from the cubes module in maplestory_idle root
 from game.cubes import (
     PotentialLine,
@@ -379,6 +381,7 @@ def analyze_all_cube_priorities(
     aggregate_stats_func: Callable[[], Dict[str, float]],
     calculate_dps_func: Callable[[Dict[str, float]], Dict[str, Any]],
     main_stat_type: StatType = None,
+    slots: Optional[Sequence[str]] = None,
 ) -> List[CubeRecommendation]:
     """
     Analyze cube priority for all equipment slots.
@@ -390,6 +393,8 @@ def analyze_all_cube_priorities(
         aggregate_stats_func: Function to aggregate all stats (returns stats dict)
         calculate_dps_func: Function to calculate DPS from stats dict
         main_stat_type: Player's main stat type. If None, auto-detects from user_data.job_class
+        slots: Only analyze these slots (default: all). Results for separate
+            slot subsets can be merged with rank_cube_recommendations()
 
     Returns:
         List of CubeRecommendation sorted by efficiency (best first)
@@ -406,7 +411,7 @@ def analyze_all_cube_priorities(
     results: List[CubeRecommendation] = []
 
     try:
-      for slot in EQUIPMENT_SLOTS:
+      for slot in (EQUIPMENT_SLOTS if slots is None else slots):
         slot_pots = user_data.equipment_potentials.get(slot, {})
 
         # Capture original potentials ONCE before any testing
@@ -515,8 +520,13 @@ def analyze_all_cube_priorities(
         # Always restore potentials — guards against any exception or missed per-call restore
         user_data.equipment_potentials = _potentials_backup
 
+    return rank_cube_recommendations(results)
+
+
+def rank_cube_recommendations(results: List[CubeRecommendation]) -> List[CubeRecommendation]:
+    """Sort recommendations by efficiency (best first) and assign priority ranks."""
     # Sort by efficiency score (higher = better to cube)
-    results.sort(key=lambda x: x.efficiency_score, reverse=True)
+    results = sorted(results, key=lambda x: x.efficiency_score, reverse=True)
 
     # Assign priority ranks
     for i, r in enumerate(results):
@@ -677,43 +687,27 @@ def _solve_optimal_stopping_no_tierup(
 
     This is solved by finding T where continuing has zero expected gain.
     """
-    n = len(sorted_dps)
-
-    # Binary search for threshold
-    # At threshold T: E[continue] = E[keep]
-    # E[continue] = -cost + E[max(new_roll, optimal_value)]
-    # E[keep at T] = T
-
-    # Simpler approach: iterate from high to low, find where E[continue] = d
-    # E[continue from d] = -cost + sum over d' of P(d') * max(d', threshold)
-
-    best_threshold = sorted_dps[-1]  # Start with highest value
-    best_ev = sorted_dps[-1]
-
-    # Try each possible threshold (keeping if >= threshold)
-    for i in range(n - 1, -1, -1):
-        threshold = sorted_dps[i]
-
-        # If we use threshold T:
-        # P(keep) = P(d >= T) = sum of probs for d >= T
-        # E[d | keep] = sum of (d * prob) for d >= T / P(keep)
-        # E[cubes] = 1 / P(keep)
-        # E[value] = E[d | keep] - E[cubes] * cost
-
-        p_keep = sum(sorted_probs[i:])
-        if p_keep <= 0:
-            continue
-
-        e_d_given_keep = sum(d * p for d, p in zip(sorted_dps[i:], sorted_probs[i:])) / p_keep
-        e_cubes = 1.0 / p_keep
-        e_value = e_d_given_keep - e_cubes * cube_cost_dps
-
-        if e_value > best_ev:
-            best_ev = e_value
-            best_threshold = threshold
+    dps = np.asarray(sorted_dps, dtype=float)
+    probs = np.asarray(sorted_probs, dtype=float)
+
+    # Keeping any roll >= threshold T = sorted_dps[i]:
+    # P(keep) = P(d >= T), E[d | keep] = sum(d * p for d >= T) / P(keep),
+    # E[cubes] = 1 / P(keep), E[value] = E[d | keep] - E[cubes] * cost.
+    # Suffix sums give every threshold at once.
+    p_keep = np.cumsum(probs[::-1])[::-1]
+    kept_dps = np.cumsum((dps * probs)[::-1])[::-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        e_value = np.where(p_keep > 0, kept_dps / p_keep - (1.0 / p_keep) * cube_cost_dps, -np.inf)
+
+    # Best threshold beats keeping only the highest roll; ties go to the higher threshold
+    best = len(dps) - 1 - int(np.argmax(e_value[::-1]))
+    if e_value[best] > dps[-1]:
+        best_threshold, best_ev = float(dps[best]), float(e_value[best])
+    else:
+        best_threshold, best_ev = float(dps[-1]), float(dps[-1])
 
     # Calculate expected cubes to reach threshold
-    p_above_threshold = sum(p for d, p in zip(sorted_dps, sorted_probs) if d >= best_threshold)
+    p_above_threshold = float(probs[dps >= best_threshold].sum())
     e_cubes = 1.0 / p_above_threshold if p_above_threshold > 0 else float('inf')
 
     return (best_threshold, best_ev, e_cubes)
@@ -736,10 +730,11 @@ def _solve_optimal_stopping_with_tierup(
 
     This is a fixed-point equation. We iterate until convergence.
     """
-    n = len(sorted_dps)
+    dps = np.asarray(sorted_dps, dtype=float)
+    probs = np.asarray(sorted_probs, dtype=float)
 
     # Initialize V(d) = d for all d (keeping is baseline)
-    V = {d: d for d in sorted_dps}
+    V = dps
 
     # Value iteration
     max_iterations = 100
@@ -747,37 +742,29 @@ def _solve_optimal_stopping_with_tierup(
 
     for iteration in range(max_iterations):
         # E[V(new_roll)] = sum of P(d') * V(d')
-        e_v_new_roll = sum(p * V[d] for d, p in zip(sorted_dps, sorted_probs))
+        e_v_new_roll = float(probs @ V)
 
         # Expected value of using a cube
         e_cube = -cube_cost_dps + tier_up_prob * next_tier_ev + (1 - tier_up_prob) * e_v_new_roll
 
         # Update V(d) = max(d, e_cube)
-        new_V = {}
-        max_change = 0.0
-        for d in sorted_dps:
-            new_val = max(d, e_cube)
-            max_change = max(max_change, abs(new_val - V[d]))
-            new_V[d] = new_val
-
+        new_V = np.maximum(dps, e_cube)
+        max_change = float(np.max(np.abs(new_V - V)))
         V = new_V
 
         if max_change < tolerance:
             break
 
     # Find threshold: lowest d where V(d) = d (keeping is optimal)
-    threshold = sorted_dps[0]
-    for d in sorted_dps:
-        if V[d] <= d + tolerance:  # Keeping is optimal
-            threshold = d
-            break
+    keep = V <= dps + tolerance
+    threshold = float(dps[np.argmax(keep)]) if keep.any() else float(dps[0])
 
     # Expected value = E[V(d)] over distribution (starting fresh)
-    expected_value = sum(p * V[d] for d, p in zip(sorted_dps, sorted_probs))
+    expected_value = float(probs @ V)
 
     # Expected cubes to reach threshold or tier-up
     # This is complex - approximate with geometric
-    p_keep = sum(p for d, p in zip(sorted_dps, sorted_probs) if d >= threshold)
+    p_keep = float(probs[dps >= threshold].sum())
     p_stop = p_keep + tier_up_prob * (1 - p_keep)  # Stop if keep OR tier-up
     e_cubes = 1.0 / p_stop if p_stop > 0 else float('inf')
 
@@ -1086,9 +1073,10 @@ def analyze_all_tier_upgrades(
     aggregate_stats_func: Callable[[], Dict[str, float]],
     calculate_dps_func: Callable[[Dict[str, float]], Dict[str, Any]],
     main_stat_type: StatType = None,
+    slots: Optional[Sequence[str]] = None,
 ) -> List[TierUpgradeRecommendation]:
     """
-    Analyze tier upgrade value for all equipment slots.
+    Analyze tier upgrade value for all equipment slots (or only `slots`).
 
     Returns list of recommendations sorted by efficiency (best first).
     """
@@ -1106,7 +1094,7 @@ def analyze_all_tier_upgrades(
     _potentials_backup = deepcopy(user_data.equipment_potentials)
 
     try:
-      for slot in EQUIPMENT_SLOTS:
+      for slot in (EQUIPMENT_SLOTS if slots is None else slots):
         slot_pots = user_data.equipment_potentials.get(slot, {})
 
         # Capture original potentials ONCE before any testing
@@ -3,9 +3,20 @@ Data manager for loading and saving user data to CSV files.
 Each user has a single CSV file with all their character data.
 """
 import os
+import atexit
+import copy
 import csv
-from typing import Dict, Any, Optional, List, TYPE_CHECKING
-from pydantic import BaseModel, Field
+import hashlib
+import json
+import threading
+from typing import Callable, Dict, Any, Optional, List, Tuple, TYPE_CHECKING
+from pydantic import BaseModel, Field, PrivateAttr
+
+from core.constants import EQUIPMENT_SLOTS
+
+from .tracked_containers import TrackedDict, VersionCell, track
+from .save_queue import SaveQueue
+from .user_store import AccountVersion, UserStore, section_table
 
 if TYPE_CHECKING:
     from game.equipment import Equipment
@@ -16,12 +27,7 @@ if TYPE_CHECKING:
 # Path to user data directory
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 USERS_DATA_DIR = os.path.join(DATA_DIR, "users")
-
-# Equipment slots
-EQUIPMENT_SLOTS = [
-    "hat", "top", "bottom", "gloves", "shoes",
-    "belt", "shoulder", "cape", "ring", "necklace", "eye", "face", "earrings"
-]
+USER_DB_NAME = "users.db"
 
 
 class UserData(BaseModel):
@@ -96,6 +102,216 @@ class UserData(BaseModel):
     # Unique stats (HeroUniqueStatOption levels)
     unique_stats: Dict[str, int] = Field(default_factory=dict)
 
+    # Change tracking for digest() (see "Account digest" below)
+    _root_cell: VersionCell = PrivateAttr(default_factory=VersionCell)
+    _field_cells: Dict[str, VersionCell] = PrivateAttr(default_factory=dict)
+    _slot_cells: Dict[str, Dict[str, VersionCell]] = PrivateAttr(default_factory=dict)
+    _section_cells: Dict[str, Tuple[VersionCell, ...]] = PrivateAttr(default_factory=dict)
+    _section_digests: Dict[str, Tuple[Tuple[int, ...], str]] = PrivateAttr(default_factory=dict)
+    _root_digest: Optional[Tuple[int, str]] = PrivateAttr(default=None)
+
+    # Deferred tables (see "Deferred loading" below)
+    _unloaded: Dict[str, str] = PrivateAttr(default_factory=dict)
+    _loader: Optional[Callable[[str], Dict[str, Any]]] = PrivateAttr(default=None)
+    _stored_digests: Dict[str, str] = PrivateAttr(default_factory=dict)
+    _load_failed: bool = PrivateAttr(default=False)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._install_tracking()
+
+    if not TYPE_CHECKING:
+        def __getattr__(self, name: str) -> Any:
+            if name in _GROUPED_FIELDS:
+                table = self.__pydantic_private__['_unloaded'].get(name)
+                if table is not None:
+                    self._load_table(table)
+                    return self.__dict__[name]
+            return super().__getattr__(name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            self.__pydantic_private__['_unloaded'].pop(name, None)
+            self._track_field(name)
+
+    def __copy__(self) -> 'UserData':
+        # Shares the field containers, and with them their version cells
+        self._load_all()
+        copied = super().__copy__()
+        copied._section_digests = {}
+        copied._root_digest = None
+        return copied
+
+    def __deepcopy__(self, memo: Optional[Dict[int, Any]] = None) -> 'UserData':
+        self._load_all()
+        copied = super().__deepcopy__(memo)
+        copied._install_tracking()
+        return copied
+
+    def __getstate__(self) -> Dict[Any, Any]:
+        self._load_all()
+        return super().__getstate__()
+
+    def __setstate__(self, state: Dict[Any, Any]) -> None:
+        super().__setstate__(state)
+        self._install_tracking()
+
+    def __iter__(self):
+        self._load_all()
+        return super().__iter__()
+
+    def __repr_args__(self):
+        self._load_all()
+        return super().__repr_args__()
+
+    def model_dump(self, **kwargs: Any) -> Dict[str, Any]:
+        self._load_all()
+        return super().model_dump(**kwargs)
+
+    def model_dump_json(self, **kwargs: Any) -> str:
+        self._load_all()
+        return super().model_dump_json(**kwargs)
+
+    @property
+    def load_failed(self) -> bool:
+        """
+        True when the saved account could not be read. The data is then not
+        the user's, and save_user_data()/queue_user_data_save() refuse to
+        write it over what is stored.
+        """
+        return self.__pydantic_private__['_load_failed']
+
+    def _install_tracking(self) -> None:
+        """Fresh version cells for every field, and every container value tracked by them."""
+        root = VersionCell()
+        self._root_cell = root
+        self._field_cells = {name: VersionCell(root) for name in type(self).model_fields}
+        self._slot_cells = {name: {slot: VersionCell(root) for slot in EQUIPMENT_SLOTS} for name in _SLOT_FIELDS}
+        self._section_cells = self._cells_by_section()
+        self._section_digests = {}
+        self._root_digest = None
+        for name in type(self).model_fields:
+            self._track_field(name, bump=False)
+
+    def _track_field(self, name: str, bump: bool = True) -> None:
+        """Re-track field `name` after it was assigned."""
+        value = self.__dict__[name]
+        cell = self._field_cells[name]
+        if name in _SLOT_FIELDS:
+            slot_cells = self._slot_cells[name]
+            if isinstance(value, dict):
+                self.__dict__[name] = TrackedDict(value, cell, cells=slot_cells)
+            if bump:
+                for slot_cell in slot_cells.values():
+                    slot_cell.bump()
+        else:
+            self.__dict__[name] = track(value, cell)
+        if bump:
+            cell.bump()
+
+    def _cells_by_section(self) -> Dict[str, Tuple[VersionCell, ...]]:
+        cells = {
+            source: tuple(self._field_cells[name] for name in names)
+            for source, names in SOURCE_FIELDS.items()
+        }
+        for source, names in SLOT_SOURCE_FIELDS.items():
+            for slot in EQUIPMENT_SLOTS:
+                cells[slot_source(source, slot)] = tuple(self._slot_cells[name][slot] for name in names)
+        cells[CHARACTER_SOURCE] = tuple(
+            cell for name, cell in self._field_cells.items() if name not in _GROUPED_FIELDS
+        )
+        return cells
+
+    def _section_value(self, source: str) -> Any:
+        """The values hashed for stat source `source` (see source_fingerprints)."""
+        if source in SOURCE_FIELDS:
+            return [getattr(self, name) for name in SOURCE_FIELDS[source]]
+        if source == CHARACTER_SOURCE:
+            return {name: getattr(self, name) for name in type(self).model_fields if name not in _GROUPED_FIELDS}
+        group, slot = source.split(":", 1)
+        return [(getattr(self, name) or {}).get(slot) for name in SLOT_SOURCE_FIELDS[group]]
+
+    def section_digests(self) -> Dict[str, str]:
+        """Digest of every stat source (see source_fingerprints), re-hashing only edited ones."""
+        # Private attributes are read from __pydantic_private__ directly:
+        # BaseModel.__getattr__ costs more than the rest of a cache hit
+        private = self.__pydantic_private__
+        cache = private['_section_digests']
+        digests = {}
+        for source, cells in private['_section_cells'].items():
+            versions = tuple(cell.value for cell in cells)
+            cached = cache.get(source)
+            if cached is None or cached[0] != versions:
+                cached = (versions, _digest(self._section_value(source)))
+                cache[source] = cached
+            digests[source] = cached[1]
+        return digests
+
+    def digest(self) -> str:
+        """
+        Canonical digest of the whole account: equal for two UserData with equal
+        contents. Free while nothing was edited since the last call.
+        """
+        private = self.__pydantic_private__
+        version = private['_root_cell'].value
+        cached = private['_root_digest']
+        if cached is None or cached[0] != version:
+            cached = (version, _digest(sorted(self.section_digests().items())))
+            private['_root_digest'] = cached
+        return cached[1]
+
+    def _defer_tables(self, loader: Callable[[str], Dict[str, Any]], stored_digests: Dict[str, str]) -> None:
+        """
+        Drop every grouped field until it is first read; `loader(table)`
+        then supplies the fields of its store table. Until then the
+        table's sections report `stored_digests`, so digests and auto-saves
+        do not load it.
+        """
+        private = self.__pydantic_private__
+        for table, names in _TABLE_FIELDS.items():
+            for name in names:
+                del self.__dict__[name]
+                private['_unloaded'][name] = table
+        private['_loader'] = loader
+        private['_stored_digests'] = stored_digests
+        for source, cells in private['_section_cells'].items():
+            if source != CHARACTER_SOURCE and source in stored_digests:
+                private['_section_digests'][source] = (tuple(cell.value for cell in cells), stored_digests[source])
+
+    def _load_table(self, table: str) -> None:
+        """Read the still-unloaded fields of store table `table`."""
+        private = self.__pydantic_private__
+        with _deferred_load_lock:
+            names = [name for name, name_table in private['_unloaded'].items() if name_table == table]
+            if not names:
+                return
+            try:
+                fields = private['_loader'](table)
+            except Exception:
+                private['_load_failed'] = True
+                raise
+            model_fields = type(self).model_fields
+            for name in names:
+                value = fields[name] if name in fields else model_fields[name].get_default(call_default_factory=True)
+                self.__pydantic_validator__.validate_assignment(self, name, value)
+                # Unchanged since the save: the stored digests still hold
+                self._track_field(name, bump=False)
+                del private['_unloaded'][name]
+            if not private['_unloaded']:
+                private['_loader'] = None
+
+    def _load_all(self) -> None:
+        for table in set(self.__pydantic_private__['_unloaded'].values()):
+            self._load_table(table)
+
+    def _deferred_digests(self, table: str) -> Optional[Dict[str, str]]:
+        """Stored digests of `table`'s sections while none of its fields is loaded, else None."""
+        private = self.__pydantic_private__
+        if any(private['_unloaded'].get(name) != table for name in _TABLE_FIELDS[table]):
+            return None
+        return {section: digest for section, digest in private['_stored_digests'].items()
+                if section_table(section)[0] == table}
+
     def get_equipment(self, slot: str) -> 'Equipment':
         """
         Get Equipment object for a slot.
@@ -181,164 +397,287 @@ class UserData(BaseModel):
         )
 
 
+# =============================================================================
+# Stat sources
+# =============================================================================
+
+# UserData fields grouped by the part of the account they describe, so an
+# analysis can record what it read and tell later what changed since.
+CHARACTER_SOURCE = "character"  # every field not listed below
+SOURCE_FIELDS = {
+    "hero_power": (
+        "hero_power_lines", "hero_power_passives", "hero_power_level",
+        "hero_power_presets", "active_hero_power_preset", "hero_power_passive_values",
+    ),
+    "artifacts": ("artifacts_equipped", "artifacts_inventory", "artifacts_resonance"),
+    "weapons": ("weapons_data", "equipped_weapon_key", "summoning_level"),
+    "companions": (
+        "companions_equipped", "companions_inventory", "companion_levels", "equipped_companions",
+    ),
+}
+# Slot-keyed fields get one source per equipment slot, e.g. "potentials:gloves"
+SLOT_SOURCE_FIELDS = {
+    "equipment": ("equipment_items", "equipment_scrolls"),
+    "potentials": ("equipment_potentials",),
+}
+
+
+def slot_source(source: str, slot: str) -> str:
+    """Name of the per-slot stat source, e.g. slot_source("potentials", "gloves")."""
+    return f"{source}:{slot}"
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def source_fingerprints(data: UserData) -> Dict[str, str]:
+    """
+    Digest of every stat source in `data`: one per SOURCE_FIELDS group, one
+    per slot for SLOT_SOURCE_FIELDS, and CHARACTER_SOURCE for the remaining
+    fields (level, job, combat settings, maple rank, ...). A source is
+    unchanged between two snapshots iff its digest is equal.
+    """
+    return data.section_digests()
+
+
+# =============================================================================
+# Account digest
+# =============================================================================
+# UserData keeps its dict/list fields in change-tracked containers
+# (tracked_containers.py). Each stat source above has its own version cells:
+# one per field, and one per (field, slot) for the slot-keyed fields. An
+# edit bumps the cells of the sources it touches plus a root cell, so
+# digest() is a single comparison while nothing changed and otherwise
+# re-hashes only the edited sources.
+
+_SLOT_FIELDS = frozenset(name for names in SLOT_SOURCE_FIELDS.values() for name in names)
+_GROUPED_FIELDS = frozenset(name for names in SOURCE_FIELDS.values() for name in names) | _SLOT_FIELDS
+
+
+# =============================================================================
+# Deferred loading
+# =============================================================================
+# load_user_data() reads only the character table. Every other store table
+# (one per SOURCE_FIELDS / SLOT_SOURCE_FIELDS group) is read the first time
+# one of its fields is, so a page loads just the parts of the account it
+# shows. Copies, pickles, dumps and iteration load the whole account.
+
+# Store table -> the UserData fields it holds
+_TABLE_FIELDS: Dict[str, Tuple[str, ...]] = {**SOURCE_FIELDS, **SLOT_SOURCE_FIELDS}
+_deferred_load_lock = threading.RLock()
+
+
 def _get_user_file(username: str) -> str:
-    """Get path to user's data file."""
+    """Get path to user's legacy CSV data file."""
     os.makedirs(USERS_DATA_DIR, exist_ok=True)
     return os.path.join(USERS_DATA_DIR, f"{username.lower()}_data.csv")
 
 
+_user_stores: Dict[str, UserStore] = {}
+_user_stores_lock = threading.Lock()
+
+
+def _get_user_store() -> UserStore:
+    """The account store in USERS_DATA_DIR (one UserStore per database file)."""
+    os.makedirs(USERS_DATA_DIR, exist_ok=True)
+    path = os.path.join(USERS_DATA_DIR, USER_DB_NAME)
+    with _user_stores_lock:
+        store = _user_stores.get(path)
+        if store is None:
+            store = _user_stores[path] = UserStore(path)
+    return store
+
+
+def _write_queued_sections(username: str, sections: Dict[str, Any], removed: set) -> None:
+    _get_user_store().save_sections(username, sections, removed, label="Auto-save")
+
+
+_save_queue = SaveQueue(_write_queued_sections)
+# Section digests as of each user's last queued save (what the queue already holds)
+_queued_digests: Dict[str, Dict[str, str]] = {}
+_queued_digests_lock = threading.Lock()
+atexit.register(_save_queue.flush)
+
+_SLOT_ORDER = {slot: i for i, slot in enumerate(EQUIPMENT_SLOTS)}
+
+
+def _store_digests(data: UserData) -> Dict[str, str]:
+    """section_digests(), plus a section for any slot-field key that is not an equipment slot."""
+    digests = data.section_digests()
+    for group, names in SLOT_SOURCE_FIELDS.items():
+        deferred = data._deferred_digests(group)
+        if deferred is not None:
+            digests.update((section, digest) for section, digest in deferred.items()
+                           if section_table(section)[1] not in _SLOT_ORDER)
+            continue
+        per_slot = [getattr(data, name) or {} for name in names]
+        for key in set().union(*per_slot).difference(_SLOT_ORDER):
+            digests[slot_source(group, key)] = _digest([values.get(key) for values in per_slot])
+    return digests
+
+
+def _store_rows(data: UserData, section: str) -> List[Tuple[str, str, Any]]:
+    """(field, part, value) rows the store keeps for `section`."""
+    table, part = section_table(section)
+    if part:
+        return [(name, part, (getattr(data, name) or {}).get(part)) for name in SLOT_SOURCE_FIELDS[table]]
+    if table in SOURCE_FIELDS:
+        names = SOURCE_FIELDS[table]
+    else:
+        names = [name for name in UserData.model_fields if name not in _GROUPED_FIELDS]
+    return [(name, '', getattr(data, name)) for name in names]
+
+
+def _fields_from_tables(tables: Dict[str, List[Tuple[str, str, Any]]]) -> Dict[str, Any]:
+    """UserData field values from UserStore.load() rows (slot-keyed fields in EQUIPMENT_SLOTS order)."""
+    fields: Dict[str, Any] = {}
+    for rows in tables.values():
+        for name, part, value in rows:
+            if part:
+                fields.setdefault(name, {})[part] = value
+            else:
+                fields[name] = value
+    for name in _SLOT_FIELDS.intersection(fields):
+        fields[name] = dict(sorted(fields[name].items(),
+                                   key=lambda item: (_SLOT_ORDER.get(item[0], len(_SLOT_ORDER)), item[0])))
+    return fields
+
+
 def user_has_data(username: str) -> bool:
     """Check if user has saved data."""
-    return os.path.exists(_get_user_file(username))
+    return _get_user_store().has_user(username) or os.path.exists(_get_user_file(username))
 
 
-def save_user_data(username: str, data: UserData) -> bool:
+def save_user_data(username: str, data: UserData, label: str = "") -> bool:
     """
-    Save user data to CSV.
-    Format: section,key,subkey,value
+    Save user data to the account store (see user_store.py), rewriting only
+    the sections that changed since the last save. Auto-saves still queued
+    for the user are written first. `label` names the new history version.
     """
-    filepath = _get_user_file(username)
-
+    if data.load_failed:
+        print(f"Not saving user data: {username}'s saved account failed to load")
+        return False
+    key = username.lower()
+    digests = _store_digests(data)
     try:
-        with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['section', 'key', 'subkey', 'value'])
-
-            # Character info
-            writer.writerow(['character', 'level', '', str(data.character_level)])
-            writer.writerow(['character', 'all_skills', '', str(data.all_skills)])
-            writer.writerow(['character', 'combat_mode', '', data.combat_mode])
-            writer.writerow(['character', 'chapter', '', data.chapter])
-            writer.writerow(['character', 'job_class', '', data.job_class])
-
-            # Equipment items
-            for slot, item in data.equipment_items.items():
-                for key, value in item.items():
-                    writer.writerow(['equipment', slot, key, str(value)])
-
-            # Equipment potentials
-            for slot, pots in data.equipment_potentials.items():
-                for key, value in pots.items():
-                    writer.writerow(['potential', slot, key, str(value)])
-
-            # Hero Power lines
-            for line_id, line_data in data.hero_power_lines.items():
-                for key, value in line_data.items():
-                    writer.writerow(['hero_power_line', line_id, key, str(value)])
-
-            # Hero Power passives
-            for stat_type, level in data.hero_power_passives.items():
-                writer.writerow(['hero_power_passive', stat_type, '', str(level)])
-
-            # Hero Power level config
-            for key, value in data.hero_power_level.items():
-                writer.writerow(['hero_power_level', key, '', str(value)])
-
-            # Hero Power presets
-            for preset_name, preset_data in data.hero_power_presets.items():
-                for line_id, line_data in preset_data.get('lines', {}).items():
-                    for key, value in line_data.items():
-                        writer.writerow(['hero_power_preset', preset_name, f'{line_id}_{key}', str(value)])
-
-            # Active Hero Power preset
-            writer.writerow(['hero_power_active_preset', 'name', '', data.active_hero_power_preset])
-
-            # Artifacts equipped
-            for slot, artifact in data.artifacts_equipped.items():
-                for key, value in artifact.items():
-                    writer.writerow(['artifact_equipped', slot, key, str(value)])
-
-            # Artifacts inventory
-            for artifact_id, artifact in data.artifacts_inventory.items():
-                for key, value in artifact.items():
-                    writer.writerow(['artifact_inventory', artifact_id, key, str(value)])
-
-            # Artifacts resonance
-            for key, value in data.artifacts_resonance.items():
-                writer.writerow(['artifact_resonance', key, '', str(value)])
-
-            # Weapons data
-            for weapon_key, weapon_data in data.weapons_data.items():
-                for key, value in weapon_data.items():
-                    writer.writerow(['weapons_data', weapon_key, key, str(value)])
-
-            # Equipped weapon key
-            if data.equipped_weapon_key:
-                writer.writerow(['equipped_weapon_key', '', '', data.equipped_weapon_key])
-
-            # Summoning level
-            writer.writerow(['summoning_level', '', '', str(data.summoning_level)])
-
-            # Companions equipped
-            for slot, companion in data.companions_equipped.items():
-                for key, value in companion.items():
-                    writer.writerow(['companion_equipped', slot, key, str(value)])
-
-            # Companions inventory
-            for comp_id, companion in data.companions_inventory.items():
-                for key, value in companion.items():
-                    writer.writerow(['companion_inventory', comp_id, key, str(value)])
-
-            # Companion levels (new format)
-            for comp_key, level in data.companion_levels.items():
-                writer.writerow(['companion_level', comp_key, '', str(level)])
-
-            # Equipped companions (new format)
-            for slot_idx, comp_key in enumerate(data.equipped_companions or []):
-                if comp_key:
-                    writer.writerow(['equipped_companion', str(slot_idx), '', comp_key])
-
-            # Maple Rank - handle nested stat_levels dict
-            for key, value in data.maple_rank.items():
-                if key == 'stat_levels' and isinstance(value, dict):
-                    for stat_key, stat_value in value.items():
-                        writer.writerow(['maple_rank_stat', stat_key, '', str(stat_value)])
-                else:
-                    writer.writerow(['maple_rank', key, '', str(value)])
-
-            # Equipment Sets
-            for key, value in data.equipment_sets.items():
-                writer.writerow(['equipment_sets', key, '', str(value)])
-
-            # Manual adjustments
-            for stat, value in data.manual_adjustments.items():
-                writer.writerow(['manual_adj', stat, '', str(value)])
-
-            # Guild skills
-            for stat, value in data.guild_skills.items():
-                writer.writerow(['guild_skill', stat, '', str(value)])
-
-            # Equipment scrolls
-            for slot, scroll_data in data.equipment_scrolls.items():
-                for key, value in scroll_data.items():
-                    writer.writerow(['equipment_scroll', slot, key, str(value)])
-
-            # Hero Power passive values (direct values)
-            for stat_key, value in data.hero_power_passive_values.items():
-                writer.writerow(['hero_power_passive_value', stat_key, '', str(value)])
-
-            # Unique stats
-            for stat_key, level in data.unique_stats.items():
-                writer.writerow(['unique_stat', stat_key, '', str(level)])
-
-        return True
+        _save_queue.flush(key)
+        _get_user_store().save(username, digests, lambda section: _store_rows(data, section), label=label)
     except Exception as e:
         print(f"Error saving user data: {e}")
+        with _queued_digests_lock:
+            _queued_digests.pop(key, None)
         return False
+    # The store now holds `digests`; later auto-saves queue what differs from them
+    with _queued_digests_lock:
+        _queued_digests[key] = digests
+    return True
 
 
 def load_user_data(username: str) -> UserData:
     """
-    Load user data from CSV.
-    Returns default UserData if file doesn't exist.
+    Load user data from the account store. Only the character table is read
+    now; the other sections load when first accessed (see "Deferred
+    loading"). Accounts still saved as CSV (before the store existed) are
+    migrated into it on first load. Returns default UserData if the user has
+    no data, and default UserData marked load_failed if the store could not
+    be read.
     """
+    _save_queue.flush(username.lower())
+    with _queued_digests_lock:
+        _queued_digests.pop(username.lower(), None)
+    store = _get_user_store()
+    if store.has_user(username):
+        try:
+            data = UserData(**{**_fields_from_tables(store.load(username, [CHARACTER_SOURCE])),
+                               'username': username})
+            data._defer_tables(lambda table: load_user_section(username, table), store.saved_digests(username))
+            return data
+        except Exception as e:
+            print(f"Error loading user data: {e}")
+            data = UserData(username=username)
+            _init_default_data(data)
+            data._load_failed = True
+            return data
+
     data = UserData(username=username)
     filepath = _get_user_file(username)
-
     if not os.path.exists(filepath):
         _init_default_data(data)
         return data
 
+    data = _load_user_csv(data, filepath)
+    save_user_data(username, data, label="Migrated from CSV")
+    return data
+
+
+def queue_user_data_save(username: str, data: UserData) -> None:
+    """
+    Auto-save without blocking: hand the sections of `data` that changed
+    since the last queued save to the background writer (save_queue.py),
+    which writes them once the user stops editing for a moment.
+    """
+    if data.load_failed:
+        return
+    key = username.lower()
+    digests = _store_digests(data)
+    with _queued_digests_lock:
+        known = _queued_digests.get(key)
+        if known is None:
+            known = _get_user_store().saved_digests(key)
+        _queued_digests[key] = digests
+        sections = {
+            section: (digest, copy.deepcopy(_store_rows(data, section)))
+            for section, digest in digests.items() if known.get(section) != digest
+        }
+        removed = [section for section in known if section not in digests]
+        if sections or removed:
+            _save_queue.put(key, sections, removed)
+
+
+def flush_user_data(username: Optional[str] = None) -> bool:
+    """Write queued auto-saves of `username` (everyone's if None) now; False if a write failed."""
+    return _save_queue.flush(username.lower() if username is not None else None)
+
+
+def user_history(username: str) -> List[AccountVersion]:
+    """Every saved version of the user's account, oldest first."""
+    _save_queue.flush(username.lower())
+    return _get_user_store().history(username)
+
+
+def load_user_version(username: str, version: int) -> UserData:
+    """The account as saved in `version` (see user_history). Raises KeyError for an unknown version."""
+    return UserData(**{**_fields_from_tables(_get_user_store().load_version(username, version)),
+                       'username': username})
+
+
+def diff_user_versions(username: str, from_version: int, to_version: int) -> List[str]:
+    """Stat sources (see source_fingerprints) that differ between two saved versions."""
+    return _get_user_store().diff(username, from_version, to_version)
+
+
+def restore_user_version(username: str, version: int) -> UserData:
+    """
+    Make `version` the current account again. History is append-only: the
+    restore is saved as a new version. Returns the restored data.
+    """
+    data = load_user_version(username, version)
+    if not save_user_data(username, data, label=f"Restored version {version}"):
+        raise RuntimeError(f"Could not restore version {version}")
+    return data
+
+
+def load_user_section(username: str, section: str) -> Dict[str, Any]:
+    """
+    Fields stored in one section table (e.g. "artifacts", "potentials") of a
+    saved account, without loading the rest of it.
+    """
+    return _fields_from_tables(_get_user_store().load(username, [section_table(section)[0]]))
+
+
+def _load_user_csv(data: UserData, filepath: str) -> UserData:
+    """Read a legacy section,key,subkey,value user file into `data`."""
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
@@ -566,12 +905,16 @@ def _init_default_data(data: UserData):
 
 
 def delete_user_data(username: str) -> bool:
-    """Delete a user's data file."""
+    """Delete a user's saved data (and legacy CSV file, if any)."""
+    _save_queue.flush(username.lower())
+    with _queued_digests_lock:
+        _queued_digests.pop(username.lower(), None)
+    deleted = _get_user_store().delete(username)
     filepath = _get_user_file(username)
     if os.path.exists(filepath):
         os.remove(filepath)
-        return True
-    return False
+        deleted = True
+    return deleted
 
 
 def export_user_data_csv(data: UserData) -> str:
@@ -0,0 +1,142 @@
+"""
+Background writer for auto-saves.
+
+Pages auto-save on every widget change. Instead of writing on the UI thread,
+they put() the sections that changed into a SaveQueue and return at once. A
+daemon thread writes each account once it has been quiet for `delay`
+seconds, so a burst of edits becomes one write of every section it touched
+(later values of a section replace earlier ones).
+
+Writes for one account never overlap and happen in the order they were
+queued. flush() writes pending sections on the calling thread and waits
+for any write in progress, for explicit saves, logout and process exit.
+
+A failed write stays queued and is retried with exponential backoff (up to
+MAX_RETRY_DELAY). Only the first failure in a row is reported.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+DEFAULT_SAVE_DELAY = 0.5  # seconds an account must be quiet before it is written
+MAX_RETRY_DELAY = 60.0    # longest wait between retries of a failing write
+
+# write(key, sections, removed): store `sections` (section -> value) and delete `removed`
+WriteFunc = Callable[[str, Dict[str, Any], Set[str]], Any]
+
+
+@dataclass
+class _Pending:
+    """Sections queued for one key, and when they are due."""
+    sections: Dict[str, Any] = field(default_factory=dict)
+    removed: Set[str] = field(default_factory=set)
+    due: float = 0.0
+    failures: int = 0       # failed writes in a row
+    retry_at: float = 0.0   # no retry before this, however soon the key goes quiet
+
+    def merge(self, sections: Dict[str, Any], removed: Iterable[str]) -> None:
+        for section in removed:
+            self.sections.pop(section, None)
+            self.removed.add(section)
+        for section, value in sections.items():
+            self.removed.discard(section)
+            self.sections[section] = value
+
+
+class SaveQueue:
+    """Debouncing, coalescing background writer keyed by account."""
+
+    def __init__(self, write: WriteFunc, delay: float = DEFAULT_SAVE_DELAY):
+        self.write = write
+        self.delay = delay
+        self._pending: Dict[str, _Pending] = {}
+        self._writing: Set[str] = set()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def put(self, key: str, sections: Dict[str, Any], removed: Iterable[str] = ()) -> None:
+        """Queue `sections` and `removed` for `key`; restarts its quiet period."""
+        with self._condition:
+            pending = self._pending.setdefault(key, _Pending())
+            pending.merge(sections, removed)
+            pending.due = max(time.monotonic() + self.delay, pending.retry_at)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="save-queue", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def pending_keys(self) -> List[str]:
+        """Keys with sections queued or being written."""
+        with self._condition:
+            return sorted(set(self._pending) | self._writing)
+
+    def flush(self, key: Optional[str] = None) -> bool:
+        """
+        Write what is queued for `key` (every key if None) now, on the calling
+        thread. Returns False if a write failed; its sections stay queued.
+        """
+        ok = True
+        with self._condition:
+            # Include keys being written, so flush() also waits for their writes
+            keys = [key] if key is not None else list(set(self._pending) | self._writing)
+        for flush_key in keys:
+            pending = self._take(flush_key)
+            if pending is not None:
+                ok = self._write_pending(flush_key, pending) and ok
+        return ok
+
+    def _take(self, key: str) -> Optional[_Pending]:
+        """Claim `key`'s queued sections once no other write of `key` is running."""
+        with self._condition:
+            self._condition.wait_for(lambda: key not in self._writing)
+            pending = self._pending.pop(key, None)
+            if pending is not None:
+                self._writing.add(key)
+            return pending
+
+    def _write_pending(self, key: str, pending: _Pending) -> bool:
+        try:
+            self.write(key, pending.sections, pending.removed)
+            return True
+        except Exception as e:
+            if not pending.failures:
+                print(f"Error saving user data: {e}")
+            with self._condition:
+                # Retry later, under anything queued while this write ran
+                newer = self._pending.get(key)
+                if newer is not None:
+                    pending.merge(newer.sections, newer.removed)
+                pending.failures += 1
+                pending.retry_at = time.monotonic() + self._retry_delay(pending.failures)
+                pending.due = pending.retry_at
+                self._pending[key] = pending
+            return False
+        finally:
+            with self._condition:
+                self._writing.discard(key)
+                self._condition.notify_all()
+
+    def _retry_delay(self, failures: int) -> float:
+        return min(max(self.delay, 0.1) * 2 ** (failures - 1), MAX_RETRY_DELAY)
+
+    def _next_due(self) -> Optional[str]:
+        """Wait (holding the condition) until some idle key is due, and return it."""
+        while True:
+            now = time.monotonic()
+            idle = {key: pending.due for key, pending in self._pending.items() if key not in self._writing}
+            if not idle:
+                self._condition.wait()
+                continue
+            key = min(idle, key=idle.get)
+            if idle[key] <= now:
+                return key
+            self._condition.wait(idle[key] - now)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                key = self._next_due()
+                pending = self._pending.pop(key)
+                self._writing.add(key)
+            self._write_pending(key, pending)
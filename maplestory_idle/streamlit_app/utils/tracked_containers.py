@@ -0,0 +1,204 @@
+"""
+Change-tracked dict/list containers for UserData.
+
+Pages edit UserData in place (data.equipment_potentials['gloves']['line1_value']
+= 12), so the model cannot see edits through attribute assignment alone.
+UserData stores its dict/list fields as TrackedDict / TrackedList instead:
+every mutating method bumps the VersionCell of the part of the account the
+container belongs to. UserData.digest() then re-hashes only the sections
+whose cells moved.
+
+Values stored into a tracked container are converted to tracked containers
+(a plain dict/list is copied on the way in), so everything reachable from a
+field is tracked. Reads are plain dict/list reads. Copies and pickles of a
+tracked container are plain dicts/lists.
+"""
+import copy
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class VersionCell:
+    """Edit counter for one part of an account; every bump also bumps `root`."""
+
+    __slots__ = ('value', 'root')
+
+    def __init__(self, root: Optional['VersionCell'] = None):
+        self.value = 0
+        self.root = root
+
+    def bump(self) -> None:
+        self.value += 1
+        if self.root is not None:
+            self.root.value += 1
+
+
+def track(value: Any, cell: VersionCell) -> Any:
+    """`value` with every dict/list inside it tracked by `cell` (containers are copied, scalars returned as is)."""
+    if isinstance(value, TrackedDict):
+        if value._cell is not cell or value._cells is not None:
+            value._retrack(cell)
+        return value
+    if isinstance(value, TrackedList):
+        if value._cell is not cell:
+            value._retrack(cell)
+        return value
+    if isinstance(value, dict):
+        return TrackedDict(value, cell)
+    if isinstance(value, list):
+        return TrackedList(value, cell)
+    return value
+
+
+class TrackedDict(dict):
+    """
+    dict that bumps its VersionCell on every mutation.
+
+    With `cells` (key -> VersionCell, for the slot-keyed UserData fields)
+    the value under each key is tracked by that key's cell instead, and
+    `cell` is bumped only for keys without one.
+    """
+
+    __slots__ = ('_cell', '_cells')
+
+    def __init__(self, items: Any = (), cell: Optional[VersionCell] = None,
+                 cells: Optional[Dict[str, VersionCell]] = None):
+        super().__init__()
+        self._cell = cell
+        self._cells = cells
+        for key, value in dict(items).items():
+            dict.__setitem__(self, key, track(value, self._cell_for(key)))
+
+    def _cell_for(self, key: Any) -> VersionCell:
+        if self._cells is not None:
+            return self._cells.get(key, self._cell)
+        return self._cell
+
+    def _retrack(self, cell: VersionCell) -> None:
+        self._cell, self._cells = cell, None
+        for key, value in dict.items(self):
+            dict.__setitem__(self, key, track(value, cell))
+
+    def _touch(self, key: Any = None) -> None:
+        if key is None and self._cells is not None:
+            for cell in self._cells.values():
+                cell.bump()
+        self._cell_for(key).bump()
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, track(value, self._cell_for(key)))
+        self._touch(key)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._touch(key)
+
+    def clear(self):
+        dict.clear(self)
+        self._touch()
+
+    def pop(self, key, *default):
+        had_key = key in self
+        result = dict.pop(self, key, *default)
+        if had_key:
+            self._touch(key)
+        return result
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self._touch(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def copy(self) -> dict:
+        return dict(self)
+
+    def __copy__(self) -> dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo) -> dict:
+        return {copy.deepcopy(key, memo): copy.deepcopy(value, memo) for key, value in dict.items(self)}
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self),)
+
+
+class TrackedList(list):
+    """list that bumps its VersionCell on every mutation."""
+
+    __slots__ = ('_cell',)
+
+    def __init__(self, items: Iterable = (), cell: Optional[VersionCell] = None):
+        super().__init__(track(value, cell) for value in items)
+        self._cell = cell
+
+    def _retrack(self, cell: VersionCell) -> None:
+        self._cell = cell
+        for i, value in enumerate(list.__iter__(self)):
+            list.__setitem__(self, i, track(value, cell))
+
+    def _mutator(name: str) -> Callable:
+        method = getattr(list, name)
+
+        def mutate(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._cell.bump()
+            return result
+        mutate.__name__ = name
+        return mutate
+
+    __delitem__ = _mutator('__delitem__')
+    pop = _mutator('pop')
+    remove = _mutator('remove')
+    clear = _mutator('clear')
+    sort = _mutator('sort')
+    reverse = _mutator('reverse')
+    __imul__ = _mutator('__imul__')
+    del _mutator
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [track(item, self._cell) for item in value]
+        else:
+            value = track(value, self._cell)
+        list.__setitem__(self, index, value)
+        self._cell.bump()
+
+    def append(self, value):
+        list.append(self, track(value, self._cell))
+        self._cell.bump()
+
+    def insert(self, index, value):
+        list.insert(self, index, track(value, self._cell))
+        self._cell.bump()
+
+    def extend(self, values):
+        list.extend(self, [track(value, self._cell) for value in values])
+        self._cell.bump()
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def copy(self) -> list:
+        return list(self)
+
+    def __copy__(self) -> list:
+        return list(self)
+
+    def __deepcopy__(self, memo) -> list:
+        return [copy.deepcopy(value, memo) for value in list.__iter__(self)]
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
@@ -0,0 +1,338 @@
+"""
+SQLite storage for saved accounts.
+
+One table per stat source group (character, hero_power, artifacts, weapons,
+companions, equipment, potentials), each holding one JSON value per
+(username, field, part) row; part is the equipment slot for the slot-keyed
+tables and '' elsewhere. The `sections` table records the digest each saved
+section had (UserData.section_digests()), so a save rewrites only the
+sections whose digest moved, in one transaction.
+
+Every save that changes something also appends a version to the account's
+history, in the same transaction. A version records only the sections that
+changed (their new digest, or NULL for a deleted section); the section
+contents live in `section_blobs`, keyed by digest, so a section value is
+stored once however many versions, slots or accounts share it. Snapshot N is the
+latest digest of each section at or before N. Deleting an account also
+drops the blobs no other account's history refers to.
+
+The database runs in WAL mode and every save takes the write lock up front
+(BEGIN IMMEDIATE), so API workers and Streamlit sessions can read and save
+the same file concurrently. Connections are per thread.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Section "potentials:gloves" lives in table "potentials", part "gloves"
+TABLES = ("character", "hero_power", "artifacts", "weapons", "companions", "equipment", "potentials")
+
+# (field, part, value) rows of one section; value None deletes the row
+SectionRows = Iterable[Tuple[str, str, Any]]
+
+BUSY_TIMEOUT_SECONDS = 30.0
+
+
+class AccountVersion(NamedTuple):
+    """One entry of an account's save history."""
+    version: int
+    saved_at: float  # time.time() of the save
+    label: str
+    sections: Tuple[str, ...]  # sections this version changed
+
+
+def section_table(section: str) -> Tuple[str, str]:
+    """(table, part) a section is stored under."""
+    table, _, part = section.partition(":")
+    return table, part
+
+
+class UserStore:
+    """Sectioned, digest-tracked account storage in one SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._create_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _create_schema(self) -> None:
+        connection = self._connection()
+        with _transaction(connection):
+            for table in TABLES:
+                connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    "username TEXT NOT NULL, field TEXT NOT NULL, part TEXT NOT NULL, value TEXT NOT NULL, "
+                    "PRIMARY KEY (username, field, part)) WITHOUT ROWID"
+                )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sections ("
+                "username TEXT NOT NULL, section TEXT NOT NULL, digest TEXT NOT NULL, "
+                "PRIMARY KEY (username, section)) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS versions ("
+                "username TEXT NOT NULL, version INTEGER NOT NULL, saved_at REAL NOT NULL, label TEXT NOT NULL, "
+                "PRIMARY KEY (username, version)) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS version_sections ("
+                "username TEXT NOT NULL, section TEXT NOT NULL, version INTEGER NOT NULL, digest TEXT, "
+                "PRIMARY KEY (username, section, version)) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS section_blobs (digest TEXT PRIMARY KEY, rows TEXT NOT NULL) WITHOUT ROWID"
+            )
+            # For delete(): is a blob still referenced by some version?
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS version_sections_digest ON version_sections (digest)"
+            )
+
+    def has_user(self, username: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM sections WHERE username = ? LIMIT 1", (username.lower(),)
+        ).fetchone()
+        return row is not None
+
+    def saved_digests(self, username: str) -> Dict[str, str]:
+        """Section -> digest as last saved."""
+        return dict(self._connection().execute(
+            "SELECT section, digest FROM sections WHERE username = ?", (username.lower(),)
+        ))
+
+    def save(self, username: str, digests: Dict[str, str], rows: Callable[[str], SectionRows],
+             label: str = "") -> List[str]:
+        """
+        Write every section whose digest differs from the saved one.
+
+        `digests` is the account's section -> digest map and `rows(section)`
+        the rows to store for a section. Saved sections missing from
+        `digests` are deleted. If anything changed, a new version labelled
+        `label` is added to the history. Returns the sections written.
+        """
+        return self._save(username, digests, rows, removed=None, label=label)
+
+    def save_sections(self, username: str, sections: Dict[str, Tuple[str, SectionRows]],
+                      removed: Iterable[str] = (), label: str = "") -> List[str]:
+        """
+        Like save(), for part of an account: `sections` maps section ->
+        (digest, rows) and only those sections, plus the `removed` ones, are
+        touched. Returns the sections written.
+        """
+        digests = {section: digest for section, (digest, _) in sections.items()}
+        return self._save(username, digests, lambda section: sections[section][1], removed=removed, label=label)
+
+    def _save(self, username: str, digests: Dict[str, str], rows: Callable[[str], SectionRows],
+              removed: Optional[Iterable[str]], label: str) -> List[str]:
+        username = username.lower()
+        connection = self._connection()
+        with _transaction(connection, immediate=True):
+            saved = dict(connection.execute(
+                "SELECT section, digest FROM sections WHERE username = ?", (username,)
+            ))
+            changed = [section for section, digest in digests.items() if saved.get(section) != digest]
+            if removed is None:
+                removed = [section for section in saved if section not in digests]
+            else:
+                removed = [section for section in removed if section in saved and section not in digests]
+            if not changed and not removed:
+                return []
+            # An account saved before history existed starts it from a full snapshot
+            baseline = {} if self._has_history(connection, username) else {
+                section: self._stored_rows(connection, username, section)
+                for section in saved if section not in changed and section not in removed
+            }
+            written: Dict[str, List[Tuple[str, str, str]]] = {}
+            for section in changed + removed:
+                table, part = section_table(section)
+                if part:
+                    connection.execute(f"DELETE FROM {table} WHERE username = ? AND part = ?", (username, part))
+                else:
+                    connection.execute(f"DELETE FROM {table} WHERE username = ? AND part = ''", (username,))
+            for section in changed:
+                table, part = section_table(section)
+                written[section] = [(field, row_part, _dumps(value))
+                                    for field, row_part, value in rows(section) if value is not None]
+                connection.executemany(
+                    f"INSERT INTO {table} (username, field, part, value) VALUES (?, ?, ?, ?)",
+                    [(username, field, row_part, value) for field, row_part, value in written[section]],
+                )
+            connection.executemany(
+                "INSERT INTO sections (username, section, digest) VALUES (?, ?, ?) "
+                "ON CONFLICT (username, section) DO UPDATE SET digest = excluded.digest",
+                [(username, section, digests[section]) for section in changed],
+            )
+            connection.executemany(
+                "DELETE FROM sections WHERE username = ? AND section = ?",
+                [(username, section) for section in removed],
+            )
+            version_sections = {section: (digests[section], written[section]) for section in changed}
+            version_sections.update((section, (saved[section], rows)) for section, rows in baseline.items())
+            version_sections.update((section, (None, None)) for section in removed)
+            self._add_version(connection, username, version_sections, label)
+        return changed + removed
+
+    # -- history ------------------------------------------------------------
+
+    @staticmethod
+    def _has_history(connection: sqlite3.Connection, username: str) -> bool:
+        return connection.execute(
+            "SELECT 1 FROM versions WHERE username = ? LIMIT 1", (username,)
+        ).fetchone() is not None
+
+    @staticmethod
+    def _stored_rows(connection: sqlite3.Connection, username: str, section: str) -> List[Tuple[str, str, str]]:
+        table, part = section_table(section)
+        return list(connection.execute(
+            f"SELECT field, part, value FROM {table} WHERE username = ? AND part = ?", (username, part)
+        ))
+
+    @staticmethod
+    def _add_version(connection: sqlite3.Connection, username: str,
+                     sections: Dict[str, Tuple[Optional[str], Optional[List[Tuple[str, str, str]]]]],
+                     label: str) -> int:
+        """Append a version recording `sections` (section -> (digest, encoded rows), (None, None) if deleted)."""
+        version = connection.execute(
+            "SELECT COALESCE(MAX(version), 0) + 1 FROM versions WHERE username = ?", (username,)
+        ).fetchone()[0]
+        connection.execute(
+            "INSERT INTO versions (username, version, saved_at, label) VALUES (?, ?, ?, ?)",
+            (username, version, time.time(), label),
+        )
+        connection.executemany(
+            "INSERT INTO version_sections (username, section, version, digest) VALUES (?, ?, ?, ?)",
+            [(username, section, version, digest) for section, (digest, _) in sections.items()],
+        )
+        connection.executemany(
+            "INSERT OR IGNORE INTO section_blobs (digest, rows) VALUES (?, ?)",
+            # Rows are stored without their part: equal slots share a digest
+            [(digest, "[" + ",".join(f"[{json.dumps(field)},{value}]" for field, _, value in rows) + "]")
+             for digest, rows in sections.values() if digest is not None],
+        )
+        return version
+
+    def history(self, username: str) -> List[AccountVersion]:
+        """Every saved version of `username`, oldest first."""
+        username = username.lower()
+        connection = self._connection()
+        with _transaction(connection):
+            changed: Dict[int, List[str]] = {}
+            for version, section in connection.execute(
+                "SELECT version, section FROM version_sections WHERE username = ? ORDER BY section", (username,)
+            ):
+                changed.setdefault(version, []).append(section)
+            return [
+                AccountVersion(version, saved_at, label, tuple(changed.get(version, ())))
+                for version, saved_at, label in connection.execute(
+                    "SELECT version, saved_at, label FROM versions WHERE username = ? ORDER BY version", (username,)
+                )
+            ]
+
+    def version_digests(self, username: str, version: int) -> Dict[str, str]:
+        """Section -> digest of the account as saved in `version`."""
+        connection = self._connection()
+        with _transaction(connection):
+            return self._version_digests(connection, username.lower(), version)
+
+    def _version_digests(self, connection: sqlite3.Connection, username: str, version: int) -> Dict[str, str]:
+        exists = connection.execute(
+            "SELECT 1 FROM versions WHERE username = ? AND version = ?", (username, version)
+        ).fetchone()
+        if exists is None:
+            raise KeyError(f"{username!r} has no version {version}")
+        # SQLite takes the bare `digest` column from the row holding MAX(version)
+        return {
+            section: digest for section, digest, _ in connection.execute(
+                "SELECT section, digest, MAX(version) FROM version_sections "
+                "WHERE username = ? AND version <= ? GROUP BY section", (username, version)
+            ) if digest is not None
+        }
+
+    def load_version(self, username: str, version: int) -> Dict[str, List[Tuple[str, str, Any]]]:
+        """Like load(), for the account as saved in `version`."""
+        connection = self._connection()
+        with _transaction(connection):
+            digests = self._version_digests(connection, username.lower(), version)
+            tables: Dict[str, List[Tuple[str, str, Any]]] = {table: [] for table in TABLES}
+            for section, digest in digests.items():
+                table, part = section_table(section)
+                (rows,) = connection.execute("SELECT rows FROM section_blobs WHERE digest = ?", (digest,)).fetchone()
+                tables[table].extend((field, part, value) for field, value in json.loads(rows))
+            return tables
+
+    def diff(self, username: str, from_version: int, to_version: int) -> List[str]:
+        """Sections that differ between two versions (added, changed or deleted), sorted."""
+        connection = self._connection()
+        with _transaction(connection):
+            before = self._version_digests(connection, username.lower(), from_version)
+            after = self._version_digests(connection, username.lower(), to_version)
+        return sorted(section for section in before.keys() | after.keys() if before.get(section) != after.get(section))
+
+    def load(self, username: str, tables: Optional[Iterable[str]] = None) -> Dict[str, List[Tuple[str, str, Any]]]:
+        """Table -> its (field, part, value) rows for `username`; all tables unless `tables` is given."""
+        username = username.lower()
+        connection = self._connection()
+        with _transaction(connection):
+            return {
+                table: [(field, part, json.loads(value)) for field, part, value in connection.execute(
+                    f"SELECT field, part, value FROM {_checked_table(table)} WHERE username = ?", (username,)
+                )]
+                for table in (tables if tables is not None else TABLES)
+            }
+
+    def delete(self, username: str) -> bool:
+        """
+        Delete every row of `username`, history included, and the section
+        blobs only its history used; True if there were any.
+        """
+        username = username.lower()
+        connection = self._connection()
+        with _transaction(connection, immediate=True):
+            existed = connection.execute(
+                "DELETE FROM sections WHERE username = ?", (username,)
+            ).rowcount > 0
+            connection.execute(
+                "DELETE FROM section_blobs WHERE digest IN "
+                "(SELECT digest FROM version_sections WHERE username = ?) AND NOT EXISTS "
+                "(SELECT 1 FROM version_sections AS other "
+                "WHERE other.digest = section_blobs.digest AND other.username != ?)",
+                (username, username),
+            )
+            for table in TABLES + ("versions", "version_sections"):
+                connection.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+        return existed
+
+
+def _checked_table(table: str) -> str:
+    if table not in TABLES:
+        raise ValueError(f"Unknown user data table {table!r} (expected one of {', '.join(TABLES)})")
+    return table
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, default=str)
+
+
+class _transaction:
+    """BEGIN/COMMIT around a block (ROLLBACK on error) for an autocommit connection."""
+
+    def __init__(self, connection: sqlite3.Connection, immediate: bool = False):
+        self.connection = connection
+        self.begin = "BEGIN IMMEDIATE" if immediate else "BEGIN"
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.connection.execute(self.begin)
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.connection.execute("ROLLBACK" if exc_type is not None else "COMMIT")
@@ -0,0 +1,232 @@
+"""
+Tests for optimizers/account_analysis.py and optimizers/analysis_benchmark.py
+
+Covers: the snapshot seeds every baseline an analyser needs and pickles,
+tasks give the same results and evaluation reports in a worker process as
+in-process, worker reports merge into the parent context, the analysers
+match the page's direct calls, cube and tier-up reranks after another slot's
+edit match a full re-run with fewer DPS evaluations, and the benchmark runs.
+"""
+import copy
+import pickle
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from engine.dps_calculator import BASELINE_ANALYSER, aggregate_stats
+from optimizers.account_analysis import (
+    ANALYSIS_TASKS,
+    analysis_rerank,
+    analysis_task,
+    analysis_tasks,
+    build_snapshot,
+    starforce_stars,
+)
+from optimizers.analysis_benchmark import DEFAULT_ACCOUNT, run_benchmark
+from game.hero_power import _stats_fingerprint
+from optimizers.upgrade_optimizer import AnalysisUnit, IncrementalAnalysis, create_analysis_pool, run_analyses
+from streamlit_app.utils.cube_analyzer import analyze_all_cube_priorities
+from streamlit_app.utils.data_manager import (
+    CHARACTER_SOURCE,
+    import_user_data_csv,
+    slot_source,
+    source_fingerprints,
+)
+
+FAST_TASKS = ["Cubes:eye", "Starforce", "Hero Power", "Companion Tickets", "Artifacts"]
+RERANK_SLOTS = ['hat', 'eye', 'shoulder', 'gloves']
+
+
+def _dps_fields(result):
+    """
+    Cube recommendations' DPS gains in slot order (their roll statistics,
+    and with them the ranking, are sampled).
+    """
+    if isinstance(result, list) and result and hasattr(result[0], 'current_dps_gain'):
+        return sorted((rec.slot, rec.is_bonus, rec.current_dps_gain, rec.best_possible_dps_gain,
+                       rec.line1_dps_gain, rec.line2_dps_gain, rec.line3_dps_gain) for rec in result)
+    return result
+
+
+def _ranked_fields(result):
+    """The DPS fields of cube / tier-up recommendations, in slot order."""
+    fields = []
+    for rec in sorted(result, key=lambda rec: (rec.slot, rec.is_bonus)):
+        if hasattr(rec, 'best_possible_dps_gain'):
+            fields.append((rec.current_dps_gain, rec.best_possible_dps_gain,
+                           rec.line1_dps_gain, rec.line2_dps_gain, rec.line3_dps_gain))
+        else:
+            fields.append((rec.current_dps_gain, rec.keep_threshold, rec.expected_value_at_tier, rec.efficiency))
+    return fields
+
+
+def _edit_gloves(account):
+    edited = copy.deepcopy(account)
+    edited.equipment_potentials['gloves'] = dict(edited.equipment_potentials['gloves'],
+                                                 line3_stat='crit_rate', line3_value=12.0)
+    return edited
+
+
+def _slot_units(snapshot, calls=None):
+    """Cube and tier-up units of RERANK_SLOTS; `calls` counts (name, 'run' / 'rerank')."""
+    def counted(name, kind, fn):
+        def call(*args):
+            calls[name, kind] = calls.get((name, kind), 0) + 1
+            return fn(*args)
+        return call if calls is not None else fn
+
+    units = []
+    for slot in RERANK_SLOTS:
+        reads = frozenset({CHARACTER_SOURCE, slot_source('potentials', slot), slot_source('equipment', slot)})
+        for kind in ("Cubes", "Tier Upgrades"):
+            name = f"{kind}:{slot}"
+            units.append(AnalysisUnit(name, counted(name, 'run', analysis_task(snapshot, name)),
+                                      reads=reads, uses_baseline=True,
+                                      rerank=counted(name, 'rerank', analysis_rerank(snapshot, name))))
+    return units
+
+
+@pytest.fixture(scope="module")
+def account():
+    with open(DEFAULT_ACCOUNT, encoding='utf-8') as f:
+        return import_user_data_csv(f.read(), 'test')
+
+
+@pytest.fixture(scope="module")
+def snapshot(account):
+    return build_snapshot(account)
+
+
+def test_snapshot_seeds_stage_phase_baselines(snapshot):
+    assert snapshot.combat_mode == 'stage'
+    assert sorted(snapshot.baseline_results) == ['boss', 'chapter_hunt', 'stage']
+    ctx = snapshot.context()
+    ctx.score(snapshot.baseline_stats)
+    assert ctx.total_evaluations == 0
+    assert ctx.report()['baseline_hits'] > 0
+
+
+def test_snapshot_and_tasks_pickle(snapshot):
+    restored = pickle.loads(pickle.dumps(snapshot))
+    assert restored.key == snapshot.key
+    assert restored.baseline_dps == snapshot.baseline_dps
+    for name, task in analysis_tasks(snapshot):
+        pickle.dumps(task)
+    assert [name for name, _ in analysis_tasks(snapshot)] == [name for name, _, _, _ in ANALYSIS_TASKS]
+
+
+def test_unknown_task_raises(snapshot):
+    with pytest.raises(KeyError):
+        analysis_task(snapshot, "Cubes:nowhere")
+
+
+def test_worker_process_matches_in_process(snapshot):
+    tasks = [(name, analysis_task(snapshot, name)) for name in FAST_TASKS]
+    local = {name: task() for name, task in tasks}
+    pool = create_analysis_pool(2)
+    try:
+        events = {event.name: event for event in run_analyses(tasks, executor=pool)}
+    finally:
+        pool.shutdown()
+    for name in FAST_TASKS:
+        assert events[name].error is None, name
+        assert _dps_fields(events[name].result.result) == _dps_fields(local[name].result), name
+        assert events[name].result.report['evaluations'] == local[name].report['evaluations'], name
+
+
+def test_reports_merge_per_analyser(snapshot):
+    ctx = snapshot.context()
+    outputs = {name: analysis_task(snapshot, name)() for name in ("Cubes:eye", "Cubes:hat", "Starforce")}
+    for output in outputs.values():
+        ctx.merge_report(output.report)
+    counts = ctx.evaluation_counts
+    assert counts['Cubes'] == outputs["Cubes:eye"].report['total'] + outputs["Cubes:hat"].report['total']
+    assert counts['Starforce'] == outputs["Starforce"].report['total'] > 0
+    assert BASELINE_ANALYSER not in counts
+
+
+def test_cube_task_matches_direct_analysis(account, snapshot):
+    output = analysis_task(snapshot, "Cubes:gloves")()
+    ctx = snapshot.context()
+    expected = analyze_all_cube_priorities(
+        user_data=account,
+        aggregate_stats_func=lambda star_overrides=None: aggregate_stats(account, star_overrides),
+        calculate_dps_func=ctx.calculate_dps,
+        slots=['gloves'],
+    )
+    assert _dps_fields(output.result) == _dps_fields(expected)
+
+
+def test_starforce_task_ranks_slots_by_efficiency(account, snapshot):
+    gains, detailed = analysis_task(snapshot, "Starforce")().result
+    stars = starforce_stars(account)
+    assert set(gains) <= set(stars)
+    for rec in detailed:
+        assert rec['current_stars'] == stars[rec['slot']] < rec['target_stars']
+        assert rec['dps_gain'] == gains[rec['slot']][rec['target_stars']]
+    assert [rec['efficiency'] for rec in detailed] == sorted((rec['efficiency'] for rec in detailed), reverse=True)
+
+
+def test_only_slot_analysers_rerank(snapshot):
+    assert analysis_rerank(snapshot, "Cubes:hat") is not None
+    assert analysis_rerank(snapshot, "Tier Upgrades:hat") is not None
+    assert analysis_rerank(snapshot, "Starforce") is None
+    with pytest.raises(KeyError):
+        analysis_rerank(snapshot, "Cubes:nowhere")
+
+
+@pytest.mark.parametrize("name", ["Cubes:hat", "Tier Upgrades:hat"])
+def test_rerank_matches_full_run_after_another_slots_edit(account, snapshot, name):
+    previous = analysis_task(snapshot, name)()
+    assert previous.candidates
+    edited = build_snapshot(_edit_gloves(account))
+    assert edited.baseline_dps != snapshot.baseline_dps
+    full = analysis_task(edited, name)()
+    reranked = analysis_rerank(edited, name)(previous)
+    assert reranked.report['total'] < full.report['total']
+    for expected, actual in zip(_ranked_fields(full.result), _ranked_fields(reranked.result)):
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+
+def _refresh_evaluations(analysis, snapshot, account, calls=None):
+    """DPS evaluations per unit of one IncrementalAnalysis refresh."""
+    events = list(analysis.refresh(_slot_units(snapshot, calls), source_fingerprints(account),
+                                   _stats_fingerprint(snapshot.baseline_stats), max_workers=1))
+    assert all(event.error is None for event in events)
+    return {event.name: event.result.report['total'] for event in events}
+
+
+def test_single_slot_edit_reranks_the_other_slots(account, snapshot):
+    analysis = IncrementalAnalysis()
+    _refresh_evaluations(analysis, snapshot, account)
+    edited_account = _edit_gloves(account)
+    edited = build_snapshot(edited_account)
+    units = _slot_units(edited)
+    fingerprints = source_fingerprints(edited_account)
+    baseline = _stats_fingerprint(edited.baseline_stats)
+    assert set(analysis.stale(units, fingerprints, baseline)) == {unit.name for unit in units}
+    assert set(analysis.reranked(units, fingerprints, baseline)) == {
+        unit.name for unit in units if not unit.name.endswith(":gloves")}
+
+    calls = {}
+    edit = _refresh_evaluations(analysis, edited, edited_account, calls)
+    full = _refresh_evaluations(IncrementalAnalysis(), edited, edited_account)
+    # Only the edited slot's units run in full; the others re-score their
+    # kept candidates with fewer DPS evaluations than a full run makes
+    assert {name for name, kind in calls if kind == 'run'} == {"Cubes:gloves", "Tier Upgrades:gloves"}
+    assert sum(count for (_, kind), count in calls.items() if kind == 'rerank') == 6
+    for name, evaluations in edit.items():
+        if not name.endswith(":gloves"):
+            assert evaluations < full[name], name
+    assert sum(edit.values()) < sum(full.values())
+
+
+def test_benchmark_reports_each_mode(snapshot):
+    results = run_benchmark(snapshot, [2], names=["Starforce", "Hero Power"])
+    assert set(results['analysers']) == {"Starforce", "Hero Power"}
+    assert results['serial'][1] == pytest.approx(sum(results['analysers'].values()))
+    assert set(results['threads']) == set(results['processes']) == {2}
+    assert all(seconds > 0 for seconds in results['processes'].values())
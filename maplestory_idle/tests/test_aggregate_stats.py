@@ -0,0 +1,167 @@
+"""
+Tests for the block-cached `aggregate_stats` in engine/dps_calculator.py
+
+Covers: incremental aggregation after random edits equals a rebuild from an
+empty block cache, an edit only recomputes the blocks whose inputs changed,
+callers mutating the result cannot corrupt cached blocks, and artifact
+effects derived from running totals follow the stats they depend on.
+"""
+import copy
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from engine.cache import get_cache_backend
+from engine.dps_calculator import aggregate_stats, last_aggregation_report
+from streamlit_app.utils.data_manager import UserData, EQUIPMENT_SLOTS
+from game.artifacts import ARTIFACTS
+from game.companions import COMPANIONS
+from game.weapons import BASE_ATK
+
+POT_STATS = ['damage', 'crit_rate', 'crit_damage', 'def_pen', 'final_damage', 'attack_speed', 'main_stat_pct',
+             'dex_pct', 'dex_flat', 'boss_damage', 'all_skills', 'skill_cd', 'buff_duration', 'ba_targets',
+             'min_dmg_mult', 'max_dmg_mult', '']
+
+ARTIFACT_POOL = ['athena_pierces_gloves', 'bottle_of_emotions', 'book_of_ancient', 'candle',
+                 'hexagon_necklace', 'fire_flower', 'chalice', 'silver_pendant']
+
+
+def _potential_lines(rng):
+    return {f'{prefix}line{i}_{key}': (rng.choice(POT_STATS) if key == 'stat' else rng.uniform(0, 30))
+            for prefix in ('', 'bonus_') for i in (1, 2, 3) for key in ('stat', 'value')}
+
+
+def _random_user(rng, artifacts=None):
+    data = UserData(username='test', job_class='bowmaster', character_level=rng.randint(60, 140),
+                    all_skills=rng.randint(0, 40))
+    for slot in EQUIPMENT_SLOTS:
+        data.equipment_items[slot] = {
+            'stars': rng.randint(0, 25), 'base_attack': rng.uniform(0, 2000), 'sub_attack_flat': rng.uniform(0, 300),
+            'sub_crit_damage': rng.uniform(0, 20), 'sub_boss_damage': rng.uniform(0, 10),
+            'sub_damage_pct': rng.uniform(0, 10), 'sub_skill_4th': rng.randint(0, 3),
+        }
+        data.equipment_potentials[slot] = _potential_lines(rng)
+    data.equipment_scrolls = {slot: {'damage_amp': rng.uniform(0, 5), 'flat_attack': rng.uniform(0, 50)}
+                              for slot in rng.sample(list(EQUIPMENT_SLOTS), 4)}
+    data.hero_power_presets = {'Default': {'lines': {
+        f'line{i}': {'stat': rng.choice(POT_STATS), 'value': rng.uniform(0, 40)} for i in range(1, 7)}}}
+    data.maple_rank = {'current_stage': rng.randint(1, 20), 'main_stat_level': rng.randint(0, 50),
+                       'stat_levels': {'crit_rate': rng.randint(0, 10), 'damage_percent': rng.randint(0, 50)}}
+    data.guild_skills = {'def_pen': rng.uniform(0, 10), 'damage': rng.uniform(0, 20)}
+    keys = [f'{rarity}_{tier}' for rarity, tier in BASE_ATK]
+    data.weapons_data = {k: {'level': rng.randint(0, 150), 'awakening': rng.randint(0, 5)} for k in rng.sample(keys, 4)}
+    data.equipped_weapon_key = rng.choice(list(data.weapons_data))
+    companions = rng.sample(list(COMPANIONS), 6)
+    data.companion_levels = {k: rng.randint(0, 10) for k in companions}
+    data.equipped_companions = companions[:4]
+    artifacts = artifacts or rng.sample(ARTIFACT_POOL, 3)
+    data.artifacts_equipped = {f'slot{i}': {'name': ARTIFACTS[a].name, 'artifact': a, 'stars': rng.randint(0, 5)}
+                               for i, a in enumerate(artifacts)}
+    data.artifacts_inventory = {a: {'stars': rng.randint(0, 5), 'potentials': [
+        {'stat': rng.choice(['damage_pct', 'crit_rate', 'def_pen']), 'value': rng.uniform(0, 10)}]} for a in artifacts}
+    data.manual_adjustments = {'crit_rate': rng.uniform(-5, 5), 'def_pen': rng.uniform(0, 5)}
+    return data
+
+
+def _random_edit(rng, data):
+    edit = rng.randrange(5)
+    if edit == 0:
+        data.equipment_potentials[rng.choice(EQUIPMENT_SLOTS)] = _potential_lines(rng)
+    elif edit == 1:
+        data.equipment_items[rng.choice(EQUIPMENT_SLOTS)]['stars'] = rng.randint(0, 25)
+    elif edit == 2:
+        data.guild_skills['damage'] = rng.uniform(0, 20)
+    elif edit == 3:
+        data.character_level = rng.randint(60, 140)
+    else:
+        slot = rng.choice(list(data.artifacts_equipped))
+        data.artifacts_equipped[slot]['stars'] = rng.randint(0, 5)
+
+
+def _rebuild(data, **kwargs):
+    get_cache_backend().clear()
+    return aggregate_stats(data, **kwargs)
+
+
+def _assert_same(incremental, rebuilt):
+    assert set(incremental) == set(rebuilt)
+    for key, value in rebuilt.items():
+        if isinstance(value, float):
+            assert incremental[key] == pytest.approx(value, rel=1e-12, abs=1e-12), key
+        else:
+            assert incremental[key] == value, key
+
+
+@pytest.fixture(autouse=True)
+def _empty_block_cache():
+    get_cache_backend().clear()
+    yield
+    get_cache_backend().clear()
+
+
+class TestIncrementalAggregation:
+
+    @pytest.mark.parametrize("seed", range(6))
+    def test_matches_rebuild_after_random_edits(self, seed):
+        rng = random.Random(seed)
+        data = _random_user(rng)
+        aggregate_stats(data)
+        for _ in range(8):
+            _random_edit(rng, data)
+            incremental = aggregate_stats(data)
+            _assert_same(incremental, _rebuild(data))
+
+    def test_unchanged_account_reuses_every_block(self):
+        data = _random_user(random.Random(1))
+        aggregate_stats(data)
+        aggregate_stats(data)
+        report = last_aggregation_report()
+        assert report.blocks
+        assert report.recomputed == []
+        assert report.reused == report.blocks
+
+    def test_potential_edit_recomputes_only_its_slot(self):
+        rng = random.Random(2)
+        data = _random_user(rng)
+        aggregate_stats(data)
+        data.equipment_potentials['gloves']['line1_value'] += 1.0
+        aggregate_stats(data)
+        assert last_aggregation_report().recomputed == ['potentials:gloves']
+
+    def test_report_lists_blocks_in_merge_order(self):
+        aggregate_stats(_random_user(random.Random(3)))
+        blocks = last_aggregation_report().blocks
+        assert blocks[0] == f'potentials:{EQUIPMENT_SLOTS[0]}'
+        assert blocks.index('skill_passives') > blocks.index('artifact_resonance')
+        assert blocks[-1] == 'manual_adjustments'
+        aggregate_stats(_random_user(random.Random(3)), apply_adjustments=False)
+        assert 'manual_adjustments' not in last_aggregation_report().blocks
+
+    def test_mutating_result_does_not_corrupt_cache(self):
+        data = _random_user(random.Random(4))
+        expected = copy.deepcopy(aggregate_stats(data))
+        first = aggregate_stats(data)
+        for value in first.values():
+            if isinstance(value, list):
+                value.append(('tampered', 1.0))
+            elif isinstance(value, set):
+                value.add('tampered')
+        first['damage_percent'] = -1
+        _assert_same(aggregate_stats(data), expected)
+
+
+class TestDerivedArtifactEffects:
+
+    def test_athena_follows_the_stat_it_converts(self):
+        rng = random.Random(5)
+        data = _random_user(rng, artifacts=['athena_pierces_gloves', 'chalice', 'candle'])
+        aggregate_stats(data)
+        data.equipment_items['gloves']['sub_crit_damage'] = 15.0
+        data.equipment_potentials['hat'] = {'line1_stat': 'crit_rate', 'line1_value': 30.0}
+        incremental = aggregate_stats(data)
+        assert 'artifact_actives' in last_aggregation_report().recomputed
+        _assert_same(incremental, _rebuild(data))
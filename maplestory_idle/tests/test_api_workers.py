@@ -0,0 +1,196 @@
+"""
+Tests for api/workers.py and the async DPS / skill endpoints.
+
+Covers: the CPU-bound endpoints are coroutines that return what the job
+functions compute, a warm process pool returns the same results from
+another process, admission control answers 503 once `max_pending` jobs are
+admitted, job errors become 500s, the upgrade analysis streams one NDJSON
+event per analyser from the workers, the app lifespan starts and stops the
+pool, and the load test runs.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import HTTPException
+
+import api.routers.upgrades as upgrades
+import api.workers as workers
+from api.loadtest import run_load_test
+from api.routers.dps import aggregate_stats_endpoint, calculate_dps_endpoint, _calculate_dps
+from api.routers.skills import skill_breakdown_endpoint, cooldown_analysis_endpoint, _cooldown_analysis
+from api.routers.upgrades import upgrade_analysis_endpoint
+from api.workers import ComputePool, PoolOverloaded, run_job
+from streamlit_app.utils.data_manager import UserData
+
+
+@pytest.fixture
+def body():
+    return {'user_data': UserData().model_dump(), 'combat_mode': 'boss'}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """compute_pool replaced by a two-process pool."""
+    pool = ComputePool(workers=2, max_pending=8)
+    pool.start()
+    monkeypatch.setattr(workers, 'compute_pool', pool)
+    yield pool
+    pool.shutdown()
+
+
+def _worker_state():
+    from engine import special_potential_tables
+    return os.getpid(), special_potential_tables._tables is not None
+
+
+def _fail(message):
+    raise ValueError(message)
+
+
+async def _gather(pool, fn, count):
+    return await asyncio.gather(*(pool.run(fn) for _ in range(count)))
+
+
+@pytest.fixture
+def analyses(monkeypatch):
+    """The upgrade analysis cut to its quick analysers plus one that fails."""
+    names = ["Starforce", "Hero Power", "Companion Tickets"]
+    all_tasks = upgrades.analysis_tasks
+    tasks = {}
+
+    def quick_tasks(snapshot):
+        tasks.update((name, task) for name, task in all_tasks(snapshot) if name in names)
+        return [*tasks.items(), ("Broken", functools.partial(_fail, 'bad analyser'))]
+
+    monkeypatch.setattr(upgrades, 'analysis_tasks', quick_tasks)
+    return tasks
+
+
+async def _read_stream(response):
+    return [json.loads(line) async for line in response.body_iterator]
+
+
+def test_endpoints_are_async():
+    for endpoint in (aggregate_stats_endpoint, calculate_dps_endpoint,
+                     skill_breakdown_endpoint, cooldown_analysis_endpoint, upgrade_analysis_endpoint):
+        assert inspect.iscoroutinefunction(endpoint)
+
+
+def test_unstarted_pool_runs_on_threads(body):
+    assert not workers.compute_pool.started
+    assert asyncio.run(calculate_dps_endpoint(body)) == _calculate_dps(body)
+
+
+class TestProcessPool:
+
+    def test_workers_are_warm_separate_processes(self, pool):
+        states = asyncio.run(_gather(pool, _worker_state, 4))
+        assert all(pid != os.getpid() and warm for pid, warm in states)
+
+    def test_results_match_in_process(self, pool, body):
+        assert asyncio.run(cooldown_analysis_endpoint(body)) == _cooldown_analysis(body)
+
+    def test_job_errors_are_500s(self, pool):
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(run_job(_fail, 'bad body'))
+        assert raised.value.status_code == 500 and raised.value.detail == 'bad body'
+        assert pool.pending == 0
+
+    def test_upgrade_analysis_streams_each_analyser(self, pool, body, analyses):
+        async def scenario():
+            response = await upgrade_analysis_endpoint(body)
+            return response.media_type, await _read_stream(response)
+
+        media_type, (header, *events) = asyncio.run(scenario())
+        assert media_type == 'application/x-ndjson'
+        assert header['combat_mode'] == 'boss' and header['baseline_dps'] > 0
+        assert header['analyses'] == [*analyses, "Broken"]
+        assert sorted(e['name'] for e in events) == sorted(header['analyses'])
+        assert [e['completed'] for e in events] == [1, 2, 3, 4]
+        by_name = {e['name']: e for e in events}
+        assert by_name['Broken']['error'] == 'bad analyser' and 'result' not in by_name['Broken']
+        expected = analyses["Hero Power"]()
+        assert by_name["Hero Power"]['result'] == json.loads(upgrades._line(expected.result))
+        assert by_name["Hero Power"]['evaluations'] == expected.report['total']
+        assert pool.pending == 0
+
+
+class TestAdmission:
+
+    def test_full_pool_rejects_with_503(self, monkeypatch):
+        pool = ComputePool(workers=0, max_pending=2)
+        monkeypatch.setattr(workers, 'compute_pool', pool)
+        release = threading.Event()
+
+        async def scenario():
+            admitted = [asyncio.ensure_future(run_job(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as raised:
+                await run_job(release.wait)
+            release.set()
+            await asyncio.gather(*admitted)
+            return raised.value
+
+        rejected = asyncio.run(scenario())
+        assert rejected.status_code == 503
+        assert rejected.headers['Retry-After'] == str(workers.RETRY_AFTER_SECONDS)
+        assert pool.pending == 0
+
+    def test_finished_jobs_free_their_slot(self):
+        pool = ComputePool(workers=0, max_pending=1)
+
+        async def scenario():
+            for _ in range(3):
+                await pool.run(os.getpid)
+            return pool.pending
+
+        assert asyncio.run(scenario()) == 0
+
+    def test_full_pool_rejects_upgrade_analysis_with_503(self, monkeypatch, body):
+        monkeypatch.setattr(workers, 'compute_pool', ComputePool(workers=0, max_pending=0))
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(upgrade_analysis_endpoint(body))
+        assert raised.value.status_code == 503
+
+    def test_overloaded_pool_raises(self):
+        pool = ComputePool(workers=0, max_pending=0)
+        with pytest.raises(PoolOverloaded):
+            asyncio.run(pool.run(os.getpid))
+
+
+def test_settings_from_environment(monkeypatch):
+    monkeypatch.setenv('MAPLE_API_WORKERS', '3')
+    monkeypatch.setenv('MAPLE_API_MAX_PENDING', '')
+    pool = ComputePool()
+    assert (pool.workers, pool.max_pending) == (3, 3 * workers.PENDING_PER_WORKER)
+
+
+def test_app_lifespan_starts_and_stops_the_pool(monkeypatch):
+    from api.main import app
+    pool = ComputePool(workers=1)
+    monkeypatch.setattr('api.main.compute_pool', pool)
+
+    async def scenario():
+        async with app.router.lifespan_context(app):
+            assert pool.started
+        assert not pool.started
+
+    asyncio.run(scenario())
+
+
+def test_load_test_reports_each_worker_count(body):
+    results = run_load_test(_calculate_dps, body, [0, 1], requests=4)
+    assert set(results) == {0, 1}
+    assert all(result['throughput'] > 0 for result in results.values())
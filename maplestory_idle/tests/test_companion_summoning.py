@@ -5,6 +5,7 @@ Tests for the companion summoning EV recommendation:
   - Cascading promotion handling (extras of maxed comp → tier-above value)
   - Edge cases (empty collection, all-maxed)
   - Optimizer-wrapper shape contract
+  - Batched value oracle (stat tables, single batch call, fingerprint cache)
 """
 import sys
 from pathlib import Path
@@ -13,7 +14,9 @@ import pytest
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from game.companions import COMPANIONS, JobAdvancement, MAX_LEVELS
+import game.companion_summoning as cs
 from game.companion_summoning import (
+    COMPANION_STAT_AXIS,
     DIAMONDS_PER_TICKET,
     TIER_RATES,
     PROMOTION_RATES,
@@ -21,7 +24,11 @@ from game.companion_summoning import (
     companions_in_tier,
     calculate_ev_per_pull_at_tier,
     calculate_expected_value_per_ticket,
+    companion_stat_delta,
+    companion_stat_table,
+    evaluate_companion_marginals,
     get_companion_ticket_recommendation_for_optimizer,
+    required_companion_overrides,
 )
 
 
@@ -286,5 +293,98 @@ class TestOptimizerWrapper:
         assert top['tier'] == 'BASIC'
 
 
+# ---------------------------------------------------------------------------
+# Batched value oracle
+# ---------------------------------------------------------------------------
+
+def _level_sensitive_fn(calls=None):
+    """Marginal DPS that depends on the companion and its level."""
+    def fn(overrides):
+        if calls is not None:
+            calls.append(dict(overrides))
+        (key, level), = overrides.items()
+        return (len(key) % 7 + 1) * level ** 0.5
+    return fn
+
+
+def _mixed_state():
+    owned = {}
+    for i, key in enumerate(sorted(COMPANIONS)):
+        max_lvl = COMPANIONS[key].max_level
+        owned[key] = (0, 1, max_lvl // 2, max_lvl)[i % 4]
+    return {'owned': {k: v for k, v in owned.items() if v > 0}, 'equipped': sorted(owned)[:3]}
+
+
+class TestValueOracle:
+    @pytest.fixture(autouse=True)
+    def _fresh_cache(self):
+        cs._marginal_cache.clear()
+        yield
+        cs._marginal_cache.clear()
+
+    def test_stat_table_matches_companion_definitions(self):
+        for key, comp in COMPANIONS.items():
+            inventory, on_equip = companion_stat_table(key)
+            assert inventory.shape == (comp.max_level + 1, len(COMPANION_STAT_AXIS))
+            assert not inventory[0].any() and not on_equip[0].any()
+            for level in (1, comp.max_level // 2, comp.max_level):
+                for stat, value in comp.get_inventory_stats(level).items():
+                    if stat in COMPANION_STAT_AXIS:
+                        assert inventory[level, COMPANION_STAT_AXIS.index(stat)] == value
+                assert on_equip[level].sum() in (0.0, comp.get_on_equip_value(level))
+
+    def test_stat_delta_is_row_difference(self):
+        key = companions_in_tier(JobAdvancement.FOURTH)[0]
+        inventory, on_equip = companion_stat_table(key)
+        delta = companion_stat_delta(key, 3, 4, equipped=True)
+        expected = (inventory[4] + on_equip[4]) - (inventory[3] + on_equip[3])
+        for i, stat in enumerate(COMPANION_STAT_AXIS):
+            assert delta.get(stat, 0.0) == pytest.approx(expected[i])
+        assert companion_stat_delta(key, 4, 4) == {}
+
+    def test_required_overrides_cover_solver_reads(self):
+        state = _mixed_state()
+        calls = []
+        calculate_expected_value_per_ticket(state, _level_sensitive_fn(calls))
+        expected = required_companion_overrides(state)
+        assert len(set(expected)) == len(expected)
+        assert [next(iter(c.items())) for c in calls] == expected
+
+    def test_batch_matches_per_state_solve(self):
+        state = _mixed_state()
+        fn = _level_sensitive_fn()
+        batch_calls = []
+
+        def batch_fn(deltas):
+            batch_calls.append(deltas)
+            return [fn(d) for d in deltas]
+
+        per_state = calculate_expected_value_per_ticket(state, fn)
+        batched = calculate_expected_value_per_ticket(state, marginal_dps_batch_fn=batch_fn)
+        assert len(batch_calls) == 1
+        assert batched['expected_value'] == pytest.approx(per_state['expected_value'])
+        assert batched['breakdown'] == pytest.approx(per_state['breakdown'])
+
+    def test_cached_per_account_fingerprint(self):
+        state = _mixed_state()
+        calls = []
+        fn = _level_sensitive_fn(calls)
+        first = evaluate_companion_marginals(state, fn, cache_key='acct')
+        n = len(calls)
+        assert evaluate_companion_marginals(dict(state), fn, cache_key='acct') is first
+        assert len(calls) == n
+        # A level change or a different cache key is a new account state
+        changed = {'owned': {**state['owned'], next(iter(state['owned'])): 2},
+                   'equipped': state['equipped']}
+        evaluate_companion_marginals(changed, fn, cache_key='acct')
+        assert len(calls) == n + len(required_companion_overrides(changed))
+        evaluate_companion_marginals(state, fn, cache_key='other')
+        assert len(calls) == 2 * n + len(required_companion_overrides(changed))
+
+    def test_batch_length_mismatch_raises(self):
+        with pytest.raises(ValueError):
+            evaluate_companion_marginals({'owned': {}}, marginal_dps_batch_fn=lambda deltas: [])
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -9,6 +9,7 @@ Covers:
 - Stat name normalization (legacy aliases → canonical StatType.value)
 - convert_streamlit_lines_to_potential_lines correctness
 - analyze_slot_potentials current-line extraction
+- Optimal stopping thresholds against a direct per-threshold evaluation
 """
 import sys
 from pathlib import Path
@@ -25,7 +26,11 @@ from streamlit_app.utils.cube_analyzer import (
     convert_streamlit_lines_to_potential_lines,
     analyze_slot_potentials,
     analyze_all_cube_priorities,
+    rank_cube_recommendations,
     CubeRecommendation,
+    EQUIPMENT_SLOTS,
+    _solve_optimal_stopping_no_tierup,
+    _solve_optimal_stopping_with_tierup,
 )
 from game.cubes import PotentialTier, StatType
 
@@ -426,6 +431,22 @@ class TestAnalyzeAllCubePriorities:
         ranks = [r.priority_rank for r in recs]
         assert ranks == list(range(1, len(recs) + 1))
 
+    def test_slot_subsets_merge_to_full_ranking(self):
+        ud = self._make_user_data()
+
+        def dps(stats, cm="stage"):
+            return {"total": 1000.0 + len(ud.equipment_potentials)}
+
+        full = analyze_all_cube_priorities(ud, lambda: {}, dps)
+        hat = analyze_all_cube_priorities(ud, lambda: {}, dps, slots=["hat"])
+        assert {r.slot for r in hat} == {"hat"}
+        # Equal efficiencies keep slot order, so merge in EQUIPMENT_SLOTS order
+        rest = analyze_all_cube_priorities(ud, lambda: {}, dps, slots=EQUIPMENT_SLOTS[1:])
+        merged = rank_cube_recommendations(hat + rest)
+        assert [(r.slot, r.is_bonus, r.efficiency_score, r.priority_rank) for r in merged] == [
+            (r.slot, r.is_bonus, r.efficiency_score, r.priority_rank) for r in full
+        ]
+
     def test_line_stats_correct_for_known_slot(self):
         ud = self._make_user_data()
         recs = analyze_all_cube_priorities(
@@ -453,3 +474,35 @@ class TestAnalyzeAllCubePriorities:
         assert len(glove_recs) == 1
         # Tier stored as the raw CSV value, not normalized to title case
         assert glove_recs[0].tier == "mystic"
+
+
+# ---------------------------------------------------------------------------
+# Optimal stopping
+# ---------------------------------------------------------------------------
+
+class TestOptimalStopping:
+    DPS = [0.0, 0.5, 1.0, 2.0, 4.0, 8.0]
+    PROBS = [0.4, 0.25, 0.15, 0.1, 0.07, 0.03]
+
+    def _threshold_value(self, i, cost):
+        p_keep = sum(self.PROBS[i:])
+        kept = sum(d * p for d, p in zip(self.DPS[i:], self.PROBS[i:]))
+        return kept / p_keep - cost / p_keep
+
+    @pytest.mark.parametrize("cost", [0.0, 0.05, 0.3, 5.0])
+    def test_no_tierup_picks_best_threshold(self, cost):
+        threshold, value, cubes = _solve_optimal_stopping_no_tierup(self.DPS, self.PROBS, cost)
+        values = [self._threshold_value(i, cost) for i in range(len(self.DPS))]
+        if max(values) > self.DPS[-1]:
+            assert value == pytest.approx(max(values))
+            assert threshold == self.DPS[max(i for i, v in enumerate(values) if v == pytest.approx(max(values)))]
+        else:
+            assert (threshold, value) == (self.DPS[-1], self.DPS[-1])
+        assert cubes == pytest.approx(1 / sum(p for d, p in zip(self.DPS, self.PROBS) if d >= threshold))
+
+    def test_with_tierup_keeps_rolls_above_continuation_value(self):
+        threshold, value, _ = _solve_optimal_stopping_with_tierup(self.DPS, self.PROBS, 0.1, 6.0, 0.05)
+        # A cube is worth -cost + p * next_tier + (1 - p) * E[V]; keep every roll worth more
+        continue_value = -0.1 + 0.05 * 6.0 + 0.95 * value
+        assert threshold == min(d for d in self.DPS if d >= continue_value - 1e-4)
+        assert value == pytest.approx(sum(max(d, continue_value) * p for d, p in zip(self.DPS, self.PROBS)), abs=1e-3)
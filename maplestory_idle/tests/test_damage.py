@@ -5,8 +5,11 @@ Each test validates one formula in isolation.  Numbers are derived from the
 formula definitions, not from game observation, so they double as regression
 guards if formulas ever change.
 """
+import random
 import sys
 from pathlib import Path
+
+import numpy as np
 import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -24,6 +27,19 @@ from core.damage import (
     calculate_damage,
     calculate_damage_simple,
     DamageResult,
+    calculate_final_damage_mult_batch,
+    calculate_effective_crit_multiplier_batch,
+    calculate_defense_pen_batch,
+    calculate_defense_multiplier_batch,
+    calculate_attack_speed_batch,
+    calculate_damage_batch,
+)
+from stats import (
+    ATTACK_SPEED_BREAKPOINTS,
+    calculate_attack_speed_dps_value,
+    calculate_attack_speed_dps_value_batch,
+    get_animation_frames,
+    get_animation_frames_batch,
 )
 from core.constants import BASE_CRIT_DMG, DEF_PEN_CAP, ATK_SPD_CAP
 
@@ -383,3 +399,112 @@ class TestCalculateDamageSimple:
         )
         expected = 5_000 * 3.0 * 1.5 * 1.0 * 1.10 * 2.30 * 1.0
         assert result == pytest.approx(expected)
+
+
+# ---------------------------------------------------------------------------
+# Batched (NumPy) formulas — must match the scalar versions exactly
+# ---------------------------------------------------------------------------
+
+def _draw(rng, low, high, edges=()):
+    """Random value, with a fair chance of hitting a boundary value exactly."""
+    if edges and rng.random() < 0.3:
+        return float(rng.choice(edges))
+    return rng.uniform(low, high)
+
+
+def _draw_sources(rng, n, low, high):
+    """n candidates of 0-5 sources each, zero-padded into an (n, 5) array."""
+    lists = [[_draw(rng, low, high, (0.0, high)) for _ in range(rng.randint(0, 5))] for _ in range(n)]
+    padded = np.zeros((n, 5))
+    for i, values in enumerate(lists):
+        padded[i, :len(values)] = values
+    return lists, padded
+
+
+class TestBatchedFormulas:
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_final_damage_and_defense_pen_sources(self, seed):
+        rng = random.Random(seed)
+        fd_lists, fd = _draw_sources(rng, 200, 0.0, 0.5)
+        pen_lists, pen = _draw_sources(rng, 200, 0.0, 1.0)
+        assert calculate_final_damage_mult_batch(fd).tolist() == [
+            calculate_final_damage_mult(v) for v in fd_lists
+        ]
+        assert calculate_defense_pen_batch(pen).tolist() == [calculate_defense_pen(v) for v in pen_lists]
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_crit_and_defense_multipliers(self, seed):
+        rng = random.Random(seed)
+        rates = [_draw(rng, 0, 150, (0.0, 100.0)) for _ in range(200)]
+        damages = [_draw(rng, 0, 500, (BASE_CRIT_DMG,)) for _ in range(200)]
+        pens = [_draw(rng, 0, 1, (0.0, 1.0)) for _ in range(200)]
+        enemy_def = _draw(rng, 0, 5, (0.0,))
+        assert calculate_effective_crit_multiplier_batch(rates, damages).tolist() == [
+            calculate_effective_crit_multiplier(r, d) for r, d in zip(rates, damages)
+        ]
+        assert calculate_defense_multiplier_batch(pens, enemy_def).tolist() == [
+            calculate_defense_multiplier(p, enemy_def) for p in pens
+        ]
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_attack_speed_sources(self, seed):
+        rng = random.Random(seed)
+        lists, padded = _draw_sources(rng, 200, -10.0, ATK_SPD_CAP)
+        assert calculate_attack_speed_batch(padded).tolist() == [
+            calculate_attack_speed([("src", v) for v in values]) for values in lists
+        ]
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_attack_speed_breakpoints(self, seed):
+        rng = random.Random(seed)
+        thresholds = tuple(float(t) for t, _, _ in ATTACK_SPEED_BREAKPOINTS)
+        current = [_draw(rng, 0, 150, thresholds) for _ in range(300)]
+        gains = [_draw(rng, 0, 40, (0.0,)) for _ in range(300)]
+        assert get_animation_frames_batch(current).tolist() == [get_animation_frames(c) for c in current]
+        assert calculate_attack_speed_dps_value_batch(current, gains).tolist() == [
+            calculate_attack_speed_dps_value(c, g) for c, g in zip(current, gains)
+        ]
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_damage_matches_scalar(self, seed):
+        rng = random.Random(seed)
+        fd_lists, fd = _draw_sources(rng, 100, 0.0, 0.5)
+        candidates = [
+            dict(
+                base_atk=rng.uniform(1, 1e6),
+                dex_flat=rng.uniform(0, 1e5),
+                dex_percent=rng.uniform(0, 300),
+                damage_percent=rng.uniform(0, 1000),
+                damage_amp=rng.uniform(0, 50),
+                crit_rate=_draw(rng, 0, 150, (100.0,)),
+                crit_damage=rng.uniform(0, 400),
+                defense_pen=_draw(rng, 0, 1, (1.0,)),
+                enemy_def=rng.uniform(0, 5),
+                boss_damage=rng.uniform(0, 200),
+                str_flat=rng.uniform(0, 1e4),
+                dex_flat_conversion=rng.uniform(0, 1e3),
+            )
+            for _ in fd_lists
+        ]
+        batch = calculate_damage_batch(
+            final_damage_sources=fd,
+            **{key: np.array([c[key] for c in candidates]) for key in candidates[0]},
+        )
+        for i, (c, sources) in enumerate(zip(candidates, fd_lists)):
+            scalar = calculate_damage(final_damage_sources=sources, **c)
+            for field in DamageResult.__dataclass_fields__:
+                assert getattr(batch, field)[i] == getattr(scalar, field), field
+
+    def test_damage_broadcasts_scalar_arguments(self):
+        batch = calculate_damage_batch(
+            base_atk=[1_000, 2_000, 3_000], dex_flat=10_000, dex_percent=0, damage_percent=0,
+            damage_amp=0, final_damage_sources=[0.1, 0.2], crit_rate=0, crit_damage=0,
+            defense_pen=1.0, enemy_def=0.5,
+        )
+        assert batch.total.shape == (3,)
+        assert batch.fd_mult.tolist() == [calculate_final_damage_mult([0.1, 0.2])] * 3
+        assert batch.total.tolist() == [
+            calculate_damage(a, 10_000, 0, 0, 0, [0.1, 0.2], 0, 0, 1.0, 0.5).total
+            for a in (1_000, 2_000, 3_000)
+        ]
@@ -0,0 +1,147 @@
+"""
+Tests for the framework-free DPS engine package (engine/)
+
+Covers: the default LRU cache backend (including concurrent use), plugging a custom backend into
+aggregate_stats, that the engine and the API routers import without
+pulling in Streamlit (checked in a fresh interpreter), and that the import
+benchmark runs.
+"""
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from engine.cache import CacheBackend, LRUCache, get_cache_backend, set_cache_backend
+from engine.dps_calculator import aggregate_stats, last_aggregation_report
+from engine.import_benchmark import cold_import, run_benchmark
+from streamlit_app.utils.data_manager import UserData
+
+
+class _DictBackend(CacheBackend):
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries[key] = value
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+@pytest.fixture
+def restore_backend():
+    yield
+    set_cache_backend(None)
+
+
+class TestLRUCache:
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert (cache.get('a'), cache.get('c')) == (1, 3)
+        assert len(cache) == 2
+
+    def test_clear(self):
+        cache = LRUCache()
+        cache.set('a', 1)
+        cache.clear()
+        assert len(cache) == 0 and cache.get('a') is None
+
+    def test_most_recent_follows_gets_and_sets(self):
+        cache = LRUCache()
+        assert cache.most_recent() is None
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.most_recent() == 2
+        cache.get('a')
+        assert cache.most_recent() == 1
+
+    def test_concurrent_access(self):
+        cache = LRUCache(maxsize=4)
+        errors = []
+
+        def worker(offset):
+            try:
+                for i in range(2000):
+                    key = (offset + i) % 9
+                    cache.set(key, key)
+                    value = cache.get(key)
+                    assert value is None or value == key
+                    cache.most_recent()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert len(cache) <= 4
+
+
+class TestPluggableBackend:
+
+    def test_backend_must_implement_the_interface(self):
+        class _GetOnly(CacheBackend):
+            def get(self, key):
+                return None
+
+        with pytest.raises(TypeError):
+            _GetOnly()
+
+    def test_aggregation_uses_the_configured_backend(self, restore_backend):
+        backend = _DictBackend()
+        set_cache_backend(backend)
+        assert get_cache_backend() is backend
+        data = UserData(username='test')
+        first = aggregate_stats(data)
+        # One entry per block, plus the whole-account entry keyed on data.digest()
+        assert len(backend) == len(last_aggregation_report().blocks) + 1
+        assert aggregate_stats(data) == first
+        assert last_aggregation_report().recomputed == []
+
+    def test_provider_is_resolved_per_aggregation(self, restore_backend):
+        backends = [_DictBackend(), _DictBackend()]
+        set_cache_backend(lambda: backends[0])
+        aggregate_stats(UserData(username='test'))
+        backends.reverse()
+        aggregate_stats(UserData(username='test'))
+        assert last_aggregation_report().recomputed == last_aggregation_report().blocks
+        assert len(backends[0]) == len(backends[1]) > 0
+
+    def test_none_restores_the_default_lru(self):
+        set_cache_backend(_DictBackend())
+        set_cache_backend(None)
+        assert isinstance(get_cache_backend(), LRUCache)
+
+
+class TestImportIsolation:
+
+    def test_engine_does_not_import_streamlit(self):
+        assert not cold_import("engine.dps_calculator", runs=1)[1]
+
+    def test_api_routers_do_not_import_streamlit(self):
+        pytest.importorskip("fastapi")
+        assert not cold_import("api.main", runs=1)[1]
+
+    def test_benchmark_reports_each_module(self):
+        results = run_benchmark(["engine.dps_calculator", "engine.no_such_module"], runs=1)
+        assert results["engine.dps_calculator"]["seconds"] > 0
+        assert results["engine.dps_calculator"]["streamlit"] is False
+        assert "No module named" in results["engine.no_such_module"]["error"]
@@ -0,0 +1,163 @@
+"""
+Tests for the /api/evaluate-batch endpoint (api/routers/dps.py).
+
+Covers: stat-delta, source, star-override and overlay-edit candidates score
+the same as evaluating each candidate build on its own, the base build is
+left untouched, a bad candidate reports an error without failing the batch,
+the legacy path scores uniform stat-delta candidates in one NumPy batch, the
+realistic path shares one sim cache across the batch, and malformed or
+oversized batches are rejected before they reach the pool.
+"""
+import asyncio
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import HTTPException
+
+import api.routers.dps as dps_router
+from api.routers.dps import _evaluate_batch, _calculate_dps, _candidate_stats, evaluate_batch_endpoint
+from core.stat_vector import StatVector
+from engine.dps_calculator import aggregate_stats, calculate_dps
+from game.job_classes import JobClass
+from streamlit_app.utils.data_manager import UserData
+from tests.test_aggregate_stats import _random_user
+
+
+@pytest.fixture
+def user():
+    return _random_user(random.Random(11))
+
+
+def _batch(user, candidates, **options):
+    body = {'user_data': user.model_dump(), 'candidates': candidates, 'combat_mode': 'boss', **options}
+    return _evaluate_batch(body)
+
+
+def _legacy_dps(user, stats):
+    return calculate_dps(stats, 'boss', 0.752, job_class=JobClass(user.job_class))['total']
+
+
+class TestCandidates:
+
+    def test_baseline_matches_calculate_dps(self, user):
+        for realistic in (False, True):
+            result = _batch(user, [{}], use_realistic_dps=realistic)
+            single = _calculate_dps({'user_data': user.model_dump(), 'combat_mode': 'boss',
+                                     'use_realistic_dps': realistic})
+            assert result['baseline_dps'] == pytest.approx(single['total'])
+            assert result['results'] == [{'label': '0', 'dps': result['baseline_dps'], 'gain_pct': 0.0}]
+
+    def test_stat_deltas_and_sources(self, user):
+        result = _batch(user, [
+            {'label': 'damage', 'stat_deltas': {'damage_pct': 15.0, 'crit_damage': 5.0}},
+            {'label': 'def pen', 'sources': {'def_pen_sources': [['new_line', 0.1, 100]]}},
+        ])
+        base = StatVector.from_dict(aggregate_stats(user))
+        expected = [
+            _legacy_dps(user, base.with_deltas({'damage_pct': 15.0, 'crit_damage': 5.0})),
+            _legacy_dps(user, base.with_source('def_pen_sources', ('new_line', 0.1, 100))),
+        ]
+        assert [row['label'] for row in result['results']] == ['damage', 'def pen']
+        assert [row['dps'] for row in result['results']] == pytest.approx(expected)
+        assert all(row['gain_pct'] > 0 for row in result['results'])
+
+    def test_overlay_edit_matches_the_edited_build(self, user):
+        result = _batch(user, [{'edits': [
+            {'field': 'equipment_potentials', 'path': ['gloves', 'line1_stat'], 'value': 'crit_damage'},
+            {'field': 'equipment_potentials', 'path': ['gloves', 'line1_value'], 'value': 30.0},
+        ]}])
+        edited = UserData(**user.model_dump())
+        edited.equipment_potentials['gloves']['line1_stat'] = 'crit_damage'
+        edited.equipment_potentials['gloves']['line1_value'] = 30.0
+        assert result['results'][0]['dps'] == pytest.approx(_legacy_dps(user, aggregate_stats(edited)))
+
+    def test_whole_field_edit(self, user):
+        result = _batch(user, [{'edits': [{'field': 'character_level', 'value': user.character_level + 10}]}])
+        edited = UserData(**user.model_dump())
+        edited.character_level += 10
+        assert result['results'][0]['dps'] == pytest.approx(_legacy_dps(user, aggregate_stats(edited)))
+
+    def test_star_overrides(self, user):
+        overrides = {'hat': 25}
+        result = _batch(user, [{'star_overrides': overrides}])
+        expected = _legacy_dps(user, aggregate_stats(user, star_overrides=overrides))
+        assert result['results'][0]['dps'] == pytest.approx(expected)
+
+    def test_edits_are_undone(self, user):
+        digest = user.digest()
+        base = StatVector.from_dict(aggregate_stats(user))
+        _candidate_stats(user, base, {'edits': [
+            {'field': 'equipment_potentials', 'path': ['gloves', 'line1_value'], 'value': 99.0},
+            {'field': 'artifacts_equipped', 'path': ['new_slot'], 'value': {'name': 'x'}},
+        ]})
+        assert user.digest() == digest
+        assert 'new_slot' not in user.artifacts_equipped
+
+    def test_bad_candidate_reports_an_error(self, user):
+        result = _batch(user, [
+            {'edits': [{'field': 'no_such_field', 'value': 1}]},
+            {'stat_deltas': {'damage_pct': 1.0}},
+        ])
+        assert 'no_such_field' in result['results'][0]['error']
+        assert result['results'][1]['gain_pct'] > 0
+
+
+class TestLegacyBatch:
+
+    def test_uniform_deltas_skip_calculate_dps(self, user, monkeypatch):
+        calls = []
+
+        def counted(*args, **kwargs):
+            calls.append(args[0])
+            return calculate_dps(*args, **kwargs)
+
+        monkeypatch.setattr(dps_router, 'calculate_dps', counted)
+        candidates = [{'stat_deltas': {'crit_damage': value}} for value in (1.0, 2.0, 3.0)]
+        candidates.insert(1, {'stat_deltas': {'boss_damage': 5.0}})
+        candidates.append({'star_overrides': {'hat': 25}})
+        result = _batch(user, candidates)
+        assert len(calls) == 2
+
+        base = StatVector.from_dict(aggregate_stats(user))
+        expected = [_legacy_dps(user, base.with_deltas(c['stat_deltas'])) for c in candidates[:4]]
+        expected.append(_legacy_dps(user, aggregate_stats(user, star_overrides={'hat': 25})))
+        assert [row['label'] for row in result['results']] == ['0', '1', '2', '3', '4']
+        assert [row['dps'] for row in result['results']] == pytest.approx(expected, rel=1e-9)
+
+
+class TestRealisticBatch:
+
+    def test_sim_cache_is_shared_across_the_batch(self, user):
+        candidates = [{'stat_deltas': {'skill_cd_reduction': 1.0}} for _ in range(5)]
+        candidates += [{'stat_deltas': {'damage_pct': value}} for value in (5.0, 10.0)]
+        result = _batch(user, candidates, use_realistic_dps=True)
+        assert result['simulations'] == {'cache_hits': 4, 'runs': 1}
+        gains = [row['gain_pct'] for row in result['results']]
+        assert len(set(gains[:5])) == 1
+        assert 0 < gains[5] < gains[6]
+
+
+class TestEndpoint:
+
+    def test_runs_the_batch(self, user):
+        body = {'user_data': user.model_dump(), 'candidates': [{'stat_deltas': {'damage_pct': 3.0}}]}
+        assert asyncio.run(evaluate_batch_endpoint(body)) == _evaluate_batch(body)
+
+    @pytest.mark.parametrize('candidates', [None, {'label': 'x'}, [1, 2]])
+    def test_malformed_candidates_are_rejected(self, candidates):
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(evaluate_batch_endpoint({'user_data': {}, 'candidates': candidates}))
+        assert raised.value.status_code == 400
+
+    def test_oversized_batch_is_rejected(self, monkeypatch):
+        monkeypatch.setattr(dps_router, 'MAX_BATCH_CANDIDATES', 2)
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(evaluate_batch_endpoint({'user_data': {}, 'candidates': [{}] * 3}))
+        assert raised.value.status_code == 400
@@ -5,20 +5,41 @@ Tests for the optimizer's fast-DPS path:
   - `FastDPSEvaluator.evaluate` returns the same DPS as direct realistic
     evaluation for sequence-affecting stats, and scales correctly via the
     baseline ratio for non-sequence stats.
+  - `FastDPSEvaluator.evaluate_changed` picks the path from the stats that
+    differ from the baseline.
   - `calculate_marginal_dps_value` honors the optional `fast_evaluator`.
   - `companion_duration` stat plumbing: extends summon window in the sim.
+  - `EvaluationContext` computes each baseline once per run and attributes
+    DPS evaluations to the analyser that made them.
+  - `LegacyBatchEvaluator` matches legacy calculate_dps for batches of
+    uniform-stat candidates and only claims candidates it can score.
 """
+import copy
+import random
 import sys
 from pathlib import Path
 import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from streamlit_app.utils.dps_calculator import (
+from engine.dps_calculator import (
     is_sequence_affecting,
     SEQUENCE_AFFECTING_STAT_KEYS,
     FastDPSEvaluator,
+    SEQUENCE_CACHE_STAT_KEYS,
+    compute_sequence_cache_key,
+    EvaluationContext,
+    BASELINE_ANALYSER,
+    compute_stage_weighted_gain_pct,
+    LegacyBatchEvaluator,
+    UNIFORM_LEGACY_STAT_KEYS,
+    aggregate_stats,
+    calculate_dps,
+    evaluate_companion_level_changes,
 )
+from core.stat_vector import StatVector
+from game.job_classes import JobClass
+from tests.test_aggregate_stats import _random_user
 
 
 # ---------------------------------------------------------------------------
@@ -251,6 +272,67 @@ class TestFastDPSEvaluator:
         assert len(calc.calls) == calls_before  # no new sim call
 
 
+class TestEvaluateChanged:
+    def _evaluator(self, calc):
+        return FastDPSEvaluator(
+            baseline_stats=_baseline_stats(),
+            combat_mode='boss',
+            enemy_def=0.752,
+            calculate_dps_fn=calc,
+        )
+
+    def test_unchanged_candidate_is_the_baseline(self):
+        calc = _RecordingCalc(realistic_factor=1.20)
+        evaluator = self._evaluator(calc)
+        calls_before = len(calc.calls)
+        assert evaluator.evaluate_changed(_baseline_stats()) == evaluator.baseline_realistic_dps
+        assert len(calc.calls) == calls_before
+
+    def test_several_non_sequence_changes_scale_the_legacy_path(self):
+        calc = _RecordingCalc(realistic_factor=1.20)
+        evaluator = self._evaluator(calc)
+        calls_before = len(calc.calls)
+        candidate = _baseline_stats()
+        candidate['damage_pct'] += 20.0
+        candidate['crit_damage'] += 10.0
+        dps = evaluator.evaluate_changed(candidate)
+        assert [realistic for _, realistic in calc.calls[calls_before:]] == [False]
+        assert dps == pytest.approx(calc(candidate, 'boss', 0.752, use_realistic_dps=True)['total'])
+
+    def test_sequence_only_changes_use_the_sim_cache(self):
+        calc = _RecordingCalc(realistic_factor=1.20)
+        evaluator = self._evaluator(calc)
+        candidate = _baseline_stats()
+        candidate['skill_cd_reduction'] += 1.0
+        candidate['buff_duration'] += 5.0
+        first = evaluator.evaluate_changed(candidate)
+        assert evaluator.evaluate_changed(dict(candidate)) == first
+        assert evaluator.cache_stats == (1, 1)
+
+    def test_mixed_changes_are_not_answered_from_the_cache(self):
+        # Both candidates have the same sequence cache key but different
+        # damage, so a cached answer would be wrong for the second.
+        calc = _RecordingCalc(realistic_factor=1.20)
+        evaluator = self._evaluator(calc)
+        first, second = _baseline_stats(), _baseline_stats()
+        for candidate, damage in ((first, 10.0), (second, 20.0)):
+            candidate['skill_cd_reduction'] += 1.0
+            candidate['damage_pct'] += damage
+        assert evaluator.evaluate_changed(first) < evaluator.evaluate_changed(second)
+        assert evaluator.evaluate_changed(second) == pytest.approx(
+            calc(second, 'boss', 0.752, use_realistic_dps=True)['total'])
+
+    def test_sequence_keys_cover_the_cache_key(self):
+        # Changing a key outside SEQUENCE_CACHE_STAT_KEYS never moves the cache key
+        stats = dict(_baseline_stats(), level=100, attack_speed_sources=[('a', 10.0)])
+        key = compute_sequence_cache_key(stats, 'boss', 0.752, {})
+        for stat in ('attack_flat', 'damage_pct', 'crit_damage', 'boss_damage', 'final_damage_sources'):
+            assert stat not in SEQUENCE_CACHE_STAT_KEYS
+            assert compute_sequence_cache_key(dict(stats, **{stat: 12345}), 'boss', 0.752, {}) == key
+        for stat in SEQUENCE_CACHE_STAT_KEYS:
+            assert compute_sequence_cache_key(dict(stats, **{stat: 7}), 'boss', 0.752, {}) != key, stat
+
+
 # ---------------------------------------------------------------------------
 # calculate_marginal_dps_value × fast_evaluator
 # ---------------------------------------------------------------------------
@@ -353,5 +435,248 @@ class TestCompanionDurationPlumbing:
         )
 
 
+# ---------------------------------------------------------------------------
+# EvaluationContext
+# ---------------------------------------------------------------------------
+
+class _ModeCalc:
+    """
+    Page-style `calculate_dps(stats, mode)` wrapper over _RecordingCalc:
+    mob phases score a little lower than boss phases so stage blending is
+    observable.
+    """
+
+    MODE_FACTORS = {'stage': 1.0, 'chapter_hunt': 0.8, 'boss': 1.25, 'world_boss': 1.3}
+
+    def __init__(self):
+        self.inner = _RecordingCalc()
+        self.modes = []
+
+    def __call__(self, stats, mode):
+        self.modes.append(mode)
+        total = self.inner(stats, mode, 0.752)['total'] * self.MODE_FACTORS[mode]
+        return {'total': total}
+
+
+def _candidate(**changes):
+    stats = _baseline_stats()
+    for key, value in changes.items():
+        stats[key] += value
+    return stats
+
+
+class TestEvaluationContext:
+    def test_each_baseline_computed_once(self):
+        calc = _ModeCalc()
+        ctx = EvaluationContext(_baseline_stats(), 'stage', calc)
+        for name in ('Cubes', 'Hero Power', 'Artifacts'):
+            with ctx.analyser(name):
+                # Every analyser re-derives the baseline its own way
+                ctx.calculate_dps(ctx.get_stats(), 'stage')
+                ctx.score(ctx.get_stats())
+                compute_stage_weighted_gain_pct(
+                    ctx.get_stats(), _candidate(damage_pct=5.0), ctx.calculate_dps,
+                )
+        # stage + chapter_hunt + boss baselines, one run each
+        assert sorted(calc.modes[:3]) == ['boss', 'chapter_hunt', 'stage']
+        assert ctx.evaluation_counts[BASELINE_ANALYSER] == 3
+        assert ctx.report()['baseline_modes'] == ['boss', 'chapter_hunt', 'stage']
+
+    def test_counts_per_analyser(self):
+        ctx = EvaluationContext(_baseline_stats(), 'boss', _ModeCalc())
+        with ctx.analyser('Starforce'):
+            for i in range(3):
+                ctx.score(_candidate(attack_flat=i + 1))
+        with ctx.analyser('Artifacts'):
+            ctx.gain_pct(_candidate(boss_damage=10.0))
+        ctx.calculate_dps(_candidate(crit_damage=1.0))
+        assert ctx.evaluation_counts == {
+            'Starforce': 3, BASELINE_ANALYSER: 1, 'Artifacts': 1, 'other': 1,
+        }
+        assert ctx.total_evaluations == 6
+
+    def test_attribution_is_per_thread(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        ctx = EvaluationContext(_baseline_stats(), 'boss', _ModeCalc())
+        ctx.baseline_result()
+        tasks = {
+            name: ctx.bind(name, lambda n=n: [ctx.score(_candidate(damage_pct=i + 1)) for i in range(n)])
+            for name, n in (('Cubes', 5), ('Weapons', 2), ('Summons', 7))
+        }
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            list(pool.map(lambda fn: fn(), tasks.values()))
+        counts = ctx.evaluation_counts
+        assert (counts['Cubes'], counts['Weapons'], counts['Summons']) == (5, 2, 7)
+        assert 'other' not in counts
+
+    def test_merge_report_adds_worker_counts(self):
+        ctx = EvaluationContext(_baseline_stats(), 'boss', _ModeCalc())
+        with ctx.analyser('Cubes'):
+            ctx.score(_candidate(damage_pct=1.0))
+        worker = EvaluationContext(_baseline_stats(), 'boss', _ModeCalc())
+        with worker.analyser('Cubes'):
+            worker.score(_candidate(damage_pct=2.0))
+        with worker.analyser('Artifacts'):
+            worker.score(_baseline_stats())
+        ctx.merge_report(worker.report())
+        report = ctx.report()
+        assert report['evaluations'] == {'Cubes': 2, BASELINE_ANALYSER: 1}
+        assert report['total'] == 3
+        assert report['baseline_hits'] == 0
+
+    def test_score_and_gain_match_phase_helpers(self):
+        calc = _ModeCalc()
+        ctx = EvaluationContext(_baseline_stats(), 'stage', calc)
+        candidate = _candidate(boss_damage=20.0)
+        hunt = calc(candidate, 'chapter_hunt')['total']
+        boss = calc(candidate, 'boss')['total']
+        assert ctx.score(candidate) == pytest.approx(hunt * 0.6 + boss * 0.4)
+        assert ctx.gain_pct(candidate) == pytest.approx(compute_stage_weighted_gain_pct(
+            _baseline_stats(), candidate, lambda s, m: calc(s, m)['total'],
+        ))
+
+    def test_seeded_baseline_is_not_recomputed(self):
+        calc = _ModeCalc()
+        seeded = calc(_baseline_stats(), 'boss')
+        calc.modes.clear()
+        ctx = EvaluationContext(_baseline_stats(), 'boss', calc, baseline_results={'boss': seeded})
+        assert ctx.baseline_dps() == seeded['total']
+        assert ctx.score(_baseline_stats()) == seeded['total']
+        assert calc.modes == []
+        assert ctx.total_evaluations == 0
+        assert ctx.report()['baseline_hits'] == 2
+
+    def test_extra_kwargs_bypass_baseline(self):
+        calls = []
+
+        def calc(stats, mode, enemy_def=None):
+            calls.append(enemy_def)
+            return {'total': 1.0}
+
+        ctx = EvaluationContext(_baseline_stats(), 'boss', calc)
+        ctx.calculate_dps(_baseline_stats())
+        ctx.calculate_dps(_baseline_stats(), 'boss', 0.5)
+        assert calls == [None, 0.5]
+
+    def test_fast_evaluator_reuses_realistic_baseline(self):
+        page_calc = _RecordingCalc(realistic_factor=1.20)
+        ctx = EvaluationContext(
+            _baseline_stats(), 'boss',
+            lambda s, m: page_calc(s, m, 0.752, use_realistic_dps=True),
+            fast_evaluator_kwargs={'enemy_def': 0.752, 'calculate_dps_fn': page_calc},
+        )
+        evaluator = ctx.fast_evaluator
+        assert ctx.fast_evaluator is evaluator
+        # Realistic baseline from the context + the legacy anchor only
+        assert [realistic for _, realistic in page_calc.calls] == [True, False]
+        assert evaluator.ratio == pytest.approx(1.20)
+        assert ctx.evaluation_counts == {BASELINE_ANALYSER: 2}
+
+        with ctx.analyser('Slot Efficiency'):
+            evaluator.evaluate(_candidate(damage_pct=3.0), changed_stat='damage_pct')
+            evaluator.evaluate(_baseline_stats(), changed_stat='skill_cd_reduction')
+        assert ctx.evaluation_counts['Slot Efficiency'] == 1
+        report = ctx.report()
+        assert (report['sim_cache_hits'], report['sim_cache_misses']) == (1, 0)
+
+    def test_no_fast_evaluator_without_kwargs(self):
+        assert EvaluationContext(_baseline_stats(), 'boss', _ModeCalc()).fast_evaluator is None
+
+
+
+# ---------------------------------------------------------------------------
+# LegacyBatchEvaluator
+# ---------------------------------------------------------------------------
+
+def _random_candidate(rng, base, keys):
+    candidate = base.with_deltas({key: rng.uniform(-5, 50) for key in rng.sample(keys, 3)})
+    if rng.random() < 0.5:
+        # Shoulder pots and priority-1 sources are ordered ahead of the rest
+        name = rng.choice(['shoulder_pot_line', 'guild', 'new_line'])
+        candidate = candidate.with_source('def_pen_sources', (name, rng.uniform(0, 0.3), rng.choice([1, 100])))
+    if rng.random() < 0.5:
+        candidate = candidate.with_source('final_damage_sources', rng.uniform(0, 0.3))
+    if rng.random() < 0.3:
+        candidate = candidate.with_values({'final_damage_correction': rng.uniform(0.5, 1.5)})
+    return candidate
+
+
+class TestLegacyBatchEvaluator:
+    @pytest.mark.parametrize('job_class', ['bowmaster', 'night_lord', 'shadower'])
+    @pytest.mark.parametrize('combat_mode', ['boss', 'stage', 'chapter_hunt'])
+    def test_matches_calculate_dps(self, job_class, combat_mode):
+        rng = random.Random(f'{job_class}-{combat_mode}')
+        user = _random_user(rng)
+        user.job_class = job_class
+        base = StatVector.from_dict(aggregate_stats(user))
+        batch = LegacyBatchEvaluator(base, combat_mode, 0.752, JobClass(job_class))
+        keys = sorted(key for key in batch.supported_keys
+                      if not key.endswith('_sources') and key != 'final_damage_correction')
+        candidates = [base, base.with_delta('crit_rate', 500.0)]  # no-op, crit rate past the cap
+        candidates += [_random_candidate(rng, base, keys) for _ in range(15)]
+        assert all(batch.supports(candidate) for candidate in candidates)
+
+        expected = [calculate_dps(candidate, combat_mode, 0.752, job_class=JobClass(job_class))['total']
+                    for candidate in candidates]
+        assert batch.baseline_dps == expected[0]
+        assert batch.evaluate(candidates).tolist() == pytest.approx(expected, rel=1e-9)
+
+    def test_supports_only_uniform_stats(self):
+        base = StatVector.from_dict(aggregate_stats(_random_user(random.Random(5))))
+        batch = LegacyBatchEvaluator(base, 'boss', 0.752, JobClass.BOWMASTER)
+        assert batch.supported_keys == UNIFORM_LEGACY_STAT_KEYS | {'dex_flat', 'dex_pct', 'str_flat', 'str_pct'}
+        assert batch.supports(base.with_deltas({'dex_pct': 5.0, 'crit_damage': 5.0}))
+        for stat in ('boss_damage', 'skill_damage', 'all_skills_bonus', 'skill_cd_reduction', 'luk_flat'):
+            assert not batch.supports(base.with_delta(stat, 1.0)), stat
+        assert not batch.supports(base.with_source('attack_speed_sources', ('new_line', 5.0)))
+        assert LegacyBatchEvaluator.supported_keys_for('bowmaster') == batch.supported_keys
+
+    def test_candidates_sharing_unsupported_stats_batch_on_an_anchor(self):
+        # Candidates that move the same unsupported stats by the same amount
+        # score exactly on a batch built from those values
+        base = StatVector.from_dict(aggregate_stats(_random_user(random.Random(9))))
+        anchor = base.with_delta('boss_damage', 12.0)
+        candidates = [anchor.with_delta('crit_damage', 8.0), anchor.with_delta('dex_pct', 6.0)]
+        batch = LegacyBatchEvaluator(anchor, 'stage', 0.752, JobClass.BOWMASTER)
+        assert all(batch.supports(candidate) for candidate in candidates)
+        expected = [calculate_dps(candidate, 'stage', 0.752, job_class=JobClass.BOWMASTER)['total']
+                    for candidate in candidates]
+        assert batch.evaluate(candidates).tolist() == pytest.approx(expected, rel=1e-9)
+
+
+class TestCompanionLevelChanges:
+    @pytest.mark.parametrize('combat_mode', ['stage', 'boss'])
+    def test_matches_reaggregated_calculate_dps(self, combat_mode):
+        user = _random_user(random.Random(f'companions-{combat_mode}'))
+        owned = sorted(user.companion_levels)
+        changes = [(key, level) for key in owned for level in (0, user.companion_levels[key] + 1)]
+        changes.append((owned[0], user.companion_levels[owned[0]]))  # unchanged level
+
+        fallback = []
+
+        def counting_dps(*args, **kwargs):
+            fallback.append(args)
+            return calculate_dps(*args, **kwargs)
+
+        baseline, dps = evaluate_companion_level_changes(
+            user, aggregate_stats(user), combat_mode, 0.752, changes, calculate_dps_fn=counting_dps,
+        )
+
+        phases = [('chapter_hunt', 0.6), ('boss', 0.4)] if combat_mode == 'stage' else [(combat_mode, 1.0)]
+
+        def weighted(stats):
+            return sum(calculate_dps(stats, mode, 0.752, job_class=JobClass(user.job_class))['total'] * weight
+                       for mode, weight in phases)
+
+        assert baseline == pytest.approx(weighted(aggregate_stats(user)), rel=1e-9)
+        for (key, level), value in zip(changes, dps):
+            synthetic = copy.copy(user)
+            synthetic.companion_levels = {**user.companion_levels, key: level}
+            assert value == pytest.approx(weighted(aggregate_stats(synthetic)), rel=1e-9), (key, level)
+        # Only the main companion and non-uniform stat changes leave the batch
+        assert len(fallback) < len(changes) * len(phases)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
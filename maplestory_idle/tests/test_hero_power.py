@@ -6,6 +6,7 @@ tier rates and reroll cost formula, HeroPowerConfig stat totals and locking.
 """
 import sys
 from pathlib import Path
+import numpy as np
 import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -509,3 +510,269 @@ class TestAnalyzeBudget:
             f"expected fewer locks at large budget: "
             f"small_locks={small['recommended_locks']}, large_locks={large['recommended_locks']}"
         )
+
+
+# ---------------------------------------------------------------------------
+# solve_custom_target_exact — analytic custom-target rerolls
+# ---------------------------------------------------------------------------
+
+from game.hero_power import (
+    SimulationTarget,
+    calculate_custom_target_roll_probability,
+    run_custom_target_simulation,
+    solve_custom_target_exact,
+)
+
+
+class TestCustomTargetExact:
+    def test_single_line_probability_matches_rates(self):
+        # One unlocked line needing Main Stat at Mystic: P = mystic_rate * P(Main Stat | Mystic).
+        target = SimulationTarget(
+            stat_requirements=[(HeroPowerStatType.MAIN_STAT_FLAT, 1)],
+            min_tier=HeroPowerTier.MYSTIC,
+        )
+        level = HeroPowerLevelConfig()
+        p = calculate_custom_target_roll_probability(target, [1, 2, 3, 4, 5], level)
+        expected = level.mystic_rate / 100 * STAT_PROBABILITIES[HeroPowerTier.MYSTIC][HeroPowerStatType.MAIN_STAT_FLAT]
+        assert p == pytest.approx(expected)
+
+    def test_expected_rerolls_is_geometric_mean(self):
+        target = SimulationTarget(
+            stat_requirements=[(HeroPowerStatType.DAMAGE, 2)],
+            min_tier=HeroPowerTier.UNIQUE,
+        )
+        p = calculate_custom_target_roll_probability(target)
+        result = solve_custom_target_exact(target, max_rerolls=10_000_000)
+        assert result.is_exact
+        assert result.expected_rerolls == pytest.approx(1 / p, rel=1e-6)
+        assert sum(result.reroll_pmf) == pytest.approx(1.0, abs=1e-9)
+
+    def test_locking_lines_reduces_success_probability(self):
+        target = SimulationTarget(
+            stat_requirements=[(HeroPowerStatType.DAMAGE, 2)],
+            min_tier=HeroPowerTier.UNIQUE,
+        )
+        p_open = calculate_custom_target_roll_probability(target)
+        p_locked = calculate_custom_target_roll_probability(target, [1, 2])
+        assert p_locked < p_open
+
+    def test_locked_qualifying_lines_count_toward_target(self):
+        cfg = _make_config_with_lines([
+            (1, HeroPowerStatType.DAMAGE, 35.0, HeroPowerTier.MYSTIC, True),
+            (2, HeroPowerStatType.DAMAGE, 35.0, HeroPowerTier.MYSTIC, True),
+        ] + [
+            (i, HeroPowerStatType.MAX_HP, 1300.0, HeroPowerTier.COMMON, False)
+            for i in range(3, 7)
+        ])
+        target = SimulationTarget(
+            stat_requirements=[(HeroPowerStatType.DAMAGE, 2)],
+            min_tier=HeroPowerTier.LEGENDARY,
+        )
+        result = solve_custom_target_exact(target, config=cfg)
+        assert result.expected_rerolls == 0
+        assert result.success_rate == 1.0
+
+    def test_unreachable_target_is_fully_capped(self):
+        # Def Pen never rolls at Legendary+ in STAT_PROBABILITIES
+        target = SimulationTarget(
+            stat_requirements=[(HeroPowerStatType.DEF_PEN, 1)],
+            min_tier=HeroPowerTier.LEGENDARY,
+        )
+        result = solve_custom_target_exact(target, max_rerolls=100)
+        assert result.success_rate == 0.0
+        assert result.capped_probability == 1.0
+        assert result.expected_rerolls == 100
+
+    def test_monte_carlo_agrees_with_exact(self):
+        target = SimulationTarget(
+            stat_requirements=[(HeroPowerStatType.DAMAGE, 1), (HeroPowerStatType.CRIT_RATE, 1)],
+            min_tier=HeroPowerTier.EPIC,
+        )
+        exact = solve_custom_target_exact(target, locked_lines=[1, 2])
+        mc = run_custom_target_simulation(target, locked_lines=[1, 2], iterations=20_000, seed=7)
+        assert mc.expected_rerolls == pytest.approx(exact.expected_rerolls, rel=0.05)
+        assert mc.median_rerolls == pytest.approx(exact.median_rerolls, rel=0.1)
+        assert mc.percentile_90_rerolls == pytest.approx(exact.percentile_90_rerolls, rel=0.1)
+        assert mc.expected_medals == pytest.approx(exact.expected_medals, rel=0.05)
+
+
+# ---------------------------------------------------------------------------
+# get_line_value_table — shared fresh-roll value table
+# ---------------------------------------------------------------------------
+
+from game.hero_power import (
+    analyze_lock_strategy,
+    calculate_hypothetical_line_dps_value,
+    clear_line_value_cache,
+    get_line_value_table,
+    rank_all_possible_lines_by_dps,
+)
+
+
+def _counting(calc):
+    calls = {'n': 0}
+
+    def wrapped(stats):
+        calls['n'] += 1
+        return calc(stats)
+    return wrapped, calls
+
+
+class TestLineValueTable:
+    def setup_method(self):
+        clear_line_value_cache()
+
+    def test_probabilities_sum_to_one(self):
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0})
+        table = get_line_value_table(gs(), calc, HeroPowerLevelConfig())
+        assert sum(p for _, p in table.atoms) == pytest.approx(1.0, abs=1e-6)
+
+    def test_knots_match_direct_evaluation(self):
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0, 'def_pen': 2.0})
+        stats = gs()
+        table = get_line_value_table(stats, calc, HeroPowerLevelConfig())
+        base = calc(stats)
+        for tier, stat_type, value in [
+            (HeroPowerTier.MYSTIC, HeroPowerStatType.DEF_PEN, 20.0),
+            (HeroPowerTier.EPIC, HeroPowerStatType.DAMAGE, 8.5),
+        ]:
+            line = HeroPowerLine(slot=0, stat_type=stat_type, value=value, tier=tier)
+            direct = calculate_hypothetical_line_dps_value(line, stats, base, calc)
+            assert table.line_value(stat_type, tier, value) == pytest.approx(direct)
+
+    def test_more_samples_refine_without_more_dps_calls(self):
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0})
+        counted, calls = _counting(calc)
+        coarse = get_line_value_table(gs(), counted, HeroPowerLevelConfig(), samples_per_range=3, context=('test',))
+        first_calls = calls['n']
+        fine = get_line_value_table(gs(), counted, HeroPowerLevelConfig(), samples_per_range=64, context=('test',))
+        assert calls['n'] == first_calls  # knots came from the cache
+        assert len(fine.atoms) > len(coarse.atoms)
+        # Linear DPS model: the mean is exact at any sample count
+        assert fine.mean() == pytest.approx(coarse.mean(), rel=1e-6)
+
+    def test_analyses_share_one_table(self):
+        cfg = _make_config_with_lines([
+            (i, HeroPowerStatType.DAMAGE, 5.0, HeroPowerTier.RARE, False)
+            for i in range(1, 7)
+        ])
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0})
+        counted, calls = _counting(calc)
+        table = get_line_value_table(gs(), counted, HeroPowerLevelConfig())
+        calls['n'] = 0
+        analyze_budget(cfg, HeroPowerLevelConfig(), 100_000, counted, gs, value_table=table)
+        # Only the per-line current contributions are evaluated (2 calls each)
+        assert calls['n'] <= 2 * len(cfg.lines) + 1
+
+    def test_no_context_is_not_cached(self):
+        from game import hero_power
+        cached = len(hero_power._line_value_knot_cache)
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0})
+        get_line_value_table(gs(), lambda stats: calc(stats), HeroPowerLevelConfig())
+        counted, calls = _counting(calc)
+        get_line_value_table(gs(), counted, HeroPowerLevelConfig())
+        assert calls['n'] > 0
+        assert len(hero_power._line_value_knot_cache) == cached
+
+    def test_context_reaches_tables_built_by_the_analyses(self):
+        cfg = _make_config_with_lines([
+            (i, HeroPowerStatType.DAMAGE, 10.0, HeroPowerTier.EPIC, False)
+            for i in range(1, 7)
+        ])
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0})
+        counted, calls = _counting(calc)
+        analyze_lock_strategy(cfg, HeroPowerLevelConfig(), counted, gs, context=('test',))
+        first = calls['n']
+        calls['n'] = 0
+        analyze_lock_strategy(cfg, HeroPowerLevelConfig(), counted, gs, context=('test',))
+        # Only the per-line current contributions are evaluated again
+        assert calls['n'] <= 2 * len(cfg.lines) + 1 < first
+        calls['n'] = 0
+        rank_all_possible_lines_by_dps(counted, gs, context=('test',))
+        assert calls['n'] == 0
+
+    def test_replaced_line_is_removed_from_baseline(self):
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0})
+        stats = gs()
+        stats['damage_pct'] = 30.0
+        replaced = HeroPowerLine(slot=2, stat_type=HeroPowerStatType.DAMAGE, value=30.0, tier=HeroPowerTier.MYSTIC)
+        table = get_line_value_table(stats, calc, HeroPowerLevelConfig(), replaced_line=replaced)
+        assert table.replaced_slot == 2
+        assert table.baseline_dps == pytest.approx(100.0)
+
+
+# ---------------------------------------------------------------------------
+# analyze_budget_policy — DP lock/reroll policy
+# ---------------------------------------------------------------------------
+
+from game.hero_power import analyze_budget_policy, solve_reroll_policy
+
+
+class TestBudgetPolicy:
+
+    def _weak_config(self, locked_slot=None):
+        return _make_config_with_lines([
+            (i, HeroPowerStatType.DAMAGE, 4.0, HeroPowerTier.COMMON, i == locked_slot)
+            for i in range(1, 7)
+        ])
+
+    def test_zero_budget_locks_everything(self):
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0})
+        result = analyze_budget_policy(self._weak_config(), HeroPowerLevelConfig(), 0, calc, gs)
+        assert result['recommended_locks'] == [1, 2, 3, 4, 5, 6]
+        assert result['expected_gain_pct'] == pytest.approx(0.0, abs=1e-9)
+        assert result['expected_rerolls'] == 0
+
+    def test_respects_user_explicit_locks(self):
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0})
+        for budget in [0, 10_000, 10_000_000]:
+            result = analyze_budget_policy(
+                self._weak_config(locked_slot=3), HeroPowerLevelConfig(), budget, calc, gs,
+            )
+            assert 3 in result['recommended_locks']
+
+    def test_weak_lines_rerolled_and_gain_grows_with_budget(self):
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0})
+        prev_gain = 0.0
+        for budget in [1_000, 10_000, 100_000, 1_000_000]:
+            result = analyze_budget_policy(self._weak_config(), HeroPowerLevelConfig(), budget, calc, gs)
+            assert result['expected_gain_pct'] >= prev_gain - 1e-6
+            prev_gain = result['expected_gain_pct']
+        assert all(la['recommendation'] == 'REROLL' for la in result['line_analysis'])
+        assert prev_gain > 0
+
+    def test_thresholds_relax_as_locks_accumulate(self):
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0})
+        result = analyze_budget_policy(self._weak_config(), HeroPowerLevelConfig(), 100_000, calc, gs)
+        taus = [c['reservation_dps_pct'] for c in result['cascade']]
+        assert all(t is not None for t in taus)
+        assert taus == sorted(taus, reverse=True)
+
+    def test_policy_value_matches_simulation(self):
+        calc, gs = _fake_dps_callbacks({'damage_pct': 1.0, 'boss_damage': 0.5})
+        level = HeroPowerLevelConfig()
+        table = get_line_value_table(gs(), calc, level)
+        budget = 3_000
+        policy = solve_reroll_policy(table, level, budget)
+
+        rng = np.random.default_rng(7)
+        totals = []
+        for _ in range(3000):
+            remaining = budget - level.get_reroll_cost(0)
+            open_slots, banked = 6, 0.0
+            while open_slots:
+                draws = rng.choice(policy.bucket_values, size=open_slots, p=policy.bucket_probs)
+                keep = draws >= policy.lock_threshold(open_slots, remaining)
+                banked += draws[keep].sum()
+                rest = int((~keep).sum())
+                cost = level.get_reroll_cost(6 - rest)
+                if rest == 0 or remaining < cost:
+                    banked += draws[~keep].sum()
+                    break
+                remaining -= cost
+                open_slots = rest
+            totals.append(banked)
+
+        expected = policy.expected_value(6, budget - level.get_reroll_cost(0))
+        stderr = np.std(totals) / np.sqrt(len(totals))
+        assert np.mean(totals) == pytest.approx(expected, abs=4 * stderr + 0.02 * expected)
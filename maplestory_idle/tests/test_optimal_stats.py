@@ -0,0 +1,172 @@
+"""
+Unit tests for optimizers/optimal_stats.py distribution solver
+
+Covers: the concave curve model, the line assignment against brute force on
+small instances, slot/source constraints of the full build, and the full
+solver against a greedy marginal-value reference.
+"""
+import copy
+import itertools
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from optimizers.optimal_stats import (
+    StatSource,
+    _ConcaveCurve,
+    _apply_stat_to_dict,
+    _build_line_classes,
+    calculate_optimal_distribution,
+    fit_local_dps_model,
+    generate_all_sources,
+    solve_line_assignment,
+)
+
+
+def _dps(stats):
+    """Multiplicative DPS stand-in with a shared damage factor and a crit cap."""
+    damage = 1 + (stats.get('damage_percent', 0) + 0.6 * stats.get('boss_damage', 0)) / 100
+    crit_rate = min(1.0, 0.3 + stats.get('crit_rate', 0) / 100)
+    crit = 1 + crit_rate * (0.5 + stats.get('crit_damage', 0) / 100)
+    main = (1000 + stats.get('flat_dex', 0)) * (1 + stats.get('dex_percent', 0) / 100)
+    final = 1 + stats.get('final_damage', 0) / 100
+    defense = 1 - 0.5 * (1 - stats.get('defense_pen', 0) / 100)
+    spread = 1 + (stats.get('min_dmg_mult', 0) + stats.get('max_dmg_mult', 0)) / 200
+    speed = 1 + min(stats.get('attack_speed', 0), 50) / 100
+    return damage * crit * main * final * defense * spread * speed
+
+
+BASE = {'damage_percent': 300, 'boss_damage': 100, 'crit_damage': 150, 'crit_rate': 40,
+        'dex_percent': 80, 'flat_dex': 5000, 'final_damage': 20, 'defense_pen': 30}
+
+
+def _greedy_reference(base_stats, calc_dps_func, tier):
+    """Reference: fill the line whose stat gains the most % DPS per point, one at a time."""
+    sources = generate_all_sources(True)
+    stats = copy.deepcopy(base_stats)
+    for _ in sources:
+        best = None
+        baseline = calc_dps_func(stats)
+        for source in sources:
+            if getattr(source, '_used', False):
+                continue
+            for stat in source.available_stats:
+                value = source.get_max_value(stat, tier)
+                if value <= 0:
+                    continue
+                modified = copy.deepcopy(stats)
+                _apply_stat_to_dict(modified, stat, value)
+                efficiency = (calc_dps_func(modified) / baseline - 1) / value
+                if best is None or efficiency > best[0]:
+                    best = (efficiency, source, stat, value)
+        _, source, stat, value = best
+        source._used = True
+        _apply_stat_to_dict(stats, stat, value)
+    return stats
+
+
+def _model_value(model, lines):
+    amounts, fixed = {}, 0.0
+    for stat, value in lines:
+        factor, amount, gain = model.line_effect(stat, value)
+        if factor is None:
+            fixed += gain
+        else:
+            amounts[factor] = amounts.get(factor, 0) + amount
+    return fixed + sum(curve(amounts.get(f, 0)) - curve(0) for f, curve in model.curves.items())
+
+
+def _source(source_id, options, exclusive=()):
+    return StatSource(
+        source_type="test", source_id=source_id, slot=None, line_num=1,
+        available_stats=list(options), exclusive_stats=list(exclusive),
+        stat_max_values={stat: {'mystic': value} for stat, value in options.items()},
+    )
+
+
+class TestConcaveCurve:
+
+    def test_points_under_the_hull_are_dropped(self):
+        curve = _ConcaveCurve([(0, 0.0), (1, 0.1), (2, 0.5), (4, 0.8)])
+        assert curve.xs == [0, 2, 4]
+        assert curve(1) == pytest.approx(0.25)
+        assert curve.slopes == sorted(curve.slopes, reverse=True)
+
+    def test_slope_is_a_supergradient(self):
+        rng = random.Random(0)
+        curve = _ConcaveCurve([(x, rng.uniform(0, 1)) for x in range(0, 50, 5)])
+        for x in range(0, 46):
+            for y in range(0, 46):
+                assert curve(y) <= curve(x) + curve.slope(x) * (y - x) + 1e-12
+
+
+class TestLineAssignment:
+
+    @pytest.mark.parametrize("seed", range(8))
+    def test_matches_brute_force(self, seed):
+        rng = random.Random(seed)
+        pool = {'damage': 35.0, 'crit_rate': 15.0, 'dex_pct': 15.0, 'attack_speed': 10.0}
+        sources = [_source(f"pool_{i}", pool) for i in range(rng.randint(2, 3))]
+        sources += [
+            _source(f"special_{i}", {**pool, 'final_atk_dmg': 12.0}, ['final_atk_dmg'])
+            for i in range(rng.randint(1, 2))
+        ]
+        hero = {'damage': 40.0, 'crit_damage': rng.choice([10.0, 30.0]), 'def_pen': 20.0}
+        sources += [_source(f"hero_{i}", hero) for i in range(2)]
+        base = {k: v * rng.uniform(0, 2) for k, v in BASE.items()}
+
+        classes = _build_line_classes(sources, 'mystic')
+        model = fit_local_dps_model(base, [], classes, _dps)
+        assignments, proven = solve_line_assignment(classes, model)
+        assert proven
+
+        best = max(
+            _model_value(model, [(stat, s.get_max_value(stat)) for s, stat in zip(sources, choice)])
+            for choice in itertools.product(*(s.available_stats for s in sources))
+        )
+        assert _model_value(model, [(stat, value) for _, stat, value in assignments]) == pytest.approx(best, abs=1e-9)
+
+    def test_empty_classes(self):
+        model = fit_local_dps_model(BASE, [], [], _dps)
+        assert solve_line_assignment([], model) == ([], True)
+
+
+class TestOptimalDistribution:
+
+    def test_every_source_gets_one_available_line(self):
+        build = calculate_optimal_distribution(BASE, _dps, "legendary")
+        sources = {s.source_id: s for s in generate_all_sources(True)}
+        assert sorted(a.source_id for a in build.allocations) == sorted(sources)
+        for alloc in build.allocations:
+            source = sources[alloc.source_id]
+            assert alloc.stat_type in source.available_stats
+            assert alloc.value == source.get_max_value(alloc.stat_type, "legendary")
+            assert alloc.is_exclusive == (alloc.stat_type in source.exclusive_stats)
+
+    def test_gain_is_verified_with_full_calculation(self):
+        build = calculate_optimal_distribution(BASE, _dps, "mystic", include_artifacts=False)
+        assert build.estimated_dps_gain == pytest.approx((_dps(build.total_stats) / _dps(BASE) - 1) * 100)
+        assert not any(a.source_type == "artifact" for a in build.allocations)
+
+    @pytest.mark.parametrize("tier", ["mystic", "unique"])
+    def test_beats_greedy_with_fewer_evaluations(self, tier):
+        calls = []
+
+        def counting(stats):
+            calls.append(1)
+            return _dps(stats)
+
+        build = calculate_optimal_distribution(BASE, counting, tier)
+        greedy = _greedy_reference(BASE, _dps, tier)
+        assert _dps(build.total_stats) >= _dps(greedy)
+        assert len(calls) < 500
+
+    def test_no_dps_returns_empty_build(self):
+        build = calculate_optimal_distribution(BASE, lambda stats: 0.0)
+        assert build.allocations == []
+        assert build.total_stats == BASE
+        assert build.estimated_dps_gain == 0.0
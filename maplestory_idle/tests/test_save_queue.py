@@ -0,0 +1,226 @@
+"""
+Tests for streamlit_app/utils/save_queue.py and queued auto-saves in
+data_manager.
+
+Covers: bursts are coalesced into one write, later values replace earlier
+ones, flush() writes on the calling thread and waits for writes in
+progress, failed writes are retried with backoff and reported once, writes
+of one key never overlap, and queue_user_data_save() queues only sections
+changed since the last queued or explicit save, which explicit saves, loads
+and deletes write first.
+"""
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import streamlit_app.utils.data_manager as data_manager
+import streamlit_app.utils.save_queue as save_queue
+from streamlit_app.utils.data_manager import (
+    queue_user_data_save, flush_user_data, save_user_data, load_user_data, delete_user_data, user_has_data,
+    restore_user_version, user_history,
+)
+from streamlit_app.utils.save_queue import SaveQueue
+from tests.test_aggregate_stats import _random_user
+
+
+class _Recorder:
+    def __init__(self, fail=0, delay=0.0):
+        self.writes = []
+        self.fail = fail
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, key, sections, removed):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if self.fail:
+                self.fail -= 1
+                raise OSError("disk full")
+            self.writes.append((key, dict(sections), set(removed)))
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+class TestSaveQueue:
+
+    def test_burst_is_one_write(self):
+        write = _Recorder()
+        queue = SaveQueue(write, delay=60)
+        for value in range(10):
+            queue.put('alice', {'character': value, f'section{value % 3}': value})
+        assert write.writes == []
+        assert queue.flush()
+        assert write.writes == [('alice', {'character': 9, 'section0': 9, 'section1': 7, 'section2': 8}, set())]
+
+    def test_removal_and_rewrite_coalesce(self):
+        write = _Recorder()
+        queue = SaveQueue(write, delay=60)
+        queue.put('alice', {'a': 1, 'b': 1})
+        queue.put('alice', {}, removed=['a'])
+        queue.put('alice', {'c': 1})
+        queue.put('alice', {}, removed=['c'])
+        assert queue.flush('alice')
+        assert write.writes == [('alice', {'b': 1}, {'a', 'c'})]
+
+    def test_flush_writes_now(self):
+        write = _Recorder()
+        queue = SaveQueue(write, delay=60)
+        queue.put('alice', {'a': 1})
+        queue.put('bob', {'b': 1})
+        assert queue.flush('alice')
+        assert [key for key, _, _ in write.writes] == ['alice']
+        assert queue.pending_keys() == ['bob']
+        assert queue.flush()
+        assert queue.pending_keys() == []
+
+    def test_failed_write_is_retried(self, capsys):
+        write = _Recorder(fail=1)
+        queue = SaveQueue(write, delay=60)
+        queue.put('alice', {'a': 1})
+        assert not queue.flush('alice')
+        assert 'disk full' in capsys.readouterr().out
+        queue.put('alice', {'b': 2})
+        assert queue.flush('alice')
+        assert write.writes == [('alice', {'a': 1, 'b': 2}, set())]
+
+    def test_lasting_failure_backs_off_and_is_reported_once(self, capsys, monkeypatch):
+        # Long delays, so the background writer never retries during the test
+        monkeypatch.setattr(save_queue, 'MAX_RETRY_DELAY', 200.0)
+        write = _Recorder(fail=3)
+        queue = SaveQueue(write, delay=60)
+        queue.put('alice', {'a': 1})
+        for failures, delay in zip(range(1, 4), [60.0, 120.0, 200.0]):
+            before = time.monotonic()
+            assert not queue.flush('alice')
+            after = time.monotonic()
+            pending = queue._pending['alice']
+            assert pending.failures == failures
+            assert before + delay <= pending.retry_at <= after + delay
+            assert pending.due == pending.retry_at
+        # An edit during the backoff does not bring the retry forward
+        queue.put('alice', {'b': 2})
+        assert queue._pending['alice'].due == pending.retry_at
+        assert capsys.readouterr().out.count('disk full') == 1
+        assert queue.flush('alice')
+        assert write.writes == [('alice', {'a': 1, 'b': 2}, set())]
+
+    def test_flush_all_waits_for_writes_in_progress(self):
+        write = _Recorder(delay=0.05)
+        queue = SaveQueue(write, delay=0.0)
+        queue.put('alice', {'a': 1})
+        _wait_for(lambda: write.active)
+        assert queue.flush()
+        assert write.writes == [('alice', {'a': 1}, set())]
+
+    def test_writes_of_one_key_do_not_overlap(self):
+        write = _Recorder(delay=0.05)
+        queue = SaveQueue(write, delay=0.0)
+        queue.put('alice', {'a': 1})
+        _wait_for(lambda: write.active)
+        queue.put('alice', {'a': 2})
+        assert queue.flush('alice')
+        assert write.max_active == 1
+        assert [sections['a'] for _, sections, _ in write.writes] == [1, 2]
+
+
+@pytest.fixture
+def users_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_manager, 'USERS_DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(data_manager._save_queue, 'delay', 60)
+    yield tmp_path
+    data_manager._save_queue.flush()
+    data_manager._queued_digests.clear()
+
+
+@pytest.fixture
+def user(users_dir):
+    data = _random_user(random.Random(21))
+    save_user_data('Tester', data)
+    return data
+
+
+class TestQueuedAutoSave:
+
+    def test_auto_save_does_not_write(self, user):
+        user.equipment_potentials['gloves']['line1_value'] = 42.0
+        queue_user_data_save('Tester', user)
+        assert data_manager._save_queue.pending_keys() == ['tester']
+        stored = data_manager._get_user_store().load('Tester', ['potentials'])['potentials']
+        assert ('equipment_potentials', 'gloves', 42.0) not in [
+            (field, part, value.get('line1_value')) for field, part, value in stored]
+        assert flush_user_data('Tester')
+        assert load_user_data('Tester').equipment_potentials['gloves']['line1_value'] == 42.0
+
+    def test_only_changed_sections_are_queued(self, user):
+        queue_user_data_save('Tester', user)
+        assert data_manager._save_queue.pending_keys() == []
+        user.equipment_potentials['gloves']['line1_value'] = 1.0
+        user.weapons_data['new_weapon'] = {'level': 3}
+        queue_user_data_save('Tester', user)
+        assert sorted(data_manager._save_queue._pending['tester'].sections) == ['potentials:gloves', 'weapons']
+
+    def test_queued_rows_are_snapshots(self, user):
+        user.equipment_potentials['gloves']['line1_value'] = 1.0
+        queue_user_data_save('Tester', user)
+        user.equipment_potentials['gloves']['line1_value'] = 2.0
+        flush_user_data('Tester')
+        assert load_user_data('Tester').equipment_potentials['gloves']['line1_value'] == 1.0
+
+    def test_explicit_save_writes_queued_sections_first(self, user):
+        user.guild_skills['damage'] = 5.0
+        queue_user_data_save('Tester', user)
+        user.guild_skills['damage'] = 6.0
+        save_user_data('Tester', user)
+        assert data_manager._save_queue.pending_keys() == []
+        assert load_user_data('Tester').guild_skills['damage'] == 6.0
+
+    def test_load_sees_queued_edits(self, user):
+        user.character_level = 77
+        queue_user_data_save('Tester', user)
+        assert load_user_data('Tester').character_level == 77
+
+    def test_delete_is_not_undone_by_queued_saves(self, user):
+        user.character_level = 78
+        queue_user_data_save('Tester', user)
+        delete_user_data('Tester')
+        flush_user_data()
+        assert not user_has_data('Tester')
+
+    def test_background_writer_saves_after_the_quiet_period(self, user, monkeypatch):
+        monkeypatch.setattr(data_manager._save_queue, 'delay', 0.02)
+        user.character_level = 79
+        queue_user_data_save('Tester', user)
+        _wait_for(lambda: not data_manager._save_queue.pending_keys())
+        assert data_manager._get_user_store().saved_digests('Tester') == data_manager._store_digests(user)
+
+    def test_restore_resets_what_auto_saves_compare_against(self, user):
+        user.character_level = 80
+        queue_user_data_save('Tester', user)
+        flush_user_data('Tester')
+        level_80 = user_history('Tester')[-1].version
+        user.character_level = 81
+        queue_user_data_save('Tester', user)
+        restore_user_version('Tester', level_80)
+        # Back to what was last queued, but no longer what is stored
+        queue_user_data_save('Tester', user)
+        flush_user_data('Tester')
+        assert load_user_data('Tester').character_level == 81
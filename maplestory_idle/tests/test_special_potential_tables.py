@@ -0,0 +1,165 @@
+"""
+Tests for engine/special_potential_tables.py
+
+Covers: tables round-trip through the .npz file, lookups reproduce the
+simulation at grid points and interpolate between them, the special
+potential helpers read the tables without simulating and fall back to the
+simulation outside them or without a tables file, the committed tables
+cover every table on DEFAULT_GRID, and stat aggregation runs no simulation.
+"""
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import engine.dps_calculator as dps_calculator
+import engine.special_potential_tables as tables
+from engine.special_potential_tables import (
+    ConversionTable, build_tables, save_tables, read_tables, load_special_potential_tables,
+    lookup_special_potential, simulate_skill_cd_dps_value, simulate_all_skills_dps_value,
+    SIM_ATTACK, TABLE_AXES, DEFAULT_GRID, TABULATED_JOBS, SPECIAL_POTENTIAL_TABLES_PATH,
+)
+from game.job_classes import JobClass
+from tests.test_aggregate_stats import _random_user
+
+SMALL_GRID = {
+    'all_skills': ((99, 100), (0, 10), (200, 300)),
+    'ba_percent': ((99, 100), (0, 10), (0, 3)),
+    'skill_cd': ((99, 100), (0, 10), (0.0, 1.0, 2.0)),
+    'buff_duration': ((99, 100), (0, 10), (0, 20)),
+}
+
+HELPERS = (
+    dps_calculator.get_all_skills_dps_value,
+    dps_calculator.calculate_ba_percent_of_dps,
+    dps_calculator.calculate_skill_cd_dps_value,
+    dps_calculator.calculate_buff_duration_dps_value,
+)
+
+
+def _clear_helper_caches():
+    for helper in HELPERS:
+        helper.cache_clear()
+
+
+class _NoSimulation:
+    def __init__(self, *args, **kwargs):
+        raise AssertionError("simulation ran")
+
+
+@pytest.fixture(scope='module')
+def small_tables():
+    return build_tables(grids=SMALL_GRID)
+
+
+@pytest.fixture
+def installed_tables(small_tables, tmp_path):
+    path = tmp_path / 'tables.npz'
+    save_tables(small_tables, path)
+    load_special_potential_tables(path)
+    _clear_helper_caches()
+    yield small_tables
+    load_special_potential_tables()
+    _clear_helper_caches()
+
+
+class TestConversionTable:
+
+    def test_interpolates_between_grid_points(self):
+        table = ConversionTable((np.array([0.0, 1.0]), np.array([0.0, 2.0])),
+                                np.array([[0.0, 2.0], [10.0, 12.0]]))
+        assert table.lookup(0.0, 2.0) == 2.0
+        assert table.lookup(0.5, 1.0) == pytest.approx(6.0)
+        assert table.lookup(0.25, 0.5) == pytest.approx(3.0)
+
+    def test_outside_the_grid_is_none(self):
+        table = ConversionTable((np.array([0.0, 1.0]),), np.array([0.0, 1.0]))
+        assert table.lookup(1.5) is None
+        assert table.lookup(-0.1) is None
+
+    def test_file_round_trip(self, small_tables, tmp_path):
+        path = tmp_path / 'tables.npz'
+        save_tables(small_tables, path)
+        loaded = read_tables(path)
+        assert set(loaded) == set(small_tables) == {('bowmaster', name) for name in TABLE_AXES}
+        for key, table in small_tables.items():
+            np.testing.assert_array_equal(loaded[key].values, table.values)
+            for axis, expected in zip(loaded[key].axes, table.axes):
+                np.testing.assert_array_equal(axis, expected)
+
+    def test_missing_file_has_no_tables(self, tmp_path):
+        assert read_tables(tmp_path / 'missing.npz') == {}
+
+
+class TestLookups:
+
+    def test_grid_points_match_the_simulation(self, installed_tables):
+        assert lookup_special_potential('skill_cd', 100, 10, 1.0) == simulate_skill_cd_dps_value(100, 10, 1.0)
+        assert lookup_special_potential('all_skills', 99, 0, 300) == pytest.approx(
+            simulate_all_skills_dps_value(99, 0, SIM_ATTACK, 300), rel=1e-12)
+
+    def test_untabulated_job_is_none(self, installed_tables):
+        assert lookup_special_potential('skill_cd', 100, 10, 1.0, job_class=JobClass.NIGHT_LORD) is None
+
+    def test_helpers_read_the_tables_without_simulating(self, installed_tables, monkeypatch):
+        monkeypatch.setattr(tables, 'DPSCalculator', _NoSimulation)
+        monkeypatch.setattr(tables, 'calculate_all_skills_value', _NoSimulation)
+        expected = installed_tables[('bowmaster', 'skill_cd')].lookup(100, 5, 1.5)
+        assert dps_calculator.calculate_skill_cd_dps_value(100, 5, 1.5) == expected
+        dps_calculator.get_all_skills_dps_value(100, 10, 12345, 250)
+        dps_calculator.calculate_ba_percent_of_dps(99, 0, 1, 1, ba_target_bonus=3)
+        dps_calculator.calculate_buff_duration_dps_value(100, 10, 12.0)
+
+    def test_helpers_simulate_outside_the_tables(self, installed_tables):
+        assert dps_calculator.calculate_skill_cd_dps_value(150, 10, 1.0) == simulate_skill_cd_dps_value(150, 10, 1.0)
+
+    def test_helpers_simulate_without_a_tables_file(self, tmp_path):
+        load_special_potential_tables(tmp_path / 'missing.npz')
+        _clear_helper_caches()
+        try:
+            assert dps_calculator.calculate_skill_cd_dps_value(100, 10, 1.0) == simulate_skill_cd_dps_value(100, 10, 1.0)
+            assert dps_calculator.get_all_skills_dps_value(100, 10, SIM_ATTACK, 200) == \
+                simulate_all_skills_dps_value(100, 10, SIM_ATTACK, 200)
+        finally:
+            load_special_potential_tables()
+            _clear_helper_caches()
+
+    def test_ba_share_is_only_tabulated_for_the_standard_fight(self, installed_tables):
+        tabulated = dps_calculator.calculate_ba_percent_of_dps(100, 10, SIM_ATTACK, 200)
+        single_target = dps_calculator.calculate_ba_percent_of_dps(100, 10, SIM_ATTACK, 200, num_enemies=1)
+        assert tabulated == installed_tables[('bowmaster', 'ba_percent')].lookup(100, 10, 0)
+        assert single_target == tables.simulate_ba_percent_of_dps(100, 10, SIM_ATTACK, 200, num_enemies=1)
+
+
+class TestCommittedTables:
+    """engine/data/special_potential_tables.npz is generated by `python -m engine.special_potential_tables`."""
+
+    def test_covers_every_table_for_every_tabulated_job(self):
+        committed = read_tables(SPECIAL_POTENTIAL_TABLES_PATH)
+        assert set(committed) == {(job.value, name) for job in TABULATED_JOBS for name in TABLE_AXES}
+
+    def test_sampled_on_the_default_grid(self):
+        # Fails when DEFAULT_GRID changes without regenerating the file
+        for (job, name), table in read_tables(SPECIAL_POTENTIAL_TABLES_PATH).items():
+            assert len(table.axes) == len(TABLE_AXES[name])
+            for axis, expected in zip(table.axes, DEFAULT_GRID[name]):
+                np.testing.assert_array_equal(axis, np.asarray(expected, dtype=float))
+            assert table.values.shape == tuple(len(axis) for axis in table.axes)
+
+    def test_grid_points_match_the_simulation(self):
+        committed = read_tables(SPECIAL_POTENTIAL_TABLES_PATH)
+        assert committed[('bowmaster', 'skill_cd')].lookup(100, 10, 1.0) == simulate_skill_cd_dps_value(100, 10, 1.0)
+        assert committed[('bowmaster', 'buff_duration')].lookup(120, 20, 15) == pytest.approx(
+            tables.simulate_buff_duration_dps_value(120, 20, 15), rel=1e-12)
+
+
+def test_aggregation_runs_no_simulation(monkeypatch):
+    monkeypatch.setattr(tables, 'DPSCalculator', _NoSimulation)
+    monkeypatch.setattr(tables, 'calculate_all_skills_value', _NoSimulation)
+    monkeypatch.setattr('game.skills.DPSCalculator', _NoSimulation)
+    dps_calculator.get_cache_backend().clear()
+    dps_calculator.aggregate_stats(_random_user(random.Random(11)))
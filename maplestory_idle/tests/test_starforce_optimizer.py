@@ -0,0 +1,172 @@
+"""
+Unit tests for optimizers/starforce_optimizer.py
+
+Covers: direct Markov chain solve, memoisation per strategy vector, restart
+costs, policy-iteration protection strategies against brute force, and the
+phase-type / Monte Carlo cost distributions.
+"""
+import itertools
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from game.equipment import STARFORCE_TABLE
+from optimizers.starforce_optimizer import (
+    DESTRUCTION_FEE_DIAMONDS,
+    PROTECTION_STRATEGIES,
+    NO_DESTROY_PROT_STAGES,
+    _solve_chain,
+    build_optimal_strategy_table,
+    calculate_cost_distribution,
+    calculate_diamond_cost,
+    calculate_total_cost_markov,
+    calculate_total_cost_per_stage,
+    find_optimal_per_stage_strategy,
+    find_optimal_strategy,
+    optimal_rebuild_cost,
+    solve_markov_chain,
+    simulate_cost_distribution,
+    solve_optimal_protection_policy,
+)
+
+
+class TestMarkovChainSolve:
+
+    def test_no_decrease_stage_is_geometric(self):
+        # ★12 has no decrease/destroy: E[cost] = cost / p, always succeeds
+        data = STARFORCE_TABLE[12]
+        C, P_s = solve_markov_chain(12, 13)
+        assert C[12] == pytest.approx(calculate_diamond_cost(data.meso, data.stones) / data.success_rate)
+        assert P_s[12] == pytest.approx(1.0)
+        assert C[13] == 0.0 and P_s[13] == 1.0
+
+    def test_uniform_totals_match_reference(self):
+        # Reference values from the iterative (Gauss-Seidel) solver
+        expected = {
+            'none': 177055573.261615,
+            'decrease': 56615420.014662735,
+            'destroy': 128532781.34731671,
+            'both': 44928809.708577715,
+        }
+        for name, (use_dec, use_dest) in PROTECTION_STRATEGIES.items():
+            result = calculate_total_cost_markov(12, 25, use_dec, use_dest)
+            assert result.total_cost == pytest.approx(expected[name], rel=1e-9)
+
+    def test_destruction_probability_only_above_20(self):
+        assert calculate_total_cost_markov(12, 20).destroy_probability == pytest.approx(0.0, abs=1e-12)
+        assert calculate_total_cost_markov(20, 21).destroy_probability > 0
+
+    def test_solutions_are_memoised(self):
+        strategy = tuple((True, True) for _ in range(15, 22))
+        _solve_chain(15, 22, strategy)
+        hits = _solve_chain.cache_info().hits
+        C, _ = _solve_chain(15, 22, strategy)
+        assert _solve_chain.cache_info().hits == hits + 1
+        assert not C.flags.writeable
+
+    def test_restart_chain_matches_renewal_formula(self):
+        # With restarts folded into the chain (destruction -> fee + rebuild
+        # from ★12), the solved cost equals the renewal formula
+        # (enhance + P_destroy * (fee + rebuild)) / P_success.
+        no_protection = tuple((False, False) for _ in range(12, 23))
+        V, _ = _solve_chain(20, 23, no_protection, True)
+        rebuild = calculate_total_cost_markov(12, 20).total_cost
+        result = calculate_total_cost_markov(20, 23, rebuild_cost=rebuild)
+        assert V[(20 - 12) * 3] == pytest.approx(result.total_cost, rel=1e-9)
+
+
+class TestOptimalProtectionPolicy:
+
+    @staticmethod
+    def _options(stage):
+        data = STARFORCE_TABLE[stage]
+        options = [(False, False)]
+        if data.decrease_rate > 0:
+            options.append((True, False))
+        if data.destroy_rate > 0 and stage not in NO_DESTROY_PROT_STAGES:
+            options.append((False, True))
+            if data.decrease_rate > 0:
+                options.append((True, True))
+        return options
+
+    def test_policy_iteration_matches_brute_force(self):
+        stages = list(range(12, 23))
+        best = float('inf')
+        for combo in itertools.product(*(self._options(s) for s in stages)):
+            result = calculate_total_cost_per_stage(12, 23, dict(zip(stages, combo)))
+            best = min(best, result.total_cost)
+        _, total_cost = solve_optimal_protection_policy(12, 23)
+        assert total_cost == pytest.approx(best, rel=1e-9)
+
+    def test_per_stage_never_worse_than_uniform(self):
+        for start, target in [(10, 18), (12, 22), (16, 21), (18, 25)]:
+            _, per_stage = find_optimal_per_stage_strategy(start, target)
+            _, uniform, _ = find_optimal_strategy(start, target)
+            assert per_stage.total_cost <= uniform.total_cost * (1 + 1e-9)
+
+    def test_per_stage_result_includes_rebuild(self):
+        names, result = find_optimal_per_stage_strategy(21, 23)
+        _, total_cost = solve_optimal_protection_policy(21, 23)
+        assert set(names) == {21, 22}
+        assert result.total_cost == pytest.approx(total_cost, rel=1e-9)
+        assert optimal_rebuild_cost(21) > DESTRUCTION_FEE_DIAMONDS
+
+    def test_returned_policy_is_a_copy(self):
+        names, _ = solve_optimal_protection_policy(12, 20)
+        names[12] = 'bogus'
+        assert solve_optimal_protection_policy(12, 20)[0][12] != 'bogus'
+
+    def test_strategy_table_consistent_with_on_request_solve(self):
+        strategies, C_to, P_to = build_optimal_strategy_table()
+        for target in (15, 20, 25):
+            assert C_to[target] == pytest.approx(solve_optimal_protection_policy(12, target)[1])
+        assert set(strategies) == set(range(12, 25))
+        assert P_to[20] == pytest.approx(1.0)
+        assert 0 < P_to[25] < 1
+
+
+class TestCostDistribution:
+
+    def test_geometric_attempts_on_safe_stage(self):
+        dist = calculate_cost_distribution(12, 13)
+        p = STARFORCE_TABLE[12].success_rate
+        assert dist.attempts_quantum == 1.0
+        assert dist.attempts_pmf[1] == pytest.approx(p)
+        assert dist.attempts_pmf[2] == pytest.approx((1 - p) * p)
+        assert dist.destroy_probability == 0.0
+
+    def test_moments_match_markov(self):
+        for start, target in [(12, 17), (17, 22), (21, 23)]:
+            names, result = find_optimal_per_stage_strategy(start, target)
+            dist = calculate_cost_distribution(start, target, names)
+            lattice = np.arange(len(dist.cost_pmf)) * dist.cost_quantum
+            assert dist.cost_pmf.sum() == pytest.approx(1.0, abs=1e-5)
+            assert dist.expected_cost == pytest.approx(result.total_cost, rel=1e-9)
+            assert lattice @ dist.cost_pmf == pytest.approx(result.total_cost, rel=1e-3)
+            assert dist.destroy_probability == pytest.approx(result.destroy_probability)
+
+    def test_percentiles_and_budget_probability_are_consistent(self):
+        dist = calculate_cost_distribution(18, 22)
+        p50, p90, p99 = (dist.cost_percentile(q) for q in (50, 90, 99))
+        assert p50 < dist.expected_cost < p99
+        assert p50 < p90 < p99
+        assert dist.probability_within(p90) >= 0.9
+        assert dist.probability_within(0) == 0.0
+        assert dist.probability_within(1e12) == pytest.approx(1.0, abs=1e-5)
+
+    def test_monte_carlo_agrees_with_phase_type(self):
+        dist = calculate_cost_distribution(17, 22)
+        sim = simulate_cost_distribution(17, 22, runs=50_000, seed=3)
+        assert sim.expected_cost == pytest.approx(dist.expected_cost, rel=0.03)
+        assert sim.cost_percentile(90) == pytest.approx(dist.cost_percentile(90), rel=0.03)
+        assert sim.destroy_probability == pytest.approx(dist.destroy_probability, abs=0.01)
+        assert sim.attempts.mean() == pytest.approx(dist.expected_attempts, rel=0.03)
+
+    def test_monte_carlo_is_seeded(self):
+        a = simulate_cost_distribution(15, 19, runs=1_000, seed=11)
+        b = simulate_cost_distribution(15, 19, runs=1_000, seed=11)
+        assert np.array_equal(a.diamonds, b.diamonds)
@@ -0,0 +1,215 @@
+"""
+Tests for core/stat_vector.py
+
+Covers: the dict round trip, calculate_dps on a StatVector equals the dict
+result, with_delta / with_source / with_values leave the original untouched
+and match the equivalent dict mutation, the NumPy views are read-only and
+laid out by StatIndex, StatDelta replays a change onto another build, and
+the hero power / optimal stats helpers that derive candidates from a vector.
+"""
+import copy
+import pickle
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.stat_vector import StatDelta, StatVector, StatIndex, SCALAR_STAT_KEYS, SOURCE_LIST_KEYS
+from engine.dps_calculator import aggregate_stats, calculate_dps, EvaluationContext
+from game.job_classes import JobClass
+from game.hero_power import (
+    HeroPowerLine, HeroPowerStatType, HeroPowerTier,
+    _remove_line_from_stats, _stats_fingerprint, calculate_hypothetical_line_dps_value,
+)
+from optimizers.optimal_stats import _apply_stat_to_dict, _with_stat
+from tests.test_aggregate_stats import _random_user
+
+
+@pytest.fixture(scope='module')
+def stats():
+    return aggregate_stats(_random_user(random.Random(7)))
+
+
+def _calculate(stats, mode='stage'):
+    return calculate_dps(stats, mode, job_class=JobClass.BOWMASTER)
+
+
+def _dps(stats, mode='stage'):
+    return _calculate(stats, mode)['total']
+
+
+class TestConversion:
+
+    def test_round_trip(self, stats):
+        vector = StatVector.from_dict(stats)
+        assert vector == stats
+        assert vector.to_dict() == stats
+        assert list(vector) == list(stats)
+        assert len(vector) == len(stats)
+
+    def test_from_dict_of_a_vector_is_the_vector(self, stats):
+        vector = StatVector.from_dict(stats)
+        assert StatVector.from_dict(vector) is vector
+
+    def test_to_dict_is_independent(self, stats):
+        vector = StatVector.from_dict(stats)
+        result = vector.to_dict()
+        result['def_pen_sources'].append(('tampered', 0.5, 1))
+        result['crit_rate'] = -1
+        assert vector == stats
+
+    def test_pickle(self, stats):
+        vector = StatVector.from_dict(stats).with_delta('crit_damage', 5.0)
+        assert pickle.loads(pickle.dumps(vector)) == vector
+
+    @pytest.mark.parametrize("mode", ['stage', 'boss', 'chapter_hunt'])
+    def test_calculate_dps_matches_the_dict(self, stats, mode):
+        assert _calculate(StatVector.from_dict(stats), mode) == _calculate(stats, mode)
+
+
+class TestDerivedVectors:
+
+    def test_with_delta_matches_dict_mutation(self, stats):
+        vector = StatVector.from_dict(stats)
+        expected = copy.deepcopy(stats)
+        expected['crit_damage'] = expected.get('crit_damage', 0) + 12.5
+        derived = vector.with_delta('crit_damage', 12.5)
+        assert derived == expected
+        assert vector == stats
+        assert _dps(derived) == _dps(expected)
+
+    def test_with_delta_on_a_missing_stat(self, stats):
+        derived = StatVector.from_dict(stats).with_delta('flat_dex', 100)
+        assert derived['flat_dex'] == 100
+        assert list(derived)[-1] == 'flat_dex'
+
+    def test_with_source_matches_dict_append(self, stats):
+        vector = StatVector.from_dict(stats)
+        expected = copy.deepcopy(stats)
+        expected['def_pen_sources'].append(('extra', 0.1, 50))
+        derived = vector.with_source('def_pen_sources', ('extra', 0.1, 50))
+        assert derived == expected
+        assert vector['def_pen_sources'] == stats['def_pen_sources']
+        assert _dps(derived) == _dps(expected)
+
+    def test_with_source_rejects_scalar_keys(self, stats):
+        with pytest.raises(KeyError):
+            StatVector.from_dict(stats).with_source('crit_rate', 1.0)
+
+    def test_with_delta_rejects_source_lists(self, stats):
+        with pytest.raises(ValueError):
+            StatVector.from_dict(stats).with_delta('def_pen_sources', 0.1)
+
+    def test_changed_keys(self, stats):
+        vector = StatVector.from_dict(stats)
+        derived = (vector.with_deltas({'crit_damage': 5.0, 'damage_pct': 0.0, 'new_stat': 1.0})
+                   .with_source('def_pen_sources', ('extra', 0.1, 50)))
+        assert derived.changed_keys(vector) == {'crit_damage', 'new_stat', 'def_pen_sources'}
+        assert vector.changed_keys(derived) == derived.changed_keys(vector)
+        assert vector.changed_keys(vector) == frozenset()
+        assert StatVector.from_dict(stats).changed_keys(vector) == frozenset()
+
+    def test_with_values_replaces_a_source_list(self, stats):
+        derived = StatVector.from_dict(stats).with_values({'final_damage_sources': [0.1, 0.2]})
+        assert derived['final_damage_sources'] == [0.1, 0.2]
+        assert derived.source_values('final_damage_sources').tolist() == [0.1, 0.2]
+
+
+class TestStatDelta:
+
+    def _candidate(self, vector):
+        # A potential swap: lose the first def pen entry, gain crit damage and a new one
+        removed = vector['def_pen_sources'][0]
+        return (vector.with_values({'def_pen_sources': vector['def_pen_sources'][1:]})
+                .with_delta('crit_damage', 12.0)
+                .with_source('def_pen_sources', ('hat_pot', 0.1, 50))), removed
+
+    def test_apply_rebuilds_the_candidate(self, stats):
+        vector = StatVector.from_dict(stats)
+        candidate, removed = self._candidate(vector)
+        delta = StatDelta.between(candidate, stats)
+        assert dict(delta.scalars) == {'crit_damage': 12.0}
+        assert dict(delta.removed) == {'def_pen_sources': (removed,)}
+        assert dict(delta.added) == {'def_pen_sources': (('hat_pot', 0.1, 50),)}
+        assert _dps(delta.apply(stats)) == _dps(candidate)
+
+    def test_apply_onto_a_moved_baseline(self, stats):
+        vector = StatVector.from_dict(stats)
+        candidate, _ = self._candidate(vector)
+        moved = vector.with_deltas({'dex_pct': 9.0, 'crit_damage': 3.0}).with_source('final_damage_sources', 0.05)
+        expected, _ = self._candidate(moved)
+        assert StatDelta.between(candidate, vector).apply(moved) == expected
+
+    def test_missing_source_entry_raises(self, stats):
+        vector = StatVector.from_dict(stats)
+        candidate, _ = self._candidate(vector)
+        delta = StatDelta.between(candidate, vector)
+        with pytest.raises(ValueError):
+            delta.apply(vector.with_values({'def_pen_sources': []}))
+
+    def test_non_numeric_change_has_no_delta(self, stats):
+        vector = StatVector.from_dict(stats)
+        assert StatDelta.between(vector.with_values({'main_stat_type': 'other'}), vector) is None
+        assert StatDelta.between(vector, stats) == StatDelta((), (), ())
+
+
+class TestViews:
+
+    def test_scalars_are_laid_out_by_stat_index(self, stats):
+        vector = StatVector.from_dict(stats)
+        assert len(vector.scalars) == len(SCALAR_STAT_KEYS) == len(StatIndex)
+        assert vector.scalars[StatIndex.CRIT_RATE] == stats['crit_rate']
+
+    def test_views_are_read_only(self, stats):
+        vector = StatVector.from_dict(stats)
+        with pytest.raises(ValueError):
+            vector.scalars[StatIndex.CRIT_RATE] = 0
+        with pytest.raises(ValueError):
+            vector.source_values('def_pen_sources')[0] = 0
+
+    def test_source_values_follow_the_entries(self, stats):
+        vector = StatVector.from_dict(stats)
+        for key in SOURCE_LIST_KEYS:
+            entries = stats.get(key, [])
+            expected = [e if isinstance(e, float) else e[1] for e in entries]
+            np.testing.assert_array_equal(vector.source_values(key), expected)
+
+
+class TestOptimizerHelpers:
+
+    @pytest.mark.parametrize("stat_type", [HeroPowerStatType.DEF_PEN, HeroPowerStatType.BOSS_DAMAGE,
+                                           HeroPowerStatType.MAIN_STAT_FLAT, HeroPowerStatType.ATTACK_SPEED])
+    def test_hypothetical_line_accepts_dict_or_vector(self, stats, stat_type):
+        line = HeroPowerLine(slot=1, stat_type=stat_type, value=10.0, tier=HeroPowerTier.MYSTIC)
+        base = _dps(stats)
+        from_dict = calculate_hypothetical_line_dps_value(line, stats, base, _dps)
+        from_vector = calculate_hypothetical_line_dps_value(line, StatVector.from_dict(stats), base, _dps)
+        assert from_dict == from_vector
+
+    def test_remove_line_returns_a_vector(self, stats):
+        line = HeroPowerLine(slot=1, stat_type=HeroPowerStatType.BOSS_DAMAGE, value=10.0,
+                             tier=HeroPowerTier.MYSTIC)
+        removed = _remove_line_from_stats(stats, line)
+        assert isinstance(removed, StatVector)
+        assert removed['boss_damage'] == stats.get('boss_damage', 0) - 10.0
+
+    def test_fingerprint_is_the_same_for_dict_and_vector(self, stats):
+        assert _stats_fingerprint(StatVector.from_dict(stats)) == _stats_fingerprint(stats)
+
+    @pytest.mark.parametrize("stat_type", ['def_pen', 'final_damage', 'crit_damage', 'dex_flat'])
+    def test_with_stat_mirrors_apply_stat_to_dict(self, stats, stat_type):
+        expected = copy.deepcopy(stats)
+        _apply_stat_to_dict(expected, stat_type, 15.0)
+        assert _with_stat(StatVector.from_dict(stats), stat_type, 15.0) == expected
+
+    def test_context_vector_is_served_from_the_baseline(self, stats):
+        ctx = EvaluationContext(stats, 'stage', _calculate)
+        baseline = ctx.calculate_dps(ctx.get_stat_vector())
+        assert ctx.get_stat_vector() is ctx.get_stat_vector()
+        assert ctx.calculate_dps(ctx.get_stat_vector()) == baseline
+        assert ctx.total_evaluations == 1
+        assert ctx.get_stats() == stats
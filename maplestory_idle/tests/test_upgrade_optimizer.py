@@ -0,0 +1,698 @@
+"""
+Unit tests for optimizers/upgrade_optimizer.py
+
+Covers: batched real-DPS starforce gains, the cross-item starforce budget
+planner (costs, budget, spend distribution), the optimizer's starforce
+options built on them, the re-evaluating greedy upgrade path, the
+concurrent analyser runner (on threads, or on worker processes for
+CPU-bound tasks; with per-analyser evaluation attribution) and the
+incremental re-analysis driven by stat-source fingerprints (re-ranking
+units whose only change is the baseline).
+"""
+import functools
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from game.equipment import EquipmentItem, get_amplify_multiplier
+from streamlit_app.utils.data_manager import UserData, slot_source, source_fingerprints
+from engine.dps_calculator import EvaluationContext
+from optimizers.starforce_optimizer import (
+    calculate_cost_distribution,
+    find_optimal_per_stage_strategy,
+)
+from optimizers.upgrade_optimizer import (
+    AnalysisUnit,
+    IncrementalAnalysis,
+    StarforcePlan,
+    UpgradeOptimizer,
+    UpgradeOption,
+    UpgradeType,
+    create_analysis_pool,
+    evaluate_starforce_dps_gains,
+    plan_starforce_budget,
+    run_analyses,
+)
+
+
+SUB_STATS = {'hat': 20.0, 'gloves': 40.0, 'ring': 0.0}
+
+
+def _make_stats_for_stars(current_stars):
+    """Damage % = sum of each slot's sub stat amplified at its stars."""
+    def stats_for_stars(overrides):
+        stars = {**current_stars, **overrides}
+        damage = sum(
+            SUB_STATS.get(slot, 0.0) * get_amplify_multiplier(s, is_sub=True)
+            for slot, s in stars.items()
+        )
+        return {'damage_percent': damage}
+    return stats_for_stars
+
+
+def _make_gain_func(stats_for_stars, calls=None):
+    base = 100 + stats_for_stars({})['damage_percent']
+
+    def gain(stats):
+        if calls is not None:
+            calls.append(stats)
+        return ((100 + stats['damage_percent']) / base - 1) * 100
+    return gain
+
+
+class TestEvaluateStarforceGains:
+
+    def test_gains_cover_every_reachable_star(self):
+        current = {'hat': 15, 'gloves': 20, 'ring': 18}
+        stats_fn = _make_stats_for_stars(current)
+        gains = evaluate_starforce_dps_gains(current, stats_fn, _make_gain_func(stats_fn))
+        assert set(gains['hat']) == set(range(16, 26))
+        assert set(gains['gloves']) == set(range(21, 26))
+        # More stars never lower amplified stats
+        for slot in ('hat', 'gloves'):
+            values = [gains[slot][t] for t in sorted(gains[slot])]
+            assert values == sorted(values)
+            assert values[-1] > 0
+
+    def test_skips_slots_outside_starforce_range(self):
+        current = {'hat': 10, 'gloves': 25, 'ring': 12}
+        stats_fn = _make_stats_for_stars(current)
+        gains = evaluate_starforce_dps_gains(current, stats_fn, _make_gain_func(stats_fn))
+        assert set(gains) == {'ring'}
+
+    def test_identical_stats_evaluated_once(self):
+        # The ring has no sub stats: all its overrides give baseline stats
+        current = {'ring': 12}
+        stats_fn = _make_stats_for_stars(current)
+        calls = []
+        gains = evaluate_starforce_dps_gains(current, stats_fn, _make_gain_func(stats_fn, calls))
+        assert len(gains['ring']) == 13
+        assert len(calls) == 1
+        assert all(g == pytest.approx(0.0) for g in gains['ring'].values())
+
+    def test_identical_aggregated_stats_evaluated_once(self):
+        # Real aggregated stats hold source lists and companion dataclasses
+        current = {'ring': 12}
+        calls = []
+
+        def stats_fn(overrides):
+            return {
+                'damage_percent': 0.0,
+                'attack_speed_sources': [('ring', 5.0)],
+                'def_pen_sources': [('belt_pot', 0.1, 100)],
+                '_main_companion_player_bonuses': {'crit_rate': 1.0},
+            }
+        evaluate_starforce_dps_gains(current, stats_fn, lambda stats: calls.append(stats) or 0.0)
+        assert len(calls) == 1
+
+    def test_max_stars_ahead(self):
+        current = {'hat': 15, 'gloves': 24}
+        stats_fn = _make_stats_for_stars(current)
+        gains = evaluate_starforce_dps_gains(
+            current, stats_fn, _make_gain_func(stats_fn), max_stars_ahead=1,
+        )
+        assert set(gains['hat']) == {16}
+        assert set(gains['gloves']) == {25}
+
+
+class TestStarforceBudgetPlan:
+
+    @pytest.fixture
+    def setup(self):
+        current = {'hat': 15, 'gloves': 17, 'ring': 16}
+        stats_fn = _make_stats_for_stars(current)
+        gains = evaluate_starforce_dps_gains(current, stats_fn, _make_gain_func(stats_fn))
+        return current, gains
+
+    def test_expected_cost_within_budget(self, setup):
+        current, gains = setup
+        for budget in (0, 50_000, 500_000, 5_000_000):
+            plan = plan_starforce_budget(current, gains, budget)
+            assert isinstance(plan, StarforcePlan)
+            assert plan.expected_cost <= budget + 1e-6
+
+    def test_steps_chain_per_slot_at_markov_cost(self, setup):
+        current, gains = setup
+        plan = plan_starforce_budget(current, gains, 3_000_000)
+        assert plan.steps
+        stars = dict(current)
+        for step in plan.steps:
+            assert step.start_stars == stars[step.slot]
+            # Segment price is the restart-chain cost (rebuild after destruction included)
+            _, result = find_optimal_per_stage_strategy(step.start_stars, step.target_stars)
+            assert step.expected_cost == pytest.approx(result.total_cost)
+            assert step.dps_gain_pct > 0
+            stars[step.slot] = step.target_stars
+        assert stars == plan.final_stars
+        assert plan.dps_gain_pct == pytest.approx(sum(s.dps_gain_pct for s in plan.steps))
+
+    def test_no_gain_slot_never_planned(self, setup):
+        current, gains = setup
+        plan = plan_starforce_budget(current, gains, 10_000_000)
+        assert 'ring' not in {step.slot for step in plan.steps}
+
+    def test_first_step_is_most_efficient_affordable_segment(self, setup):
+        current, gains = setup
+        budget = 2_000_000
+        plan = plan_starforce_budget(current, gains, budget)
+        best = 0.0
+        for slot, start in current.items():
+            for target, gain in gains[slot].items():
+                cost = find_optimal_per_stage_strategy(start, target)[1].total_cost
+                if cost <= budget and gain > 0:
+                    best = max(best, gain / cost * 1000)
+        assert plan.steps[0].efficiency == pytest.approx(best)
+
+    def test_empty_budget(self, setup):
+        current, gains = setup
+        plan = plan_starforce_budget(current, gains, 0)
+        assert plan.steps == []
+        assert plan.final_stars == current
+        assert plan.probability_within() == pytest.approx(1.0)
+
+    def test_spend_distribution_mean_matches_expected_cost(self, setup):
+        current, gains = setup
+        plan = plan_starforce_budget(current, gains, 3_000_000)
+        mean = float(np.arange(len(plan.cost_pmf)) @ plan.cost_pmf) * plan.cost_quantum
+        assert plan.cost_pmf.sum() == pytest.approx(1.0, abs=1e-4)
+        assert mean == pytest.approx(plan.expected_cost, rel=0.01)
+        assert plan.probability_within(0) < plan.probability_within() <= 1.0
+        assert plan.cost_percentile(50) <= plan.cost_percentile(90)
+
+    def test_single_step_matches_segment_distribution(self):
+        current = {'gloves': 17}
+        gains = {'gloves': {18: 1.0}}
+        plan = plan_starforce_budget(current, gains, 1e9)
+        assert len(plan.steps) == 1
+        step = plan.steps[0]
+        dist = calculate_cost_distribution(17, 18, step.stage_strategies, resolution=200)
+        for pct in (50, 90):
+            assert plan.cost_percentile(pct) == pytest.approx(
+                dist.cost_percentile(pct), abs=2 * plan.cost_quantum,
+            )
+
+
+class TestOptimizerStarforceOptions:
+
+    def _optimizer(self, items, **kwargs):
+        stats_fn = _make_stats_for_stars({})
+
+        def get_stats():
+            return stats_fn({slot: item.stars for slot, item in items.items()})
+
+        def calc_dps(stats):
+            return 100 + stats['damage_percent']
+
+        return UpgradeOptimizer(
+            calc_dps_func=calc_dps,
+            get_stats_func=get_stats,
+            equipment_state={},
+            equipment_items=items,
+            hero_power_config=None,
+            current_dps=calc_dps(get_stats()),
+            **kwargs,
+        )
+
+    def test_next_star_options_use_real_dps_delta(self):
+        items = {
+            'hat': EquipmentItem(slot='hat', stars=15),
+            'gloves': EquipmentItem(slot='gloves', stars=20),
+        }
+        optimizer = self._optimizer(items)
+        optimizer._analyze_starforce_upgrades()
+        options = {o.details['slot']: o for o in optimizer.upgrade_options}
+        assert set(options) == {'hat', 'gloves'}
+        for slot, option in options.items():
+            assert option.upgrade_type == UpgradeType.STARFORCE
+            stars = items[slot].stars
+            before = 100 + sum(
+                SUB_STATS[s] * get_amplify_multiplier(i.stars, is_sub=True) for s, i in items.items()
+            )
+            delta = SUB_STATS[slot] * (
+                get_amplify_multiplier(stars + 1, is_sub=True) - get_amplify_multiplier(stars, is_sub=True)
+            )
+            assert option.expected_dps_gain_pct == pytest.approx(delta / before * 100)
+        # Star overrides are undone after evaluation
+        assert items['hat'].stars == 15 and items['gloves'].stars == 20
+
+    def test_star_override_callback_and_plan(self):
+        items = {'gloves': EquipmentItem(slot='gloves', stars=17)}
+        seen = []
+        stats_fn = _make_stats_for_stars({'gloves': 17})
+
+        def with_stars(overrides):
+            seen.append(dict(overrides))
+            return stats_fn(overrides)
+
+        optimizer = self._optimizer(items, get_stats_with_stars_func=with_stars)
+        plan = optimizer.get_starforce_plan(5_000_000)
+        assert {'gloves': 25} in seen
+        assert plan.steps and plan.final_stars['gloves'] > 17
+
+
+class TestOptimalPath:
+
+    def _optimizer(self, stars, calls=None, dps=None, **kwargs):
+        items = {slot: EquipmentItem(slot=slot, stars=n) for slot, n in stars.items()}
+        stats_fn = _make_stats_for_stars({})
+        dps = dps or (lambda stats: 100 + stats['damage_percent'])
+
+        def get_stats():
+            return stats_fn({slot: item.stars for slot, item in items.items()})
+
+        def calc_dps(stats):
+            if calls is not None:
+                calls.append(stats)
+            return dps(stats)
+
+        optimizer = UpgradeOptimizer(
+            calc_dps_func=calc_dps,
+            get_stats_func=get_stats,
+            equipment_state={},
+            equipment_items=items,
+            hero_power_config=None,
+            current_dps=calc_dps(get_stats()),
+            **kwargs,
+        )
+        optimizer._analyze_starforce_upgrades()
+        return optimizer
+
+    def _real_gain_pct(self, start, final):
+        stats_fn = _make_stats_for_stars({})
+        before = 100 + stats_fn(start)['damage_percent']
+        after = 100 + stats_fn(final)['damage_percent']
+        return (after / before - 1) * 100
+
+    def test_sequential_steps_on_one_target(self):
+        path = self._optimizer({'hat': 15}).get_optimal_path(2_000_000)
+        assert len(path.upgrades) > 1
+        stars = 15
+        for option in path.upgrades:
+            assert option.details['start'] == stars
+            stars = option.details['end']
+
+    def test_gain_compounds_to_real_dps(self):
+        start = {'hat': 15, 'gloves': 16}
+        path = self._optimizer(start).get_optimal_path(3_000_000)
+        final = dict(start)
+        for option in path.upgrades:
+            final[option.details['slot']] = option.details['end']
+        assert path.total_dps_gain == pytest.approx(self._real_gain_pct(start, final))
+        assert path.cumulative_dps_gain[-1] == path.total_dps_gain
+        assert path.total_cost <= path.budget
+        # Step gains are relative to the DPS at that step, so they compound
+        assert path.total_dps_gain > sum(o.expected_dps_gain_pct for o in path.upgrades)
+
+    def test_matches_eager_rescoring(self):
+        start = {'hat': 15, 'gloves': 16, 'ring': 14}
+        budget = 4_000_000
+        optimizer = self._optimizer(start)
+        path = optimizer.get_optimal_path(budget)
+
+        # Reference: re-score every slot's next star after every step
+        stars, remaining, eager = dict(start), budget, []
+        while True:
+            best = None
+            for slot, n in stars.items():
+                if n >= 25:
+                    continue
+                gain = self._real_gain_pct(stars, {**stars, slot: n + 1})
+                option = optimizer._starforce_option(slot, n, gain)
+                if gain > 0 and option.cost_diamonds <= remaining and (
+                    best is None or option.efficiency > best.efficiency
+                ):
+                    best = option
+            if best is None:
+                break
+            eager.append((best.details['slot'], best.details['end']))
+            remaining -= best.cost_diamonds
+            stars[best.details['slot']] += 1
+
+        assert [(o.details['slot'], o.details['end']) for o in path.upgrades] == eager
+
+    @staticmethod
+    def _crit_dps(stats):
+        # Crit damage is worth nothing until crit rate is taken
+        crit = 1 + stats.get('crit_rate', 0) / 100 * (1 + stats.get('crit_damage', 0) / 100)
+        return (100 + stats['damage_percent']) * crit
+
+    def _stat_options(self):
+        def option(target, stat, value):
+            return UpgradeOption(UpgradeType.ARTIFACT, target, target, 30_000, 1.0,
+                                 details={"artifact": target}, stat_changes={stat: value})
+        return [
+            option("crit_rate", "crit_rate", 50.0),
+            option("crit_damage", "crit_damage", 100.0),
+            option("damage", "damage_percent", 26.0),
+            UpgradeOption(UpgradeType.CUBE_REGULAR, "Hat cube", "hat_regular", 30_000, 10.0),
+        ]
+
+    def test_matches_exhaustive_search(self):
+        start, budget = {'hat': 15}, 90_000
+        optimizer = self._optimizer(start, dps=self._crit_dps)
+        extra = self._stat_options()
+        optimizer.upgrade_options += extra
+        path = optimizer.get_optimal_path(budget)
+
+        stats_fn = _make_stats_for_stars({})
+        base_dps = self._crit_dps(stats_fn(start))
+
+        def gain_pct(stars, options):
+            stats = stats_fn({'hat': stars})
+            for option in options:
+                for key, value in option.stat_changes.items():
+                    stats[key] = stats.get(key, 0) + value
+            growth = self._crit_dps(stats) / base_dps
+            for option in options:
+                if not option.stat_changes:
+                    growth *= 1 + option.expected_dps_gain_pct / 100
+            return (growth - 1) * 100
+
+        # Every star level of the hat with every subset of the other options
+        best, star_cost = 0.0, 0.0
+        for stars in range(15, 26):
+            if stars > 15:
+                star_cost += optimizer._starforce_option('hat', stars - 1, 0.0).cost_diamonds
+            for n in range(len(extra) + 1):
+                for options in itertools.combinations(extra, n):
+                    if star_cost + sum(o.cost_diamonds for o in options) <= budget:
+                        best = max(best, gain_pct(stars, options))
+
+        taken = [o for o in path.upgrades if o.upgrade_type != UpgradeType.STARFORCE]
+        final_stars = max([15] + [o.details['end'] for o in path.upgrades
+                                  if o.upgrade_type == UpgradeType.STARFORCE])
+        chosen = [o for o in extra if o.target in {t.target for t in taken}]
+        # Bookkeeping follows the real DPS of the final state...
+        assert path.total_dps_gain == pytest.approx(gain_pct(final_stars, chosen))
+        # ...and crit damage is picked once crit rate makes it worth more than damage
+        assert [o.target for o in taken] == ["crit_rate", "crit_damage", "damage"]
+        assert path.total_dps_gain == pytest.approx(best)
+
+    def test_rescoring_uses_fast_evaluator(self):
+        seen = []
+
+        def fast_calc(stats, mode, enemy_def, use_realistic_dps=False, log_actions=False):
+            seen.append(use_realistic_dps)
+            # Realistic path runs at twice the legacy DPS; gains are unchanged
+            return {'total': self._crit_dps(stats) * (2 if use_realistic_dps else 1)}
+
+        stats = _make_stats_for_stars({})({'hat': 15})
+        ctx = EvaluationContext(
+            stats, 'boss', lambda s, mode: {'total': self._crit_dps(s)},
+            fast_evaluator_kwargs={'enemy_def': 0.752, 'calculate_dps_fn': fast_calc},
+        )
+        optimizer = self._optimizer({'hat': 15}, dps=self._crit_dps, evaluation_context=ctx)
+        optimizer.upgrade_options = self._stat_options()
+        path = optimizer.get_optimal_path(90_000)
+        assert [o.target for o in path.upgrades] == ["crit_rate", "crit_damage", "damage"]
+        assert path.total_dps_gain == pytest.approx((156 * 2.0 / 130 - 1) * 100)
+        assert seen.count(False) > seen.count(True)  # candidates take the legacy + ratio path
+
+    def test_group_taken_once_and_informational_skipped(self):
+        optimizer = self._optimizer({})
+        optimizer.upgrade_options = [
+            UpgradeOption(UpgradeType.ARTIFACT, "Awaken ★0→★3", "chalice_awaken_3", 1_000, 2.0,
+                          details={"artifact": "chalice"}),
+            UpgradeOption(UpgradeType.ARTIFACT, "Awaken ★0→★5", "chalice_awaken_5", 2_000, 3.0,
+                          details={"artifact": "chalice"}),
+            UpgradeOption(UpgradeType.HERO_POWER, "Line ranking", "hero_power_line_ranking", 0, 0),
+            UpgradeOption(UpgradeType.CUBE_REGULAR, "Hat cube", "hat_regular", 5_000, 4.0),
+        ]
+        path = optimizer.get_optimal_path(100_000)
+        assert [o.target for o in path.upgrades] == ["chalice_awaken_3", "hat_regular"]
+        assert path.total_dps_gain == pytest.approx((1.02 * 1.04 - 1) * 100)
+
+
+def _spin(rounds):
+    """CPU-bound stand-in for an analyser: pure Python, holds the GIL throughout."""
+    total = 0
+    for i in range(rounds):
+        total += i * i % 7
+    return os.getpid(), total
+
+
+def _spin_at_barrier(barrier, rounds):
+    barrier.wait()
+    return _spin(rounds)
+
+
+@pytest.fixture(scope="module")
+def process_pool():
+    pool = create_analysis_pool(2)
+    list(pool.map(_spin, [1, 1]))  # start both workers
+    yield pool
+    pool.shutdown()
+
+
+class TestConcurrentAnalysis:
+
+    def test_cpu_bound_analysers_run_in_worker_processes(self, process_pool):
+        rounds = 200_000
+        tasks = [("slow", functools.partial(_spin, 6 * rounds)),
+                 ("fast", functools.partial(_spin, rounds)),
+                 ("mid", functools.partial(_spin, 2 * rounds))]
+        events = list(run_analyses(tasks, executor=process_pool))
+        assert [e.name for e in events] == ["fast", "mid", "slow"]
+        assert [e.completed for e in events] == [1, 2, 3]
+        assert events[-1].done and not events[0].done
+        assert {e.name: e.result[1] for e in events} == {name: task()[1] for name, task in tasks}
+        assert os.getpid() not in {e.result[0] for e in events}
+        # A caller-owned executor stays usable
+        assert process_pool.submit(_spin, 1).result()[1] == 0
+
+    def test_processes_overlap_cpu_bound_analysers(self, process_pool):
+        # Each task waits at a two-party barrier, so both only finish if two
+        # workers ran them at the same time
+        with multiprocessing.Manager() as manager:
+            barrier = manager.Barrier(2, timeout=30)
+            tasks = [(str(i), functools.partial(_spin_at_barrier, barrier, 100_000)) for i in range(2)]
+            events = list(run_analyses(tasks, executor=process_pool))
+        assert all(e.error is None for e in events)
+        assert {e.name: e.result[1] for e in events} == {"0": _spin(100_000)[1], "1": _spin(100_000)[1]}
+        pids = {e.result[0] for e in events}
+        assert len(pids) == 2 and os.getpid() not in pids
+
+    def test_error_reported_without_stopping_others(self):
+        def boom():
+            raise RuntimeError("bad analyser")
+
+        events = {e.name: e for e in run_analyses([("bad", boom), ("good", lambda: 42)])}
+        assert isinstance(events["bad"].error, RuntimeError) and events["bad"].result is None
+        assert events["good"].error is None and events["good"].result == 42
+
+    def test_initializer_runs_in_workers(self):
+        seen = threading.local()
+
+        def init():
+            seen.ready = True
+
+        events = list(run_analyses([("a", lambda: getattr(seen, "ready", False))], initializer=init))
+        assert events[0].result is True
+
+    def test_analyze_all_upgrades_streams_and_matches_serial(self):
+        optimizer = TestOptimalPath()._optimizer({'hat': 15, 'gloves': 17})
+        events = []
+        options = optimizer.analyze_all_upgrades(progress_callback=events.append)
+        assert sorted(e.name for e in events) == sorted(name for name, _ in optimizer._analysers())
+        assert events[-1].done
+
+        serial = []
+        for _, method in optimizer._analysers():
+            serial.extend(optimizer._run_analyser(method))
+        serial.sort(key=lambda o: o.efficiency, reverse=True)
+        assert [(o.target, o.cost_diamonds, o.expected_dps_gain_pct) for o in options] == [
+            (o.target, o.cost_diamonds, o.expected_dps_gain_pct) for o in serial
+        ]
+        # Star overrides used during the starforce analyser are restored
+        assert optimizer.equipment_items['hat'].stars == 15
+
+    def test_evaluations_attributed_to_analysers(self):
+        class CountingContext:
+            def __init__(self):
+                self.local = threading.local()
+                self.counts = {}
+                self.lock = threading.Lock()
+
+            @contextmanager
+            def analyser(self, name):
+                self.local.name = name
+                try:
+                    yield
+                finally:
+                    self.local.name = None
+
+            def score(self, stats):
+                name = getattr(self.local, 'name', None)
+                with self.lock:
+                    self.counts[name] = self.counts.get(name, 0) + 1
+                return 100 + stats['damage_percent']
+
+        reference = TestOptimalPath()._optimizer({'hat': 15, 'gloves': 17})
+        context = CountingContext()
+        optimizer = UpgradeOptimizer(
+            calc_dps_func=None,
+            get_stats_func=reference.get_stats,
+            equipment_state={},
+            equipment_items=reference.equipment_items,
+            hero_power_config=None,
+            current_dps=reference.current_dps,
+            evaluation_context=context,
+        )
+        options = optimizer.analyze_all_upgrades()
+        assert [o.expected_dps_gain_pct for o in options] == [
+            o.expected_dps_gain_pct for o in reference.analyze_all_upgrades()
+        ]
+        # Every evaluation ran inside some analyser's block
+        assert None not in context.counts
+        assert set(context.counts) <= {name for name, _ in optimizer._analysers()}
+        assert context.counts['starforce'] > 0
+
+
+class TestHeroPowerAnalysers:
+
+    def test_line_value_table_built_once_per_run(self, monkeypatch):
+        import optimizers.upgrade_optimizer as upgrade_optimizer
+        from game.hero_power import HeroPowerConfig, HeroPowerLine, HeroPowerStatType, HeroPowerTier
+
+        builds = []
+        build = upgrade_optimizer.get_line_value_table
+
+        def counted(*args, **kwargs):
+            builds.append(args)
+            return build(*args, **kwargs)
+
+        monkeypatch.setattr(upgrade_optimizer, "get_line_value_table", counted)
+        stats = {'def_pen_sources': [], 'attack_speed_sources': [], 'final_damage_sources': [],
+                 'main_stat_type': 'dex', 'damage_pct': 0.0, 'boss_damage': 0.0}
+        config = HeroPowerConfig(lines=[
+            HeroPowerLine(slot=i, stat_type=HeroPowerStatType.DAMAGE, value=5.0, tier=HeroPowerTier.EPIC)
+            for i in range(1, 7)
+        ])
+        optimizer = UpgradeOptimizer(
+            calc_dps_func=lambda s: 100 + s.get('damage_pct', 0.0) + s.get('boss_damage', 0.0),
+            get_stats_func=lambda: dict(stats),
+            equipment_state={},
+            equipment_items={},
+            hero_power_config=config,
+            current_dps=100.0,
+        )
+        targets = {option.target
+                   for method in ("_analyze_hero_power_upgrades", "_analyze_hero_power_line_ranking")
+                   for option in optimizer._run_analyser(method)}
+        assert {"hero_power", "hero_power_line_ranking"} <= targets
+        assert len(builds) == 1
+
+        # New stats get a new table
+        stats['damage_pct'] = 10.0
+        optimizer._run_analyser("_analyze_hero_power_line_ranking")
+        assert len(builds) == 2
+
+
+class TestIncrementalAnalysis:
+
+    def _units(self, runs, fail=()):
+        def make(name):
+            def run():
+                runs.append(name)
+                if name in fail:
+                    raise RuntimeError(name)
+                return f"{name}-{runs.count(name)}"
+            return run
+
+        return [
+            AnalysisUnit("cubes:hat", make("cubes:hat"), frozenset({"potentials:hat"})),
+            AnalysisUnit("cubes:gloves", make("cubes:gloves"), frozenset({"potentials:gloves"})),
+            AnalysisUnit("weapons", make("weapons"), frozenset({"weapons"})),
+            AnalysisUnit("artifacts", make("artifacts"), frozenset({"artifacts"}), uses_baseline=True),
+        ]
+
+    def _refresh(self, analysis, units, fingerprints, baseline):
+        return sorted(e.name for e in analysis.refresh(units, fingerprints, baseline))
+
+    def test_unchanged_sources_reuse_results(self):
+        runs = []
+        analysis = IncrementalAnalysis()
+        fps = {"potentials:hat": "a", "potentials:gloves": "b", "weapons": "c", "artifacts": "d"}
+        assert len(self._refresh(analysis, self._units(runs), fps, "base")) == 4
+        assert self._refresh(analysis, self._units(runs), dict(fps), "base") == []
+        assert analysis.results["weapons"] == "weapons-1"
+
+    def test_only_readers_of_changed_source_rerun(self):
+        runs = []
+        analysis = IncrementalAnalysis()
+        fps = {"potentials:hat": "a", "potentials:gloves": "b", "weapons": "c", "artifacts": "d"}
+        self._refresh(analysis, self._units(runs), fps, "base")
+        fps["potentials:gloves"] = "b2"
+        assert self._refresh(analysis, self._units(runs), fps, "base") == ["cubes:gloves"]
+        assert analysis.results["cubes:gloves"] == "cubes:gloves-2"
+        assert analysis.results["cubes:hat"] == "cubes:hat-1"
+
+    def test_baseline_change_reruns_baseline_ranked_units(self):
+        runs = []
+        analysis = IncrementalAnalysis()
+        fps = {"potentials:hat": "a", "potentials:gloves": "b", "weapons": "c", "artifacts": "d"}
+        self._refresh(analysis, self._units(runs), fps, "base")
+        fps["potentials:gloves"] = "b2"
+        assert analysis.stale(self._units(runs), fps, "base2") == ["cubes:gloves", "artifacts"]
+        assert self._refresh(analysis, self._units(runs), fps, "base2") == ["artifacts", "cubes:gloves"]
+
+    def test_baseline_only_change_reranks_previous_result(self):
+        runs = []
+        analysis = IncrementalAnalysis()
+        fps = {"potentials:hat": "a", "potentials:gloves": "b", "weapons": "c", "artifacts": "d"}
+
+        def units():
+            return [AnalysisUnit(unit.name, unit.run, unit.reads, uses_baseline=True,
+                                 rerank=lambda previous: f"{previous}-reranked")
+                    if unit.name.startswith("cubes") else unit
+                    for unit in self._units(runs)]
+
+        self._refresh(analysis, units(), fps, "base")
+        fps["potentials:gloves"] = "b2"
+        assert analysis.stale(units(), fps, "base2") == ["cubes:hat", "cubes:gloves", "artifacts"]
+        assert analysis.reranked(units(), fps, "base2") == ["cubes:hat"]
+        assert self._refresh(analysis, units(), fps, "base2") == ["artifacts", "cubes:gloves", "cubes:hat"]
+        assert analysis.results["cubes:hat"] == "cubes:hat-1-reranked"
+        assert analysis.results["cubes:gloves"] == "cubes:gloves-2"
+        assert analysis.results["artifacts"] == "artifacts-2"
+        assert runs.count("cubes:hat") == 1
+
+    def test_failed_unit_is_retried(self):
+        runs = []
+        analysis = IncrementalAnalysis()
+        fps = {"potentials:hat": "a", "potentials:gloves": "b", "weapons": "c", "artifacts": "d"}
+        events = list(analysis.refresh(self._units(runs, fail={"weapons"}), fps, "base"))
+        assert [e.name for e in events if e.error is not None] == ["weapons"]
+        assert "weapons" not in analysis.results
+        assert self._refresh(analysis, self._units(runs), fps, "base") == ["weapons"]
+
+    def test_dropped_units_are_forgotten(self):
+        runs = []
+        analysis = IncrementalAnalysis()
+        fps = {"potentials:hat": "a", "potentials:gloves": "b", "weapons": "c", "artifacts": "d"}
+        self._refresh(analysis, self._units(runs), fps, "base")
+        self._refresh(analysis, self._units(runs)[:2], fps, "base")
+        assert sorted(analysis.results) == ["cubes:gloves", "cubes:hat"]
+
+    def test_user_data_edit_touches_one_source(self):
+        data = UserData()
+        data.equipment_potentials = {"gloves": {"tier": "legendary", "line1_stat": "crit_damage"}}
+        data.equipment_items = {"gloves": {"stars": 15}}
+        before = source_fingerprints(data)
+        data.equipment_potentials["gloves"]["line1_stat"] = "damage_pct"
+        after = source_fingerprints(data)
+        assert [source for source in before if before[source] != after[source]] == [
+            slot_source("potentials", "gloves")
+        ]
+        data.artifacts_resonance = {"resonance_level": 20}
+        assert {s for s in after if after[s] != source_fingerprints(data)[s]} == {"artifacts"}
+
@@ -0,0 +1,182 @@
+"""
+Tests for the UserData digest (streamlit_app/utils/tracked_containers.py and
+UserData.digest / section_digests) and the aggregate_stats cache keyed on it.
+
+Covers: in-place edits of nested fields move the digest and only the edited
+section, equal contents give equal digests, copies / deep copies / pickles
+keep tracking independently, serialization still sees plain values, and
+aggregate_stats serves an unchanged account from the cache without its
+results being mutable through the returned dict.
+"""
+import copy
+import pickle
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from engine.dps_calculator import aggregate_stats, _aggregate_stats, get_cache_backend, last_aggregation_report
+from streamlit_app.utils.data_manager import UserData, source_fingerprints, _digest
+from streamlit_app.utils.tracked_containers import TrackedDict, TrackedList, VersionCell, track
+from tests.test_aggregate_stats import _random_user
+
+
+@pytest.fixture
+def user():
+    return _random_user(random.Random(5))
+
+
+def _changed_sections(user, edit):
+    before = user.section_digests()
+    edit(user)
+    after = user.section_digests()
+    return sorted(source for source in before if before[source] != after[source])
+
+
+class TestTrackedContainers:
+
+    def test_nested_edits_bump_the_cell(self):
+        cell = VersionCell()
+        data = track({'a': {'b': [1, 2]}}, cell)
+        data['a']['b'].append(3)
+        data['a']['c'] = {}
+        data['a']['c']['d'] = 1
+        assert cell.value == 3
+        assert isinstance(data['a']['c'], TrackedDict)
+
+    def test_every_edit_bumps_the_root(self):
+        root = VersionCell()
+        first, second = VersionCell(root), VersionCell(root)
+        track([], first).append(1)
+        track({}, second)['x'] = 1
+        assert (first.value, second.value, root.value) == (1, 1, 2)
+
+    def test_copies_are_plain_containers(self):
+        data = track({'a': [1, {'b': 2}]}, VersionCell())
+        for copied in (copy.copy(data), copy.deepcopy(data), data.copy(), pickle.loads(pickle.dumps(data))):
+            assert type(copied) is dict
+        assert type(copy.deepcopy(data)['a']) is list
+        assert type(copy.deepcopy(data['a'])[1]) is dict
+
+    def test_stored_plain_values_are_copied_in(self):
+        data = track({}, VersionCell())
+        value = {'x': 1}
+        data['key'] = value
+        assert isinstance(data['key'], TrackedDict)
+        assert data['key'] == value
+
+    def test_list_slice_assignment_is_tracked(self):
+        cell = VersionCell()
+        data = TrackedList([1, 2, 3], cell)
+        data[1:] = [{'x': 1}]
+        assert cell.value == 1
+        assert isinstance(data[1], TrackedDict)
+
+
+class TestDigest:
+
+    def test_matches_source_fingerprints_of_a_fresh_model(self, user):
+        fresh = UserData(**user.model_dump())
+        assert source_fingerprints(fresh) == source_fingerprints(user)
+        assert fresh.digest() == user.digest()
+
+    def test_section_digest_hashes_the_section(self, user):
+        names = ('artifacts_equipped', 'artifacts_inventory', 'artifacts_resonance')
+        assert user.section_digests()['artifacts'] == _digest([user.model_dump()[name] for name in names])
+
+    def test_nested_slot_edit_changes_only_that_slot(self, user):
+        def edit(data):
+            data.equipment_potentials['gloves']['line1_value'] = 99.0
+        assert _changed_sections(user, edit) == ['potentials:gloves']
+
+    def test_nested_field_edit_changes_only_its_section(self, user):
+        def edit(data):
+            data.artifacts_inventory.setdefault('new_artifact', {})['stars'] = 3
+        assert _changed_sections(user, edit) == ['artifacts']
+
+    def test_attribute_assignment(self, user):
+        def edit(data):
+            data.character_level += 1
+        assert _changed_sections(user, edit) == ['character']
+
+    def test_replacing_a_slot_field_rehashes_every_slot(self, user):
+        digest = user.digest()
+        potentials = copy.deepcopy(user.equipment_potentials)
+        user.equipment_potentials = potentials
+        assert user.digest() == digest
+        user.equipment_potentials['ring']['line2_value'] = 1.0
+        assert user.digest() != digest
+
+    def test_reverting_an_edit_restores_the_digest(self, user):
+        digest = user.digest()
+        user.maple_rank['new_key'] = 1
+        assert user.digest() != digest
+        del user.maple_rank['new_key']
+        assert user.digest() == digest
+
+    def test_unchanged_account_is_not_rehashed(self, user, monkeypatch):
+        user.digest()
+        monkeypatch.setattr('streamlit_app.utils.data_manager._digest', None)
+        user.digest()
+        user.section_digests()
+
+
+class TestCopies:
+
+    def test_deepcopy_tracks_independently(self, user):
+        digest = user.digest()
+        copied = copy.deepcopy(user)
+        copied.equipment_potentials['hat']['line1_value'] = 123.0
+        assert user.digest() == digest
+        assert copied.digest() != digest
+
+    def test_shallow_copy_sees_shared_edits(self, user):
+        copied = copy.copy(user)
+        assert copied.digest() == user.digest()
+        user.hero_power_passives['new_passive'] = 1
+        assert copied.digest() == user.digest()
+
+    def test_pickle_round_trip(self, user):
+        loaded = pickle.loads(pickle.dumps(user))
+        assert loaded.digest() == user.digest()
+        loaded.weapons_data['new_weapon'] = {'level': 1}
+        assert loaded.digest() != user.digest()
+
+    def test_serialization_sees_plain_values(self, user):
+        dumped = user.model_dump()
+        assert type(dumped['equipment_potentials']) is dict
+        assert UserData.model_validate_json(user.model_dump_json()).digest() == user.digest()
+
+
+class TestAggregateCache:
+
+    def test_unchanged_account_skips_the_blocks(self, user):
+        get_cache_backend().clear()
+        first = aggregate_stats(user)
+        second = aggregate_stats(user)
+        assert second == first == _aggregate_stats(user, None, True, None, False)
+        assert last_aggregation_report().recomputed == []
+        assert last_aggregation_report().blocks
+
+    def test_edit_is_seen_after_a_hit(self, user):
+        before = aggregate_stats(user)
+        user.manual_adjustments['crit_damage'] = user.manual_adjustments.get('crit_damage', 0) + 50
+        after = aggregate_stats(user)
+        assert after['crit_damage'] == pytest.approx(before['crit_damage'] + 50)
+        assert last_aggregation_report().recomputed == ['manual_adjustments']
+
+    def test_arguments_are_part_of_the_key(self, user):
+        assert aggregate_stats(user, apply_adjustments=False) == _aggregate_stats(user, None, False, None, False)
+        overrides = {'hat': 0}
+        assert aggregate_stats(user, star_overrides=overrides) == _aggregate_stats(user, overrides, True, None, False)
+
+    def test_results_do_not_share_state(self, user):
+        first = aggregate_stats(user)
+        expected = copy.deepcopy(first)
+        first['crit_damage'] = -1
+        first['def_pen_sources'].append(('tampered', 0.5, 1))
+        first['_main_companion_player_bonuses']['tampered'] = 1
+        assert aggregate_stats(user) == expected
@@ -0,0 +1,386 @@
+"""
+Tests for streamlit_app/utils/user_store.py and the data_manager functions
+that save and load accounts through it.
+
+Covers: save/load round trip, saves rewrite only the edited sections,
+removed slots and non-slot keys are stored and deleted, section-level loads,
+sections loaded only when first read, an unreadable account is never saved,
+migration of legacy CSV files, CSV export/import, deletion, concurrent
+saves from several connections to one database, and the version history
+(deltas, deduplicated blobs, snapshots, diffs and restores).
+"""
+import copy
+import pickle
+import random
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import streamlit_app.utils.data_manager as data_manager
+from streamlit_app.utils.data_manager import (
+    SOURCE_FIELDS, SLOT_SOURCE_FIELDS, CHARACTER_SOURCE,
+    save_user_data, load_user_data, load_user_section, user_has_data, delete_user_data,
+    queue_user_data_save, flush_user_data,
+    export_user_data_csv, import_user_data_csv,
+    user_history, load_user_version, diff_user_versions, restore_user_version,
+)
+from streamlit_app.utils.user_store import UserStore, TABLES
+from tests.test_aggregate_stats import _random_user
+
+
+@pytest.fixture(autouse=True)
+def users_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_manager, 'USERS_DATA_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def user():
+    data = _random_user(random.Random(9))
+    data.username = 'Tester'
+    return data
+
+
+def _save(data):
+    store = data_manager._get_user_store()
+    return store.save(data.username, data_manager._store_digests(data),
+                      lambda section: data_manager._store_rows(data, section))
+
+
+def test_tables_cover_every_section():
+    assert set(TABLES) == {CHARACTER_SOURCE} | set(SOURCE_FIELDS) | set(SLOT_SOURCE_FIELDS)
+
+
+class TestRoundTrip:
+
+    def test_load_returns_the_saved_account(self, user):
+        assert save_user_data('Tester', user)
+        loaded = load_user_data('Tester')
+        assert loaded.model_dump() == user.model_dump()
+        assert list(loaded.equipment_items) == list(user.equipment_items)
+
+    def test_fields_the_csv_dropped_are_kept(self, user):
+        user.boss_importance = 12
+        user.artifacts_inventory['some_artifact'] = {'stars': 2, 'potentials': [{'stat': 'boss', 'value': 1.5}]}
+        save_user_data('Tester', user)
+        loaded = load_user_data('Tester')
+        assert loaded.boss_importance == 12
+        assert loaded.artifacts_inventory['some_artifact']['potentials'][0]['value'] == 1.5
+
+    def test_username_is_case_insensitive(self, user):
+        save_user_data('Tester', user)
+        assert user_has_data('tester')
+        assert load_user_data('TESTER').username == 'TESTER'
+
+    def test_unknown_user_gets_defaults(self):
+        data = load_user_data('nobody')
+        assert data.equipment_potentials and not user_has_data('nobody')
+
+
+class TestPartialWrites:
+
+    def test_first_save_writes_every_section(self, user):
+        written = _save(user)
+        assert set(written) == set(user.section_digests())
+
+    def test_unchanged_account_writes_nothing(self, user):
+        _save(user)
+        assert _save(user) == []
+
+    def test_edit_writes_only_its_section(self, user):
+        _save(user)
+        user.equipment_potentials['gloves']['line1_value'] = 42.0
+        user.character_level += 1
+        assert sorted(_save(user)) == ['character', 'potentials:gloves']
+        assert load_user_data('Tester').equipment_potentials['gloves']['line1_value'] == 42.0
+
+    def test_removed_slot_is_deleted(self, user):
+        _save(user)
+        del user.equipment_scrolls['hat']
+        _save(user)
+        assert 'hat' not in load_user_data('Tester').equipment_scrolls
+
+    def test_keys_outside_the_equipment_slots(self, user):
+        user.equipment_items['spare'] = {'name': 'Spare'}
+        _save(user)
+        assert load_user_data('Tester').equipment_items['spare'] == {'name': 'Spare'}
+        del user.equipment_items['spare']
+        assert _save(user) == ['equipment:spare']
+        assert 'spare' not in load_user_data('Tester').equipment_items
+
+
+class TestSectionLoads:
+
+    def test_loads_one_table(self, user):
+        save_user_data('Tester', user)
+        artifacts = load_user_section('Tester', 'artifacts')
+        assert set(artifacts) == set(SOURCE_FIELDS['artifacts'])
+        assert artifacts['artifacts_inventory'] == user.artifacts_inventory
+
+    def test_slot_section_loads_its_table(self, user):
+        save_user_data('Tester', user)
+        assert load_user_section('Tester', 'potentials:gloves')['equipment_potentials'] == user.equipment_potentials
+
+    def test_unknown_table(self, user):
+        with pytest.raises(ValueError):
+            data_manager._get_user_store().load('Tester', ['nope'])
+
+
+@pytest.fixture
+def table_loads(monkeypatch):
+    """Tables each UserStore.load() call read, in call order."""
+    loads = []
+    load = UserStore.load
+
+    def counting_load(self, username, tables=None):
+        tables = list(tables) if tables is not None else list(TABLES)
+        loads.append(tables)
+        return load(self, username, tables)
+
+    monkeypatch.setattr(UserStore, 'load', counting_load)
+    return loads
+
+
+class TestDeferredLoading:
+
+    def test_only_the_character_table_is_read_up_front(self, user, table_loads):
+        save_user_data('Tester', user)
+        loaded = load_user_data('Tester')
+        assert table_loads == [[CHARACTER_SOURCE]]
+        assert loaded.character_level == user.character_level
+        assert loaded.artifacts_inventory == user.artifacts_inventory
+        assert loaded.artifacts_resonance == user.artifacts_resonance
+        assert table_loads == [[CHARACTER_SOURCE], ['artifacts']]
+
+    def test_digest_and_auto_save_load_nothing(self, user, table_loads):
+        save_user_data('Tester', user)
+        loaded = load_user_data('Tester')
+        assert loaded.digest() == user.digest()
+        queue_user_data_save('Tester', loaded)
+        assert flush_user_data('Tester')
+        assert table_loads == [[CHARACTER_SOURCE]]
+        assert len(user_history('Tester')) == 1
+
+    def test_edit_loads_and_writes_only_its_table(self, user, table_loads):
+        save_user_data('Tester', user)
+        loaded = load_user_data('Tester')
+        loaded.equipment_potentials['gloves']['line1_value'] = 42.0
+        assert _save(loaded) == ['potentials:gloves']
+        assert table_loads == [[CHARACTER_SOURCE], ['potentials']]
+
+    def test_assigned_field_keeps_its_unread_neighbours(self, user):
+        save_user_data('Tester', user)
+        loaded = load_user_data('Tester')
+        loaded.weapons_data = {}
+        assert _save(loaded) == ['weapons']
+        reloaded = load_user_data('Tester')
+        assert reloaded.weapons_data == {}
+        assert reloaded.equipped_weapon_key == user.equipped_weapon_key
+        assert reloaded.summoning_level == user.summoning_level
+
+    def test_whole_account_operations_load_every_table(self, user):
+        save_user_data('Tester', user)
+        assert copy.deepcopy(load_user_data('Tester')).model_dump() == user.model_dump()
+        assert pickle.loads(pickle.dumps(load_user_data('Tester'))).model_dump() == user.model_dump()
+        assert dict(load_user_data('Tester')) == dict(user)
+
+
+class TestFailedLoads:
+
+    def _break_store(self, monkeypatch):
+        def failing_load(self, username, tables=None):
+            raise sqlite3.DatabaseError("database disk image is malformed")
+        monkeypatch.setattr(UserStore, 'load', failing_load)
+
+    def test_unreadable_account_is_never_saved(self, user, monkeypatch):
+        save_user_data('Tester', user)
+        with monkeypatch.context() as patch:
+            self._break_store(patch)
+            data = load_user_data('Tester')
+        assert data.load_failed
+        assert not save_user_data('Tester', data)
+        queue_user_data_save('Tester', data)
+        assert flush_user_data('Tester')
+        assert load_user_data('Tester').model_dump() == user.model_dump()
+
+    def test_section_that_fails_to_load_is_never_saved(self, user, monkeypatch):
+        save_user_data('Tester', user)
+        data = load_user_data('Tester')
+        assert not data.load_failed
+        with monkeypatch.context() as patch:
+            self._break_store(patch)
+            with pytest.raises(sqlite3.DatabaseError):
+                data.hero_power_lines
+        assert data.load_failed
+        data.character_level += 1
+        assert not save_user_data('Tester', data)
+        assert load_user_data('Tester').character_level == user.character_level
+
+
+class TestCsv:
+
+    def test_legacy_csv_is_migrated(self, user, users_dir):
+        (users_dir / 'legacy_data.csv').write_text(export_user_data_csv(user), encoding='utf-8')
+        migrated = load_user_data('legacy')
+        assert data_manager._get_user_store().has_user('legacy')
+        assert migrated.equipment_potentials == user.equipment_potentials
+        assert load_user_data('legacy').model_dump() == migrated.model_dump()
+
+    def test_export_import_round_trip(self, user):
+        save_user_data('Tester', user)
+        exported = export_user_data_csv(load_user_data('Tester'))
+        # Slot-keyed fields come back in EQUIPMENT_SLOTS order
+        assert sorted(exported.splitlines()) == sorted(export_user_data_csv(user).splitlines())
+        imported = import_user_data_csv(exported, 'Tester')
+        assert imported.hero_power_presets == user.hero_power_presets
+        assert imported.equipment_scrolls == user.equipment_scrolls
+
+    def test_delete_removes_store_rows_and_csv(self, user, users_dir):
+        save_user_data('Tester', user)
+        (users_dir / 'tester_data.csv').write_text('section,key,subkey,value\n', encoding='utf-8')
+        assert delete_user_data('Tester')
+        assert not user_has_data('Tester')
+        assert not delete_user_data('Tester')
+
+
+class TestConcurrency:
+
+    def test_wal_mode(self, user):
+        save_user_data('Tester', user)
+        path = data_manager._get_user_store().path
+        assert sqlite3.connect(path).execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    def test_concurrent_saves_from_separate_stores(self, users_dir):
+        path = str(users_dir / 'shared.db')
+        errors = []
+
+        def worker(index):
+            store = UserStore(path)
+            data = _random_user(random.Random(index))
+            try:
+                for level in range(20):
+                    data.character_level = level
+                    store.save(f'user{index}', data_manager._store_digests(data),
+                               lambda section: data_manager._store_rows(data, section))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        store = UserStore(path)
+        for i in range(4):
+            fields = data_manager._fields_from_tables(store.load(f'user{i}'))
+            assert fields['character_level'] == 19
+
+
+def _blob_count():
+    path = data_manager._get_user_store().path
+    return sqlite3.connect(path).execute('SELECT COUNT(*) FROM section_blobs').fetchone()[0]
+
+
+class TestHistory:
+
+    def test_each_save_that_changes_something_is_a_version(self, user):
+        save_user_data('Tester', user, label='first')
+        save_user_data('Tester', user)
+        user.equipment_potentials['gloves']['line1_value'] = 42.0
+        save_user_data('Tester', user)
+        history = user_history('Tester')
+        assert [version.version for version in history] == [1, 2]
+        assert history[0].label == 'first'
+        assert set(history[0].sections) == set(user.section_digests())
+        assert history[1].sections == ('potentials:gloves',)
+
+    def test_versions_reconstruct_the_saved_account(self, user):
+        save_user_data('Tester', user)
+        first = user.model_dump()
+        user.equipment_potentials['gloves']['line1_value'] = 42.0
+        del user.equipment_scrolls[next(iter(user.equipment_scrolls))]
+        user.character_level += 1
+        save_user_data('Tester', user)
+        assert load_user_version('Tester', 1).model_dump() == first
+        assert load_user_version('Tester', 2).model_dump() == user.model_dump()
+
+    def test_diff_lists_changed_sections(self, user):
+        save_user_data('Tester', user)
+        scroll_slot = next(iter(user.equipment_scrolls))
+        user.equipment_potentials['gloves']['line1_value'] = 42.0
+        save_user_data('Tester', user)
+        del user.equipment_scrolls[scroll_slot]
+        save_user_data('Tester', user)
+        expected = sorted(['potentials:gloves', f'equipment:{scroll_slot}'])
+        assert diff_user_versions('Tester', 1, 3) == expected
+        assert diff_user_versions('Tester', 3, 1) == expected
+        assert diff_user_versions('Tester', 2, 2) == []
+
+    def test_section_contents_are_stored_once(self, user):
+        save_user_data('Tester', user)
+        blobs = _blob_count()
+        old = user.equipment_potentials['gloves']['line1_value']
+        user.equipment_potentials['gloves']['line1_value'] = 42.0
+        save_user_data('Tester', user)
+        user.equipment_potentials['gloves']['line1_value'] = old
+        save_user_data('Tester', user)
+        assert _blob_count() == blobs + 1
+        save_user_data('Other', user)
+        assert _blob_count() == blobs + 1
+
+    def test_equal_slots_share_a_blob(self, user):
+        user.equipment_potentials['hat'] = dict(user.equipment_potentials['gloves'])
+        save_user_data('Tester', user)
+        snapshot = load_user_version('Tester', 1)
+        assert snapshot.equipment_potentials['hat'] == snapshot.equipment_potentials['gloves']
+
+    def test_restore_appends_a_version(self, user):
+        save_user_data('Tester', user)
+        first = user.digest()
+        user.character_level += 1
+        save_user_data('Tester', user)
+        restored = restore_user_version('Tester', 1)
+        assert restored.digest() == first
+        assert load_user_data('Tester').digest() == first
+        history = user_history('Tester')
+        assert [version.version for version in history] == [1, 2, 3]
+        assert history[-1].label == 'Restored version 1'
+
+    def test_unknown_version(self, user):
+        save_user_data('Tester', user)
+        with pytest.raises(KeyError):
+            load_user_version('Tester', 5)
+
+    def test_history_starts_from_a_full_snapshot(self, user):
+        save_user_data('Tester', user)
+        connection = sqlite3.connect(data_manager._get_user_store().path)
+        with connection:
+            connection.execute('DELETE FROM versions')
+            connection.execute('DELETE FROM version_sections')
+        user.character_level += 1
+        save_user_data('Tester', user)
+        assert load_user_version('Tester', 1).model_dump() == user.model_dump()
+
+    def test_delete_removes_history(self, user):
+        save_user_data('Tester', user)
+        delete_user_data('Tester')
+        assert user_history('Tester') == []
+
+    def test_delete_removes_blobs_no_other_account_uses(self, user):
+        save_user_data('Other', user)
+        blobs = _blob_count()
+        user.character_level += 1
+        user.equipment_potentials['gloves']['line1_value'] = 42.0
+        save_user_data('Tester', user)
+        assert _blob_count() == blobs + 2
+        delete_user_data('Tester')
+        assert _blob_count() == blobs
+        assert load_user_version('Other', 1).model_dump() == load_user_data('Other').model_dump()
+        delete_user_data('Other')
+        assert _blob_count() == 0
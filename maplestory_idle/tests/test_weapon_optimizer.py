@@ -0,0 +1,148 @@
+"""
+Unit tests for optimizers/weapon_optimizer.py
+
+Covers: the incremental heap-driven upgrade path against full re-scoring,
+equipped-weapon crossover switching, and the enhancer allocation built on
+the same engine.
+"""
+import copy
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from game.weapons import BASE_ATK, calculate_total_cost
+from optimizers.weapon_optimizer import (
+    analyze_all_weapon_upgrades,
+    calculate_optimal_enhancer_allocation,
+    calculate_total_weapon_atk_percent,
+    generate_weapon_upgrade_path,
+)
+
+
+ALL_KEYS = [f"{rarity}_{tier}" for rarity, tier in BASE_ATK]
+
+
+def _rescoring_path(weapons_data, equipped_key, budget):
+    """Reference: re-score every weapon after every purchased level."""
+    working = copy.deepcopy(weapons_data)
+    equipped = equipped_key
+    path, spent = [], 0.0
+    while spent < budget:
+        result = analyze_all_weapon_upgrades(working, equipped)
+        if not result.recommendations:
+            break
+        best = result.recommendations[0]
+        if spent + best.cost_diamonds > budget:
+            break
+        path.append(best)
+        spent += best.cost_diamonds
+        working[best.weapon_key]['level'] = best.target_level
+        if best.can_become_best and best.crossover_level and best.target_level >= best.crossover_level:
+            equipped = best.weapon_key
+    return path, working, equipped
+
+
+def _random_inventory(rng):
+    data = {}
+    for key in rng.sample(ALL_KEYS, rng.randint(2, 12)):
+        data[key] = {'level': rng.choice([0, 1, rng.randint(1, 200)]), 'awakening': rng.randint(0, 5)}
+    return data
+
+
+class TestUpgradePath:
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_matches_full_rescoring(self, seed):
+        rng = random.Random(seed)
+        data = _random_inventory(rng)
+        equipped = rng.choice(list(data))
+        budget = rng.choice([2_000, 20_000, 60_000])
+        reference, _, _ = _rescoring_path(data, equipped, budget)
+        path = generate_weapon_upgrade_path(data, equipped, budget)
+        # Exact efficiency ties may be taken in either order
+        assert len(path) == len(reference)
+        assert sum(r.dps_gain_percent for r in path) == pytest.approx(
+            sum(r.dps_gain_percent for r in reference), rel=1e-9,
+        )
+        assert sorted((r.weapon_key, r.current_level) for r in path) == sorted(
+            (r.weapon_key, r.current_level) for r in reference
+        )
+
+    def test_does_not_modify_input(self):
+        data = {"ancient_2": {"level": 50, "awakening": 3}, "mystic_1": {"level": 120, "awakening": 4}}
+        before = copy.deepcopy(data)
+        generate_weapon_upgrade_path(data, "ancient_2", 50_000)
+        assert data == before
+
+    def test_dps_gain_uses_running_total_atk(self):
+        data = {"legendary_1": {"level": 10, "awakening": 0}, "epic_1": {"level": 10, "awakening": 0}}
+        path = generate_weapon_upgrade_path(data, "legendary_1", 5_000)
+        working = copy.deepcopy(data)
+        for rec in path:
+            total = calculate_total_weapon_atk_percent(working, "legendary_1")
+            assert rec.dps_gain_percent == pytest.approx(rec.atk_gain / (1 + total / 100))
+            working[rec.weapon_key]['level'] = rec.target_level
+
+    def test_switches_equipped_at_crossover(self):
+        # Ancient T1 overtakes a low-cap normal weapon's maximum almost at once
+        data = {"normal_4": {"level": 100, "awakening": 0}, "ancient_1": {"level": 1, "awakening": 5}}
+        path = generate_weapon_upgrade_path(data, "normal_4", 100_000)
+        reference, _, equipped = _rescoring_path(data, "normal_4", 100_000)
+        assert equipped == "ancient_1"
+        assert any(rec.is_equipped and rec.weapon_key == "ancient_1" for rec in path)
+        assert [(r.weapon_key, r.is_equipped) for r in path] == [
+            (r.weapon_key, r.is_equipped) for r in reference
+        ]
+
+    def test_each_level_rescores_only_the_upgraded_weapon(self, monkeypatch):
+        import optimizers.weapon_optimizer as weapon_optimizer
+        calls = {'gain': 0, 'total': 0}
+        gain = weapon_optimizer.calculate_atk_gain_for_level
+        total = weapon_optimizer.calculate_total_weapon_atk_percent
+
+        def counted_gain(*args):
+            calls['gain'] += 1
+            return gain(*args)
+
+        def counted_total(*args):
+            calls['total'] += 1
+            return total(*args)
+
+        monkeypatch.setattr(weapon_optimizer, "calculate_atk_gain_for_level", counted_gain)
+        monkeypatch.setattr(weapon_optimizer, "calculate_total_weapon_atk_percent", counted_total)
+        data = {key: {'level': 1, 'awakening': 5} for key in ALL_KEYS}
+        path = generate_weapon_upgrade_path(data, "ancient_1", 100_000)
+        assert len(path) > 10 * len(data)
+        # One scoring per weapon up front, then a constant number per level
+        # bought, where re-scoring every weapon would cost len(data) per level
+        assert calls['gain'] <= len(data) + 4 * len(path)
+        assert calls['total'] == 1
+
+
+class TestEnhancerAllocation:
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_allocation_within_budget_and_greedy(self, seed):
+        rng = random.Random(seed)
+        data = _random_inventory(rng)
+        budget = rng.choice([100, 5_000, 100_000])
+        recs, equipped = calculate_optimal_enhancer_allocation(data, budget)
+        assert sum(r.cost for r in recs) <= budget
+        for rec in recs:
+            rarity, tier = rec.weapon_key.rsplit('_', 1)
+            assert rec.cost == calculate_total_cost(rarity, int(tier), rec.from_level, rec.to_level)
+            assert rec.display_name.endswith("(Equipped)") == (rec.weapon_key == equipped)
+        assert [r.atk_gain for r in recs] == sorted((r.atk_gain for r in recs), reverse=True)
+
+    def test_empty_budget(self):
+        data = {"ancient_2": {"level": 50, "awakening": 3}}
+        assert calculate_optimal_enhancer_allocation(data, 0, "ancient_2") == ([], "ancient_2")
+
+    def test_maxed_weapons_skipped(self):
+        data = {"ancient_2": {"level": 100, "awakening": 0}}
+        recs, _ = calculate_optimal_enhancer_allocation(data, 1_000_000)
+        assert recs == []
@@ -0,0 +1,170 @@
+"""
+Unit tests for game/weapon_summoning.py summon value tables
+
+Covers: rate table layout, fingerprint caching, incremental updates against
+a full rebuild (single weapon, equipped switch, promotion chains), and the
+EV functions built on the tables.
+"""
+import copy
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import game.weapon_summoning as ws
+from game.weapon_summoning import (
+    SUMMON_WEAPONS,
+    calculate_expected_value_per_summon,
+    calculate_expected_value_per_ticket,
+    calculate_weapon_drop_value,
+    get_all_weapon_rates,
+    get_summon_value_table,
+)
+
+
+KEYS = [f"{rarity}_{tier}" for rarity, tier in SUMMON_WEAPONS]
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    ws._summon_value_tables.clear()
+    yield
+    ws._summon_value_tables.clear()
+
+
+def _random_weapons(rng):
+    return {
+        key: {
+            'level': rng.choice([0, rng.randint(1, 200)]),
+            'awakening': rng.randint(0, 5),
+            'duplicates': rng.randint(0, 4),
+        }
+        for key in rng.sample(KEYS, rng.randint(3, len(KEYS)))
+    }
+
+
+def _full_rebuild(weapons_data, equipped_key):
+    ws._summon_value_tables.clear()
+    return get_summon_value_table(weapons_data, equipped_key)
+
+
+def _assert_tables_equal(a, b):
+    np.testing.assert_allclose(a.drop_values, b.drop_values, rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(a.summon_values, b.summon_values, rtol=1e-12, atol=1e-15)
+    assert {k: r['reason'] for k, r in a.drop_results.items()} == {
+        k: r['reason'] for k, r in b.drop_results.items()
+    }
+
+
+class TestRateTable:
+
+    def test_rates_match_per_level_lookup(self):
+        rates, orders = ws._summon_rate_table()
+        for level in range(1, 18):
+            expected = get_all_weapon_rates(level)
+            listed = [SUMMON_WEAPONS[i] for i in orders[level]]
+            assert listed == list(expected)
+            for (rarity, tier), rate in expected.items():
+                assert rates[level, SUMMON_WEAPONS.index((rarity, tier))] == rate
+            assert rates[level].sum() == pytest.approx(sum(expected.values()))
+
+
+class TestSummonValueTable:
+
+    def test_same_inventory_hits_cache(self):
+        weapons = _random_weapons(random.Random(1))
+        first = get_summon_value_table(weapons, KEYS[0])
+        assert get_summon_value_table(copy.deepcopy(weapons), KEYS[0]) is first
+
+    def test_values_match_drop_value_function(self):
+        weapons = _random_weapons(random.Random(2))
+        table = get_summon_value_table(weapons, 'legendary_2')
+        for i, (rarity, tier) in enumerate(SUMMON_WEAPONS):
+            expected = calculate_weapon_drop_value(rarity, tier, weapons, 'legendary_2', 0.0)
+            assert table.drop_values[i] == pytest.approx(expected['value'])
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_incremental_update_matches_rebuild(self, seed):
+        rng = random.Random(seed)
+        weapons = _random_weapons(rng)
+        equipped = rng.choice(KEYS)
+        get_summon_value_table(weapons, equipped)
+        for _ in range(15):
+            weapons = copy.deepcopy(weapons)
+            weapons[rng.choice(KEYS)] = {
+                'level': rng.choice([0, rng.randint(1, 200)]),
+                'awakening': rng.randint(0, 5),
+                'duplicates': rng.randint(0, 4),
+            }
+            if rng.random() < 0.2:
+                equipped = rng.choice(KEYS)
+            incremental = get_summon_value_table(weapons, equipped)
+            _assert_tables_equal(incremental, _full_rebuild(weapons, equipped))
+            get_summon_value_table(weapons, equipped)  # re-seed as latest
+
+    def test_single_change_recomputes_only_that_weapon(self, monkeypatch):
+        weapons = {key: {'level': 50, 'awakening': 2, 'duplicates': 0} for key in KEYS}
+        get_summon_value_table(weapons, 'ancient_4')
+
+        calls = []
+        original = ws.calculate_weapon_drop_value
+
+        def counting(rarity, tier, *args, **kwargs):
+            calls.append(f"{rarity}_{tier}")
+            return original(rarity, tier, *args, **kwargs)
+
+        monkeypatch.setattr(ws, 'calculate_weapon_drop_value', counting)
+        changed = copy.deepcopy(weapons)
+        changed['epic_3']['awakening'] = 3
+        get_summon_value_table(changed, 'ancient_4')
+        assert calls == ['epic_3']
+
+    def test_promotion_source_follows_target(self):
+        # Epic T1 at A5 is worth a share of a Unique T4 drop
+        weapons = {
+            'epic_1': {'level': 100, 'awakening': 5, 'duplicates': 0},
+            'unique_4': {'level': 0},
+            'normal_4': {'level': 10},
+        }
+        before = get_summon_value_table(weapons, 'normal_4')
+        weapons = copy.deepcopy(weapons)
+        weapons['unique_4'] = {'level': 150, 'awakening': 1, 'duplicates': 0}
+        after = get_summon_value_table(weapons, 'normal_4')
+        i = KEYS.index('epic_1')
+        assert after.drop_values[i] != before.drop_values[i]
+        assert after.drop_values[i] == pytest.approx(after.drop_values[KEYS.index('unique_4')] / 5)
+
+    def test_equipped_level_change_revalues_new_weapons(self):
+        weapons = {'rare_4': {'level': 1}}
+        low = get_summon_value_table(weapons, 'rare_4')
+        weapons = {'rare_4': {'level': 200, 'awakening': 5}}
+        high = get_summon_value_table(weapons, 'rare_4')
+        i = KEYS.index('rare_3')  # unowned, beats a level-1 Rare T4 but not a maxed one
+        assert high.drop_values[i] < low.drop_values[i]
+        _assert_tables_equal(high, _full_rebuild(weapons, 'rare_4'))
+
+
+class TestExpectedValue:
+
+    def test_ticket_ev_is_rate_weighted_drop_value(self):
+        weapons = _random_weapons(random.Random(5))
+        ev = calculate_expected_value_per_ticket(15, weapons, 'mystic_3', 250.0)
+        expected = sum(
+            rate * calculate_weapon_drop_value(r, t, weapons, 'mystic_3', 250.0)['value']
+            for (r, t), rate in get_all_weapon_rates(15).items()
+        )
+        assert ev['expected_value'] == pytest.approx(expected)
+        contributions = [b['contribution'] for b in ev['breakdown']]
+        assert contributions == sorted(contributions, reverse=True)
+
+    def test_summon_ev_progression_is_non_negative(self):
+        weapons = _random_weapons(random.Random(6))
+        result = calculate_expected_value_per_summon(5, weapons, 'unique_1', 100.0)
+        assert result['breakdown']['progression_value'] >= 0
+        assert result['level_values'][17] == pytest.approx(
+            ws._atk_to_dps(get_summon_value_table(weapons, 'unique_1').summon_level_values[17], 100.0)
+        )